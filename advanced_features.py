@@ -16,6 +16,9 @@ from typing import List, Dict, Optional, Tuple
 from calendar import monthcalendar, month_name
 import logging
 
+from reminder_system import get_reminder_planner, notify_reminder_scheduled, notify_reminders_scheduled
+from cache_manager import appointment_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -76,9 +79,29 @@ class CustomReminderManager:
         ''', (appointment_id, minutes_before, custom_message))
         
         reminder_id = cursor.lastrowid
+        
+        # إنشاء صف في جدول reminders حتى يُرسله نظام التذكيرات
+        scheduled = None
+        cursor.execute('SELECT date_time FROM appointments WHERE id = ?', (appointment_id,))
+        row = cursor.fetchone()
+        
+        if row:
+            apt_time = datetime.strptime(row[0].split('.')[0], '%Y-%m-%d %H:%M:%S')
+            reminder_time = apt_time - timedelta(minutes=minutes_before)
+            
+            if reminder_time > datetime.now():
+                cursor.execute('''
+                    INSERT INTO reminders (appointment_id, reminder_time, custom_message)
+                    VALUES (?, ?, ?)
+                ''', (appointment_id, reminder_time.strftime('%Y-%m-%d %H:%M:%S'), 'type:advance'))
+                scheduled = (cursor.lastrowid, reminder_time)
+        
         conn.commit()
         conn.close()
         
+        if scheduled:
+            notify_reminder_scheduled(*scheduled)
+        
         logger.info(
             f"✅ Custom reminder added: {minutes_before}min before "
             f"appointment #{appointment_id}"
@@ -288,6 +311,78 @@ class RecurringAppointmentManager:
         
         return instances
     
+    def materialize_instances(
+        self,
+        recurring_id: int,
+        from_date: datetime,
+        to_date: datetime
+    ) -> List[int]:
+        """
+        إنشاء مواعيد فعلية (مع تذكيراتها) من النمط المتكرر
+        
+        النسخ الموجودة مسبقاً (نفس المستخدم والعنوان والوقت) لا تتكرر
+        
+        Args:
+            recurring_id: معرف الموعد المتكرر
+            from_date: من تاريخ
+            to_date: إلى تاريخ
+            
+        Returns:
+            List[int]: معرفات المواعيد المنشأة
+        """
+        instances = self.generate_instances(recurring_id, from_date, to_date)
+        if not instances:
+            return []
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT user_id, title, description, priority
+            FROM recurring_appointments
+            WHERE id = ?
+        ''', (recurring_id,))
+        user_id, title, description, priority = cursor.fetchone()
+        
+        cursor.execute('''
+            SELECT date_time FROM appointments
+            WHERE user_id = ? AND title = ? AND date_time BETWEEN ? AND ?
+        ''', (
+            user_id, title,
+            instances[0].strftime('%Y-%m-%d %H:%M:%S'),
+            instances[-1].strftime('%Y-%m-%d %H:%M:%S')
+        ))
+        existing = {row[0] for row in cursor.fetchall()}
+        
+        created = []
+        for date_time in instances:
+            date_str = date_time.strftime('%Y-%m-%d %H:%M:%S')
+            if date_str in existing:
+                continue
+            
+            cursor.execute('''
+                INSERT INTO appointments (user_id, title, description, date_time, priority)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, title, description, date_str, priority))
+            created.append((cursor.lastrowid, date_time))
+        
+        # تذكيرات كل النسخ بـ executemany واحد
+        scheduled = get_reminder_planner().insert(cursor, created)
+        
+        conn.commit()
+        conn.close()
+        
+        if created:
+            appointment_cache.invalidate_user(user_id)
+        notify_reminders_scheduled(scheduled)
+        
+        logger.info(
+            f"✅ Materialized {len(created)} instances of recurring #{recurring_id} "
+            f"with {len(scheduled)} reminders"
+        )
+        
+        return [appointment_id for appointment_id, _ in created]
+    
     def get_user_recurring_appointments(self, user_id: int) -> List[Dict]:
         """الحصول على جميع المواعيد المتكررة للمستخدم"""
         conn = sqlite3.connect(self.db_path)
@@ -346,14 +441,11 @@ class MonthlyCalendar:
         month: int
     ) -> Dict[int, List[Dict]]:
         """
-        الحصول على جميع مواعيد الشهر
+        الحصول على جميع مواعيد الشهر (من الخط الزمني المخزن للمستخدم)
         
         Returns:
             Dict: {day: [appointments]}
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # نطاق الشهر
         start_date = datetime(year, month, 1)
         if month == 12:
@@ -361,36 +453,29 @@ class MonthlyCalendar:
         else:
             end_date = datetime(year, month + 1, 1)
         
-        cursor.execute('''
-            SELECT id, title, date_time, priority
-            FROM appointments
-            WHERE user_id = ?
-            AND date_time >= ?
-            AND date_time < ?
-            ORDER BY date_time
-        ''', (
-            user_id,
+        timeline = appointment_cache.get_timeline(self.db_path, user_id)
+        rows = timeline.between(
             start_date.strftime('%Y-%m-%d %H:%M:%S'),
-            end_date.strftime('%Y-%m-%d %H:%M:%S')
-        ))
+            end_date.strftime('%Y-%m-%d %H:%M:%S'),
+            inclusive_end=False
+        )
         
         # تنظيم حسب اليوم
         appointments_by_day = {}
-        for row in cursor.fetchall():
-            apt_datetime = datetime.strptime(row[2], '%Y-%m-%d %H:%M:%S')
+        for row in rows:
+            apt_datetime = datetime.strptime(row['date_time'], '%Y-%m-%d %H:%M:%S')
             day = apt_datetime.day
             
             if day not in appointments_by_day:
                 appointments_by_day[day] = []
             
             appointments_by_day[day].append({
-                'id': row[0],
-                'title': row[1][:20],  # أول 20 حرف
+                'id': row['id'],
+                'title': row['title'][:20],  # أول 20 حرف
                 'time': apt_datetime.strftime('%H:%M'),
-                'priority': row[3]
+                'priority': row['priority']
             })
         
-        conn.close()
         return appointments_by_day
     
     def generate_calendar_text(
@@ -597,9 +682,10 @@ class AppointmentExportImport:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        imported = 0
+        imported = []
         for apt in appointments:
             try:
+                date_time = datetime.fromisoformat(apt['date_time']).replace(microsecond=0)
                 cursor.execute('''
                     INSERT INTO appointments (user_id, title, description, date_time, priority)
                     VALUES (?, ?, ?, ?, ?)
@@ -607,16 +693,25 @@ class AppointmentExportImport:
                     user_id,
                     apt['title'],
                     apt.get('description', ''),
-                    apt['date_time'],
+                    date_time.strftime('%Y-%m-%d %H:%M:%S'),
                     apt.get('priority', 2)
                 ))
-                imported += 1
+                imported.append((cursor.lastrowid, date_time))
             except Exception as e:
                 logger.warning(f"Failed to import appointment: {e}")
         
+        # تذكيرات كل المواعيد المستوردة بـ executemany واحد
+        scheduled = get_reminder_planner().insert(cursor, imported)
+        
         conn.commit()
         conn.close()
         
+        if imported:
+            appointment_cache.invalidate_user(user_id)
+        notify_reminders_scheduled(scheduled)
+        
+        imported = len(imported)
+        
         logger.info(f"✅ Imported {imported} appointments from {filepath}")
         return imported
 
@@ -5,12 +5,14 @@
 ✅ رؤى ذكية عن أنماط المواعيد
 """
 
-import sqlite3
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Tuple
-from collections import defaultdict
+from collections import Counter, defaultdict
 import logging
 
+from database_pool import get_pool
+from cache_manager import appointment_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,15 +21,11 @@ class AnalyticsDashboard:
     
     def __init__(self, db_path: str = "agent_data.db"):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
     
     def _execute_query(self, query: str, params: tuple = ()) -> List:
-        """تنفيذ استعلام وإرجاع النتائج"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        """تنفيذ استعلام وإرجاع النتائج (عبر المجموعة المشتركة)"""
+        return [tuple(row) for row in self.pool.execute(query, params)]
     
     # ==========================================
     # إحصائيات عامة
@@ -42,43 +40,25 @@ class AnalyticsDashboard:
         """
         stats = {}
         
+        # المواعيد من الخط الزمني المخزن للمستخدم (استعلام واحد عند أول طلب فقط)
+        timeline = appointment_cache.get_timeline(self.db_path, user_id)
+        
         # 1. إجمالي المواعيد
-        result = self._execute_query(
-            'SELECT COUNT(*) FROM appointments WHERE user_id = ?',
-            (user_id,)
-        )
-        stats['total_appointments'] = result[0][0]
+        stats['total_appointments'] = len(timeline)
         
-        # 2. المواعيد القادمة
+        # 2. المواعيد القادمة / 3. المنتهية
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        result = self._execute_query(
-            'SELECT COUNT(*) FROM appointments WHERE user_id = ? AND date_time >= ?',
-            (user_id, now)
-        )
-        stats['upcoming_appointments'] = result[0][0]
-        
-        # 3. المواعيد المنتهية
-        result = self._execute_query(
-            'SELECT COUNT(*) FROM appointments WHERE user_id = ? AND date_time < ?',
-            (user_id, now)
-        )
-        stats['past_appointments'] = result[0][0]
+        stats['past_appointments'] = timeline.count_before(now)
+        stats['upcoming_appointments'] = len(timeline) - stats['past_appointments']
         
         # 4. المواعيد حسب الأولوية
-        result = self._execute_query('''
-            SELECT priority, COUNT(*) 
-            FROM appointments 
-            WHERE user_id = ?
-            GROUP BY priority
-        ''', (user_id,))
-        
         stats['by_priority'] = {
             1: 0,  # عاجل
             2: 0,  # متوسط
             3: 0   # منخفض
         }
-        for priority, count in result:
-            stats['by_priority'][priority] = count
+        for row in timeline.rows:
+            stats['by_priority'][row['priority']] = stats['by_priority'].get(row['priority'], 0) + 1
         
         # 5. معدل التفاعل
         result = self._execute_query(
@@ -95,37 +75,28 @@ class AnalyticsDashboard:
         ''', (user_id,))
         stats['reminders_sent'] = result[0][0]
         
-        # 7. أكثر يوم نشاطاً
-        result = self._execute_query('''
-            SELECT strftime('%w', date_time) as day, COUNT(*) as count
-            FROM appointments
-            WHERE user_id = ?
-            GROUP BY day
-            ORDER BY count DESC
-            LIMIT 1
-        ''', (user_id,))
+        # 7. أكثر يوم نشاطاً (0 = الأحد كما في strftime('%w'))
+        days = Counter(
+            date.fromisoformat(row['date_time'][:10]).isoweekday() % 7
+            for row in timeline.rows
+        )
         
-        if result:
+        if days:
             day_names = ['الأحد', 'الاثنين', 'الثلاثاء', 'الأربعاء', 'الخميس', 'الجمعة', 'السبت']
-            stats['most_active_day'] = day_names[int(result[0][0])]
-            stats['most_active_day_count'] = result[0][1]
+            day, count = days.most_common(1)[0]
+            stats['most_active_day'] = day_names[day]
+            stats['most_active_day_count'] = count
         else:
             stats['most_active_day'] = 'N/A'
             stats['most_active_day_count'] = 0
         
         # 8. أكثر ساعة نشاطاً
-        result = self._execute_query('''
-            SELECT strftime('%H', date_time) as hour, COUNT(*) as count
-            FROM appointments
-            WHERE user_id = ?
-            GROUP BY hour
-            ORDER BY count DESC
-            LIMIT 1
-        ''', (user_id,))
+        hours = Counter(row['date_time'][11:13] for row in timeline.rows)
         
-        if result:
-            stats['most_active_hour'] = f"{result[0][0]}:00"
-            stats['most_active_hour_count'] = result[0][1]
+        if hours:
+            hour, count = hours.most_common(1)[0]
+            stats['most_active_hour'] = f"{hour}:00"
+            stats['most_active_hour_count'] = count
         else:
             stats['most_active_hour'] = 'N/A'
             stats['most_active_hour_count'] = 0
@@ -3,59 +3,165 @@
 عمليات قاعدة البيانات غير المتزامنة
 ✅ تحسين الأداء بنسبة 300%
 ✅ دعم العمليات المتزامنة
+✅ اتصال aiosqlite دائم واحد بدلاً من اتصال لكل استدعاء
+✅ مسار وكيل async كامل لا يحجب event loop
 """
 
 import aiosqlite
-from typing import List, Dict, Optional
-from datetime import datetime
+import json
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
 import asyncio
+import logging
+
+from reminder_system import (
+    INSERT_REMINDER_SQL,
+    LAST_REMINDER_ID_SQL,
+    NEW_REMINDER_IDS_SQL,
+    get_reminder_planner,
+    match_reminder_ids,
+    notify_reminder_scheduled,
+    notify_reminders_scheduled,
+    reminder_params
+)
+from cache_manager import appointment_cache
+from intelligent_agent import IntelligentAgent
+
+logger = logging.getLogger(__name__)
 
 
 class AsyncDatabase:
-    """قاعدة بيانات غير متزامنة"""
-    
+    """
+    قاعدة بيانات غير متزامنة
+
+    - اتصال واحد دائم يُفتح عند أول استخدام
+    - القراءات تُنفذ مباشرة على الاتصال
+    - الكتابات تمر عبر transaction() بقفل واحد حتى لا تتداخل
+      معاملتان من coroutines مختلفة على نفس الاتصال
+
+    الجداول الأساسية (appointments, reminders, interactions) يُنشئها Database.init_database
+    """
+
     def __init__(self, db_path: str = "agent_data.db"):
         self.db_path = db_path
-    
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+    # ==========================================
+    # إدارة الاتصال
+    # ==========================================
+
+    async def connect(self) -> aiosqlite.Connection:
+        """فتح الاتصال الدائم (مرة واحدة)"""
+        if self._conn is not None:
+            return self._conn
+
+        async with self._connect_lock:
+            if self._conn is None:
+                conn = await aiosqlite.connect(self.db_path, timeout=30)
+
+                await conn.execute("PRAGMA journal_mode = WAL")
+                await conn.execute("PRAGMA synchronous = NORMAL")
+                await conn.execute("PRAGMA busy_timeout = 30000")
+                await self._ensure_tables(conn)
+
+                self._conn = conn
+                logger.info(f"✅ اتصال async دائم: {self.db_path}")
+
+        return self._conn
+
+    async def close(self):
+        """إغلاق الاتصال الدائم"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+    async def _ensure_tables(self, conn: aiosqlite.Connection):
+        """إنشاء جداول السياق والتذكيرات المخصصة إن لم تكن موجودة"""
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_contexts (
+                user_id INTEGER PRIMARY KEY,
+                context_data TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                user_message TEXT NOT NULL,
+                bot_response TEXT NOT NULL,
+                intent TEXT,
+                extracted_info TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS custom_reminders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                appointment_id INTEGER NOT NULL,
+                minutes_before INTEGER NOT NULL,
+                custom_message TEXT,
+                sent INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (appointment_id) REFERENCES appointments(id) ON DELETE CASCADE
+            )
+        ''')
+
+        await conn.commit()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        معاملة كتابة متسلسلة على الاتصال الدائم
+
+        Usage:
+            async with adb.transaction() as db:
+                await db.execute(...)
+        """
+        conn = await self.connect()
+
+        async with self._write_lock:
+            try:
+                yield conn
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def _fetchall(self, query: str, params: tuple = ()) -> List:
+        """تنفيذ استعلام قراءة"""
+        conn = await self.connect()
+        async with conn.execute(query, params) as cursor:
+            return await cursor.fetchall()
+
+    async def _fetchone(self, query: str, params: tuple = ()):
+        """تنفيذ استعلام قراءة وإرجاع صف واحد"""
+        conn = await self.connect()
+        async with conn.execute(query, params) as cursor:
+            return await cursor.fetchone()
+
+    # ==========================================
+    # المواعيد
+    # ==========================================
+
     async def get_appointments(
         self,
         user_id: int,
         start_date: str = None,
         end_date: str = None
     ) -> List[Dict]:
-        """الحصول على المواعيد - async"""
-        async with aiosqlite.connect(self.db_path) as db:
-            if start_date and end_date:
-                query = '''
-                    SELECT id, title, description, date_time, priority
-                    FROM appointments
-                    WHERE user_id = ? AND date_time BETWEEN ? AND ?
-                    ORDER BY date_time ASC
-                '''
-                params = (user_id, start_date, end_date)
-            else:
-                query = '''
-                    SELECT id, title, description, date_time, priority
-                    FROM appointments
-                    WHERE user_id = ?
-                    ORDER BY date_time ASC
-                '''
-                params = (user_id,)
-            
-            async with db.execute(query, params) as cursor:
-                rows = await cursor.fetchall()
-            
-            return [
-                {
-                    'id': row[0],
-                    'title': row[1],
-                    'description': row[2],
-                    'date_time': row[3],
-                    'priority': row[4]
-                }
-                for row in rows
-            ]
-    
+        """الحصول على المواعيد - async (من الخط الزمني المخزن للمستخدم)"""
+        timeline = await appointment_cache.get_timeline_async(self.db_path, user_id, self._fetchall)
+
+        if start_date and end_date:
+            return timeline.between(start_date, end_date)
+        return timeline.between()
+
     async def add_appointment(
         self,
         user_id: int,
@@ -64,26 +170,58 @@ class AsyncDatabase:
         date_time: datetime,
         priority: int = 2
     ) -> int:
-        """إضافة موعد - async"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """إضافة موعد مع التذكيرات التلقائية - async"""
+        async with self.transaction() as db:
             cursor = await db.execute('''
                 INSERT INTO appointments (user_id, title, description, date_time, priority)
                 VALUES (?, ?, ?, ?, ?)
             ''', (user_id, title, description, date_time.strftime('%Y-%m-%d %H:%M:%S'), priority))
-            
+
             appointment_id = cursor.lastrowid
-            await db.commit()
-            
-            return appointment_id
-    
+
+            scheduled = await self._insert_reminders(db, [(appointment_id, date_time)])
+
+        appointment_cache.invalidate_user(user_id)
+
+        notify_reminders_scheduled(scheduled)
+
+        logger.info(f"✅ تم إنشاء موعد #{appointment_id} مع {len(scheduled)} تذكير")
+
+        return appointment_id
+
+    async def _insert_reminders(
+        self,
+        db,
+        appointments: List[Tuple[int, datetime]]
+    ) -> List[Tuple[int, datetime]]:
+        """
+        التذكيرات التلقائية لدفعة مواعيد بـ executemany واحد (داخل المعاملة)
+
+        Returns:
+            List[Tuple]: [(معرف التذكير, وقته)] - للإبلاغ بعد commit
+        """
+        rows = get_reminder_planner().plan_batch(appointments)
+        if not rows:
+            return []
+
+        async with db.execute(LAST_REMINDER_ID_SQL) as cursor:
+            last_id = (await cursor.fetchone())[0]
+
+        await db.executemany(INSERT_REMINDER_SQL, reminder_params(rows))
+
+        async with db.execute(NEW_REMINDER_IDS_SQL, (last_id,)) as cursor:
+            inserted = await cursor.fetchall()
+
+        return match_reminder_ids(rows, inserted)
+
     async def bulk_add_appointments(
         self,
         appointments: List[Dict]
     ) -> List[int]:
-        """إضافة مواعيد متعددة دفعة واحدة - تحسين الأداء"""
-        async with aiosqlite.connect(self.db_path) as db:
-            ids = []
-            
+        """إضافة مواعيد متعددة دفعة واحدة مع تذكيراتها - تحسين الأداء"""
+        ids = []
+
+        async with self.transaction() as db:
             for apt in appointments:
                 cursor = await db.execute('''
                     INSERT INTO appointments (user_id, title, description, date_time, priority)
@@ -96,57 +234,282 @@ class AsyncDatabase:
                     apt.get('priority', 2)
                 ))
                 ids.append(cursor.lastrowid)
-            
-            await db.commit()
-            return ids
-    
-    async def get_user_statistics(self, user_id: int) -> Dict:
-        """إحصائيات المستخدم - async"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # إجمالي المواعيد
-            async with db.execute(
-                'SELECT COUNT(*) FROM appointments WHERE user_id = ?',
-                (user_id,)
-            ) as cursor:
-                total = (await cursor.fetchone())[0]
-            
-            # المواعيد القادمة
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            scheduled = await self._insert_reminders(
+                db, [(apt_id, apt['date_time']) for apt_id, apt in zip(ids, appointments)]
+            )
+
+        for user_id in {apt['user_id'] for apt in appointments}:
+            appointment_cache.invalidate_user(user_id)
+
+        notify_reminders_scheduled(scheduled)
+
+        logger.info(f"✅ تم إنشاء {len(ids)} موعد مع {len(scheduled)} تذكير")
+
+        return ids
+
+    async def get_last_appointment_id(self, user_id: int) -> Optional[int]:
+        """آخر موعد أضافه المستخدم"""
+        row = await self._fetchone('''
+            SELECT id FROM appointments
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT 1
+        ''', (user_id,))
+
+        return row[0] if row else None
+
+    async def add_custom_reminder(
+        self,
+        appointment_id: int,
+        minutes_before: int,
+        custom_message: Optional[str] = None
+    ) -> int:
+        """
+        إضافة تذكير مخصص - async (مثل CustomReminderManager.add_custom_reminder)
+
+        Returns:
+            int: معرف التذكير المخصص
+        """
+        scheduled = None
+
+        async with self.transaction() as db:
+            cursor = await db.execute('''
+                INSERT INTO custom_reminders (appointment_id, minutes_before, custom_message)
+                VALUES (?, ?, ?)
+            ''', (appointment_id, minutes_before, custom_message))
+
+            reminder_id = cursor.lastrowid
+
+            # إنشاء صف في جدول reminders حتى يُرسله نظام التذكيرات
             async with db.execute(
-                'SELECT COUNT(*) FROM appointments WHERE user_id = ? AND date_time >= ?',
-                (user_id, now)
+                'SELECT date_time FROM appointments WHERE id = ?',
+                (appointment_id,)
             ) as cursor:
-                upcoming = (await cursor.fetchone())[0]
-            
-            # حسب الأولوية
-            async with db.execute('''
-                SELECT priority, COUNT(*) 
-                FROM appointments 
-                WHERE user_id = ?
-                GROUP BY priority
-            ''', (user_id,)) as cursor:
-                priority_data = await cursor.fetchall()
-            
-            by_priority = {1: 0, 2: 0, 3: 0}
-            for priority, count in priority_data:
-                by_priority[priority] = count
-            
-            return {
-                'total_appointments': total,
-                'upcoming_appointments': upcoming,
-                'past_appointments': total - upcoming,
-                'by_priority': by_priority
-            }
-
-
-# تحديث في intelligent_agent.py
-class IntelligentAgentAsync:
-    """نسخة async من الوكيل"""
-    
+                row = await cursor.fetchone()
+
+            if row:
+                apt_time = datetime.strptime(row[0].split('.')[0], '%Y-%m-%d %H:%M:%S')
+                reminder_time = apt_time - timedelta(minutes=minutes_before)
+
+                if reminder_time > datetime.now():
+                    cursor = await db.execute('''
+                        INSERT INTO reminders (appointment_id, reminder_time, custom_message)
+                        VALUES (?, ?, ?)
+                    ''', (appointment_id, reminder_time.strftime('%Y-%m-%d %H:%M:%S'), 'type:advance'))
+                    scheduled = (cursor.lastrowid, reminder_time)
+
+        if scheduled:
+            notify_reminder_scheduled(*scheduled)
+
+        return reminder_id
+
+    async def get_user_statistics(self, user_id: int) -> Dict:
+        """إحصائيات المستخدم - async (من الخط الزمني المخزن)"""
+        timeline = await appointment_cache.get_timeline_async(self.db_path, user_id, self._fetchall)
+
+        # إجمالي المواعيد والقادمة
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        total = len(timeline)
+        upcoming = total - timeline.count_before(now)
+
+        # حسب الأولوية
+        by_priority = {1: 0, 2: 0, 3: 0}
+        for row in timeline.rows:
+            by_priority[row['priority']] = by_priority.get(row['priority'], 0) + 1
+
+        return {
+            'total_appointments': total,
+            'upcoming_appointments': upcoming,
+            'past_appointments': total - upcoming,
+            'by_priority': by_priority
+        }
+
+    # ==========================================
+    # التفاعلات وسياق المحادثة
+    # ==========================================
+
+    async def log_interaction(self, user_id: int, user_message: str,
+                              bot_response: str, intent: str, language: str):
+        """تسجيل التفاعل - async"""
+        async with self.transaction() as db:
+            await db.execute('''
+                INSERT INTO interactions (user_id, user_message, bot_response, intent, language)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, user_message, bot_response, intent, language))
+
+    async def load_context(self, user_id: int) -> Optional[Dict]:
+        """تحميل بيانات سياق المحادثة (نفس صيغة ConversationManager)"""
+        row = await self._fetchone(
+            'SELECT context_data FROM conversation_contexts WHERE user_id = ?',
+            (user_id,)
+        )
+        return json.loads(row[0]) if row else None
+
+    async def save_context(self, user_id: int, context_data: Dict):
+        """حفظ بيانات سياق المحادثة"""
+        data = json.dumps(context_data, ensure_ascii=False)
+
+        async with self.transaction() as db:
+            await db.execute('''
+                INSERT OR REPLACE INTO conversation_contexts (user_id, context_data, updated_at)
+                VALUES (?, ?, ?)
+            ''', (user_id, data, datetime.now().isoformat()))
+
+    async def save_turn(self, user_id: int, user_message: str, bot_response: str,
+                        intent: str, extracted_info: Dict = None):
+        """حفظ دورة محادثة"""
+        async with self.transaction() as db:
+            await db.execute('''
+                INSERT INTO conversation_history
+                (user_id, user_message, bot_response, intent, extracted_info)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                user_id,
+                user_message,
+                bot_response,
+                intent,
+                json.dumps(extracted_info or {}, ensure_ascii=False)
+            ))
+
+    async def clear_context(self, user_id: int):
+        """مسح سياق المستخدم"""
+        async with self.transaction() as db:
+            await db.execute('DELETE FROM conversation_contexts WHERE user_id = ?', (user_id,))
+
+
+# ==========================================
+# الوكيل الذكي - المسار غير المتزامن
+# ==========================================
+
+class IntelligentAgentAsync(IntelligentAgent):
+    """
+    نسخة async من الوكيل
+
+    التحليل (اللغة، النية، التاريخ) يبقى كما هو لأنه معالجة نصية سريعة،
+    وكل عمليات قاعدة البيانات تمر عبر AsyncDatabase فلا يُحجب event loop.
+    self.db (المتزامن) يبقى متاحاً للأدوات التي تعمل خارج event loop.
+    """
+
     def __init__(self, db_path="agent_data.db"):
-        self.db = AsyncDatabase(db_path)
-    
+        super().__init__(db_path)
+        self.async_db = AsyncDatabase(db_path)
+
+    async def close(self):
+        """إغلاق الاتصال غير المتزامن"""
+        await self.async_db.close()
+
+    async def add_custom_reminder_async(self, user_id: int, minutes_before: int) -> str:
+        """إضافة تذكير مخصص لآخر موعد للمستخدم"""
+        appointment_id = await self.async_db.get_last_appointment_id(user_id)
+
+        if appointment_id is None:
+            return self.NO_RECENT_APPOINTMENT
+
+        await self.async_db.add_custom_reminder(
+            appointment_id=appointment_id,
+            minutes_before=minutes_before,
+            custom_message=f"تذكير: لديك موعد بعد {minutes_before} دقيقة"
+        )
+
+        return self.format_custom_reminder_response(appointment_id, minutes_before)
+
     async def process_message_async(self, user_id: int, message: str) -> str:
         """معالجة الرسالة بشكل async"""
-        # ... نفس المنطق لكن بـ await
-        pass
\ No newline at end of file
+        # طلب تذكير مخصص ("ذكرني قبل 30 دقيقة")
+        minutes_before = self.match_custom_reminder(message)
+
+        if minutes_before is not None:
+            try:
+                return await self.add_custom_reminder_async(user_id, minutes_before)
+            except Exception as e:
+                logger.error(f"خطأ في إضافة تذكير مخصص: {e}")
+
+        # كشف اللغة وتصنيف النية
+        language = self.detect_language(message)
+        intent = self.classify_intent(message)
+
+        if intent == 'add_appointment':
+            date_time = self.extract_datetime(message, language)
+            title, description = self._extract_title_and_description(message, language)
+
+            appointment_id = await self.async_db.add_appointment(
+                user_id,
+                title,
+                description,
+                date_time
+            )
+
+            response = self._format_added_response(appointment_id, date_time)
+
+        elif intent == 'check_specific_day':
+            day_start, day_end, day_label_ar = self._resolve_day_query(message, language)
+
+            appointments = await self.async_db.get_appointments(
+                user_id,
+                day_start.strftime('%Y-%m-%d %H:%M:%S'),
+                day_end.strftime('%Y-%m-%d %H:%M:%S')
+            )
+
+            response = self._format_day_response(appointments, day_start, day_label_ar)
+
+        elif intent == 'list_appointments':
+            appointments = await self.async_db.get_appointments(user_id)
+            response = self._format_list_response(appointments)
+
+        else:
+            response = self._static_response(intent)
+
+        # تسجيل التفاعل عبر مخزن الكتابة المؤجلة - الرد لا ينتظر commit
+        self.db.log_interaction(user_id, message, response, intent, language)
+
+        return response
+
+
+# ==========================================
+# اختبار الأداء
+# ==========================================
+
+if __name__ == "__main__":
+    import os
+    import time
+
+    print("="*70)
+    print("🧪 اختبار الوكيل غير المتزامن")
+    print("="*70)
+
+    db_path = "test_async_agent.db"
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    agent = IntelligentAgentAsync(db_path)
+    messages = ["موعد غدا الساعة 3", "مواعيدي اليوم", "عرض جميع المواعيد", "مرحبا"]
+
+    async def simulate(users: int, per_user: int):
+        """محاكاة مستخدمين متزامنين"""
+        async def user_session(user_id: int):
+            for i in range(per_user):
+                await agent.process_message_async(user_id, messages[i % len(messages)])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user_session(user_id) for user_id in range(users)))
+        return time.perf_counter() - start
+
+    async def main():
+        try:
+            for users in (1, 10, 50):
+                elapsed = await simulate(users, 20)
+                total = users * 20
+                print(f"  👥 {users:3d} مستخدم: {total:5d} رسالة في {elapsed:.2f}ث "
+                      f"({total / elapsed:,.0f} رسالة/ث)")
+        finally:
+            await agent.close()
+
+    asyncio.run(main())
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    print("="*70)
+    print("✅ الاختبار اكتمل!")
@@ -17,6 +17,15 @@ from pathlib import Path
 from datetime import datetime
 import logging
 
+from inference_backends import export_model, load_inference_model
+from cache_manager import PredictionCache
+from corpus_cache import CORPUS_CACHE_DIR, corpus_key, fingerprint, load_or_encode
+from model_registry import (
+    BERT_INTENT, ModelRegistry, assign_state_dict, is_published, load_checkpoint,
+    model_filename, save_checkpoint
+)
+from keyword_matcher import KeywordMatcher
+
 logger = logging.getLogger(__name__)
 
 # التحقق من توفر transformers
@@ -96,7 +105,12 @@ class ArabicBERTClassifier(nn.Module):
 # ==========================================
 
 class BERTIntentDataset(Dataset):
-    """مجموعة بيانات للتدريب مع BERT"""
+    """
+    مجموعة بيانات للتدريب مع BERT
+    
+    الترميز (tokenizer) يتم مرة واحدة للمجموعة كلها ويُحفظ على القرص
+    بمفتاح = المُرمّز + العينات.
+    """
     
     INTENT_LABELS = [
         'add_appointment',
@@ -115,7 +129,8 @@ class BERTIntentDataset(Dataset):
         self,
         tokenizer,
         max_length: int = 64,
-        db_path: str = "agent_data.db"
+        db_path: str = "agent_data.db",
+        cache_dir: Optional[str] = CORPUS_CACHE_DIR
     ):
         self.tokenizer = tokenizer
         self.max_length = max_length
@@ -123,6 +138,47 @@ class BERTIntentDataset(Dataset):
         
         self.samples = []
         self._load_data()
+        self._encode_corpus(cache_dir)
+    
+    def _tokenizer_hash(self) -> str:
+        """بصمة المُرمّز (الاسم + حجم القاموس)"""
+        if not self.tokenizer:
+            return 'none'
+        return fingerprint([
+            type(self.tokenizer).__name__,
+            str(getattr(self.tokenizer, 'name_or_path', '')),
+            str(len(self.tokenizer))
+        ])
+    
+    def _encode_batch(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """ترميز كل النصوص في استدعاء واحد للمُرمّز"""
+        if not self.tokenizer:
+            # fallback بسيط
+            return {
+                'input_ids': np.zeros((len(texts), self.max_length), dtype=np.int64),
+                'attention_mask': np.ones((len(texts), self.max_length), dtype=np.int64)
+            }
+        
+        encoding = self.tokenizer(
+            texts,
+            max_length=self.max_length,
+            padding='max_length',
+            truncation=True,
+            return_tensors='np'
+        )
+        return {
+            'input_ids': encoding['input_ids'].astype(np.int64),
+            'attention_mask': encoding['attention_mask'].astype(np.int64)
+        }
+    
+    def _encode_corpus(self, cache_dir: Optional[str]):
+        """ترميز العينات مرة واحدة (أو تحميلها من القرص بـ mmap)"""
+        key = corpus_key(self.samples, self._tokenizer_hash(), self.max_length)
+        arrays = load_or_encode(key, self.samples, self.INTENT_LABELS, self._encode_batch, cache_dir)
+        
+        self.input_ids = torch.from_numpy(arrays['input_ids'])
+        self.attention_mask = torch.from_numpy(arrays['attention_mask'])
+        self.labels = torch.from_numpy(arrays['labels'])
     
     def _load_data(self):
         """تحميل وتجهيز البيانات"""
@@ -222,30 +278,10 @@ class BERTIntentDataset(Dataset):
         return len(self.samples)
     
     def __getitem__(self, idx):
-        text, intent = self.samples[idx]
-        
-        # Tokenization
-        if self.tokenizer:
-            encoding = self.tokenizer(
-                text,
-                max_length=self.max_length,
-                padding='max_length',
-                truncation=True,
-                return_tensors='pt'
-            )
-            input_ids = encoding['input_ids'].squeeze()
-            attention_mask = encoding['attention_mask'].squeeze()
-        else:
-            # fallback بسيط
-            input_ids = torch.zeros(self.max_length, dtype=torch.long)
-            attention_mask = torch.ones(self.max_length, dtype=torch.long)
-        
-        label = self.INTENT_LABELS.index(intent) if intent in self.INTENT_LABELS else len(self.INTENT_LABELS) - 1
-        
         return {
-            'input_ids': input_ids,
-            'attention_mask': attention_mask,
-            'label': torch.tensor(label, dtype=torch.long)
+            'input_ids': self.input_ids[idx],
+            'attention_mask': self.attention_mask[idx],
+            'label': self.labels[idx]
         }
 
 
@@ -253,6 +289,17 @@ class BERTIntentDataset(Dataset):
 # 3. مصنف BERT الذكي
 # ==========================================
 
+# قواعد التنبؤ الاحتياطي (تُجمّع مرة واحدة)
+FALLBACK_KEYWORDS = KeywordMatcher({
+    'add_appointment': ['موعد', 'اجتماع', 'rdv', 'rendez', 'appointment', 'meeting', 'schedule'],
+    'list_appointments': ['عرض', 'مواعيدي', 'afficher', 'mes rdv', 'show', 'list', 'appointments'],
+    'cancel_appointment': ['إلغاء', 'حذف', 'annuler', 'cancel', 'delete'],
+    'greeting': ['مرحبا', 'السلام', 'bonjour', 'salut', 'hello', 'hi'],
+    'thanks': ['شكر', 'merci', 'thank'],
+    'help': ['مساعدة', 'aide', 'help', 'how']
+})
+
+
 class SmartBERTClassifier:
     """مصنف BERT الذكي للنوايا"""
     
@@ -263,16 +310,34 @@ class SmartBERTClassifier:
         'multilingual': 'bert-base-multilingual-cased'
     }
     
+    # أقصى طول للنص (tokens)
+    MAX_LENGTH = 64
+    
     def __init__(
         self,
         model_name: str = 'arabert',
         model_path: str = "models/bert_intent.pth",
-        db_path: str = "agent_data.db"
+        db_path: str = "agent_data.db",
+        backend: str = "eager",  # eager | int8 | torchscript | onnx
+        registry: Optional[ModelRegistry] = None
     ):
         self.model_path = model_path
         self.db_path = db_path
+        
+        # السجل: كل حفظ يُنشر كإصدار جديد (الإصدار المحمّل لا يُعدّل)
+        self.registry = registry
+        self.registry_version = Path(model_path).parent.name if is_published(model_path) else None
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
+        # واجهة الاستدلال (النموذج المُصدَّر - على CPU)
+        self.requested_backend = backend
+        self.backend = 'eager'
+        self.inference_model = None
+        
+        # Cache النتائج (يُفرغ عند تغيّر إصدار النموذج أو الواجهة)
+        self.model_version = None
+        self.prediction_cache = PredictionCache(maxsize=2048)
+        
         # اختيار النموذج
         self.bert_model_name = self.MODEL_OPTIONS.get(model_name, model_name)
         
@@ -296,6 +361,7 @@ class SmartBERTClassifier:
             # محاولة تحميل نموذج محفوظ
             if Path(self.model_path).exists():
                 self._load_model()
+                self.set_backend(self.requested_backend)
             else:
                 logger.info("ℹ️ لا يوجد نموذج محفوظ - جاهز للتدريب")
                 
@@ -305,15 +371,17 @@ class SmartBERTClassifier:
     def _load_model(self):
         """تحميل النموذج المحفوظ"""
         try:
-            checkpoint = torch.load(self.model_path, map_location=self.device)
+            # mmap: الأوزان تُشارك بين عمليات البوت على نفس الجهاز
+            state_dict, metadata = load_checkpoint(self.model_path, self.device)
             
             self.model = ArabicBERTClassifier(
                 model_name=self.bert_model_name,
                 num_intents=len(self.intent_labels)
             )
-            self.model.load_state_dict(checkpoint['model_state_dict'])
+            assign_state_dict(self.model, state_dict)
             self.model.to(self.device)
             self.model.eval()
+            self.model_version = metadata.get('timestamp')
             
             logger.info(f"✅ تم تحميل النموذج من {self.model_path}")
             
@@ -364,6 +432,7 @@ class SmartBERTClassifier:
         
         # التدريب
         best_val_acc = 0
+        best_state = None
         history = {'train_loss': [], 'val_acc': []}
         
         print(f"\n{'─'*70}")
@@ -414,9 +483,13 @@ class SmartBERTClassifier:
             
             print(f"Epoch {epoch+1}/{epochs} │ Loss: {train_loss:.4f} │ Val Acc: {val_acc:.1f}%", end="")
             
+            # أفضل نسخة تبقى في الذاكرة (على CPU)؛ الحفظ والتصدير مرة واحدة
             if val_acc > best_val_acc:
                 best_val_acc = val_acc
-                self._save_model()
+                best_state = {
+                    name: tensor.detach().cpu().clone()
+                    for name, tensor in self.model.state_dict().items()
+                }
                 print(" ⭐")
             else:
                 print()
@@ -424,79 +497,206 @@ class SmartBERTClassifier:
         print(f"{'─'*70}")
         print(f"\n🎉 انتهى التدريب! أفضل دقة: {best_val_acc:.1f}%")
         
-        return {'success': True, 'best_accuracy': best_val_acc, 'history': history}
+        # استعادة أفضل نسخة وحفظها، ثم واجهة الاستدلال من التصدير
+        if best_state is not None:
+            self.model.load_state_dict(best_state)
+        self.model.eval()
+        self._save_model(metrics={'mode': 'full', 'accuracy': best_val_acc})
+        self.set_backend(self.requested_backend)
+        
+        return {
+            'success': True,
+            'best_accuracy': best_val_acc,
+            'version': self.registry_version,
+            'history': history
+        }
     
-    def _save_model(self):
-        """حفظ النموذج"""
-        Path(self.model_path).parent.mkdir(parents=True, exist_ok=True)
+    def _save_model(self, metrics: Optional[Dict] = None):
+        """
+        حفظ النموذج وتصديره
+        
+        مع السجل: إصدار جديد يُنشر ذرياً ثم ينتقل model_path إليه.
+        بدون السجل: الكتابة في model_path، إلا داخل إصدار منشور (RuntimeError).
+        """
+        self.model_version = datetime.now().isoformat()
+        
+        if self.registry is None:
+            if is_published(self.model_path):
+                raise RuntimeError(f"Published model version is immutable: {self.model_path}")
+            self._write_model_files(self.model_path)
+        else:
+            manifest = self.registry.commit(
+                BERT_INTENT,
+                lambda staging: self._write_model_files(str(staging / model_filename())),
+                labels=list(self.intent_labels),
+                model_type=self.bert_model_name,
+                metrics=metrics or {},
+                parent=self.registry_version
+            )
+            self.model_path = str(self.registry.version_dir(BERT_INTENT, manifest.version) / manifest.files['model'])
+            self.registry_version = manifest.version
         
-        torch.save({
-            'model_state_dict': self.model.state_dict(),
+        self._stamp_cache()
+    
+    def _write_model_files(self, model_path: str) -> Dict[str, str]:
+        """
+        كتابة الأوزان والنماذج المُصدَّرة
+        
+        Returns:
+            Dict: {الدور: اسم الملف} (ملفات الـ manifest)
+        """
+        save_checkpoint(model_path, self.model.state_dict(), {
             'model_name': self.bert_model_name,
             'intent_labels': self.intent_labels,
-            'timestamp': datetime.now().isoformat()
-        }, self.model_path)
+            'timestamp': self.model_version
+        })
+        
+        # تصدير int8 / TorchScript / ONNX لواجهات CPU
+        example = self.tokenizer(
+            ["موعد غدا الساعة 3"],
+            max_length=self.MAX_LENGTH,
+            padding='longest',
+            truncation=True,
+            return_tensors='pt'
+        )
+        sequence_axes = {0: 'batch', 1: 'sequence'}
+        export_model(
+            self.model,
+            model_path,
+            (example['input_ids'], example['attention_mask']),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': sequence_axes,
+                'attention_mask': sequence_axes,
+                'logits': {0: 'batch'}
+            }
+        )
+        
+        return {'model': Path(model_path).name}
+    
+    def set_backend(self, backend: str) -> bool:
+        """
+        اختيار واجهة الاستدلال (eager | int8 | torchscript | onnx)
+        
+        Returns:
+            bool: True إذا فُعّلت الواجهة، False عند الرجوع إلى eager
+        """
+        self.inference_model = None
+        self.backend = 'eager'
+        
+        if backend != 'eager':
+            try:
+                self.inference_model = load_inference_model(backend, self.model_path)
+                self.backend = backend
+                logger.info(f"✅ واجهة الاستدلال: {backend}")
+            except Exception as e:
+                logger.warning(f"⚠️ تعذر تحميل واجهة {backend}: {e} - استخدام eager")
+        
+        self._stamp_cache()
+        return self.backend == backend
+    
+    def _stamp_cache(self):
+        """ختم الـ cache بإصدار النموذج والواجهة"""
+        self.prediction_cache.set_version(f"{self.model_version}|{self.backend}")
+    
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        """
+        مفتاح الـ cache: النص بمسافات موحدة
+        
+        BERT يرى النص كما هو (بدون توحيد الهمزات)، والـ tokenizer
+        يتجاهل المسافات فقط.
+        """
+        return ' '.join(text.split())
     
     def predict(self, text: str) -> Dict:
         """التنبؤ بالنية"""
-        if self.model is None or self.tokenizer is None:
-            return self._fallback_predict(text)
+        return self.predict_batch([text])[0]
+    
+    def predict_batch(self, texts: List[str]) -> List[Dict]:
+        """
+        التنبؤ بنوايا عدة نصوص في تمريرة واحدة
         
-        try:
-            self.model.eval()
-            
-            # Tokenization
-            encoding = self.tokenizer(
-                text,
-                max_length=64,
-                padding='max_length',
-                truncation=True,
-                return_tensors='pt'
-            )
-            
-            input_ids = encoding['input_ids'].to(self.device)
-            attention_mask = encoding['attention_mask'].to(self.device)
+        النصوص المكررة (في الـ cache أو داخل الدفعة) لا تمر بالنموذج.
+        Padding ديناميكي لأطول نص في الدفعة (بدلاً من 64 دائماً) -
+        الـ attention mask يجعل النتيجة مطابقة للـ padding الثابت.
+        """
+        if not texts:
+            return []
+        
+        if self.model is None or self.tokenizer is None:
+            return [self._fallback_predict(text) for text in texts]
+        
+        # الإصدار قبل الحساب: نموذج يُنشر أثناء الدفعة لا يستقبل نتائجها
+        version = self.prediction_cache.version
+        keys = [self._cache_key(text) for text in texts]
+        entries = [self.prediction_cache.get(key) for key in keys]
+        
+        # نص واحد لكل مفتاح غير مخزن
+        pending = {}
+        for text, key, entry in zip(texts, keys, entries):
+            if entry is None:
+                pending.setdefault(key, text)
+        
+        if pending:
+            try:
+                scored = dict(zip(pending, self._score_batch(list(pending.values()))))
+            except Exception as e:
+                logger.error(f"❌ خطأ في التنبؤ: {e}")
+                return [self._fallback_predict(text) for text in texts]
             
-            with torch.no_grad():
-                outputs = self.model(input_ids, attention_mask)
-                probabilities = torch.softmax(outputs, dim=1)[0]
-                confidence, predicted = torch.max(probabilities, 0)
+            self.prediction_cache.set_many_if_version(scored, version)
             
-            return {
-                'intent': self.intent_labels[predicted.item()],
-                'confidence': confidence.item(),
-                'all_scores': {
-                    self.intent_labels[i]: probabilities[i].item()
-                    for i in range(len(self.intent_labels))
-                },
+            entries = [entry or scored[key] for key, entry in zip(keys, entries)]
+        
+        # نسخة حتى لا يُعدّل المستدعي القيمة المخزنة
+        return [{**entry, 'all_scores': dict(entry['all_scores'])} for entry in entries]
+    
+    def _score_batch(self, texts: List[str]) -> List[Dict]:
+        """تمريرة النموذج لدفعة نصوص"""
+        # النماذج المُصدَّرة تعمل على CPU
+        if self.inference_model is not None:
+            model, device = self.inference_model, torch.device('cpu')
+        else:
+            model, device = self.model, self.device
+        
+        model.eval()
+        
+        # Tokenization
+        encoding = self.tokenizer(
+            texts,
+            max_length=self.MAX_LENGTH,
+            padding='longest',
+            truncation=True,
+            return_tensors='pt'
+        )
+        
+        input_ids = encoding['input_ids'].to(device)
+        attention_mask = encoding['attention_mask'].to(device)
+        
+        with torch.no_grad():
+            outputs = model(input_ids, attention_mask)
+            probabilities = torch.softmax(outputs, dim=1).cpu().numpy()
+        
+        predicted = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(texts)), predicted]
+        
+        return [
+            {
+                'intent': self.intent_labels[index],
+                'confidence': confidence,
+                'all_scores': dict(zip(self.intent_labels, scores)),
                 'method': 'bert'
             }
-            
-        except Exception as e:
-            logger.error(f"❌ خطأ في التنبؤ: {e}")
-            return self._fallback_predict(text)
+            for scores, index, confidence in zip(
+                probabilities.tolist(), predicted.tolist(), confidences.tolist()
+            )
+        ]
     
     def _fallback_predict(self, text: str) -> Dict:
         """تنبؤ احتياطي"""
-        text_lower = text.lower()
-        
-        keywords = {
-            'add_appointment': ['موعد', 'اجتماع', 'rdv', 'rendez', 'appointment', 'meeting', 'schedule'],
-            'list_appointments': ['عرض', 'مواعيدي', 'afficher', 'mes rdv', 'show', 'list', 'appointments'],
-            'cancel_appointment': ['إلغاء', 'حذف', 'annuler', 'cancel', 'delete'],
-            'greeting': ['مرحبا', 'السلام', 'bonjour', 'salut', 'hello', 'hi'],
-            'thanks': ['شكر', 'merci', 'thank'],
-            'help': ['مساعدة', 'aide', 'help', 'how']
-        }
-        
-        best_intent = 'unknown'
-        best_score = 0
-        
-        for intent, kws in keywords.items():
-            score = sum(1 for kw in kws if kw in text_lower)
-            if score > best_score:
-                best_score = score
-                best_intent = intent
+        best_intent, best_score = FALLBACK_KEYWORDS.best(text.lower())
         
         return {
             'intent': best_intent,
@@ -3,12 +3,19 @@
 نظام Caching ذكي للاستعلامات المتكررة
 ✅ المرحلة 2: تحسينات الأداء
 ✅ يحسن السرعة بنسبة 500% للاستعلامات المتكررة
+✅ get / set / eviction بكلفة O(1) - سياسات LRU / LFU / TinyLFU
+✅ آمن مع threads (أقفال مقسّمة على shards) + فهرس بادئات للإلغاء
 """
 
 from functools import wraps, lru_cache
-from typing import Any, Callable, Optional, Dict
+from typing import Any, Awaitable, Callable, Optional, Dict, Hashable, Set
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import nullcontext
 import hashlib
 import json
+import os
+import threading
 import time
 import logging
 from datetime import datetime, timedelta
@@ -16,36 +23,368 @@ from datetime import datetime, timedelta
 logger = logging.getLogger(__name__)
 
 
-class CacheManager:
+# فاصل مستويات المفتاح: "user:123:appointments" ← البادئات "user" و "user:123"
+KEY_SEPARATOR = ':'
+
+CACHE_POLICIES = ('lru', 'lfu', 'tinylfu')
+
+
+# ==========================================
+# سياسات الإخلاء (كلها O(1))
+# ==========================================
+
+class LRUPolicy:
+    """الأقل استخداماً مؤخراً - OrderedDict (الأحدث في النهاية)"""
+    
+    def __init__(self, maxsize: int):
+        self._order: OrderedDict = OrderedDict()
+    
+    def record(self, key: Hashable):
+        """تسجيل طلب (ناجح أو فاشل) - للسياسات التي تقدّر التكرار"""
+    
+    def add(self, key: Hashable):
+        self._order[key] = None
+    
+    def touch(self, key: Hashable):
+        self._order.move_to_end(key)
+    
+    def remove(self, key: Hashable):
+        self._order.pop(key, None)
+    
+    def victim(self) -> Hashable:
+        return next(iter(self._order))
+    
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        """هل يُقبل العنصر الجديد مكان الضحية"""
+        return True
+    
+    def clear(self):
+        self._order.clear()
+
+
+class LFUPolicy:
     """
-    مدير الذاكرة المؤقتة (Cache)
+    الأقل تكراراً - سلال تكرار (كل سلة OrderedDict)
     
-    يخزن نتائج الاستعلامات المتكررة لتسريع الاستجابة
+    التعادل في التكرار يُحسم بالأقدم استخداماً (كالسلوك السابق).
     """
     
-    def __init__(self, maxsize: int = 128, default_ttl: int = 300):
-        """
-        Args:
-            maxsize: الحد الأقصى للعناصر المخزنة
-            default_ttl: مدة الصلاحية الافتراضية بالثواني (5 دقائق)
-        """
+    def __init__(self, maxsize: int):
+        self._freq: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, OrderedDict] = {}
+        self._min_freq = 0
+    
+    def record(self, key: Hashable):
+        pass
+    
+    def add(self, key: Hashable):
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+    
+    def touch(self, key: Hashable):
+        freq = self._freq[key]
+        self._unlink(key, freq)
+        
+        if self._min_freq == freq and freq not in self._buckets:
+            self._min_freq = freq + 1
+        
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+    
+    def remove(self, key: Hashable):
+        freq = self._freq.pop(key, None)
+        if freq is not None:
+            self._unlink(key, freq)
+    
+    def _unlink(self, key: Hashable, freq: int):
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+    
+    def victim(self) -> Hashable:
+        # بعد الحذف قد تفرغ سلة الحد الأدنى
+        if self._min_freq not in self._buckets:
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+    
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return True
+    
+    def clear(self):
+        self._freq.clear()
+        self._buckets.clear()
+        self._min_freq = 0
+
+
+_HALVE_TABLE = bytes(count >> 1 for count in range(256))
+
+
+class FrequencySketch:
+    """
+    تقدير تكرار المفاتيح (Count-Min Sketch بعدادات 4-bit)
+    
+    العدادات تُنصّف دورياً حتى يتقادم التاريخ القديم.
+    """
+    
+    DEPTH = 4
+    MAX_COUNT = 15
+    
+    def __init__(self, capacity: int):
+        width = 16
+        while width < capacity * 2:
+            width *= 2
+        
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(self.DEPTH)]
+        self._seeds = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+        self._sample_size = max(capacity, 1) * 10
+        self._additions = 0
+    
+    def _indexes(self, key: Hashable) -> list:
+        h = hash(key)
+        mask = self._mask
+        return [((h ^ seed) * 0x01000193 >> 7) & mask for seed in self._seeds]
+    
+    def increment(self, key: Hashable):
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+    
+    def estimate(self, key: Hashable) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+    
+    def _age(self):
+        """تنصيف كل العدادات"""
+        for row in self._rows:
+            row[:] = row.translate(_HALVE_TABLE)
+        self._additions //= 2
+
+
+class TinyLFUPolicy(LRUPolicy):
+    """
+    LRU مع مرشح قبول TinyLFU
+    
+    عند الامتلاء يُقبل العنصر الجديد فقط إذا كان تكراره المقدّر أعلى
+    من تكرار ضحية LRU - الطلبات العابرة لا تطرد العناصر الساخنة.
+    """
+    
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self.sketch = FrequencySketch(maxsize)
+    
+    def record(self, key: Hashable):
+        self.sketch.increment(key)
+    
+    def admit(self, candidate: Hashable, victim: Hashable) -> bool:
+        return self.sketch.estimate(candidate) > self.sketch.estimate(victim)
+
+
+POLICY_CLASSES = {
+    'lru': LRUPolicy,
+    'lfu': LFUPolicy,
+    'tinylfu': TinyLFUPolicy
+}
+
+
+# ==========================================
+# Shard واحد (قفل + فهرس + سياسة)
+# ==========================================
+
+class _Entry:
+    __slots__ = ('value', 'expires', 'prefixes')
+    
+    def __init__(self, value: Any, expires: Optional[float], prefixes: tuple):
+        self.value = value
+        self.expires = expires
+        self.prefixes = prefixes
+
+
+class _CacheShard:
+    """جزء مستقل من الـ cache بقفله الخاص"""
+    
+    def __init__(self, maxsize: int, policy: str, thread_safe: bool):
         self.maxsize = maxsize
-        self.default_ttl = default_ttl
+        self.entries: Dict[Hashable, _Entry] = {}
+        self.policy = POLICY_CLASSES[policy](maxsize)
+        self.lock = threading.Lock() if thread_safe else nullcontext()
         
-        # تخزين: {key: {'value': data, 'expires': timestamp, 'hits': count}}
-        self._cache: Dict[str, dict] = {}
+        # بادئة ← المفاتيح (إلغاء مستخدم = O(مفاتيحه))
+        self.prefix_index: Dict[str, Set[Hashable]] = {}
         
-        # إحصائيات
         self.stats = {
             'hits': 0,
             'misses': 0,
             'sets': 0,
             'evictions': 0,
             'expirations': 0,
-            'invalidations': 0
+            'invalidations': 0,
+            'rejections': 0
         }
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.lock:
+            self.policy.record(key)
+            entry = self.entries.get(key)
+            
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            
+            # فحص انتهاء الصلاحية
+            if entry.expires is not None and time.time() > entry.expires:
+                self._remove(key, 'expirations')
+                self.stats['misses'] += 1
+                return None
+            
+            self.policy.touch(key)
+            self.stats['hits'] += 1
+            return entry.value
+    
+    def set(self, key: Hashable, value: Any, expires: Optional[float]):
+        with self.lock:
+            self.policy.record(key)
+            entry = self.entries.get(key)
+            
+            if entry is not None:
+                entry.value = value
+                entry.expires = expires
+                self.policy.touch(key)
+                self.stats['sets'] += 1
+                return
+            
+            if len(self.entries) >= self.maxsize:
+                victim = self.policy.victim()
+                
+                if not self.policy.admit(key, victim):
+                    self.stats['rejections'] += 1
+                    return
+                
+                self._remove(victim, 'evictions')
+            
+            prefixes = _key_prefixes(key)
+            self.entries[key] = _Entry(value, expires, prefixes)
+            self.policy.add(key)
+            for prefix in prefixes:
+                self.prefix_index.setdefault(prefix, set()).add(key)
+            
+            self.stats['sets'] += 1
+    
+    def _remove(self, key: Hashable, reason: str):
+        """حذف مفتاح (القفل مأخوذ مسبقاً)"""
+        entry = self.entries.pop(key)
+        self.policy.remove(key)
+        
+        for prefix in entry.prefixes:
+            keys = self.prefix_index[prefix]
+            keys.discard(key)
+            if not keys:
+                del self.prefix_index[prefix]
+        
+        self.stats[reason] += 1
+    
+    def invalidate(self, key: Hashable) -> bool:
+        with self.lock:
+            if key not in self.entries:
+                return False
+            self._remove(key, 'invalidations')
+            return True
+    
+    def invalidate_prefix(self, prefix: str) -> int:
+        with self.lock:
+            keys = list(self.prefix_index.get(prefix, ()))
+            for key in keys:
+                self._remove(key, 'invalidations')
+            return len(keys)
+    
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self.lock:
+            keys = [key for key in self.entries if predicate(key)]
+            for key in keys:
+                self._remove(key, 'invalidations')
+            return len(keys)
+    
+    def cleanup_expired(self, now: float) -> int:
+        with self.lock:
+            keys = [
+                key for key, entry in self.entries.items()
+                if entry.expires is not None and now > entry.expires
+            ]
+            for key in keys:
+                self._remove(key, 'expirations')
+            return len(keys)
+    
+    def clear(self) -> int:
+        with self.lock:
+            count = len(self.entries)
+            self.entries.clear()
+            self.prefix_index.clear()
+            self.policy.clear()
+            self.stats['invalidations'] += count
+            return count
+
+
+def _key_prefixes(key: Hashable) -> tuple:
+    """بادئات المفتاح عند كل فاصل (للمفاتيح النصية فقط)"""
+    if not isinstance(key, str) or KEY_SEPARATOR not in key:
+        return ()
+    
+    parts = key.split(KEY_SEPARATOR)
+    return tuple(KEY_SEPARATOR.join(parts[:i]) for i in range(1, len(parts)))
+
+
+# ==========================================
+# مدير الـ Cache
+# ==========================================
+
+class CacheManager:
+    """
+    مدير الذاكرة المؤقتة (Cache)
+    
+    يخزن نتائج الاستعلامات المتكررة لتسريع الاستجابة.
+    كل العمليات O(1)؛ مع stripes > 1 تُوزّع المفاتيح على shards
+    بأقفال مستقلة (الإخلاء يتم داخل كل shard).
+    """
+    
+    def __init__(
+        self,
+        maxsize: int = 128,
+        default_ttl: Optional[int] = 300,
+        policy: str = 'lru',
+        thread_safe: bool = True,
+        stripes: int = 1
+    ):
+        """
+        Args:
+            maxsize: الحد الأقصى للعناصر المخزنة
+            default_ttl: مدة الصلاحية الافتراضية بالثواني (5 دقائق، None = بلا انتهاء)
+            policy: سياسة الإخلاء - lru | lfu | tinylfu
+            thread_safe: حماية كل shard بقفل
+            stripes: عدد الـ shards (أقفال مستقلة لتقليل التنافس)
+        """
+        if policy not in POLICY_CLASSES:
+            raise ValueError(f"سياسة غير معروفة: {policy} (المتاح: {', '.join(CACHE_POLICIES)})")
         
-        logger.info(f"✅ Cache Manager initialized: maxsize={maxsize}, ttl={default_ttl}s")
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.policy = policy
+        
+        stripes = max(1, min(stripes, maxsize))
+        per_shard = -(-maxsize // stripes)  # تقريب للأعلى
+        self._shards = [_CacheShard(per_shard, policy, thread_safe) for _ in range(stripes)]
+        
+        logger.info(f"✅ Cache Manager initialized: maxsize={maxsize}, ttl={default_ttl}s, "
+                    f"policy={policy}, stripes={stripes}")
+    
+    def _shard(self, key: Hashable) -> _CacheShard:
+        if len(self._shards) == 1:
+            return self._shards[0]
+        return self._shards[hash(key) % len(self._shards)]
     
     def _generate_key(self, *args, **kwargs) -> str:
         """
@@ -65,7 +404,7 @@ class CacheManager:
         # Hash
         return hashlib.md5(key_str.encode()).hexdigest()
     
-    def get(self, key: str) -> Optional[Any]:
+    def get(self, key: Hashable) -> Optional[Any]:
         """
         الحصول على قيمة من الـ Cache
         
@@ -75,133 +414,96 @@ class CacheManager:
         Returns:
             القيمة أو None إذا لم تكن موجودة أو منتهية
         """
-        if key not in self._cache:
-            self.stats['misses'] += 1
-            return None
-        
-        entry = self._cache[key]
-        
-        # فحص انتهاء الصلاحية
-        if time.time() > entry['expires']:
-            # منتهي الصلاحية
-            del self._cache[key]
-            self.stats['expirations'] += 1
-            self.stats['misses'] += 1
-            return None
-        
-        # زيادة عداد الاستخدام
-        entry['hits'] += 1
-        entry['last_accessed'] = time.time()
-        
-        self.stats['hits'] += 1
-        return entry['value']
+        return self._shard(key).get(key)
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+    def set(self, key: Hashable, value: Any, ttl: Optional[int] = None):
         """
         تخزين قيمة في الـ Cache
         
         Args:
-            key: المفتاح
+            key: المفتاح (النصي بفاصل ":" يُفهرس ببادئاته)
             value: القيمة
             ttl: مدة الصلاحية (None = استخدام الافتراضي)
         """
-        # فحص الحد الأقصى
-        if len(self._cache) >= self.maxsize and key not in self._cache:
-            # حذف العنصر الأقل استخداماً (LRU)
-            self._evict_lru()
-        
-        # حساب وقت الانتهاء
         ttl = ttl if ttl is not None else self.default_ttl
-        expires = time.time() + ttl
+        expires = time.time() + ttl if ttl is not None else None
         
-        # التخزين
-        self._cache[key] = {
-            'value': value,
-            'expires': expires,
-            'hits': 0,
-            'created': time.time(),
-            'last_accessed': time.time()
-        }
-        
-        self.stats['sets'] += 1
+        self._shard(key).set(key, value, expires)
     
-    def _evict_lru(self):
-        """حذف العنصر الأقل استخداماً (Least Recently Used)"""
-        if not self._cache:
-            return
-        
-        # البحث عن الأقل استخداماً
-        lru_key = min(
-            self._cache.keys(),
-            key=lambda k: (
-                self._cache[k]['hits'],
-                self._cache[k]['last_accessed']
-            )
-        )
+    def invalidate(self, key: Hashable):
+        """إلغاء عنصر محدد"""
+        self._shard(key).invalidate(key)
+    
+    def invalidate_prefix(self, prefix: str) -> int:
+        """
+        إلغاء كل المفاتيح التي تبدأ بمستوى كامل (مثل: "user:123")
         
-        del self._cache[lru_key]
-        self.stats['evictions'] += 1
+        عبر فهرس البادئات - الكلفة بعدد المفاتيح المطابقة فقط.
         
-        logger.debug(f"Evicted LRU entry: {lru_key[:8]}...")
-    
-    def invalidate(self, key: str):
-        """إلغاء عنصر محدد"""
-        if key in self._cache:
-            del self._cache[key]
-            self.stats['invalidations'] += 1
+        Returns:
+            int: عدد العناصر الملغاة
+        """
+        return sum(shard.invalidate_prefix(prefix) for shard in self._shards)
     
-    def invalidate_pattern(self, pattern: str):
+    def invalidate_pattern(self, pattern: str) -> int:
         """
-        إلغاء جميع المفاتيح المطابقة لنمط معين
+        إلغاء جميع المفاتيح التي تحتوي نصاً معيناً (فحص كامل - O(n))
+        
+        للمفاتيح المنظمة بمستويات يُفضّل invalidate_prefix.
         
         Args:
-            pattern: النمط (مثل: "user_123_*")
+            pattern: النمط (مثل: "user_123")
         """
-        keys_to_delete = [
-            key for key in self._cache.keys()
-            if pattern in key
-        ]
-        
-        for key in keys_to_delete:
-            del self._cache[key]
-            self.stats['invalidations'] += 1
+        return sum(
+            shard.invalidate_where(lambda key: isinstance(key, str) and pattern in key)
+            for shard in self._shards
+        )
     
     def clear(self):
         """مسح كامل الـ Cache"""
-        count = len(self._cache)
-        self._cache.clear()
-        self.stats['invalidations'] += count
+        count = sum(shard.clear() for shard in self._shards)
         logger.info(f"Cache cleared: {count} entries")
     
     def cleanup_expired(self):
         """حذف العناصر المنتهية الصلاحية"""
         now = time.time()
-        expired_keys = [
-            key for key, entry in self._cache.items()
-            if now > entry['expires']
-        ]
-        
-        for key in expired_keys:
-            del self._cache[key]
-            self.stats['expirations'] += 1
+        count = sum(shard.cleanup_expired(now) for shard in self._shards)
         
-        if expired_keys:
-            logger.info(f"Cleaned up {len(expired_keys)} expired entries")
+        if count:
+            logger.info(f"Cleaned up {count} expired entries")
         
-        return len(expired_keys)
+        return count
+    
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._shard(key).entries
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        """مجموع عدادات الـ shards"""
+        totals: Dict[str, int] = {}
+        for shard in self._shards:
+            for name, value in shard.stats.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
     
     def get_stats(self) -> dict:
         """الحصول على إحصائيات الـ Cache"""
-        total_requests = self.stats['hits'] + self.stats['misses']
+        stats = self.stats
+        total_requests = stats['hits'] + stats['misses']
         hit_rate = (
-            self.stats['hits'] / total_requests * 100
+            stats['hits'] / total_requests * 100
             if total_requests > 0 else 0
         )
         
         return {
-            **self.stats,
-            'size': len(self._cache),
+            **stats,
+            'size': len(self),
             'maxsize': self.maxsize,
+            'policy': self.policy,
+            'stripes': len(self._shards),
             'hit_rate': hit_rate,
             'miss_rate': 100 - hit_rate
         }
@@ -285,36 +587,171 @@ def cached(ttl: int = 300, key_prefix: str = ""):
 # Cache مخصص للمواعيد
 # ==========================================
 
+# كل مواعيد المستخدم في استعلام واحد (الخط الزمني يخدم كل النطاقات بعدها)
+USER_APPOINTMENTS_SQL = '''
+    SELECT id, title, description, date_time, priority
+    FROM appointments
+    WHERE user_id = ?
+    ORDER BY date_time ASC, id ASC
+'''
+
+
+def appointment_row(row) -> dict:
+    """صف SQL ← قاموس موعد (نفس صيغة Database.get_appointments)"""
+    return {
+        'id': row[0],
+        'title': row[1],
+        'description': row[2],
+        'date_time': row[3],
+        'priority': row[4]
+    }
+
+
+class UserTimeline:
+    """
+    مواعيد مستخدم واحد مرتبة زمنياً
+    
+    date_time نص بصيغة '%Y-%m-%d %H:%M:%S' فالمقارنة النصية هي نفسها
+    مقارنة SQLite (BETWEEN / >= / <)، والنطاقات تُستخرج بـ bisect.
+    """
+    
+    __slots__ = ('rows', 'times')
+    
+    def __init__(self, rows: list):
+        self.rows = sorted(rows, key=lambda row: (row['date_time'], row['id']))
+        self.times = [row['date_time'] for row in self.rows]
+    
+    def between(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        inclusive_end: bool = True
+    ) -> list:
+        """
+        المواعيد في النطاق [start, end] (أو [start, end) مع inclusive_end=False)
+        
+        Returns:
+            list: نسخ من القواميس (المستدعي حر في تعديلها)
+        """
+        low = bisect_left(self.times, start) if start else 0
+        if end is None:
+            high = len(self.times)
+        elif inclusive_end:
+            high = bisect_right(self.times, end)
+        else:
+            high = bisect_left(self.times, end)
+        
+        return [dict(row) for row in self.rows[low:high]]
+    
+    def count_before(self, moment: str) -> int:
+        """عدد المواعيد قبل لحظة معينة (O(log n))"""
+        return bisect_left(self.times, moment)
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
 class AppointmentCache:
-    """Cache مخصص لمواعيد المستخدمين"""
+    """
+    Cache مخصص لمواعيد المستخدمين
+    
+    الخط الزمني لكل مستخدم نشط يُقرأ من قاعدة البيانات مرة واحدة
+    (read-through) ثم تُخدم منه كل الاستعلامات: اليوم، الأسبوع، الشهر،
+    البحث والإحصائيات. كل كتابة على المواعيد تستدعي invalidate_user.
+    """
     
     def __init__(self):
         self.cache = CacheManager(maxsize=256, default_ttl=300)  # 5 دقائق
         self.user_cache = CacheManager(maxsize=512, default_ttl=600)  # 10 دقائق
+        
+        # جيل كل مستخدم: تحميل بدأ قبل الإلغاء لا يُخزّن نتيجته القديمة
+        self._generations: Dict[int, int] = {}
+        self._generation_lock = threading.Lock()
     
     def get_user_appointments(self, user_id: int) -> Optional[list]:
         """الحصول على مواعيد المستخدم من Cache"""
-        key = f"user_{user_id}_appointments"
+        key = f"user:{user_id}:appointments"
         return self.cache.get(key)
     
     def set_user_appointments(self, user_id: int, appointments: list):
         """تخزين مواعيد المستخدم"""
-        key = f"user_{user_id}_appointments"
+        key = f"user:{user_id}:appointments"
         self.cache.set(key, appointments)
     
+    # ---------- الخط الزمني (read-through) ----------
+    
+    @staticmethod
+    def _timeline_key(db_path: str, user_id: int) -> str:
+        return f"user:{user_id}:timeline@{os.path.abspath(db_path)}"
+    
+    def _lookup_timeline(self, db_path: str, user_id: int) -> tuple:
+        """(الخط الزمني أو None، الجيل الحالي)"""
+        with self._generation_lock:
+            generation = self._generations.get(user_id, 0)
+        return self.user_cache.get(self._timeline_key(db_path, user_id)), generation
+    
+    def _store_timeline(self, db_path: str, user_id: int, rows: list, generation: int) -> UserTimeline:
+        timeline = UserTimeline(rows)
+        
+        with self._generation_lock:
+            if self._generations.get(user_id, 0) == generation:
+                self.user_cache.set(self._timeline_key(db_path, user_id), timeline)
+        
+        return timeline
+    
+    def get_timeline(self, db_path: str, user_id: int) -> UserTimeline:
+        """
+        الخط الزمني للمستخدم (من الذاكرة، أو استعلام واحد عند أول طلب)
+        
+        Args:
+            db_path: قاعدة البيانات (عبر مجموعة الاتصالات المشتركة)
+            user_id: معرف المستخدم
+        """
+        timeline, generation = self._lookup_timeline(db_path, user_id)
+        if timeline is not None:
+            return timeline
+        
+        from database_pool import get_pool
+        
+        rows = get_pool(db_path).execute(USER_APPOINTMENTS_SQL, (user_id,))
+        return self._store_timeline(db_path, user_id, [appointment_row(row) for row in rows], generation)
+    
+    async def get_timeline_async(
+        self,
+        db_path: str,
+        user_id: int,
+        fetchall: Callable[[str, tuple], Awaitable[list]]
+    ) -> UserTimeline:
+        """
+        نفس get_timeline للمسار غير المتزامن
+        
+        Args:
+            fetchall: دالة القراءة غير المتزامنة (مثل AsyncDatabase._fetchall)
+        """
+        timeline, generation = self._lookup_timeline(db_path, user_id)
+        if timeline is not None:
+            return timeline
+        
+        rows = await fetchall(USER_APPOINTMENTS_SQL, (user_id,))
+        return self._store_timeline(db_path, user_id, [appointment_row(row) for row in rows], generation)
+    
     def invalidate_user(self, user_id: int):
-        """إلغاء cache المستخدم (عند إضافة/تعديل موعد)"""
-        self.cache.invalidate_pattern(f"user_{user_id}")
-        logger.info(f"Invalidated cache for user {user_id}")
+        """إلغاء cache المستخدم (عند إضافة/تعديل/حذف/استيراد موعد) - O(مفاتيح المستخدم)"""
+        with self._generation_lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            count = self.cache.invalidate_prefix(f"user:{user_id}")
+            count += self.user_cache.invalidate_prefix(f"user:{user_id}")
+        
+        logger.info(f"Invalidated cache for user {user_id} ({count} entries)")
     
     def get_appointment(self, appointment_id: int) -> Optional[dict]:
         """الحصول على موعد محدد"""
-        key = f"appointment_{appointment_id}"
+        key = f"appointment:{appointment_id}"
         return self.cache.get(key)
     
     def set_appointment(self, appointment_id: int, appointment: dict):
         """تخزين موعد محدد"""
-        key = f"appointment_{appointment_id}"
+        key = f"appointment:{appointment_id}"
         self.cache.set(key, appointment, ttl=600)  # 10 دقائق
     
     def get_stats(self) -> dict:
@@ -325,6 +762,70 @@ class AppointmentCache:
         }
 
 
+# ==========================================
+# Cache نتائج التنبؤ
+# ==========================================
+
+class PredictionCache(CacheManager):
+    """
+    Cache نتائج مصنفات النوايا (LRU بحجم محدود، بلا انتهاء صلاحية)
+    
+    المفتاح هو النص بعد التوحيد والتقسيم (ما يراه النموذج فعلاً)،
+    والمحتوى مختوم بإصدار النموذج: تغيّر الإصدار يُفرغ الـ cache.
+    آمن للاستدعاء من threads (التنبؤ يعمل عبر asyncio.to_thread).
+    """
+    
+    def __init__(self, maxsize: int = 2048, policy: str = 'lru'):
+        """
+        Args:
+            maxsize: الحد الأقصى للعناصر المخزنة
+            policy: سياسة الإخلاء - lru | lfu | tinylfu
+        """
+        super().__init__(maxsize=maxsize, default_ttl=None, policy=policy)
+        self.version: Optional[str] = None
+        self._version_lock = threading.Lock()
+    
+    def set_version(self, version: str) -> bool:
+        """
+        ختم إصدار النموذج
+        
+        Returns:
+            bool: True إذا تغيّر الإصدار (وأُفرغ الـ cache)
+        """
+        with self._version_lock:
+            if version == self.version:
+                return False
+            
+            for shard in self._shards:
+                shard.clear()
+            self.version = version
+        
+        logger.debug(f"Prediction cache version: {version}")
+        return True
+    
+    def set_many_if_version(self, items: Dict[Hashable, Any], version: Optional[str]) -> bool:
+        """
+        تخزين نتائج دفعة فقط إذا لم يتغيّر الإصدار منذ بدء حسابها
+        
+        نموذج جديد نُشر أثناء الدفعة يعني أن النتائج من النموذج القديم:
+        لا تُخزن في cache الإصدار الجديد.
+        
+        Returns:
+            bool: True إذا خُزنت النتائج
+        """
+        with self._version_lock:
+            if version != self.version:
+                return False
+            
+            for key, value in items.items():
+                self.set(key, value)
+        return True
+    
+    def get_stats(self) -> dict:
+        """الحصول على إحصائيات الـ Cache"""
+        return {**super().get_stats(), 'version': self.version}
+
+
 # ==========================================
 # Global Cache Instance
 # ==========================================
@@ -367,7 +868,7 @@ if __name__ == "__main__":
     for i in range(4, 10):
         cache.set(f"key{i}", f"value{i}")
     
-    print(f"  الحجم: {len(cache._cache)}/{cache.maxsize}")
+    print(f"  الحجم: {len(cache)}/{cache.maxsize}")
     print(f"  key1 (قديم): {cache.get('key1')} (تم الحذف)")
     print(f"  key9 (جديد): {cache.get('key9')} (موجود)")
     
@@ -424,6 +925,80 @@ if __name__ == "__main__":
     cached_appointments = app_cache.get_user_appointments(123)
     print(f"  ✅ بعد الإلغاء: {cached_appointments}")
     
+    # فهرس البادئات: user:1 لا يمس user:12
+    app_cache.set_user_appointments(1, appointments)
+    app_cache.set_user_appointments(12, appointments)
+    app_cache.invalidate_user(1)
+    print(f"  ✅ user 1: {app_cache.get_user_appointments(1)} | "
+          f"user 12: {len(app_cache.get_user_appointments(12))} موعد")
+    
+    # 5. مقارنة السياسات
+    print("\n📊 مقارنة السياسات (توزيع Zipf + مسح عابر):")
+    print("-"*70)
+    
+    rng = random.Random(0)
+    hot_keys = [f"hot:{i}" for i in range(2000)]
+    weights = [1 / (rank + 1) for rank in range(len(hot_keys))]
+    workload = []
+    for i in range(60000):
+        workload.append(rng.choices(hot_keys, weights)[0])
+        if i % 3 == 0:
+            workload.append(f"scan:{i}")  # مفاتيح لا تتكرر
+    
+    for policy in CACHE_POLICIES:
+        policy_cache = CacheManager(maxsize=200, default_ttl=None, policy=policy)
+        start = time.perf_counter()
+        for key in workload:
+            if policy_cache.get(key) is None:
+                policy_cache.set(key, key)
+        elapsed_us = (time.perf_counter() - start) / len(workload) * 1e6
+        stats = policy_cache.get_stats()
+        print(f"  {policy:<8} Hit Rate: {stats['hit_rate']:5.1f}%  |  {elapsed_us:.2f} µs/طلب")
+    
+    # 6. كلفة الإخلاء مع الحجم (الطريقة القديمة: min() على كل المفاتيح)
+    print("\n⏱️ كلفة الإضافة مع الإخلاء:")
+    print("-"*70)
+    
+    for size in (128, 1024, 8192):
+        old_cache = {f"k{i}": time.time() + i for i in range(size)}
+        start = time.perf_counter()
+        for i in range(500):
+            del old_cache[min(old_cache, key=old_cache.get)]
+            old_cache[f"n{i}"] = time.time() + size + i
+        old_us = (time.perf_counter() - start) / 500 * 1e6
+        
+        new_cache = CacheManager(maxsize=size, default_ttl=None, stripes=8)
+        for i in range(size):
+            new_cache.set(f"k{i}", i)
+        start = time.perf_counter()
+        for i in range(500):
+            new_cache.set(f"n{i}", i)
+        new_us = (time.perf_counter() - start) / 500 * 1e6
+        
+        print(f"  {size:>5} عنصر: min() {old_us:>8.1f} µs → O(1) {new_us:>5.1f} µs")
+    
+    # 7. أمان threads
+    print("\n🔒 اختبار threads:")
+    print("-"*70)
+    
+    shared = CacheManager(maxsize=1000, default_ttl=None, policy='lfu', stripes=8)
+    
+    def worker(offset: int):
+        for i in range(5000):
+            key = f"user:{(offset + i) % 300}:item:{i % 7}"
+            if shared.get(key) is None:
+                shared.set(key, i)
+            if i % 500 == 0:
+                shared.invalidate_prefix(f"user:{offset}")
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    print(f"  ✅ 8 threads × 5000 عملية | الحجم: {len(shared)}/{shared.maxsize}")
+    
     # عرض الإحصائيات
     cache.print_stats()
     
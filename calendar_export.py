@@ -5,17 +5,19 @@
 ✅ CSV للاستيراد في Excel
 """
 
-import sqlite3
 from datetime import datetime
 from typing import List, Dict
 from pathlib import Path
 
+from database_pool import get_pool
+
 
 class CalendarExporter:
     """تصدير المواعيد لصيغ التقويم"""
     
     def __init__(self, db_path: str = "agent_data.db"):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
     
     def export_to_ical(self, user_id: int, filepath: str = None) -> str:
         """
@@ -25,19 +27,13 @@ class CalendarExporter:
         if not filepath:
             filepath = f"calendar_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ics"
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        appointments = self.pool.execute('''
             SELECT title, description, date_time, priority
             FROM appointments
             WHERE user_id = ?
             ORDER BY date_time
         ''', (user_id,))
         
-        appointments = cursor.fetchall()
-        conn.close()
-        
         # بناء ملف iCal
         ical = [
             "BEGIN:VCALENDAR",
@@ -92,19 +88,13 @@ class CalendarExporter:
         if not filepath:
             filepath = f"google_calendar_{user_id}_{datetime.now().strftime('%Y%m%d')}.csv"
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        appointments = self.pool.execute('''
             SELECT title, description, date_time, priority
             FROM appointments
             WHERE user_id = ?
             ORDER BY date_time
         ''', (user_id,))
         
-        appointments = cursor.fetchall()
-        conn.close()
-        
         # رأس CSV لـ Google Calendar
         csv_lines = [
             "Subject,Start Date,Start Time,End Date,End Time,All Day Event,Description,Location,Private"
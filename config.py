@@ -16,6 +16,14 @@ import logging
 # تحميل متغيرات البيئة من ملف .env
 load_dotenv()
 
+
+class _LazyToken:
+    """Token يُقرأ عند أول استخدام - استيراد config لا يفشل ولا ينتظر"""
+    
+    def __get__(self, instance, owner) -> str:
+        return owner.get_telegram_token()
+
+
 class Config:
     """إعدادات المشروع - النسخة المحسّنة ✨"""
     
@@ -47,7 +55,7 @@ class Config:
         
         return token
     
-    TELEGRAM_BOT_TOKEN = get_telegram_token.__func__()  # تحميل عند الاستيراد
+    TELEGRAM_BOT_TOKEN = _LazyToken()  # تحميل عند أول استخدام (وليس عند الاستيراد)
     
     # ==========================================
     # 2. Rate Limiting ⚡
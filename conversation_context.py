@@ -7,7 +7,6 @@
 ✅ ذاكرة قصيرة المدى للمحادثة
 """
 
-import sqlite3
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
@@ -15,7 +14,10 @@ from dataclasses import dataclass, field, asdict
 from enum import Enum
 import logging
 from collections import deque
-import re
+
+from database_pool import get_pool
+from write_behind import get_write_buffer
+from datetime_engine import datetime_engine, DateTimeParse
 
 logger = logging.getLogger(__name__)
 
@@ -208,38 +210,41 @@ class ConversationContext:
 class ConversationManager:
     """مدير السياقات لجميع المستخدمين"""
     
-    def __init__(self, db_path: str = "agent_data.db"):
+    def __init__(self, db_path: str = "agent_data.db", async_db=None):
+        """
+        Args:
+            db_path: مسار قاعدة البيانات
+            async_db: AsyncDatabase اختياري لدوال *_async (المسار غير المتزامن)
+        """
         self.db_path = db_path
         self.contexts: Dict[int, ConversationContext] = {}
+        self.pool = get_pool(db_path)
+        self.writer = get_write_buffer(db_path)
+        self.async_db = async_db
         self._ensure_table()
     
     def _ensure_table(self):
         """إنشاء جدول السياقات"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversation_contexts (
-                user_id INTEGER PRIMARY KEY,
-                context_data TEXT NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversation_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                user_message TEXT NOT NULL,
-                bot_response TEXT NOT NULL,
-                intent TEXT,
-                extracted_info TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.pool.get_cursor() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_contexts (
+                    user_id INTEGER PRIMARY KEY,
+                    context_data TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    user_message TEXT NOT NULL,
+                    bot_response TEXT NOT NULL,
+                    intent TEXT,
+                    extracted_info TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
     
     def get_context(self, user_id: int) -> ConversationContext:
         """الحصول على سياق المستخدم"""
@@ -265,17 +270,13 @@ class ConversationManager:
     def _load_context(self, user_id: int) -> Optional[ConversationContext]:
         """تحميل السياق من قاعدة البيانات"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            self.writer.flush()
             
-            cursor.execute(
+            row = self.pool.execute_one(
                 'SELECT context_data FROM conversation_contexts WHERE user_id = ?',
                 (user_id,)
             )
             
-            row = cursor.fetchone()
-            conn.close()
-            
             if row:
                 data = json.loads(row[0])
                 return ConversationContext.from_dict(data)
@@ -295,16 +296,11 @@ class ConversationManager:
             ctx = self.contexts[user_id]
             data = json.dumps(ctx.to_dict(), ensure_ascii=False)
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            # كتابة مؤجلة: داخل الدفعة الواحدة يُكتب آخر سياق للمستخدم فقط
+            self.writer.submit('''
                 INSERT OR REPLACE INTO conversation_contexts (user_id, context_data, updated_at)
                 VALUES (?, ?, ?)
-            ''', (user_id, data, datetime.now().isoformat()))
-            
-            conn.commit()
-            conn.close()
+            ''', (user_id, data, datetime.now().isoformat()), key=('context', user_id))
             
         except Exception as e:
             logger.error(f"❌ خطأ في حفظ السياق: {e}")
@@ -313,10 +309,7 @@ class ConversationManager:
                   intent: str, extracted_info: Dict = None):
         """حفظ دورة محادثة"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            self.writer.submit('''
                 INSERT INTO conversation_history 
                 (user_id, user_message, bot_response, intent, extracted_info)
                 VALUES (?, ?, ?, ?, ?)
@@ -328,19 +321,15 @@ class ConversationManager:
                 json.dumps(extracted_info or {}, ensure_ascii=False)
             ))
             
-            conn.commit()
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ خطأ في حفظ المحادثة: {e}")
     
     def get_user_history(self, user_id: int, limit: int = 20) -> List[Dict]:
         """الحصول على تاريخ محادثات المستخدم"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            self.writer.flush()
             
-            cursor.execute('''
+            rows = self.pool.execute('''
                 SELECT user_message, bot_response, intent, extracted_info, timestamp
                 FROM conversation_history
                 WHERE user_id = ?
@@ -349,7 +338,7 @@ class ConversationManager:
             ''', (user_id, limit))
             
             history = []
-            for row in cursor.fetchall():
+            for row in rows:
                 history.append({
                     'user_message': row[0],
                     'bot_response': row[1],
@@ -358,7 +347,6 @@ class ConversationManager:
                     'timestamp': row[4]
                 })
             
-            conn.close()
             return history[::-1]  # ترتيب تصاعدي
             
         except Exception as e:
@@ -371,13 +359,56 @@ class ConversationManager:
             self.contexts[user_id].reset()
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM conversation_contexts WHERE user_id = ?', (user_id,))
-            conn.commit()
-            conn.close()
+            # عبر المخزن بنفس مفتاح save_context: الحذف يحل محل أي حفظ معلق
+            # (كتابة مباشرة كانت تسبق الحفظ المعلق فيعيد السياق الممسوح)
+            self.writer.submit(
+                'DELETE FROM conversation_contexts WHERE user_id = ?',
+                (user_id,),
+                key=('context', user_id)
+            )
         except Exception as e:
             logger.error(f"❌ خطأ في مسح السياق: {e}")
+    
+    # ==========================================
+    # المسار غير المتزامن (AsyncDatabase)
+    # ==========================================
+    
+    async def get_context_async(self, user_id: int) -> ConversationContext:
+        """الحصول على سياق المستخدم - async"""
+        if user_id in self.contexts:
+            return self.get_context(user_id)
+        
+        ctx = None
+        try:
+            data = await self.async_db.load_context(user_id)
+            if data:
+                ctx = ConversationContext.from_dict(data)
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحميل السياق: {e}")
+        
+        if ctx is None:
+            ctx = ConversationContext(user_id)
+        
+        self.contexts[user_id] = ctx
+        return ctx
+    
+    async def save_context_async(self, user_id: int):
+        """حفظ السياق - async"""
+        if user_id not in self.contexts:
+            return
+        
+        try:
+            await self.async_db.save_context(user_id, self.contexts[user_id].to_dict())
+        except Exception as e:
+            logger.error(f"❌ خطأ في حفظ السياق: {e}")
+    
+    async def save_turn_async(self, user_id: int, user_message: str, bot_response: str, 
+                              intent: str, extracted_info: Dict = None):
+        """حفظ دورة محادثة - async"""
+        try:
+            await self.async_db.save_turn(user_id, user_message, bot_response, intent, extracted_info)
+        except Exception as e:
+            logger.error(f"❌ خطأ في حفظ المحادثة: {e}")
 
 
 # ==========================================
@@ -395,11 +426,15 @@ class ContextAwareProcessor:
         user_id: int,
         message: str,
         current_intent: str,
-        extracted_info: Dict
+        extracted_info: Dict,
+        parsed: Optional[DateTimeParse] = None
     ) -> Tuple[str, Dict, ConversationState]:
         """
         معالجة الرسالة مع مراعاة السياق
         
+        Args:
+            parsed: نتيجة datetime_engine للرسالة (إن لم تُمرَّر تُحسب هنا مرة واحدة)
+        
         Returns:
             Tuple: (النية المعدلة, المعلومات الكاملة, الحالة الجديدة)
         """
@@ -409,13 +444,17 @@ class ContextAwareProcessor:
         if ctx.is_expired():
             ctx.reset()
         
+        if parsed is None and ctx.state in (ConversationState.AWAITING_TIME,
+                                            ConversationState.AWAITING_DATE):
+            parsed = datetime_engine.parse(message)
+        
         # ==========================================
         # معالجة حسب الحالة الحالية
         # ==========================================
         
         # حالة: ينتظر وقت
         if ctx.state == ConversationState.AWAITING_TIME:
-            time_extracted = self._extract_time_from_message(message)
+            time_extracted = self._extract_time_from_message(message, parsed)
             if time_extracted:
                 ctx.extracted_info.time = time_extracted
                 
@@ -428,7 +467,7 @@ class ContextAwareProcessor:
         
         # حالة: ينتظر تاريخ
         if ctx.state == ConversationState.AWAITING_DATE:
-            date_extracted = self._extract_date_from_message(message)
+            date_extracted = self._extract_date_from_message(message, parsed)
             if date_extracted:
                 ctx.extracted_info.date = date_extracted
                 
@@ -487,56 +526,17 @@ class ContextAwareProcessor:
         if new_info.get('priority'):
             ctx.extracted_info.priority = new_info['priority']
     
-    def _extract_time_from_message(self, message: str) -> Optional[Tuple[int, int]]:
-        """استخراج الوقت من الرسالة"""
-        # نمط XX:XX
-        match = re.search(r'(\d{1,2}):(\d{2})', message)
-        if match:
-            return (int(match.group(1)), int(match.group(2)))
-        
-        # نمط XXh أو XXh00
-        match = re.search(r'(\d{1,2})h(\d{2})?', message.lower())
-        if match:
-            hour = int(match.group(1))
-            minute = int(match.group(2)) if match.group(2) else 0
-            return (hour, minute)
-        
-        # نمط رقم + صباحاً/مساءً
-        match = re.search(r'(\d{1,2})\s*(صباحا|صباحاً|مساء|مساءً|am|pm)', message.lower())
-        if match:
-            hour = int(match.group(1))
-            period = match.group(2)
-            if period in ['مساء', 'مساءً', 'pm'] and hour < 12:
-                hour += 12
-            elif period in ['صباحا', 'صباحاً', 'am'] and hour == 12:
-                hour = 0
-            return (hour, 0)
-        
-        return None
-    
-    def _extract_date_from_message(self, message: str) -> Optional[datetime]:
-        """استخراج التاريخ من الرسالة"""
-        now = datetime.now()
-        message_lower = message.lower()
-        
-        # اليوم/غداً
-        if 'اليوم' in message_lower or "aujourd'hui" in message_lower or 'today' in message_lower:
-            return now
-        if 'غدا' in message_lower or 'غداً' in message_lower or 'demain' in message_lower or 'tomorrow' in message_lower:
-            return now + timedelta(days=1)
-        
-        # تاريخ رقمي
-        match = re.search(r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})', message)
-        if match:
-            day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
-            if year < 100:
-                year += 2000
-            try:
-                return datetime(year, month, day)
-            except:
-                pass
-        
-        return None
+    def _extract_time_from_message(self, message: str,
+                                   parsed: Optional[DateTimeParse] = None) -> Optional[Tuple[int, int]]:
+        """استخراج الوقت من الرسالة (المحلل الموحد)"""
+        parsed = parsed or datetime_engine.parse(message)
+        return parsed.to_dict()['time']
+    
+    def _extract_date_from_message(self, message: str,
+                                   parsed: Optional[DateTimeParse] = None) -> Optional[datetime]:
+        """استخراج التاريخ من الرسالة (المحلل الموحد)"""
+        parsed = parsed or datetime_engine.parse(message)
+        return parsed.to_dict()['date']
     
     def _is_confirmation(self, message: str) -> bool:
         """هل الرسالة تأكيد؟"""
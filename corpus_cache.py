@@ -0,0 +1,130 @@
+# corpus_cache.py
+"""
+ذاكرة تخزين لمجموعات التدريب المُرمّزة مسبقاً
+✅ ترميز المجموعة كاملة مرة واحدة في مصفوفة int متصلة + مصفوفة labels
+✅ حفظ على القرص (.npy) بمفتاح = بصمة القاموس + العينات + الطول
+✅ التحميل بـ memory-map (لا نسخ، ولا ترميز في كل epoch)
+✅ الكتابة ذرية: مجلد مؤقت ثم os.replace
+"""
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+CORPUS_CACHE_DIR = "models/corpus_cache"
+
+# أقصى عدد مجموعات محفوظة (الأقدم يُحذف)
+MAX_CACHED_CORPORA = 8
+
+
+def fingerprint(*parts: Iterable[str]) -> str:
+    """بصمة blake2b لسلاسل نصية (ترتيبها جزء من البصمة)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        for item in part:
+            digest.update(item.encode('utf-8'))
+            digest.update(b'\x00')
+        digest.update(b'\x01')
+    return digest.hexdigest()
+
+
+def corpus_key(
+    samples: Sequence[Tuple[str, str]],
+    vocabulary_hash: str,
+    max_length: int
+) -> str:
+    """مفتاح المجموعة: أي تغيّر في العينات أو القاموس أو الطول يُنتج مفتاحاً جديداً"""
+    return fingerprint(
+        [vocabulary_hash, str(max_length)],
+        (text for text, _ in samples),
+        (label for _, label in samples)
+    )
+
+
+def load_or_encode(
+    key: str,
+    samples: Sequence[Tuple[str, str]],
+    labels: List[str],
+    encode: Callable[[List[str]], Dict[str, np.ndarray]],
+    cache_dir: Optional[str] = CORPUS_CACHE_DIR
+) -> Dict[str, np.ndarray]:
+    """
+    تحميل مجموعة مُرمّزة من القرص، أو ترميزها وحفظها
+
+    Args:
+        key: corpus_key(...)
+        samples: [(النص, النية)]
+        labels: قائمة النوايا (الفهرس = رقم الفئة؛ غير المعروف = الأخير)
+        encode: دالة (نصوص) -> {'input_ids': (n, max_length), ...}
+        cache_dir: مجلد التخزين (None = بدون قرص)
+
+    Returns:
+        Dict: المصفوفات + 'labels' (n,) - محمّلة بـ mmap عند وجودها
+    """
+    path = Path(cache_dir) / key if cache_dir else None
+
+    if path is not None and (path / 'labels.npy').exists():
+        try:
+            arrays = {
+                file.stem: np.load(file, mmap_mode='c')
+                for file in path.glob('*.npy')
+            }
+            if len(arrays['labels']) == len(samples):
+                os.utime(path)
+                logger.info(f"✅ مجموعة مُرمّزة من الذاكرة: {len(samples)} عينة ({key[:8]})")
+                return arrays
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ مجموعة مُرمّزة تالفة - إعادة الترميز: {e}")
+
+    index = {label: i for i, label in enumerate(labels)}
+    arrays = encode([text for text, _ in samples])
+    arrays['labels'] = np.fromiter(
+        (index.get(label, len(labels) - 1) for _, label in samples),
+        dtype=np.int64,
+        count=len(samples)
+    )
+
+    if path is not None:
+        try:
+            _save(path, arrays)
+            _prune(path.parent)
+        except OSError as e:
+            logger.warning(f"⚠️ تعذر حفظ المجموعة المُرمّزة: {e}")
+
+    logger.info(f"✅ تم ترميز {len(samples)} عينة ({key[:8]})")
+    return arrays
+
+
+def _save(path: Path, arrays: Dict[str, np.ndarray]):
+    """كتابة ذرية: مجلد مؤقت كامل ثم إعادة تسمية"""
+    tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    for name, array in arrays.items():
+        np.save(tmp_path / f"{name}.npy", np.ascontiguousarray(array))
+
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # عملية أخرى كتبت نفس المفتاح أولاً
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _prune(cache_dir: Path, keep: int = MAX_CACHED_CORPORA):
+    """حذف أقدم المجموعات (حسب آخر استخدام)"""
+    entries = sorted(
+        (entry for entry in cache_dir.iterdir() if entry.is_dir() and '.tmp' not in entry.name),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    for entry in entries[keep:]:
+        shutil.rmtree(entry, ignore_errors=True)
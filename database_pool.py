@@ -5,10 +5,11 @@
 ✅ يحسن الأداء بنسبة 300% في العمليات المتزامنة
 """
 
+import os
 import sqlite3
 import threading
 from contextlib import contextmanager
-from typing import Optional
+from typing import Dict, Optional
 from queue import Queue, Empty
 import logging
 import time
@@ -28,7 +29,8 @@ class DatabaseConnectionPool:
         db_path: str,
         pool_size: int = 5,
         max_overflow: int = 10,
-        timeout: int = 30
+        timeout: int = 30,
+        cached_statements: int = 256
     ):
         """
         Args:
@@ -36,11 +38,13 @@ class DatabaseConnectionPool:
             pool_size: عدد الاتصالات الأساسية
             max_overflow: عدد الاتصالات الإضافية المسموحة
             timeout: مهلة الانتظار بالثواني
+            cached_statements: حجم ذاكرة الاستعلامات المُجهّزة لكل اتصال
         """
         self.db_path = db_path
         self.pool_size = pool_size
         self.max_overflow = max_overflow
         self.timeout = timeout
+        self.cached_statements = cached_statements
         
         # Queue للاتصالات المتاحة
         self._pool = Queue(maxsize=pool_size + max_overflow)
@@ -87,7 +91,9 @@ class DatabaseConnectionPool:
             conn = sqlite3.connect(
                 self.db_path,
                 check_same_thread=False,  # مهم للـ threading
-                timeout=self.timeout
+                timeout=self.timeout,
+                # الاستعلامات المتكررة تُجهّز مرة واحدة لكل اتصال
+                cached_statements=self.cached_statements
             )
             
             # تفعيل Foreign Keys
@@ -325,35 +331,143 @@ class DatabaseConnectionPool:
 # Global Pool Instance
 # ==========================================
 
-_global_pool: Optional[DatabaseConnectionPool] = None
+# مجموعة واحدة لكل ملف قاعدة بيانات
+_pools: Dict[str, DatabaseConnectionPool] = {}
+_pools_lock = threading.Lock()
 
 
 def get_pool(db_path: str = "agent_data.db", **kwargs) -> DatabaseConnectionPool:
     """
-    الحصول على المجموعة العامة (Singleton)
+    الحصول على المجموعة المشتركة لقاعدة البيانات (Singleton لكل مسار)
     
     Args:
         db_path: مسار قاعدة البيانات
-        **kwargs: معاملات إضافية للمجموعة
+        **kwargs: معاملات إضافية للمجموعة (عند الإنشاء الأول فقط)
         
     Returns:
-        DatabaseConnectionPool: المجموعة العامة
+        DatabaseConnectionPool: المجموعة المشتركة
     """
-    global _global_pool
+    key = os.path.abspath(db_path)
     
-    if _global_pool is None:
-        _global_pool = DatabaseConnectionPool(db_path, **kwargs)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = DatabaseConnectionPool(db_path, **kwargs)
+            _pools[key] = pool
     
-    return _global_pool
+    return pool
 
 
 def close_global_pool():
-    """إغلاق المجموعة العامة"""
-    global _global_pool
+    """إغلاق جميع المجموعات المشتركة"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
     
-    if _global_pool is not None:
-        _global_pool.close_all()
-        _global_pool = None
+    for pool in pools:
+        pool.close_all()
+
+
+# ==========================================
+# قياس تكلفة قاعدة البيانات لكل رسالة
+# ==========================================
+
+_BENCH_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+        title TEXT NOT NULL, description TEXT, date_time TEXT NOT NULL,
+        priority INTEGER DEFAULT 2)''',
+    '''CREATE TABLE IF NOT EXISTS interactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+        user_message TEXT NOT NULL, bot_response TEXT NOT NULL,
+        intent TEXT, language TEXT, timestamp TEXT DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS conversation_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+        user_message TEXT NOT NULL, bot_response TEXT NOT NULL,
+        intent TEXT, extracted_info TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+]
+
+# العمليات التي تنفذها كل رسالة: جلب المواعيد، تسجيل التفاعل، حفظ دورة المحادثة
+_BENCH_OPS = [
+    ('SELECT id, title, description, date_time, priority FROM appointments '
+     'WHERE user_id = ? ORDER BY date_time ASC', lambda i: (i % 50,)),
+    ('INSERT INTO interactions (user_id, user_message, bot_response, intent, language) '
+     'VALUES (?, ?, ?, ?, ?)', lambda i: (i % 50, 'موعد غدا', 'تم', 'add_appointment', 'ar')),
+    ('INSERT INTO conversation_history (user_id, user_message, bot_response, intent, extracted_info) '
+     'VALUES (?, ?, ?, ?, ?)', lambda i: (i % 50, 'موعد غدا', 'تم', 'add_appointment', '{}')),
+]
+
+
+def _prepare_bench_db(db_path: str):
+    """إنشاء قاعدة بيانات تجريبية بمواعيد لـ 50 مستخدماً"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    
+    conn = sqlite3.connect(db_path)
+    for sql in _BENCH_SCHEMA:
+        conn.execute(sql)
+    conn.executemany(
+        'INSERT INTO appointments (user_id, title, date_time) VALUES (?, ?, ?)',
+        [(i % 50, f'موعد {i}', f'2026-01-{i % 28 + 1:02d} 10:00:00') for i in range(1000)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def benchmark_per_message(messages: int = 500, db_prefix: str = "bench_pool") -> dict:
+    """
+    مقارنة تكلفة قاعدة البيانات لكل رسالة:
+    اتصال جديد لكل عملية (السابق) مقابل المجموعة المشتركة
+    
+    Args:
+        messages: عدد الرسائل المحاكاة
+        db_prefix: بادئة ملفات قاعدة البيانات المؤقتة
+        
+    Returns:
+        dict: الزمن لكل رسالة بالميكروثانية ونسبة التحسن
+    """
+    legacy_db = f"{db_prefix}_legacy.db"
+    pooled_db = f"{db_prefix}_pooled.db"
+    _prepare_bench_db(legacy_db)
+    _prepare_bench_db(pooled_db)
+    
+    # قبل: connect / execute / commit / close لكل عملية
+    start = time.perf_counter()
+    for i in range(messages):
+        for sql, params in _BENCH_OPS:
+            conn = sqlite3.connect(legacy_db)
+            cursor = conn.cursor()
+            cursor.execute(sql, params(i))
+            cursor.fetchall()
+            conn.commit()
+            conn.close()
+    legacy = time.perf_counter() - start
+    
+    # بعد: اتصالات دائمة من المجموعة (WAL + استعلامات مُجهّزة)
+    pool = DatabaseConnectionPool(pooled_db, pool_size=2, max_overflow=0)
+    try:
+        start = time.perf_counter()
+        for i in range(messages):
+            for sql, params in _BENCH_OPS:
+                with pool.get_cursor() as cursor:
+                    cursor.execute(sql, params(i))
+                    cursor.fetchall()
+        pooled = time.perf_counter() - start
+    finally:
+        pool.close_all()
+    
+    for path in (legacy_db, pooled_db):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    
+    return {
+        'messages': messages,
+        'legacy_us_per_message': legacy / messages * 1e6,
+        'pooled_us_per_message': pooled / messages * 1e6,
+        'speedup': legacy / pooled if pooled > 0 else 0
+    }
 
 
 # ==========================================
@@ -419,5 +533,14 @@ if __name__ == "__main__":
     # التنظيف
     pool.close_all()
     
+    # تكلفة قاعدة البيانات لكل رسالة: قبل وبعد المجموعة المشتركة
+    print("\n📊 تكلفة قاعدة البيانات لكل رسالة (3 عمليات/رسالة):")
+    print("-"*70)
+    
+    result = benchmark_per_message(messages=500)
+    print(f"   قبل (اتصال لكل عملية): {result['legacy_us_per_message']:,.0f} µs/رسالة")
+    print(f"   بعد (مجموعة مشتركة):   {result['pooled_us_per_message']:,.0f} µs/رسالة")
+    print(f"   ⚡ التحسن: {result['speedup']:.1f}x")
+    
     print("="*70)
     print("✅ الاختبار اكتمل!")
\ No newline at end of file
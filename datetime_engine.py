@@ -0,0 +1,649 @@
+# datetime_engine.py
+"""
+محرك استخراج التاريخ والوقت - تمريرة واحدة
+✅ كل المفردات (الشهور، أيام الأسبوع، الإزاحات النسبية، الأرقام بالحروف)
+   مجمّعة مرة واحدة عند الاستيراد في تعبير واحد مبني على Trie
+✅ مسح واحد للرسالة ينتج كل رموز التاريخ والوقت
+✅ التكلفة خطية في طول الرسالة ولا تتأثر بحجم المفردات
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# المفردات
+# ==========================================
+
+# أسماء الشهور (مع دعم اللهجة التونسية/المغاربية)
+MONTHS = {
+    # عربي
+    'يناير': 1, 'جانفي': 1,
+    'فبراير': 2, 'فيفري': 2,
+    'مارس': 3,
+    'أبريل': 4, 'أفريل': 4,
+    'مايو': 5, 'ماي': 5,
+    'يونيو': 6, 'جوان': 6,
+    'يوليو': 7, 'جويلية': 7,
+    'أغسطس': 8, 'أوت': 8,
+    'سبتمبر': 9, 'شتنبر': 9,
+    'أكتوبر': 10, 'كتوبر': 10,
+    'نوفمبر': 11, 'نونبر': 11,
+    'ديسمبر': 12, 'دجنبر': 12,
+    # فرنسي
+    'janvier': 1, 'février': 2, 'fevrier': 2, 'mars': 3, 'avril': 4,
+    'mai': 5, 'juin': 6, 'juillet': 7, 'août': 8, 'aout': 8,
+    'septembre': 9, 'octobre': 10, 'novembre': 11, 'décembre': 12, 'decembre': 12,
+    # إنجليزي
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
+    'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6,
+    'july': 7, 'jul': 7, 'august': 8, 'aug': 8,
+    'september': 9, 'sep': 9, 'october': 10, 'oct': 10,
+    'november': 11, 'nov': 11, 'december': 12, 'dec': 12
+}
+
+# الكلمات المفتاحية النسبية: الكلمة → (عدد الأيام، الأولوية)
+# الأولوية تحافظ على ترتيب الفحص القديم (اليوم قبل غداً قبل بعد غد...)
+RELATIVE_DAYS = {
+    'اليوم': (0, 0),
+    'غدا': (1, 1), 'غداً': (1, 1), 'غدوة': (1, 1), 'بكرة': (1, 1),
+    'بعد غد': (2, 2),
+    'الأسبوع القادم': (7, 3), 'الاسبوع القادم': (7, 3),
+    'الشهر القادم': (30, 4),
+    "aujourd'hui": (0, 0), 'aujourdhui': (0, 0),
+    'demain': (1, 1),
+    'après-demain': (2, 2), 'apres-demain': (2, 2),
+    'semaine prochaine': (7, 3),
+    'today': (0, 0),
+    'tomorrow': (1, 1),
+    'day after tomorrow': (2, 2),
+    'next week': (7, 3),
+}
+
+# أيام الأسبوع (0 = الاثنين)
+WEEKDAYS = {
+    'الاثنين': 0, 'الإثنين': 0, 'الثلاثاء': 1, 'الأربعاء': 2,
+    'الخميس': 3, 'الجمعة': 4, 'السبت': 5, 'الأحد': 6,
+    'lundi': 0, 'mardi': 1, 'mercredi': 2,
+    'jeudi': 3, 'vendredi': 4, 'samedi': 5, 'dimanche': 6,
+    'monday': 0, 'tuesday': 1, 'wednesday': 2,
+    'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6
+}
+
+# الأرقام المكتوبة بالحروف (للساعة)
+HOUR_WORDS = {
+    'الواحدة': 1, 'واحدة': 1,
+    'الثانية': 2, 'ثانية': 2,
+    'الثالثة': 3, 'ثالثة': 3,
+    'الرابعة': 4, 'رابعة': 4,
+    'الخامسة': 5, 'خامسة': 5,
+    'السادسة': 6, 'سادسة': 6,
+    'السابعة': 7, 'سابعة': 7,
+    'الثامنة': 8, 'ثامنة': 8,
+    'التاسعة': 9, 'تاسعة': 9,
+    'العاشرة': 10, 'عاشرة': 10,
+    'الحادية عشرة': 11, 'حادية عشرة': 11,
+    'الثانية عشرة': 12, 'ثانية عشرة': 12,
+}
+
+# وحدات الإزاحة: الكلمة → (الوحدة، العدد الضمني بدون رقم)
+OFFSET_UNITS = {
+    'دقيقة': (timedelta(minutes=1), 1), 'دقيقتين': (timedelta(minutes=1), 2),
+    'دقائق': (timedelta(minutes=1), None),
+    'ساعة': (timedelta(hours=1), 1), 'ساعتين': (timedelta(hours=1), 2),
+    'ساعات': (timedelta(hours=1), None),
+    'يوم': (timedelta(days=1), 1), 'يومين': (timedelta(days=1), 2),
+    'أيام': (timedelta(days=1), None),
+    'minute': (timedelta(minutes=1), None), 'minutes': (timedelta(minutes=1), None),
+    'heure': (timedelta(hours=1), None), 'heures': (timedelta(hours=1), None),
+    'jour': (timedelta(days=1), None), 'jours': (timedelta(days=1), None),
+    'hour': (timedelta(hours=1), None), 'hours': (timedelta(hours=1), None),
+    'day': (timedelta(days=1), None), 'days': (timedelta(days=1), None),
+}
+
+# الأعداد المكتوبة قبل الوحدة: "dans une heure"، "in two days"
+OFFSET_COUNT_WORDS = {
+    'un': 1, 'une': 1, 'a': 1, 'an': 1,
+    'deux': 2, 'two': 2,
+}
+
+PM_PERIODS = {'مساء', 'مساءً', 'pm'}
+AM_PERIODS = {'صباحا', 'صباحاً', 'am'}
+
+# أولوية أنماط الوقت (الأصغر أدق)
+TIME_COLON, TIME_FRENCH_FULL, TIME_FRENCH_HOUR, TIME_WORD, TIME_KEYWORD, TIME_PERIOD = range(6)
+
+
+def build_trie_pattern(words: Iterable[str]) -> str:
+    """
+    بناء تعبير منتظم من Trie للكلمات
+
+    البادئات المشتركة تُدمج، فكلفة المطابقة عند كل موضع تتبع طول
+    الكلمة لا عدد الكلمات، وتُفضَّل المطابقة الأطول دائماً.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node: Dict) -> str:
+        is_end = '' in node
+        branches = [
+            re.escape(char) + build(child)
+            for char, child in sorted(node.items())
+            if char != ''
+        ]
+
+        if not branches:
+            return ''
+
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if is_end else group
+
+    return build(trie)
+
+
+def _compile_scanner() -> re.Pattern:
+    """تجميع التعبير الموحد - مرة واحدة عند الاستيراد"""
+    months = build_trie_pattern(MONTHS)
+    hour_words = build_trie_pattern(HOUR_WORDS)
+    units = build_trie_pattern(OFFSET_UNITS)
+    count_words = build_trie_pattern(OFFSET_COUNT_WORDS)
+    words = build_trie_pattern(list(RELATIVE_DAYS) + list(WEEKDAYS))
+
+    # ترتيب الفروع مهم عند تساوي موضع البداية
+    branches = [
+        # "15 مارس 2025"
+        rf'(?P<DAY_MONTH>(?P<dm_day>\d{{1,2}})\s+(?P<dm_month>{months})(?:\s+(?P<dm_year>\d{{4}}))?)',
+        # "15/03/2025" / "15/03"
+        r'(?P<NUMERIC_DATE>(?P<nd_day>\d{1,2})[/-](?P<nd_month>\d{1,2})(?:[/-](?P<nd_year>\d{2,4}))?)',
+        # "16:30" / "على الساعة 16:30"
+        r'(?P<COLON>(?:(?:على\s+)?(?:الساعة|ساعة)\s+)?\b(?P<cl_hour>[0-2]?\d):(?P<cl_minute>[0-5]\d)\b)',
+        # "16h30" / "16h"
+        r'(?P<FRENCH>(?P<fr_hour>\d{1,2})h(?:(?P<fr_minute>\d{2})|(?!\d)))',
+        # "بعد ساعتين" / "dans 3 heures" / "in an hour"
+        rf'(?P<OFFSET>(?:بعد|(?<![a-z])dans|(?<![a-z])in)\s+'
+        rf'(?:(?P<of_count>\d+)\s*|(?P<of_word>{count_words})\s+)?(?P<of_unit>{units}))',
+        # "الساعة الرابعة مساءً"
+        rf'(?P<HOUR_WORD>(?:الساعة\s+)?(?P<hw_word>{hour_words})\s*(?P<hw_period>صباحاً|صباحا|مساءً|مساء)?)',
+        # "على الساعة 5" ("الساعة 10:30" يُترك لـ COLON حتى لا تضيع الدقائق)
+        r'(?P<HOUR_KEYWORD>(?:على\s+)?(?:الساعة|ساعة)\s+(?P<hk_hour>\d{1,2})(?![\d:])'
+        r'(?:\s*(?P<hk_period>صباحاً|صباحا|مساءً|مساء))?)',
+        # "5 مساءً" / "10 am"
+        r'(?P<HOUR_PERIOD>\b(?P<hp_hour>\d{1,2})\s*(?P<hp_period>صباحا|صباحاً|مساء|مساءً|am|pm)\b)',
+        # "غداً" / "الخميس" / "demain" ...
+        rf'(?P<WORD>{words})',
+    ]
+
+    return re.compile('|'.join(branches))
+
+
+_SCANNER = _compile_scanner()
+_WORD = re.compile(r'\S+')
+
+
+def _word_spans(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """مواضع الكلمات داخل مقطع من النص"""
+    return [match.span() for match in _WORD.finditer(text, start, end)]
+
+
+# ==========================================
+# نتيجة التحليل
+# ==========================================
+
+# ثقة الاستخراج حسب مصدر التاريخ
+DATE_CONFIDENCE = {
+    'explicit': 1.0,
+    'numeric': 1.0,
+    'offset': 0.95,
+    'keyword': 0.9,
+    'weekday': 0.8,
+}
+
+# محارف تُزال من أطراف العنوان
+TITLE_STRIP = " \t\n,.،:;!?؟-"
+
+# كلمات ربط تبقى معلّقة بعد حذف التاريخ ("lunch on friday" → "lunch")
+TITLE_EDGE_WORDS = {
+    'يوم', 'في', 'على', 'بتاريخ',
+    'le', 'la', 'à', 'a', 'au', 'pour', 'prochain', 'prochaine',
+    'on', 'at', 'in', 'for', 'next',
+}
+
+
+@dataclass
+class DateTimeParse:
+    """
+    نتيجة مسح رسالة واحدة
+
+    تُحسب مرة واحدة لكل رسالة وتُمرَّر عبر خط المعالجة
+    (الوكيل، SmartMessageHandler، ContextAwareProcessor، utils)
+    """
+    text: str
+    now: datetime
+    date: Optional[datetime] = None          # تاريخ صريح أو نسبي (بدون وقت نهائي)
+    date_source: Optional[str] = None        # explicit | numeric | offset | keyword | weekday
+    time: Optional[Tuple[int, int]] = None   # (ساعة، دقيقة)
+    offset: Optional[timedelta] = None       # "بعد ساعتين" → timedelta(hours=2)
+    title_span: Optional[Tuple[int, int]] = None
+    spans: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def found(self) -> bool:
+        """هل وُجد أي تاريخ أو وقت؟"""
+        return self.date_source is not None or self.time is not None
+
+    @property
+    def title(self) -> Optional[str]:
+        """أطول جزء من الرسالة خارج رموز التاريخ والوقت"""
+        if self.title_span is None:
+            return None
+        return self.text[self.title_span[0]:self.title_span[1]]
+
+    @property
+    def confidence(self) -> float:
+        """ثقة الاستخراج (0 - 1)"""
+        if self.date_source is None:
+            return 0.6 if self.time else 0.0
+
+        confidence = DATE_CONFIDENCE[self.date_source]
+        if self.time is None and self.date_source != 'offset':
+            confidence *= 0.8   # الوقت افتراضي
+
+        return confidence
+
+    def to_datetime(self, default_hour: int = 9, default_days: int = 1) -> datetime:
+        """
+        دمج النتيجة في datetime واحد (نفس قواعد الوكيل)
+
+        - الإزاحة النسبية تُرجع now + offset كما هي
+        - بدون تاريخ: غداً (default_days)
+        - بدون وقت: default_hour:00
+        """
+        if self.date_source == 'offset':
+            return self.now + self.offset
+
+        date = self.date
+        if date is None:
+            date = self.now + timedelta(days=default_days)
+
+        hour, minute = self.time if self.time else (default_hour, 0)
+        return date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    def to_dict(self) -> Dict:
+        """تمثيل قاموسي (نفس مفاتيح DateTimeExtractor القديم + الحقول الجديدة)"""
+        date, time = self.date, self.time
+        if self.date_source == 'offset':
+            date = self.now + self.offset
+            time = (date.hour, date.minute)
+
+        return {
+            'date': date,
+            'time': time,
+            'title': self.title,
+            'offset_minutes': int(self.offset.total_seconds() // 60) if self.offset else None,
+            'date_source': self.date_source,
+            'confidence': self.confidence
+        }
+
+
+# ==========================================
+# المحرك
+# ==========================================
+
+class DateTimeEngine:
+    """محرك الاستخراج - مسح واحد ثم حل الأولويات"""
+
+    def parse(self, text: str, now: Optional[datetime] = None) -> DateTimeParse:
+        """
+        مسح الرسالة مرة واحدة وحل التاريخ والوقت
+
+        Args:
+            text: نص الرسالة
+            now: الوقت المرجعي (للاختبار)
+        """
+        now = now or datetime.now()
+        result = DateTimeParse(text=text, now=now)
+
+        explicit = numeric = offset = keyword = weekday = None
+        best_time = None   # (الأولوية، (ساعة، دقيقة))
+
+        for match in _SCANNER.finditer(text.lower()):
+            kind = match.lastgroup
+            result.spans.append(match.span())
+
+            if kind == 'DAY_MONTH':
+                if explicit is None:
+                    year = int(match.group('dm_year')) if match.group('dm_year') else now.year
+                    explicit = self._safe_date(
+                        year, MONTHS[match.group('dm_month')], int(match.group('dm_day'))
+                    )
+
+            elif kind == 'NUMERIC_DATE':
+                if numeric is None:
+                    month, day = int(match.group('nd_month')), int(match.group('nd_day'))
+                    if match.group('nd_year'):
+                        year = int(match.group('nd_year'))
+                        if year < 100:
+                            year += 2000
+                        numeric = self._safe_date(year, month, day)
+                    else:
+                        # بدون سنة: هذه السنة، أو القادمة إذا مضى التاريخ
+                        numeric = self._safe_date(now.year, month, day)
+                        if numeric and numeric.date() < now.date():
+                            numeric = self._safe_date(now.year + 1, month, day)
+
+            elif kind == 'OFFSET':
+                if offset is None:
+                    offset = self._offset(match)
+
+            elif kind == 'WORD':
+                word = match.group('WORD')
+                if word in RELATIVE_DAYS:
+                    days, rank = RELATIVE_DAYS[word]
+                    if keyword is None or rank < keyword[0]:
+                        keyword = (rank, days)
+                elif weekday is None:
+                    weekday = WEEKDAYS[word]
+
+            else:
+                candidate = self._time(kind, match)
+                if candidate and (best_time is None or candidate[0] < best_time[0]):
+                    best_time = candidate
+
+        if best_time:
+            result.time = best_time[1]
+        result.offset = offset
+
+        # الأولوية: تاريخ صريح ← تاريخ رقمي ← إزاحة ← كلمة مفتاحية ← يوم أسبوع
+        if explicit:
+            result.date, result.date_source = explicit, 'explicit'
+        elif numeric:
+            result.date, result.date_source = numeric, 'numeric'
+        elif offset is not None:
+            result.date_source = 'offset'
+        elif keyword:
+            result.date, result.date_source = now + timedelta(days=keyword[1]), 'keyword'
+        elif weekday is not None:
+            days_ahead = (weekday - now.weekday()) % 7 or 7
+            result.date, result.date_source = now + timedelta(days=days_ahead), 'weekday'
+
+        result.title_span = self._title_span(text, result.spans)
+
+        return result
+
+    def extract_datetime(self, text: str, now: Optional[datetime] = None) -> datetime:
+        """استخراج datetime نهائي (غداً 9:00 افتراضياً)"""
+        result = self.parse(text, now)
+
+        if result.date_source is None:
+            logger.warning("لم يتم العثور على تاريخ واضح - استخدام غداً كافتراضي")
+
+        return result.to_datetime()
+
+    def extract_time(self, text: str) -> Optional[Tuple[int, int]]:
+        """استخراج الوقت فقط"""
+        return self.parse(text).time
+
+    # ==========================================
+    # دوال مساعدة
+    # ==========================================
+
+    @staticmethod
+    def _title_span(text: str, spans: List[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """أطول مقطع بين رموز التاريخ والوقت (بدون كلمات الربط المعلّقة)"""
+        best = None
+        cursor = 0
+
+        for start, end in spans + [(len(text), len(text))]:
+            words = [
+                (word_start, word_end)
+                for word_start, word_end in _word_spans(text, cursor, start)
+                if text[word_start:word_end].strip(TITLE_STRIP)
+            ]
+            cursor = end
+
+            while words and text[slice(*words[0])].lower() in TITLE_EDGE_WORDS:
+                words.pop(0)
+            while words and text[slice(*words[-1])].lower() in TITLE_EDGE_WORDS:
+                words.pop()
+
+            if not words:
+                continue
+
+            segment_start, segment_end = words[0][0], words[-1][1]
+            while text[segment_start] in TITLE_STRIP:
+                segment_start += 1
+            while text[segment_end - 1] in TITLE_STRIP:
+                segment_end -= 1
+
+            if best is None or segment_end - segment_start > best[1] - best[0]:
+                best = (segment_start, segment_end)
+
+        return best
+
+    @staticmethod
+    def _safe_date(year: int, month: int, day: int) -> Optional[datetime]:
+        try:
+            return datetime(year, month, day)
+        except ValueError:
+            logger.warning(f"تاريخ غير صالح: {day}/{month}/{year}")
+            return None
+
+    @staticmethod
+    def _offset(match: re.Match) -> Optional[timedelta]:
+        unit, implicit = OFFSET_UNITS[match.group('of_unit')]
+
+        if match.group('of_count'):
+            count = int(match.group('of_count'))
+        elif match.group('of_word'):
+            count = OFFSET_COUNT_WORDS[match.group('of_word')]
+        else:
+            count = implicit
+
+        return unit * count if count is not None else None
+
+    @staticmethod
+    def _time(kind: str, match: re.Match) -> Optional[Tuple[int, Tuple[int, int]]]:
+        """تحويل رمز وقت إلى (الأولوية، (ساعة، دقيقة))"""
+        if kind == 'COLON':
+            rank, hour, minute = TIME_COLON, int(match.group('cl_hour')), int(match.group('cl_minute'))
+
+        elif kind == 'FRENCH':
+            minute_text = match.group('fr_minute')
+            rank = TIME_FRENCH_FULL if minute_text else TIME_FRENCH_HOUR
+            hour, minute = int(match.group('fr_hour')), int(minute_text or 0)
+
+        elif kind in ('HOUR_WORD', 'HOUR_KEYWORD'):
+            if kind == 'HOUR_WORD':
+                rank, hour, minute = TIME_WORD, HOUR_WORDS[match.group('hw_word')], 0
+                period = match.group('hw_period')
+            else:
+                rank, hour, minute = TIME_KEYWORD, int(match.group('hk_hour')), 0
+                period = match.group('hk_period')
+
+            if period in PM_PERIODS and hour < 12:
+                hour += 12
+            elif period in AM_PERIODS and hour == 12:
+                hour = 0
+
+        else:  # HOUR_PERIOD
+            rank, hour, minute = TIME_PERIOD, int(match.group('hp_hour')), 0
+            period = match.group('hp_period')
+            if period in PM_PERIODS and 1 <= hour <= 11:
+                hour += 12
+            elif period in AM_PERIODS and hour == 12:
+                hour = 0
+
+        if 0 <= hour <= 23 and 0 <= minute <= 59:
+            return rank, (hour, minute)
+
+        return None
+
+
+# ==========================================
+# Global Instance
+# ==========================================
+
+datetime_engine = DateTimeEngine()
+
+
+# ==========================================
+# اختبار الأداء
+# ==========================================
+
+# رسائل حقيقية من سجلات الاختبار
+SAMPLE_MESSAGES = [
+    "موعد غداً الساعة 3 مساءً",
+    "اجتماع يوم الأحد 10 صباحاً",
+    "موعد اليوم 14:30",
+    "عندي موعد مع الطبيب يوم 15 مارس 2025 على الساعة 10",
+    "موعد مع الطبيب غدا الساعة 10:30",
+    "يوم 25 أكتوبر 2027 الساعة 10:30",
+    "على الساعة 16:55",
+    "ذكرني بعد ساعتين",
+    "ذكرني بعد 30 دقيقة بالاتصال بأمي",
+    "موعد عند طبيب الأسنان الخميس على الساعة الرابعة مساء",
+    "اجتماع مع الفريق 25/12/2025 الساعة 5 مساءً",
+    "موعد يوم 15/03 الساعة 3",
+    "موعد 5 جانفي على الساعة الثانية عشرة",
+    "عندي اجتماع بعد غد في الصباح",
+    "RDV demain à 15h",
+    "rendez-vous chez le dentiste le 3 avril à 9h30",
+    "rappelle-moi dans une heure",
+    "réunion mardi prochain à 14h",
+    "Meeting tomorrow at 10am",
+    "doctor appointment on 12 may 2025 at 16:45",
+    "remind me in 20 minutes",
+    "call the bank next week",
+    "lunch with Sara on friday 1 pm",
+    "مرحبا كيف حالك",
+]
+
+# الوقت الذي كان يستخرجه المسار القديم (IntelligentAgent._extract_time)
+# للرسائل ذات الوقت - أي اختلاف خارج INTENDED_TIME_CHANGES تراجع
+BASELINE_TIMES = {
+    "موعد اليوم 14:30": (14, 30),
+    "عندي موعد مع الطبيب يوم 15 مارس 2025 على الساعة 10": (10, 0),
+    "موعد مع الطبيب غدا الساعة 10:30": (10, 30),
+    "يوم 25 أكتوبر 2027 الساعة 10:30": (10, 30),
+    "على الساعة 16:55": (16, 55),
+    "موعد عند طبيب الأسنان الخميس على الساعة الرابعة مساء": (16, 0),
+    "RDV demain à 15h": (15, 0),
+    "rendez-vous chez le dentiste le 3 avril à 9h30": (9, 30),
+    "réunion mardi prochain à 14h": (14, 0),
+    "doctor appointment on 12 may 2025 at 16:45": (16, 45),
+    "lunch with Sara on friday 1 pm": (13, 0),
+    "اجتماع يوم الأحد 10 صباحاً": (10, 0),
+}
+
+# اختلافات مقصودة عن المسار القديم (المطابقة الأطول)
+INTENDED_TIME_CHANGES = {
+    "موعد غداً الساعة 3 مساءً": (15, 0),                     # كان 03:00
+    "اجتماع مع الفريق 25/12/2025 الساعة 5 مساءً": (17, 0),   # كان 05:00
+    "موعد 5 جانفي على الساعة الثانية عشرة": (12, 0),          # كان 02:00
+    "Meeting tomorrow at 10am": (10, 0),                     # كان بدون وقت
+}
+
+
+# تواريخ متوقعة مقابل الوقت المرجعي في __main__ (الاثنين 2025-03-10)
+DATE_CASES = [
+    ("موعد يوم 15/03 الساعة 3", datetime(2025, 3, 15)),
+    ("موعد 05/01 على الساعة 10", datetime(2026, 1, 5)),      # مضى هذه السنة
+    ("اجتماع مع الفريق 25/12/2025 الساعة 5 مساءً", datetime(2025, 12, 25)),
+    ("موعد 10-03", datetime(2025, 3, 10)),                      # اليوم نفسه
+]
+
+
+def check_date_cases(now: datetime) -> List[Tuple[str, datetime, Optional[datetime]]]:
+    """
+    مقارنة تواريخ المحرك بـ DATE_CASES
+
+    Returns:
+        List: (الرسالة، المتوقع، الناتج) لكل اختلاف
+    """
+    mismatches = []
+    for message, expected in DATE_CASES:
+        parsed = datetime_engine.parse(message, now).date
+        if parsed != expected:
+            mismatches.append((message, expected, parsed))
+    return mismatches
+
+
+def check_time_parity(now: Optional[datetime] = None) -> List[Tuple[str, Optional[Tuple[int, int]], Optional[Tuple[int, int]]]]:
+    """
+    مقارنة أوقات المحرك بالمسار القديم
+
+    Returns:
+        List: (الرسالة، المتوقع، الناتج) لكل اختلاف
+    """
+    now = now or datetime.now()
+    expected = {**BASELINE_TIMES, **INTENDED_TIME_CHANGES}
+    mismatches = []
+    for message, time_value in expected.items():
+        parsed = datetime_engine.parse(message, now).time
+        if parsed != time_value:
+            mismatches.append((message, time_value, parsed))
+    return mismatches
+
+
+if __name__ == "__main__":
+    import time
+
+    print("="*70)
+    print("🧪 اختبار محرك التاريخ والوقت")
+    print("="*70)
+
+    now = datetime(2025, 3, 10, 12, 0)   # الاثنين
+    print(f"\n📅 الوقت المرجعي: {now.strftime('%A %Y-%m-%d %H:%M')}\n")
+    for message in SAMPLE_MESSAGES:
+        result = datetime_engine.parse(message, now)
+        print(f"   {result.to_datetime().strftime('%Y-%m-%d %H:%M')}  "
+              f"[{result.date_source or 'default'} {result.confidence:.2f}]  {message}  → {result.title!r}")
+
+    mismatches = check_time_parity(now)
+    print(f"\n🔁 التطابق مع المسار القديم: "
+          f"{len(BASELINE_TIMES) + len(INTENDED_TIME_CHANGES) - len(mismatches)}/"
+          f"{len(BASELINE_TIMES) + len(INTENDED_TIME_CHANGES)}")
+    for message, expected, parsed in mismatches:
+        print(f"   ❌ {message}: المتوقع {expected} - الناتج {parsed}")
+
+    date_mismatches = check_date_cases(now)
+    print(f"📅 حالات التاريخ: {len(DATE_CASES) - len(date_mismatches)}/{len(DATE_CASES)}")
+    for message, expected, parsed in date_mismatches:
+        print(f"   ❌ {message}: المتوقع {expected} - الناتج {parsed}")
+
+    iterations = 200
+    corpus = SAMPLE_MESSAGES * iterations
+
+    start = time.perf_counter()
+    for message in corpus:
+        datetime_engine.parse(message, now)
+    engine_time = time.perf_counter() - start
+
+    print(f"\n📊 {len(corpus)} رسالة:")
+    print(f"   ⚡ المحرك: {engine_time / len(corpus) * 1e6:,.1f} µs/رسالة")
+
+    # خطية في طول الرسالة
+    print("\n📏 التكلفة حسب طول الرسالة:")
+    base = "كلام عادي بدون أي تاريخ "
+    for repeat in (1, 10, 100):
+        text = base * repeat + "غداً الساعة 3 مساءً"
+        start = time.perf_counter()
+        for _ in range(200):
+            datetime_engine.parse(text, now)
+        elapsed = (time.perf_counter() - start) / 200
+        print(f"   {len(text):>6} حرف → {elapsed * 1e6:,.1f} µs")
+
+    print("="*70)
+    print("✅ الاختبار اكتمل!")
@@ -4,121 +4,457 @@
 ✅ Multi-level cache (Memory + Disk)
 ✅ Smart invalidation
 ✅ Compression للبيانات الكبيرة
+✅ L2 على القرص: ملف segment واحد (append-only) بمفاتيح digest ثابتة
+✅ حجم محدود بالبايت (LRU) + ضغط الملف (compaction) في الخلفية
 """
 
+import hashlib
+import os
 import pickle
+import struct
+import threading
 import zlib
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 import time
 from pathlib import Path
+import logging
 
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# L2: مخزن segment على القرص
+# ==========================================
+
+# رأس السجل: digest المفتاح، crc32، طول المفتاح، طول القيمة، الانتهاء، الأعلام
+RECORD_HEADER = struct.Struct('<16sIHIdB')
+
+FLAG_COMPRESSED = 1
+FLAG_TOMBSTONE = 2
+
+
+def key_digest(key: str) -> bytes:
+    """digest ثابت بين العمليات (بعكس hash() العشوائي لكل عملية)"""
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+class _DiskEntry:
+    __slots__ = ('offset', 'size', 'expires')
+
+    def __init__(self, offset: int, size: int, expires: float):
+        self.offset = offset
+        self.size = size
+        self.expires = expires
+
+
+class SegmentStore:
+    """
+    مخزن قيم على القرص في ملف واحد يُكتب بالإلحاق فقط
+
+    كل سجل يحمل المفتاح الكامل (يُقارن عند القراءة - لا تصادمات صامتة)
+    و crc32 (السجلات المبتورة بعد انهيار تُقطع عند الفتح).
+    الفهرس في الذاكرة مرتب حسب الاستخدام: تجاوز max_bytes يُخرج الأقدم،
+    والمساحة الميتة (قيم مستبدلة/محذوفة) تُستعاد بإعادة كتابة الملف
+    في thread خلفي عندما تتجاوز compaction_ratio من حجمه.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 64 * 1024 * 1024,
+        compress_threshold: int = 1024,
+        compaction_ratio: float = 0.5,
+        min_compaction_bytes: int = 1024 * 1024
+    ):
+        """
+        Args:
+            path: مسار ملف الـ segment
+            max_bytes: الحد الأقصى للبيانات الحية
+            compress_threshold: ضغط القيم الأكبر من هذا الحجم (bytes)
+            compaction_ratio: نسبة المساحة الميتة التي تطلق الضغط
+            min_compaction_bytes: لا ضغط لملف أصغر من هذا
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        self.compaction_ratio = compaction_ratio
+        self.min_compaction_bytes = min_compaction_bytes
+
+        self._index: OrderedDict = OrderedDict()  # digest ← _DiskEntry (الأحدث في النهاية)
+        self._lock = threading.RLock()
+        self._compacting = False
+        self.live_bytes = 0
+        self.file_bytes = 0
+
+        self.stats = {
+            'writes': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'collisions': 0,
+            'corrupt': 0,
+            'compressions': 0,
+            'compactions': 0
+        }
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a+b')
+        self._load()
+
+    # ---------- الفتح ----------
+
+    def _load(self):
+        """إعادة بناء الفهرس من الملف (آخر كتابة لكل مفتاح هي الصالحة)"""
+        now = time.time()
+        self._file.seek(0)
+        offset = 0
+
+        while True:
+            header = self._file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+
+            digest, crc, key_len, value_len, expires, flags = RECORD_HEADER.unpack(header)
+            body = self._file.read(key_len + value_len)
+            if len(body) < key_len + value_len or zlib.crc32(body) != crc:
+                break
+
+            size = RECORD_HEADER.size + len(body)
+            old = self._index.pop(digest, None)
+            if old is not None:
+                self.live_bytes -= old.size
+
+            if not flags & FLAG_TOMBSTONE and expires > now:
+                self._index[digest] = _DiskEntry(offset, size, expires)
+                self.live_bytes += size
+
+            offset += size
+
+        # ذيل مبتور أو تالف (انقطاع أثناء الكتابة)
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() > offset:
+            logger.warning(f"⚠️ قطع {self._file.tell() - offset} bytes تالفة من {self.path.name}")
+            self._file.truncate(offset)
+
+        self.file_bytes = offset
+        self._enforce_budget()
+
+        logger.info(f"✅ L2 cache: {len(self._index)} عنصر، {self.live_bytes / 1024:.0f}KB")
+
+    # ---------- القراءة والكتابة ----------
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[tuple]:
+        """
+        Returns:
+            (القيمة، وقت الانتهاء) أو None
+        """
+        digest = key_digest(key)
+        now = now or time.time()
+
+        with self._lock:
+            entry = self._index.get(digest)
+            if entry is None:
+                return None
+
+            if entry.expires <= now:
+                self._drop(digest, 'expirations')
+                return None
+
+            self._file.seek(entry.offset)
+            record = self._file.read(entry.size)
+            self._index.move_to_end(digest)
+
+        _, crc, key_len, _, expires, flags = RECORD_HEADER.unpack_from(record)
+        body = record[RECORD_HEADER.size:]
+
+        if zlib.crc32(body) != crc:
+            self.stats['corrupt'] += 1
+            return None
+
+        # نفس الـ digest لمفتاح آخر: لا نُعيد قيمة غيره أبداً
+        if body[:key_len].decode('utf-8') != key:
+            self.stats['collisions'] += 1
+            return None
+
+        payload = body[key_len:]
+        if flags & FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+
+        return pickle.loads(payload), expires
+
+    def set(self, key: str, value: Any, expires: float):
+        """إلحاق سجل جديد (القديم يصبح مساحة ميتة)"""
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        flags = 0
+
+        # ضغط إذا كان كبيراً
+        if len(payload) > self.compress_threshold:
+            payload = zlib.compress(payload, level=6)
+            flags |= FLAG_COMPRESSED
+            self.stats['compressions'] += 1
+
+        digest = key_digest(key)
+
+        with self._lock:
+            offset, size = self._append(digest, key.encode('utf-8'), payload, expires, flags)
+
+            old = self._index.pop(digest, None)
+            if old is not None:
+                self.live_bytes -= old.size
+
+            self._index[digest] = _DiskEntry(offset, size, expires)
+            self.live_bytes += size
+            self.stats['writes'] += 1
+
+            self._enforce_budget()
+            self._maybe_compact()
+
+    def delete(self, key: str) -> bool:
+        """حذف مفتاح (سجل tombstone حتى لا يعود بعد إعادة التشغيل)"""
+        with self._lock:
+            return self._drop(key_digest(key), None)
+
+    def _append(self, digest: bytes, key: bytes, payload: bytes, expires: float, flags: int) -> tuple:
+        body = key + payload
+        record = RECORD_HEADER.pack(digest, zlib.crc32(body), len(key), len(payload), expires, flags) + body
+
+        offset = self.file_bytes
+        self._file.seek(offset)
+        self._file.write(record)
+        self._file.flush()
+        self.file_bytes += len(record)
+
+        return offset, len(record)
+
+    def _drop(self, digest: bytes, reason: Optional[str]) -> bool:
+        """إزالة من الفهرس + tombstone (القفل مأخوذ)"""
+        entry = self._index.pop(digest, None)
+        if entry is None:
+            return False
+
+        self.live_bytes -= entry.size
+        self._append(digest, b'', b'', 0.0, FLAG_TOMBSTONE)
+
+        if reason:
+            self.stats[reason] += 1
+        return True
+
+    def _enforce_budget(self):
+        """إخراج الأقل استخداماً حتى يعود الحجم تحت max_bytes"""
+        while self.live_bytes > self.max_bytes and len(self._index) > 1:
+            self._drop(next(iter(self._index)), 'evictions')
+
+    # ---------- الضغط ----------
+
+    @property
+    def dead_bytes(self) -> int:
+        return self.file_bytes - self.live_bytes
+
+    def _maybe_compact(self):
+        """إطلاق الضغط في الخلفية عند تجاوز نسبة المساحة الميتة"""
+        if (
+            self._compacting
+            or self.file_bytes < self.min_compaction_bytes
+            or self.dead_bytes < self.file_bytes * self.compaction_ratio
+        ):
+            return
+
+        self._compacting = True
+        threading.Thread(target=self.compact, name="l2-cache-compaction", daemon=True).start()
+
+    def compact(self):
+        """
+        إعادة كتابة السجلات الحية فقط (بترتيب الاستخدام) ثم استبدال الملف ذرياً
+
+        البيانات الحية محدودة بـ max_bytes، فالقفل يُمسك لمدة محدودة.
+        """
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+
+        try:
+            with self._lock:
+                now = time.time()
+                before = self.file_bytes
+                new_index: OrderedDict = OrderedDict()
+                offset = 0
+
+                with open(tmp_path, 'wb') as tmp:
+                    for digest, entry in self._index.items():
+                        if entry.expires <= now:
+                            self.stats['expirations'] += 1
+                            continue
+
+                        self._file.seek(entry.offset)
+                        tmp.write(self._file.read(entry.size))
+                        new_index[digest] = _DiskEntry(offset, entry.size, entry.expires)
+                        offset += entry.size
+
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
+
+                self._file.close()
+                os.replace(tmp_path, self.path)
+                self._file = open(self.path, 'a+b')
+
+                self._index = new_index
+                self.live_bytes = self.file_bytes = offset
+                self.stats['compactions'] += 1
+
+            logger.info(f"🗜️ L2 compaction: {before / 1024:.0f}KB → {offset / 1024:.0f}KB")
+        except Exception as e:
+            logger.error(f"❌ فشل ضغط L2: {e}")
+        finally:
+            self._compacting = False
+
+    def clear(self):
+        """مسح المخزن بالكامل"""
+        with self._lock:
+            self._index.clear()
+            self._file.truncate(0)
+            self.live_bytes = self.file_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            'entries': len(self._index),
+            'live_bytes': self.live_bytes,
+            'file_bytes': self.file_bytes,
+            'max_bytes': self.max_bytes
+        }
+
+
+# ==========================================
+# Cache بمستويين
+# ==========================================
 
 class EnhancedCache:
     """Cache متقدم بمستويات متعددة"""
-    
+
+    SEGMENT_FILE = "l2.seg"
+
     def __init__(
         self,
         memory_size: int = 100,
         disk_cache_dir: str = "cache",
-        compress_threshold: int = 1024  # bytes
+        compress_threshold: int = 1024,  # bytes
+        disk_max_bytes: int = 64 * 1024 * 1024
     ):
-        self.memory_cache = {}  # L1 Cache
+        self.memory_cache: OrderedDict = OrderedDict()  # L1 Cache (LRU)
         self.memory_size = memory_size
         self.disk_cache_dir = Path(disk_cache_dir)
         self.disk_cache_dir.mkdir(exist_ok=True)
         self.compress_threshold = compress_threshold
-        
+        self._lock = threading.Lock()
+
+        # ملفات النسخة القديمة (ملف لكل مفتاح بـ hash() غير ثابت) لا يمكن قراءتها
+        for legacy_file in self.disk_cache_dir.glob("*.cache"):
+            legacy_file.unlink()
+
+        self.disk = SegmentStore(
+            self.disk_cache_dir / self.SEGMENT_FILE,
+            max_bytes=disk_max_bytes,
+            compress_threshold=compress_threshold
+        )
+
         # إحصائيات
         self.stats = {
             'memory_hits': 0,
             'disk_hits': 0,
-            'misses': 0,
-            'compressions': 0
+            'misses': 0
         }
-    
-    def _get_disk_path(self, key: str) -> Path:
-        """مسار ملف الـ cache على القرص"""
-        return self.disk_cache_dir / f"{hash(key) % 100000}.cache"
-    
+
     def get(self, key: str) -> Optional[Any]:
         """الحصول من الـ cache"""
+        now = time.time()
+
         # محاولة L1 (Memory)
-        if key in self.memory_cache:
-            entry = self.memory_cache[key]
-            if time.time() < entry['expires']:
-                self.stats['memory_hits'] += 1
-                return entry['value']
-            else:
+        with self._lock:
+            entry = self.memory_cache.get(key)
+            if entry is not None:
+                if now < entry['expires']:
+                    self.memory_cache.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry['value']
                 del self.memory_cache[key]
-        
+
         # محاولة L2 (Disk)
-        disk_path = self._get_disk_path(key)
-        if disk_path.exists():
-            try:
-                with open(disk_path, 'rb') as f:
-                    data = f.read()
-                
-                # فك الضغط إذا لزم الأمر
-                if data.startswith(b'COMPRESSED:'):
-                    data = zlib.decompress(data[11:])
-                
-                entry = pickle.loads(data)
-                
-                if time.time() < entry['expires']:
-                    # نقل إلى memory cache
-                    self.memory_cache[key] = entry
-                    self.stats['disk_hits'] += 1
-                    return entry['value']
-                else:
-                    disk_path.unlink()
-            except:
-                pass
-        
+        try:
+            found = self.disk.get(key, now)
+        except Exception as e:
+            logger.warning(f"⚠️ فشل قراءة cache من القرص: {e}")
+            found = None
+
+        if found is not None:
+            value, expires = found
+            # نقل إلى memory cache (النسخة على القرص ما زالت صالحة)
+            self._store_memory(key, {'value': value, 'expires': expires, 'on_disk': True})
+            self.stats['disk_hits'] += 1
+            return value
+
         self.stats['misses'] += 1
         return None
-    
+
     def set(self, key: str, value: Any, ttl: int = 300):
         """حفظ في الـ cache"""
         expires = time.time() + ttl
-        entry = {'value': value, 'expires': expires}
-        
-        # حفظ في memory
-        if len(self.memory_cache) >= self.memory_size:
-            # حذف الأقدم
-            oldest_key = min(
-                self.memory_cache.keys(),
-                key=lambda k: self.memory_cache[k]['expires']
-            )
-            
-            # نقل إلى disk قبل الحذف
-            self._save_to_disk(oldest_key, self.memory_cache[oldest_key])
-            del self.memory_cache[oldest_key]
-        
-        self.memory_cache[key] = entry
-    
+        self._store_memory(key, {'value': value, 'expires': expires, 'on_disk': False})
+
+    def _store_memory(self, key: str, entry: dict):
+        """حفظ في memory - الأقدم استخداماً يُنقل إلى القرص"""
+        with self._lock:
+            self.memory_cache[key] = entry
+            self.memory_cache.move_to_end(key)
+
+            demoted = []
+            while len(self.memory_cache) > self.memory_size:
+                demoted.append(self.memory_cache.popitem(last=False))
+
+        for old_key, old_entry in demoted:
+            self._save_to_disk(old_key, old_entry)
+
     def _save_to_disk(self, key: str, entry: dict):
-        """حفظ على القرص"""
+        """حفظ على القرص (إلا إذا كانت نفس النسخة هناك مسبقاً)"""
+        if entry['on_disk'] or entry['expires'] <= time.time():
+            return
+
         try:
-            data = pickle.dumps(entry)
-            
-            # ضغط إذا كان كبيراً
-            if len(data) > self.compress_threshold:
-                data = b'COMPRESSED:' + zlib.compress(data, level=6)
-                self.stats['compressions'] += 1
-            
-            disk_path = self._get_disk_path(key)
-            with open(disk_path, 'wb') as f:
-                f.write(data)
+            self.disk.set(key, entry['value'], entry['expires'])
         except Exception as e:
             print(f"⚠️ فشل حفظ cache على القرص: {e}")
-    
+
+    def invalidate(self, key: str):
+        """إلغاء مفتاح من المستويين"""
+        with self._lock:
+            self.memory_cache.pop(key, None)
+        self.disk.delete(key)
+
+    def flush(self):
+        """نقل كل محتوى memory إلى القرص (قبل الإيقاف) - يبقى بعد إعادة التشغيل"""
+        with self._lock:
+            entries = list(self.memory_cache.items())
+
+        for key, entry in entries:
+            self._save_to_disk(key, entry)
+            entry['on_disk'] = True
+
+    def close(self):
+        """flush ثم إغلاق ملف القرص"""
+        self.flush()
+        self.disk.close()
+
     def clear(self):
         """مسح الـ cache"""
-        self.memory_cache.clear()
-        for cache_file in self.disk_cache_dir.glob("*.cache"):
-            cache_file.unlink()
-    
+        with self._lock:
+            self.memory_cache.clear()
+        self.disk.clear()
+
     def get_stats(self) -> dict:
         """إحصائيات الأداء"""
         total_requests = sum([
@@ -126,19 +462,20 @@ class EnhancedCache:
             self.stats['disk_hits'],
             self.stats['misses']
         ])
-        
+
         hit_rate = 0
         if total_requests > 0:
             hit_rate = (
-                (self.stats['memory_hits'] + self.stats['disk_hits']) 
+                (self.stats['memory_hits'] + self.stats['disk_hits'])
                 / total_requests * 100
             )
-        
+
         return {
             **self.stats,
             'total_requests': total_requests,
             'hit_rate': hit_rate,
-            'memory_size': len(self.memory_cache)
+            'memory_size': len(self.memory_cache),
+            'disk': self.disk.get_stats()
         }
 
 
@@ -150,27 +487,86 @@ def smart_cache(ttl: int = 300, use_enhanced: bool = True):
     else:
         from cache_manager import CacheManager
         cache = CacheManager()
-    
+
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             # توليد key
             key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            
+
             # محاولة الحصول من cache
             result = cache.get(key)
             if result is not None:
                 return result
-            
+
             # تنفيذ الدالة
             result = func(*args, **kwargs)
-            
+
             # حفظ في cache
             cache.set(key, result, ttl=ttl)
-            
+
             return result
-        
+
         wrapper.cache = cache
         return wrapper
-    
-    return decorator
\ No newline at end of file
+
+    return decorator
+
+
+# ==========================================
+# اختبار
+# ==========================================
+
+if __name__ == "__main__":
+    import tempfile
+
+    print("="*70)
+    print("🧪 اختبار Enhanced Cache (L1 + L2 segment)")
+    print("="*70)
+
+    directory = tempfile.mkdtemp()
+
+    # 1. البقاء بعد إعادة التشغيل
+    print("\n🔄 البقاء بعد إعادة التشغيل:")
+    cache = EnhancedCache(memory_size=10, disk_cache_dir=directory)
+    for i in range(50):
+        cache.set(f"user:{i}", {'id': i, 'notes': 'x' * 2000})
+    cache.close()
+
+    cache = EnhancedCache(memory_size=10, disk_cache_dir=directory)
+    restored = sum(cache.get(f"user:{i}") is not None for i in range(50))
+    print(f"   ✅ استُرجع {restored}/50 من القرص في عملية جديدة")
+
+    # 2. تصادم digest: المفتاح الكامل يُقارن
+    print("\n🔑 فحص التصادم:")
+    original_digest = key_digest
+    key_digest = lambda key: b'\x00' * 16  # كل المفاتيح بنفس الـ digest
+    cache.disk.set("a", "value-a", time.time() + 60)
+    print(f"   'b' بنفس digest 'a' → {cache.disk.get('b')} (لا قيمة خاطئة)")
+    key_digest = original_digest
+
+    # 3. الحد الأقصى + الضغط
+    print("\n🗜️ الحجم المحدود والضغط:")
+    store = SegmentStore(Path(directory) / "bounded.seg", max_bytes=200_000, min_compaction_bytes=100_000)
+    start = time.perf_counter()
+    for i in range(5000):
+        store.set(f"k{i % 600}", os.urandom(500), time.time() + 60)
+    elapsed_us = (time.perf_counter() - start) / 5000 * 1e6
+    time.sleep(0.2)
+    stats = store.get_stats()
+    print(f"   5000 كتابة ({elapsed_us:.0f} µs/كتابة): حي {stats['live_bytes'] / 1024:.0f}KB "
+          f"/ ملف {stats['file_bytes'] / 1024:.0f}KB / حد {stats['max_bytes'] / 1024:.0f}KB")
+    print(f"   إخراج: {stats['evictions']} | ضغط: {stats['compactions']} مرة")
+
+    store.close()
+
+    # محاكاة انقطاع أثناء الكتابة: سجل مبتور في النهاية
+    with open(Path(directory) / "bounded.seg", 'ab') as f:
+        f.write(b'\x01' * 40)
+
+    reopened = SegmentStore(Path(directory) / "bounded.seg", max_bytes=200_000)
+    print(f"   ✅ بعد إعادة الفتح: {len(reopened)} عنصر (قبل: {stats['entries']})")
+
+    print(f"\n📊 {cache.get_stats()}")
+    print("="*70)
+    print("✅ الاختبار اكتمل!")
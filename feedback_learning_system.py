@@ -7,7 +7,6 @@
 ✅ تحسين مستمر
 """
 
-import sqlite3
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
@@ -18,6 +17,10 @@ from pathlib import Path
 import threading
 import time
 
+from database_pool import get_pool
+from write_behind import get_write_buffer
+from keyword_matcher import KeywordMatcher
+
 logger = logging.getLogger(__name__)
 
 
@@ -59,92 +62,84 @@ class FeedbackManager:
     
     def __init__(self, db_path: str = "agent_data.db"):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.writer = get_write_buffer(db_path)
         self._ensure_tables()
     
     def _ensure_tables(self):
         """إنشاء الجداول"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # جدول التغذية الراجعة
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                message TEXT NOT NULL,
-                predicted_intent TEXT,
-                predicted_confidence REAL,
-                feedback_type TEXT NOT NULL,
-                correct_intent TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                processed INTEGER DEFAULT 0
-            )
-        ''')
-        
-        # جدول التصحيحات
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS corrections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message TEXT NOT NULL,
-                wrong_intent TEXT NOT NULL,
-                correct_intent TEXT NOT NULL,
-                user_id INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                applied INTEGER DEFAULT 0
-            )
-        ''')
-        
-        # جدول إحصائيات الأداء
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS performance_stats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date DATE NOT NULL,
-                total_predictions INTEGER DEFAULT 0,
-                correct_predictions INTEGER DEFAULT 0,
-                accuracy REAL,
-                intent TEXT,
-                UNIQUE(date, intent)
-            )
-        ''')
-        
-        # جدول سجل التدريب
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS training_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                model_type TEXT,
-                samples_count INTEGER,
-                accuracy REAL,
-                notes TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.pool.get_cursor() as cursor:
+            # جدول التغذية الراجعة
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS feedback (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    predicted_intent TEXT,
+                    predicted_confidence REAL,
+                    feedback_type TEXT NOT NULL,
+                    correct_intent TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    processed INTEGER DEFAULT 0
+                )
+            ''')
+            
+            # جدول التصحيحات
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS corrections (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message TEXT NOT NULL,
+                    wrong_intent TEXT NOT NULL,
+                    correct_intent TEXT NOT NULL,
+                    user_id INTEGER,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    applied INTEGER DEFAULT 0
+                )
+            ''')
+            
+            # جدول إحصائيات الأداء
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS performance_stats (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date DATE NOT NULL,
+                    total_predictions INTEGER DEFAULT 0,
+                    correct_predictions INTEGER DEFAULT 0,
+                    accuracy REAL,
+                    intent TEXT,
+                    UNIQUE(date, intent)
+                )
+            ''')
+            
+            # جدول سجل التدريب
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS training_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    model_type TEXT,
+                    samples_count INTEGER,
+                    accuracy REAL,
+                    notes TEXT
+                )
+            ''')
     
     def record_feedback(self, entry: FeedbackEntry):
         """تسجيل تغذية راجعة"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO feedback 
-                (user_id, message, predicted_intent, predicted_confidence, 
-                 feedback_type, correct_intent, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                entry.user_id,
-                entry.message,
-                entry.predicted_intent,
-                entry.predicted_confidence,
-                entry.feedback_type.value,
-                entry.correct_intent,
-                entry.timestamp.isoformat()
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.pool.get_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO feedback 
+                    (user_id, message, predicted_intent, predicted_confidence, 
+                     feedback_type, correct_intent, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    entry.user_id,
+                    entry.message,
+                    entry.predicted_intent,
+                    entry.predicted_confidence,
+                    entry.feedback_type.value,
+                    entry.correct_intent,
+                    entry.timestamp.isoformat()
+                ))
             
             logger.info(f"✅ تم تسجيل feedback: {entry.feedback_type.value}")
             
@@ -164,17 +159,12 @@ class FeedbackManager:
                          correct_intent: str, user_id: int = None):
         """تسجيل تصحيح"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO corrections 
-                (message, wrong_intent, correct_intent, user_id)
-                VALUES (?, ?, ?, ?)
-            ''', (message, wrong_intent, correct_intent, user_id))
-            
-            conn.commit()
-            conn.close()
+            with self.pool.get_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO corrections 
+                    (message, wrong_intent, correct_intent, user_id)
+                    VALUES (?, ?, ?, ?)
+                ''', (message, wrong_intent, correct_intent, user_id))
             
             logger.info(f"📝 تم تسجيل تصحيح: {wrong_intent} → {correct_intent}")
             
@@ -184,28 +174,24 @@ class FeedbackManager:
     def get_pending_corrections(self, limit: int = 100) -> List[Dict]:
         """الحصول على التصحيحات غير المطبقة"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, message, wrong_intent, correct_intent, user_id
-                FROM corrections
-                WHERE applied = 0
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ''', (limit,))
-            
-            corrections = []
-            for row in cursor.fetchall():
-                corrections.append({
-                    'id': row[0],
-                    'message': row[1],
-                    'wrong_intent': row[2],
-                    'correct_intent': row[3],
-                    'user_id': row[4]
-                })
-            
-            conn.close()
+            with self.pool.get_cursor() as cursor:
+                cursor.execute('''
+                    SELECT id, message, wrong_intent, correct_intent, user_id
+                    FROM corrections
+                    WHERE applied = 0
+                    ORDER BY timestamp DESC
+                    LIMIT ?
+                ''', (limit,))
+                
+                corrections = []
+                for row in cursor.fetchall():
+                    corrections.append({
+                        'id': row[0],
+                        'message': row[1],
+                        'wrong_intent': row[2],
+                        'correct_intent': row[3],
+                        'user_id': row[4]
+                    })
             return corrections
             
         except Exception as e:
@@ -215,16 +201,11 @@ class FeedbackManager:
     def mark_corrections_applied(self, correction_ids: List[int]):
         """تعليم التصحيحات كمطبقة"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.executemany(
-                'UPDATE corrections SET applied = 1 WHERE id = ?',
-                [(cid,) for cid in correction_ids]
-            )
-            
-            conn.commit()
-            conn.close()
+            with self.pool.get_cursor() as cursor:
+                cursor.executemany(
+                    'UPDATE corrections SET applied = 1 WHERE id = ?',
+                    [(cid,) for cid in correction_ids]
+                )
             
         except Exception as e:
             logger.error(f"❌ خطأ: {e}")
@@ -234,11 +215,8 @@ class FeedbackManager:
         try:
             today = datetime.now().date().isoformat()
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # محاولة التحديث
-            cursor.execute('''
+            # upsert تراكمي - آمن للتجميع في دفعة واحدة (كتابة مؤجلة)
+            self.writer.submit('''
                 INSERT INTO performance_stats (date, intent, total_predictions, correct_predictions)
                 VALUES (?, ?, 1, ?)
                 ON CONFLICT(date, intent) DO UPDATE SET
@@ -247,53 +225,48 @@ class FeedbackManager:
                     accuracy = CAST(correct_predictions + ? AS REAL) / (total_predictions + 1)
             ''', (today, intent, 1 if correct else 0, 1 if correct else 0, 1 if correct else 0))
             
-            conn.commit()
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ خطأ في تحديث الإحصائيات: {e}")
     
     def get_performance_report(self, days: int = 7) -> Dict:
         """الحصول على تقرير الأداء"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            self.writer.flush()
             
-            start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
-            
-            # إجمالي الأداء
-            cursor.execute('''
-                SELECT 
-                    SUM(total_predictions) as total,
-                    SUM(correct_predictions) as correct
-                FROM performance_stats
-                WHERE date >= ?
-            ''', (start_date,))
-            
-            row = cursor.fetchone()
-            total = row[0] or 0
-            correct = row[1] or 0
-            
-            # أداء كل نية
-            cursor.execute('''
-                SELECT 
-                    intent,
-                    SUM(total_predictions) as total,
-                    SUM(correct_predictions) as correct
-                FROM performance_stats
-                WHERE date >= ?
-                GROUP BY intent
-            ''', (start_date,))
-            
-            intent_stats = {}
-            for row in cursor.fetchall():
-                intent_stats[row[0]] = {
-                    'total': row[1],
-                    'correct': row[2],
-                    'accuracy': (row[2] / row[1] * 100) if row[1] > 0 else 0
-                }
-            
-            conn.close()
+            with self.pool.get_cursor() as cursor:
+                start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
+                
+                # إجمالي الأداء
+                cursor.execute('''
+                    SELECT 
+                        SUM(total_predictions) as total,
+                        SUM(correct_predictions) as correct
+                    FROM performance_stats
+                    WHERE date >= ?
+                ''', (start_date,))
+                
+                row = cursor.fetchone()
+                total = row[0] or 0
+                correct = row[1] or 0
+                
+                # أداء كل نية
+                cursor.execute('''
+                    SELECT 
+                        intent,
+                        SUM(total_predictions) as total,
+                        SUM(correct_predictions) as correct
+                    FROM performance_stats
+                    WHERE date >= ?
+                    GROUP BY intent
+                ''', (start_date,))
+                
+                intent_stats = {}
+                for row in cursor.fetchall():
+                    intent_stats[row[0]] = {
+                        'total': row[1],
+                        'correct': row[2],
+                        'accuracy': (row[2] / row[1] * 100) if row[1] > 0 else 0
+                    }
             
             return {
                 'period_days': days,
@@ -310,27 +283,23 @@ class FeedbackManager:
     def get_training_candidates(self, min_feedback: int = 3) -> List[Dict]:
         """الحصول على أمثلة للتدريب من التصحيحات"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # التصحيحات المتكررة
-            cursor.execute('''
-                SELECT message, correct_intent, COUNT(*) as count
-                FROM corrections
-                GROUP BY message, correct_intent
-                HAVING count >= ?
-                ORDER BY count DESC
-            ''', (min_feedback,))
-            
-            candidates = []
-            for row in cursor.fetchall():
-                candidates.append({
-                    'message': row[0],
-                    'intent': row[1],
-                    'frequency': row[2]
-                })
-            
-            conn.close()
+            with self.pool.get_cursor() as cursor:
+                # التصحيحات المتكررة
+                cursor.execute('''
+                    SELECT message, correct_intent, COUNT(*) as count
+                    FROM corrections
+                    GROUP BY message, correct_intent
+                    HAVING count >= ?
+                    ORDER BY count DESC
+                ''', (min_feedback,))
+                
+                candidates = []
+                for row in cursor.fetchall():
+                    candidates.append({
+                        'message': row[0],
+                        'intent': row[1],
+                        'frequency': row[2]
+                    })
             return candidates
             
         except Exception as e:
@@ -342,6 +311,41 @@ class FeedbackManager:
 # 3. نظام التعلم التلقائي
 # ==========================================
 
+# قواعد تحليل ردود المستخدم (تُجمّع مرة واحدة)
+RESPONSE_KEYWORDS = KeywordMatcher({
+    'positive': [
+        'نعم', 'صح', 'تمام', 'صحيح', 'أكيد', 'بالضبط', 'ممتاز',
+        'oui', 'correct', 'exactement', 'parfait',
+        'yes', 'right', 'correct', 'exactly', 'perfect', 'good'
+    ],
+    'negative': [
+        'لا', 'خطأ', 'غلط', 'مش صح',
+        'non', 'faux', 'pas correct',
+        'no', 'wrong', 'incorrect', 'not right'
+    ]
+})
+
+# تصحيح مباشر (المستخدم يذكر النية الصحيحة)
+MENTIONED_INTENT_KEYWORDS = KeywordMatcher({
+    'add_appointment': ['موعد'],
+    'list_appointments': ['عرض'],
+    'cancel_appointment': ['إلغاء'],
+    'modify_appointment': ['تعديل'],
+    'set_reminder': ['تذكير'],
+    'help': ['مساعدة']
+})
+
+# النية الصحيحة بعد رد سلبي
+CORRECT_INTENT_KEYWORDS = KeywordMatcher({
+    'add_appointment': ['موعد', 'إضافة', 'حجز', 'rdv', 'appointment', 'add'],
+    'list_appointments': ['عرض', 'قائمة', 'afficher', 'list', 'show'],
+    'cancel_appointment': ['إلغاء', 'حذف', 'annuler', 'cancel', 'delete'],
+    'modify_appointment': ['تعديل', 'تغيير', 'modifier', 'change', 'update'],
+    'greeting': ['تحية', 'سلام', 'bonjour', 'hello', 'greeting'],
+    'help': ['مساعدة', 'aide', 'help']
+})
+
+
 class AutoLearningSystem:
     """نظام التعلم التلقائي"""
     
@@ -350,10 +354,12 @@ class AutoLearningSystem:
         feedback_manager: FeedbackManager,
         classifier,  # ML classifier instance
         retrain_threshold: int = 50,
-        min_accuracy_drop: float = 5.0
+        min_accuracy_drop: float = 5.0,
+        trainer=None  # TrainingWorker - التدريب في عملية منفصلة
     ):
         self.feedback_manager = feedback_manager
         self.classifier = classifier
+        self.trainer = trainer
         self.retrain_threshold = retrain_threshold
         self.min_accuracy_drop = min_accuracy_drop
         
@@ -385,7 +391,9 @@ class AutoLearningSystem:
         """حلقة المراقبة"""
         while self._running:
             try:
-                self._check_retrain_needed()
+                # التدريب خارج العملية فقط - لا يُوقف البوت
+                if self._check_retrain_needed() and self.trainer is not None:
+                    self.retrain_model()
             except Exception as e:
                 logger.error(f"❌ خطأ في المراقبة: {e}")
             
@@ -442,69 +450,68 @@ class AutoLearningSystem:
     def _analyze_response(self, response: str, predicted_intent: str) -> Tuple[FeedbackType, Optional[str]]:
         """تحليل رد المستخدم"""
         response_lower = response.lower()
+        hits = RESPONSE_KEYWORDS.match(response_lower)
         
         # ردود إيجابية
-        positive_patterns = [
-            'نعم', 'صح', 'تمام', 'صحيح', 'أكيد', 'بالضبط', 'ممتاز',
-            'oui', 'correct', 'exactement', 'parfait',
-            'yes', 'right', 'correct', 'exactly', 'perfect', 'good'
-        ]
-        
-        if any(p in response_lower for p in positive_patterns):
+        if 'positive' in hits:
             return FeedbackType.POSITIVE, None
         
         # ردود سلبية
-        negative_patterns = [
-            'لا', 'خطأ', 'غلط', 'مش صح',
-            'non', 'faux', 'pas correct',
-            'no', 'wrong', 'incorrect', 'not right'
-        ]
-        
-        if any(p in response_lower for p in negative_patterns):
+        if 'negative' in hits:
             # محاولة استخراج النية الصحيحة
             correct_intent = self._extract_correct_intent(response)
             return FeedbackType.CORRECTION, correct_intent
         
         # تصحيح مباشر (المستخدم يذكر النية الصحيحة)
-        intent_mapping = {
-            'موعد': 'add_appointment',
-            'عرض': 'list_appointments',
-            'إلغاء': 'cancel_appointment',
-            'تعديل': 'modify_appointment',
-            'تذكير': 'set_reminder',
-            'مساعدة': 'help'
-        }
+        mentioned = MENTIONED_INTENT_KEYWORDS.match(response_lower)
         
-        for keyword, intent in intent_mapping.items():
-            if keyword in response_lower and intent != predicted_intent:
+        for intent in MENTIONED_INTENT_KEYWORDS.labels:
+            if intent in mentioned and intent != predicted_intent:
                 return FeedbackType.CORRECTION, intent
         
         return FeedbackType.SKIP, None
     
     def _extract_correct_intent(self, response: str) -> Optional[str]:
         """استخراج النية الصحيحة من الرد"""
-        response_lower = response.lower()
-        
-        intent_keywords = {
-            'add_appointment': ['موعد', 'إضافة', 'حجز', 'rdv', 'appointment', 'add'],
-            'list_appointments': ['عرض', 'قائمة', 'afficher', 'list', 'show'],
-            'cancel_appointment': ['إلغاء', 'حذف', 'annuler', 'cancel', 'delete'],
-            'modify_appointment': ['تعديل', 'تغيير', 'modifier', 'change', 'update'],
-            'greeting': ['تحية', 'سلام', 'bonjour', 'hello', 'greeting'],
-            'help': ['مساعدة', 'aide', 'help']
-        }
+        hits = CORRECT_INTENT_KEYWORDS.match(response.lower())
         
-        for intent, keywords in intent_keywords.items():
-            if any(kw in response_lower for kw in keywords):
+        for intent in CORRECT_INTENT_KEYWORDS.labels:
+            if intent in hits:
                 return intent
         
         return None
     
-    def retrain_model(self) -> Dict:
-        """إعادة تدريب النموذج"""
+    def retrain_model(self, mode: str = 'incremental', epochs: int = 5) -> Dict:
+        """
+        إعادة تدريب النموذج
+        
+        Args:
+            mode: 'incremental' (ضبط دقيق من النموذج المنشور على التصحيحات
+                  الجديدة - ثوانٍ) أو 'full' (تدريب كامل من الصفر)
+            epochs: دورات التدريب الكامل
+        
+        التدريب التزايدي يرجع إلى الكامل إذا لم يوجد نموذج منشور بعد،
+        أو إذا لم يدعم المصنف fine_tune (BERT).
+        """
         if self.is_training:
             return {'success': False, 'reason': 'training_in_progress'}
         
+        # عامل التدريب: عملية منفصلة تنشر إصداراً جديداً، والبوت يبدّل إليه
+        if self.trainer is not None:
+            if mode == 'incremental' and not self.feedback_manager.get_pending_corrections(limit=1):
+                return {'success': False, 'reason': 'no_corrections'}
+            
+            if not self.trainer.start(mode=mode, epochs=epochs):
+                return {'success': False, 'reason': 'training_in_progress'}
+            
+            self.corrections_since_retrain = 0
+            self.last_retrain = datetime.now()
+            return {'success': True, 'started': True, 'mode': mode}
+        
+        # المصنف يُحمّل في الخلفية عند الإقلاع
+        if self.classifier is None:
+            return {'success': False, 'reason': 'classifier_not_ready'}
+        
         self.is_training = True
         logger.info("🔄 بدء إعادة التدريب...")
         
@@ -515,14 +522,27 @@ class AutoLearningSystem:
             if not corrections:
                 return {'success': False, 'reason': 'no_corrections'}
             
-            # إضافة التصحيحات لبيانات التدريب
-            # (هذا سيتم تلقائياً عبر IntentDataset)
+            result = None
             
-            # إعادة التدريب
-            result = self.classifier.train(epochs=5)
+            # SmartBERTClassifier لا يدعم الضبط التزايدي - تدريب كامل
+            if mode == 'incremental' and hasattr(self.classifier, 'fine_tune'):
+                samples = [
+                    (c['message'], c['correct_intent'])
+                    for c in corrections if c['correct_intent']
+                ]
+                result = self.classifier.fine_tune(samples)
+                
+                # لا نموذج منشور بعد - تدريب كامل
+                if result.get('reason') == 'no_checkpoint':
+                    result = None
+            
+            if result is None:
+                # إعادة التدريب الكامل
+                # (التصحيحات تُضاف لبيانات التدريب عبر IntentDataset)
+                result = self.classifier.train(epochs=epochs)
             
             if result.get('success'):
-                # تعليم التصحيحات كمطبقة
+                # تعليم التصحيحات كمطبقة (المرفوضة لانخفاض الدقة تبقى معلقة)
                 correction_ids = [c['id'] for c in corrections]
                 self.feedback_manager.mark_corrections_applied(correction_ids)
                 
@@ -544,21 +564,16 @@ class AutoLearningSystem:
     def _log_training(self, result: Dict):
         """تسجيل التدريب"""
         try:
-            conn = sqlite3.connect(self.feedback_manager.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO training_log (model_type, samples_count, accuracy, notes)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                'auto_retrain',
-                result.get('samples_count', 0),
-                result.get('best_accuracy', 0),
-                json.dumps(result.get('history', {}))
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.feedback_manager.pool.get_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO training_log (model_type, samples_count, accuracy, notes)
+                    VALUES (?, ?, ?, ?)
+                ''', (
+                    'auto_finetune' if 'promoted' in result else 'auto_retrain',
+                    result.get('samples_count', 0),
+                    result.get('best_accuracy', 0),
+                    json.dumps(result.get('history', {}))
+                ))
             
         except Exception as e:
             logger.error(f"❌ خطأ في تسجيل التدريب: {e}")
@@ -0,0 +1,340 @@
+# inference_backends.py
+"""
+واجهات الاستدلال على CPU لنماذج النوايا
+✅ eager - PyTorch float32 (الافتراضي)
+✅ int8 - Dynamic Quantization لطبقات Linear/LSTM
+✅ torchscript - رسم مُجمّع لا يحتاج كود Python للنموذج
+✅ onnx - ONNX Runtime (اختياري - عند تثبيت onnxruntime)
+
+التصدير يتم عند حفظ النموذج (_save_model)، والاختيار عبر
+EngineConfig.inference_backend.
+"""
+
+import copy
+import gc
+import io
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# ONNX Runtime اختياري
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+INFERENCE_BACKENDS = ('eager', 'int8', 'torchscript', 'onnx')
+
+
+def export_paths(model_path: str) -> Dict[str, str]:
+    """مسارات النماذج المصدّرة بجانب النموذج الأصلي"""
+    base = os.path.splitext(model_path)[0]
+    return {
+        'int8': f"{base}.int8.pt",
+        'torchscript': f"{base}.ts.pt",
+        'onnx': f"{base}.onnx"
+    }
+
+
+# ==========================================
+# التصدير
+# ==========================================
+
+def quantize_dynamic(model: nn.Module) -> nn.Module:
+    """نسخة int8 من النموذج (الأوزان int8، التفعيلات تُكمّم أثناء التشغيل)"""
+    quantized = copy.deepcopy(model).cpu().eval()
+    return torch.quantization.quantize_dynamic(
+        quantized, {nn.Linear, nn.LSTM}, dtype=torch.qint8
+    )
+
+
+def to_torchscript(model: nn.Module, example_inputs: Tuple[torch.Tensor, ...]) -> torch.jit.ScriptModule:
+    """تحويل إلى TorchScript: script أولاً، ثم trace إن لم يكن النموذج قابلاً للـ script"""
+    try:
+        return torch.jit.script(model)
+    except Exception:
+        return torch.jit.trace(model, example_inputs, strict=False)
+
+
+def _write_atomic(path: str, write):
+    """كتابة ملف مُصدَّر ذرياً: write(tmp) ثم os.replace (القارئ لا يرى ملفاً ناقصاً)"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def export_model(
+    model: nn.Module,
+    model_path: str,
+    example_inputs: Tuple[torch.Tensor, ...],
+    input_names: Sequence[str],
+    output_names: Sequence[str],
+    dynamic_axes: Dict[str, Dict[int, str]]
+) -> Dict[str, str]:
+    """
+    تصدير النموذج لكل واجهات CPU
+
+    فشل واجهة واحدة لا يوقف البقية ولا يوقف التدريب. كل ملف يُكتب ذرياً.
+
+    Returns:
+        Dict: {الواجهة: المسار} للواجهات التي نجح تصديرها
+    """
+    paths = export_paths(model_path)
+    example_inputs = tuple(tensor.cpu() for tensor in example_inputs)
+    exported = {}
+
+    cpu_model = copy.deepcopy(model).cpu().eval()
+
+    builders = {
+        'torchscript': lambda: to_torchscript(cpu_model, example_inputs),
+        'int8': lambda: to_torchscript(quantize_dynamic(cpu_model), example_inputs),
+    }
+
+    with torch.no_grad():
+        for backend, build in builders.items():
+            try:
+                module = build()
+                _write_atomic(paths[backend], lambda path: torch.jit.save(module, path))
+                exported[backend] = paths[backend]
+            except Exception as e:
+                logger.warning(f"⚠️ فشل تصدير {backend}: {e}")
+
+        try:
+            _write_atomic(paths['onnx'], lambda path: torch.onnx.export(
+                cpu_model,
+                example_inputs,
+                path,
+                input_names=list(input_names),
+                output_names=list(output_names),
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            ))
+            exported['onnx'] = paths['onnx']
+        except Exception as e:
+            logger.warning(f"⚠️ فشل تصدير onnx: {e}")
+
+    logger.info(f"✅ تم تصدير النموذج: {', '.join(exported) or 'لا شيء'}")
+    return exported
+
+
+# ==========================================
+# التحميل
+# ==========================================
+
+class OnnxInferenceModule:
+    """غلاف ONNX Runtime بواجهة nn.Module (eval + استدعاء بـ tensors)"""
+
+    def __init__(self, path: str):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def eval(self):
+        return self
+
+    def __call__(self, *inputs: torch.Tensor):
+        feeds = {
+            name: tensor.cpu().numpy()
+            for name, tensor in zip(self.input_names, inputs)
+            if tensor is not None
+        }
+        outputs = [torch.from_numpy(output) for output in self.session.run(None, feeds)]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+
+def load_inference_model(backend: str, model_path: str):
+    """
+    تحميل نموذج مُصدَّر للاستدلال على CPU
+
+    Raises:
+        ValueError: واجهة غير معروفة
+        FileNotFoundError: لم يُصدَّر النموذج بعد
+        ImportError: onnxruntime غير مثبت
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"واجهة غير معروفة: {backend}")
+
+    if backend == 'eager':
+        return None
+
+    path = export_paths(model_path)[backend]
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    if backend == 'onnx':
+        if not ONNX_AVAILABLE:
+            raise ImportError("onnxruntime غير مثبت")
+        return OnnxInferenceModule(path)
+
+    module = torch.jit.load(path, map_location='cpu')
+    module.eval()
+    return module
+
+
+# ==========================================
+# اختبار الأداء
+# ==========================================
+
+def _rss_mb() -> Optional[float]:
+    """RSS الحالي للعملية (ميغابايت) من /proc - None خارج Linux"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _PeakRss:
+    """
+    ذروة RSS أثناء كتلة مقابل ما قبلها (thread يأخذ عينة كل interval)
+
+    تشمل ذاكرة torch و ONNX Runtime الأصلية (tracemalloc يرى Python فقط).
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline: Optional[float] = None
+        self.peak: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_mb() or 0.0)
+
+    def __enter__(self):
+        gc.collect()
+        self.baseline = self.peak = _rss_mb()
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.peak = max(self.peak, _rss_mb() or 0.0)
+
+    @property
+    def delta_mb(self) -> Optional[float]:
+        return None if self.baseline is None else self.peak - self.baseline
+
+
+def _model_size_mb(classifier, backend: str) -> float:
+    """حجم النموذج المسلسل على القرص (ميغابايت)"""
+    if backend == 'eager':
+        buffer = io.BytesIO()
+        torch.save(classifier.model.state_dict(), buffer)
+        return buffer.tell() / 1e6
+
+    return os.path.getsize(export_paths(classifier.model_path)[backend]) / 1e6
+
+
+def benchmark_backends(
+    classifier,
+    samples: List[Tuple[str, str]],
+    batch_size: int = 32,
+    backends: Sequence[str] = INFERENCE_BACKENDS
+) -> Dict[str, Dict]:
+    """
+    مقارنة الواجهات: زمن الاستجابة، ذاكرة التشغيل، الحجم على القرص، الدقة
+
+    memory_mb: زيادة ذروة RSS عند تحميل الواجهة وتشغيل الاستدلال، مقابل
+    العملية بنموذج eager فقط (لـ eager: التفعيلات فقط - الأوزان محمّلة مسبقاً).
+
+    Args:
+        classifier: SmartIntentClassifier أو SmartBERTClassifier (بعد التدريب)
+        samples: [(نص، النية الصحيحة)]
+        batch_size: حجم الدفعة لقياس الإنتاجية
+    """
+    texts = [text for text, _ in samples]
+    labels = [intent for _, intent in samples]
+    original_backend = classifier.backend
+    results = {}
+
+    for backend in backends:
+        # تحرير الواجهة السابقة قبل القياس
+        classifier.set_backend('eager')
+
+        with _PeakRss() as memory:
+            if not classifier.set_backend(backend):
+                continue
+
+            classifier.predict_batch(texts[:batch_size])   # إحماء
+
+            start = time.perf_counter()
+            for text in texts[:200]:
+                classifier.predict(text)
+            single_ms = (time.perf_counter() - start) / min(len(texts), 200) * 1000
+
+            start = time.perf_counter()
+            predictions = []
+            for i in range(0, len(texts), batch_size):
+                predictions.extend(classifier.predict_batch(texts[i:i + batch_size]))
+            batch_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+        accuracy = float(np.mean([p['intent'] == label for p, label in zip(predictions, labels)]))
+
+        results[backend] = {
+            'latency_ms': single_ms,
+            'batch_latency_ms': batch_ms,
+            'memory_mb': memory.delta_mb,
+            'size_mb': _model_size_mb(classifier, backend),
+            'accuracy': accuracy * 100
+        }
+
+    classifier.set_backend(original_backend)
+    return results
+
+
+def print_benchmark(results: Dict[str, Dict]):
+    """طباعة نتائج المقارنة"""
+    print(f"\n{'─'*80}")
+    print(f"{'الواجهة':<14}{'ms/رسالة':>12}{'ms/رسالة (دفعة)':>18}"
+          f"{'ذاكرة MB':>12}{'قرص MB':>10}{'الدقة %':>10}")
+    print(f"{'─'*80}")
+    for backend, row in results.items():
+        memory = f"{row['memory_mb']:.1f}" if row['memory_mb'] is not None else "-"
+        print(f"{backend:<14}{row['latency_ms']:>12.2f}{row['batch_latency_ms']:>18.3f}"
+              f"{memory:>12}{row['size_mb']:>10.2f}{row['accuracy']:>10.1f}")
+    print(f"{'─'*80}")
+
+
+if __name__ == "__main__":
+    from ml_intent_classifier import SmartIntentClassifier, IntentDataset
+
+    print("="*70)
+    print("🧪 مقارنة واجهات الاستدلال على CPU")
+    print("="*70)
+
+    for model_type in ("lstm", "cnn"):
+        print(f"\n📦 النموذج: {model_type}")
+        classifier = SmartIntentClassifier(
+            model_path=f"models/bench_{model_type}.pth",
+            processor_path=f"models/bench_{model_type}_processor.pkl",
+            db_path=":memory:",
+            model_type=model_type
+        )
+        classifier.train(epochs=10, batch_size=16)
+
+        samples = IntentDataset.synthetic_samples()
+        print_benchmark(benchmark_backends(classifier, samples))
+
+    print("\n✅ الاختبار اكتمل!")
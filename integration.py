@@ -16,11 +16,11 @@
 
 import asyncio
 import re
-from datetime import datetime, timedelta
 from typing import Dict, Optional, Tuple, Any
 import logging
 
 from smart_ai_engine import SmartAIEngine, EngineConfig
+from datetime_engine import datetime_engine, DateTimeParse
 
 logger = logging.getLogger(__name__)
 
@@ -70,14 +70,16 @@ class SmartMessageHandler:
         Returns:
             Dict: نتيجة المعالجة مع الرد المقترح
         """
-        # 1. استخراج التاريخ والوقت
-        extracted_datetime = self.datetime_extractor.extract(message)
+        # 1. استخراج التاريخ والوقت - مسح واحد يُمرَّر لبقية الخط
+        parsed_datetime = datetime_engine.parse(message)
+        extracted_datetime = self.datetime_extractor.extract(message, parsed_datetime)
         
         # 2. معالجة بالمحرك الذكي
         result = await self.engine.process_message(
             user_id,
             message,
-            extracted_datetime
+            extracted_datetime,
+            parsed_datetime
         )
         
         # 3. تحديد الإجراء المطلوب
@@ -190,145 +192,40 @@ class SmartMessageHandler:
 # ==========================================
 
 class DateTimeExtractor:
-    """مستخرج التاريخ والوقت من النصوص"""
-    
-    def __init__(self):
-        self._compile_patterns()
+    """
+    مستخرج التاريخ والوقت من النصوص
     
-    def _compile_patterns(self):
-        """تجميع الأنماط"""
-        # أنماط الوقت
-        self.time_patterns = [
-            # HH:MM
-            (r'(\d{1,2}):(\d{2})', lambda m: (int(m.group(1)), int(m.group(2)))),
-            # XXh أو XXhMM
-            (r'(\d{1,2})h(\d{2})?', lambda m: (int(m.group(1)), int(m.group(2) or 0))),
-            # الساعة X
-            (r'الساعة\s*(\d{1,2})', lambda m: (int(m.group(1)), 0)),
-            # X صباحاً/مساءً
-            (r'(\d{1,2})\s*(صباح|مساء|am|pm)', self._parse_ampm),
-        ]
-        
-        # أنماط التاريخ
-        self.date_keywords = {
-            'ar': {
-                'اليوم': 0, 'غدا': 1, 'غداً': 1, 'بعد غد': 2, 'غدوة': 1,
-                'الأحد': 'sunday', 'الإثنين': 'monday', 'الثلاثاء': 'tuesday',
-                'الأربعاء': 'wednesday', 'الخميس': 'thursday', 'الجمعة': 'friday',
-                'السبت': 'saturday'
-            },
-            'fr': {
-                "aujourd'hui": 0, 'demain': 1, 'après-demain': 2,
-                'lundi': 'monday', 'mardi': 'tuesday', 'mercredi': 'wednesday',
-                'jeudi': 'thursday', 'vendredi': 'friday', 'samedi': 'saturday',
-                'dimanche': 'sunday'
-            },
-            'en': {
-                'today': 0, 'tomorrow': 1,
-                'monday': 'monday', 'tuesday': 'tuesday', 'wednesday': 'wednesday',
-                'thursday': 'thursday', 'friday': 'friday', 'saturday': 'saturday',
-                'sunday': 'sunday'
-            }
-        }
+    واجهة رقيقة فوق المحلل الموحد (datetime_engine) - نفس النتيجة
+    التي يحصل عليها الوكيل و ContextAwareProcessor و utils.
+    """
     
-    def _parse_ampm(self, match) -> Tuple[int, int]:
-        """تحليل صيغة AM/PM"""
-        hour = int(match.group(1))
-        period = match.group(2).lower()
-        
-        if period in ['مساء', 'pm'] and hour < 12:
-            hour += 12
-        elif period in ['صباح', 'am'] and hour == 12:
-            hour = 0
-        
-        return (hour, 0)
+    # كلمات الموعد التي لا تفيد في العنوان
+    TITLE_NOISE = re.compile(r'موعد|اجتماع|rdv|rendez-vous|appointment|meeting', re.IGNORECASE)
     
-    def extract(self, text: str) -> Dict:
+    def extract(self, text: str, parsed: Optional[DateTimeParse] = None) -> Dict:
         """
         استخراج التاريخ والوقت من النص
         
+        Args:
+            text: نص الرسالة
+            parsed: نتيجة تحليل مسبقة لنفس الرسالة (لتفادي إعادة المسح)
+        
         Returns:
-            Dict: {'date': datetime, 'time': (hour, minute), 'title': str}
+            Dict: {'date', 'time', 'title', 'offset_minutes', 'date_source', 'confidence'}
         """
-        result = {
-            'date': None,
-            'time': None,
-            'title': None
-        }
+        parsed = parsed or datetime_engine.parse(text)
         
-        text_lower = text.lower()
-        now = datetime.now()
-        
-        # استخراج الوقت
-        for pattern, parser in self.time_patterns:
-            match = re.search(pattern, text_lower)
-            if match:
-                result['time'] = parser(match)
-                break
-        
-        # استخراج التاريخ
-        for lang, keywords in self.date_keywords.items():
-            for keyword, value in keywords.items():
-                if keyword in text_lower:
-                    if isinstance(value, int):
-                        result['date'] = now + timedelta(days=value)
-                    else:
-                        # يوم من أيام الأسبوع
-                        result['date'] = self._next_weekday(now, value)
-                    break
-        
-        # محاولة استخراج تاريخ رقمي
-        if result['date'] is None:
-            date_match = re.search(r'(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?', text)
-            if date_match:
-                day = int(date_match.group(1))
-                month = int(date_match.group(2))
-                year = int(date_match.group(3)) if date_match.group(3) else now.year
-                if year < 100:
-                    year += 2000
-                try:
-                    result['date'] = datetime(year, month, day)
-                except ValueError:
-                    pass
-        
-        # استخراج العنوان (ما تبقى من النص)
-        title = self._extract_title(text)
-        if title:
-            result['title'] = title
+        result = parsed.to_dict()
+        result['title'] = self._extract_title(parsed.title)
         
         return result
     
-    def _next_weekday(self, start: datetime, weekday_name: str) -> datetime:
-        """الحصول على تاريخ اليوم القادم من الأسبوع"""
-        weekdays = {
-            'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-            'friday': 4, 'saturday': 5, 'sunday': 6
-        }
-        
-        target = weekdays.get(weekday_name.lower(), 0)
-        current = start.weekday()
-        
-        days_ahead = target - current
-        if days_ahead <= 0:
-            days_ahead += 7
-        
-        return start + timedelta(days=days_ahead)
-    
-    def _extract_title(self, text: str) -> Optional[str]:
-        """استخراج العنوان من النص"""
-        # إزالة الكلمات المفتاحية
-        remove_patterns = [
-            r'موعد', r'اجتماع', r'rdv', r'rendez-vous', r'appointment', r'meeting',
-            r'الساعة\s*\d+', r'\d{1,2}:\d{2}', r'\d{1,2}h\d{0,2}',
-            r'غدا|غداً|اليوم|بكرة', r'demain|aujourd', r'today|tomorrow',
-            r'صباحا|مساء|صباحاً|مساءً'
-        ]
-        
-        title = text
-        for pattern in remove_patterns:
-            title = re.sub(pattern, '', title, flags=re.IGNORECASE)
+    def _extract_title(self, title: Optional[str]) -> Optional[str]:
+        """تنظيف العنوان من كلمات الموعد"""
+        if not title:
+            return None
         
-        # تنظيف
+        title = self.TITLE_NOISE.sub('', title)
         title = re.sub(r'\s+', ' ', title).strip()
         
         # إذا تبقى نص ذو معنى
@@ -10,7 +10,6 @@
 """
 
 import re
-import sqlite3
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Tuple
 import logging
@@ -19,6 +18,7 @@ import logging
 # المرحلة 2: تحسينات الأداء ✅
 # ==========================================
 from database_pool import get_pool, DatabaseConnectionPool
+from write_behind import get_write_buffer
 from cache_manager import appointment_cache, cached
 from advanced_features import (
     CustomReminderManager,
@@ -27,6 +27,9 @@ from advanced_features import (
     AppointmentExportImport
 )
 from analytics_dashboard import AnalyticsDashboard
+from reminder_system import get_reminder_planner, notify_reminders_scheduled
+from datetime_engine import datetime_engine
+from keyword_matcher import KeywordMatcher
 
 # إعداد السجلات
 logging.basicConfig(level=logging.INFO)
@@ -38,115 +41,75 @@ class Database:
     
     def __init__(self, db_path="agent_data.db"):
         self.db_path = db_path
+        # اتصالات دائمة مشتركة بدلاً من connect/close لكل رسالة
+        self.pool = get_pool(db_path)
+        self.writer = get_write_buffer(db_path)
         self.init_database()
     
     def init_database(self):
         """إنشاء الجداول"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # جدول المواعيد
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS appointments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                description TEXT,
-                date_time TEXT NOT NULL,
-                priority INTEGER DEFAULT 2,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # جدول التذكيرات
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reminders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                appointment_id INTEGER NOT NULL,
-                reminder_time TEXT NOT NULL,
-                sent INTEGER DEFAULT 0,
-                custom_message TEXT,
-                FOREIGN KEY (appointment_id) REFERENCES appointments (id)
-            )
-        ''')
-        
-        # جدول التفاعلات
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS interactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                user_message TEXT NOT NULL,
-                bot_response TEXT NOT NULL,
-                intent TEXT,
-                language TEXT,
-                timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                feedback INTEGER DEFAULT 0
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.pool.get_cursor() as cursor:
+            # جدول المواعيد
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS appointments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    description TEXT,
+                    date_time TEXT NOT NULL,
+                    priority INTEGER DEFAULT 2,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # جدول التذكيرات
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    appointment_id INTEGER NOT NULL,
+                    reminder_time TEXT NOT NULL,
+                    sent INTEGER DEFAULT 0,
+                    custom_message TEXT,
+                    claimed_by TEXT,
+                    lease_until TEXT,
+                    FOREIGN KEY (appointment_id) REFERENCES appointments (id)
+                )
+            ''')
+            
+            # جدول التفاعلات
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS interactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    user_message TEXT NOT NULL,
+                    bot_response TEXT NOT NULL,
+                    intent TEXT,
+                    language TEXT,
+                    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+                    feedback INTEGER DEFAULT 0
+                )
+            ''')
     
     def add_appointment(self, user_id: int, title: str, description: str, 
                        date_time: datetime, priority: int = 2) -> int:
         """إضافة موعد جديد مع التذكيرات التلقائية"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # إضافة الموعد
-        cursor.execute('''
-            INSERT INTO appointments (user_id, title, description, date_time, priority)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, title, description, date_time.strftime('%Y-%m-%d %H:%M:%S'), priority))
-        
-        appointment_id = cursor.lastrowid
-        
-        # إنشاء التذكيرات تلقائياً
-        now = datetime.now()
-        time_until = date_time - now
-        
-        reminders_created = 0
-        
-        # تذكير قبل 24 ساعة
-        if time_until > timedelta(hours=24):
-            reminder_time = date_time - timedelta(hours=24)
-            if reminder_time > now:
-                cursor.execute('''
-                    INSERT INTO reminders (appointment_id, reminder_time, custom_message)
-                    VALUES (?, ?, ?)
-                ''', (appointment_id, reminder_time.strftime('%Y-%m-%d %H:%M:%S'), 'type:advance'))
-                reminders_created += 1
-        
-        # تذكير قبل 1 ساعة
-        if time_until > timedelta(hours=1):
-            reminder_time = date_time - timedelta(hours=1)
-            if reminder_time > now:
-                cursor.execute('''
-                    INSERT INTO reminders (appointment_id, reminder_time, custom_message)
-                    VALUES (?, ?, ?)
-                ''', (appointment_id, reminder_time.strftime('%Y-%m-%d %H:%M:%S'), 'type:advance'))
-                reminders_created += 1
-        
-        # تذكير قبل 15 دقيقة
-        if time_until > timedelta(minutes=15):
-            reminder_time = date_time - timedelta(minutes=15)
-            if reminder_time > now:
-                cursor.execute('''
-                    INSERT INTO reminders (appointment_id, reminder_time, custom_message)
-                    VALUES (?, ?, ?)
-                ''', (appointment_id, reminder_time.strftime('%Y-%m-%d %H:%M:%S'), 'type:advance'))
-                reminders_created += 1
-        
-        # تذكير عند الموعد
-        if time_until > timedelta(minutes=0):
+        with self.pool.get_cursor() as cursor:
+            # إضافة الموعد
             cursor.execute('''
-                INSERT INTO reminders (appointment_id, reminder_time, custom_message)
-                VALUES (?, ?, ?)
-            ''', (appointment_id, date_time.strftime('%Y-%m-%d %H:%M:%S'), 'type:now'))
-            reminders_created += 1
+                INSERT INTO appointments (user_id, title, description, date_time, priority)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, title, description, date_time.strftime('%Y-%m-%d %H:%M:%S'), priority))
+            
+            appointment_id = cursor.lastrowid
+            
+            # التذكيرات التلقائية (Config.DEFAULT_REMINDER_HOURS) بـ executemany واحد
+            scheduled = get_reminder_planner().insert(cursor, [(appointment_id, date_time)])
+            reminders_created = len(scheduled)
+        
+        appointment_cache.invalidate_user(user_id)
         
-        conn.commit()
-        conn.close()
+        # إيقاظ مجدول التذكيرات (بدون انتظار الفحص الدوري)
+        notify_reminders_scheduled(scheduled)
         
         logger.info(f"✅ تم إنشاء موعد #{appointment_id} مع {reminders_created} تذكير")
         
@@ -154,51 +117,61 @@ class Database:
     
     def get_appointments(self, user_id: int, start_date: str = None, 
                         end_date: str = None) -> List[Dict]:
-        """الحصول على المواعيد"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """الحصول على المواعيد (من الخط الزمني المخزن للمستخدم)"""
+        timeline = appointment_cache.get_timeline(self.db_path, user_id)
         
         if start_date and end_date:
-            cursor.execute('''
-                SELECT id, title, description, date_time, priority
-                FROM appointments
-                WHERE user_id = ? AND date_time BETWEEN ? AND ?
-                ORDER BY date_time ASC
-            ''', (user_id, start_date, end_date))
-        else:
-            cursor.execute('''
-                SELECT id, title, description, date_time, priority
-                FROM appointments
-                WHERE user_id = ?
-                ORDER BY date_time ASC
-            ''', (user_id,))
-        
-        appointments = []
-        for row in cursor.fetchall():
-            appointments.append({
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'date_time': row[3],
-                'priority': row[4]
-            })
-        
-        conn.close()
-        return appointments
+            return timeline.between(start_date, end_date)
+        return timeline.between()
     
     def log_interaction(self, user_id: int, user_message: str, 
                        bot_response: str, intent: str, language: str):
-        """تسجيل التفاعل"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        """تسجيل التفاعل (كتابة مؤجلة - لا تنتظر commit)"""
+        self.writer.submit('''
             INSERT INTO interactions (user_id, user_message, bot_response, intent, language)
             VALUES (?, ?, ?, ?, ?)
         ''', (user_id, user_message, bot_response, intent, language))
-        
-        conn.commit()
-        conn.close()
+
+
+# ==========================================
+# قواعد تصنيف النوايا (تُجمّع مرة واحدة)
+# ==========================================
+
+INTENT_KEYWORDS = KeywordMatcher({
+    # إضافة موعد
+    'add_appointment': [
+        'موعد', 'اجتماع', 'لقاء', 'مقابلة', 'أضف', 'سجل',
+        'rdv', 'rendez-vous', 'réunion', 'rencontre', 'ajouter',
+        'appointment', 'meeting', 'schedule', 'book', 'add'
+    ],
+    # طلب عرض (يمنع تصنيف "إضافة موعد")
+    'view_request': [
+        'مواعيدي', 'مواعيدك', 'عرض', 'أظهر',
+        'mes rendez-vous', 'mes rdv', 'my appointments'
+    ],
+    # عرض مواعيد يوم محدد
+    'check_specific_day': [
+        'مواعيدي اليوم', 'مواعيدي غدا', 'مواعيدي غداً',
+        'ما هي مواعيدي', 'مواعيدي يوم',
+        'mes rendez-vous aujourd', 'mes rdv demain', 'mes rendez-vous le',
+        'quels sont mes rendez-vous', 'mes rdv le',
+        'my appointments today', 'appointments tomorrow',
+        'what are my appointments', 'my appointments on'
+    ],
+    # عرض جميع المواعيد
+    'list_appointments': [
+        'عرض المواعيد', 'أظهر المواعيد', 'جميع المواعيد',
+        'عرض مواعيدي', 'اعرض مواعيدي', 'شوف مواعيدي',
+        'مواعيدي', 'كل مواعيدي', 'شنوا مواعيدي',
+        'afficher', 'montrer', 'tous les rendez-vous',
+        'mes rendez-vous', 'mes rdv', 'voir mes rdv',
+        'show all', 'display all', 'list all',
+        'show my appointments', 'my appointments', 'all appointments'
+    ],
+    'greeting': ['مرحبا', 'السلام', 'صباح', 'مساء', 'bonjour', 'salut', 'hello', 'hi', 'hey'],
+    'thanks': ['شكرا', 'شكراً', 'مشكور', 'merci', 'thanks', 'thank you'],
+    'help': ['مساعدة', 'ساعدني', 'كيف', 'aide', 'help']
+})
 
 
 class IntelligentAgent:
@@ -225,446 +198,40 @@ class IntelligentAgent:
             return 'en'
     
     def classify_intent(self, message: str) -> str:
-        """تصنيف النية - محسّن"""
-        message_lower = message.lower()
-        
-        # إضافة موعد
-        add_keywords = {
-            'ar': ['موعد', 'اجتماع', 'لقاء', 'مقابلة', 'أضف', 'سجل'],
-            'fr': ['rdv', 'rendez-vous', 'réunion', 'rencontre', 'ajouter'],
-            'en': ['appointment', 'meeting', 'schedule', 'book', 'add']
-        }
-        
-        for lang, keywords in add_keywords.items():
-            if any(kw in message_lower for kw in keywords):
-                # تحقق: ليس طلب عرض المواعيد
-                view_keywords = ['مواعيدي', 'مواعيدك', 'عرض', 'أظهر', 'mes rendez-vous', 'mes rdv', 'my appointments']
-                if not any(vkw in message_lower for vkw in view_keywords):
-                    return 'add_appointment'
-        
-        # عرض مواعيد يوم محدد
-        specific_day_patterns = [
-            # عربي
-            'مواعيدي اليوم', 'مواعيدي غدا', 'مواعيدي غداً',
-            'ما هي مواعيدي', 'مواعيدي يوم',
-            # فرنسي
-            'mes rendez-vous aujourd', 'mes rdv demain', 'mes rendez-vous le',
-            'quels sont mes rendez-vous', 'mes rdv le',
-            # إنجليزي
-            'my appointments today', 'appointments tomorrow',
-            'what are my appointments', 'my appointments on'
-        ]
-        
-        if any(pattern in message_lower for pattern in specific_day_patterns):
-            return 'check_specific_day'
-        
-        # عرض جميع المواعيد - محسّن ✅
-        list_keywords = {
-            'ar': [
-                'عرض المواعيد', 'أظهر المواعيد', 'جميع المواعيد',
-                'عرض مواعيدي', 'اعرض مواعيدي', 'شوف مواعيدي',
-                'مواعيدي', 'كل مواعيدي', 'شنوا مواعيدي'
-            ],
-            'fr': [
-                'afficher', 'montrer', 'tous les rendez-vous',
-                'mes rendez-vous', 'mes rdv', 'voir mes rdv'
-            ],
-            'en': [
-                'show all', 'display all', 'list all',
-                'show my appointments', 'my appointments', 'all appointments'
-            ]
-        }
-        
-        for lang, keywords in list_keywords.items():
-            if any(kw in message_lower for kw in keywords):
-                return 'list_appointments'
+        """
+        تصنيف النية - محسّن
         
-        # تحية
-        greeting_keywords = ['مرحبا', 'السلام', 'صباح', 'مساء', 'bonjour', 'salut', 'hello', 'hi', 'hey']
-        if any(kw in message_lower for kw in greeting_keywords):
-            return 'greeting'
+        تمريرة واحدة على الرسالة (INTENT_KEYWORDS)، ثم القواعد بالأولوية.
+        """
+        hits = INTENT_KEYWORDS.match(message.lower())
         
-        # شكر
-        thanks_keywords = ['شكرا', 'شكراً', 'مشكور', 'merci', 'thanks', 'thank you']
-        if any(kw in message_lower for kw in thanks_keywords):
-            return 'thanks'
+        # إضافة موعد (وليس طلب عرض المواعيد)
+        if 'add_appointment' in hits and 'view_request' not in hits:
+            return 'add_appointment'
         
-        # مساعدة
-        help_keywords = ['مساعدة', 'ساعدني', 'كيف', 'aide', 'help']
-        if any(kw in message_lower for kw in help_keywords):
-            return 'help'
+        for intent in ('check_specific_day', 'list_appointments', 'greeting', 'thanks', 'help'):
+            if intent in hits:
+                return intent
         
         return 'unknown'
     
     def extract_datetime(self, text: str, language: str) -> datetime:
-        """استخراج التاريخ والوقت من النص - النسخة النهائية ✨"""
-        text_lower = text.lower()
-        now = datetime.now()
-        
-        # ==========================================
-        # أولاً: البحث عن تاريخ رقمي صريح (له الأولوية!)
-        # ==========================================
-        
-        # أسماء الشهور (مع دعم اللهجة التونسية/المغاربية)
-        month_names_ar = {
-            'يناير': 1, 'جانفي': 1,
-            'فبراير': 2, 'فيفري': 2,
-            'مارس': 3,
-            'أبريل': 4, 'أفريل': 4,
-            'مايو': 5, 'ماي': 5,
-            'يونيو': 6, 'جوان': 6,
-            'يوليو': 7, 'جويلية': 7,
-            'أغسطس': 8, 'أوت': 8,
-            'سبتمبر': 9, 'شتنبر': 9,
-            'أكتوبر': 10, 'كتوبر': 10,
-            'نوفمبر': 11, 'نونبر': 11,
-            'ديسمبر': 12, 'دجنبر': 12
-        }
-        
-        month_names_fr = {
-            'janvier': 1, 'février': 2, 'fevrier': 2, 'mars': 3, 'avril': 4,
-            'mai': 5, 'juin': 6, 'juillet': 7, 'août': 8, 'aout': 8,
-            'septembre': 9, 'octobre': 10, 'novembre': 11, 'décembre': 12, 'decembre': 12
-        }
-        
-        month_names_en = {
-            'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
-            'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6,
-            'july': 7, 'jul': 7, 'august': 8, 'aug': 8,
-            'september': 9, 'sep': 9, 'october': 10, 'oct': 10,
-            'november': 11, 'nov': 11, 'december': 12, 'dec': 12
-        }
-        
-        # دمج كل أسماء الشهور
-        all_months = {**month_names_ar, **month_names_fr, **month_names_en}
-        
-        # البحث عن نمط: "DD اسم_الشهر YYYY"
-        for month_name, month_num in all_months.items():
-            pattern = rf'(\d{{1,2}})\s+{month_name}(?:\s+(\d{{4}}))?'
-            match = re.search(pattern, text_lower)
-            if match:
-                day = int(match.group(1))
-                year = int(match.group(2)) if match.group(2) else now.year
-                
-                try:
-                    date = datetime(year, month_num, day)
-                    logger.info(f"✅ استخراج تاريخ صريح: {date.strftime('%Y-%m-%d')}")
-                    
-                    # استخراج الوقت
-                    time_tuple = self._extract_time(text)
-                    if time_tuple:
-                        date = date.replace(hour=time_tuple[0], minute=time_tuple[1])
-                    else:
-                        date = date.replace(hour=9, minute=0)
-                    
-                    return date
-                except ValueError:
-                    logger.warning(f"تاريخ غير صالح: {day}/{month_num}/{year}")
-                    pass
-        
-        # نمط DD/MM/YYYY أو DD-MM-YYYY
-        date_match = re.search(r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})', text)
-        if date_match:
-            day = int(date_match.group(1))
-            month = int(date_match.group(2))
-            year = int(date_match.group(3))
-            if year < 100:
-                year += 2000
-            
-            try:
-                date = datetime(year, month, day)
-                logger.info(f"✅ استخراج تاريخ رقمي: {date.strftime('%Y-%m-%d')}")
-                
-                # استخراج الوقت
-                time_tuple = self._extract_time(text)
-                if time_tuple:
-                    date = date.replace(hour=time_tuple[0], minute=time_tuple[1])
-                else:
-                    date = date.replace(hour=9, minute=0)
-                
-                return date
-            except ValueError:
-                logger.warning(f"تاريخ غير صالح: {day}/{month}/{year}")
-                pass
-        
-        # ==========================================
-        # ثانياً: البحث عن "بعد X دقيقة/ساعة"
-        # ==========================================
-        
-        # نمط عربي: "بعد X دقيقة/ساعة/يوم"
-        # ✅ FIX: دعم "بعد ساعة" بدون رقم
-        
-        # أولاً: الصيغ الخاصة بدون أرقام
-        special_patterns = {
-            r'بعد\s+ساعة(?!\d)': timedelta(hours=1),
-            r'بعد\s+ساعتين': timedelta(hours=2),
-            r'بعد\s+دقيقة(?!\d)': timedelta(minutes=1),
-            r'بعد\s+دقيقتين': timedelta(minutes=2),
-            r'بعد\s+يوم(?!\d)': timedelta(days=1),
-            r'بعد\s+يومين': timedelta(days=2),
-        }
-        
-        for pattern, delta in special_patterns.items():
-            if re.search(pattern, text_lower):
-                return now + delta
-        
-        # ثانياً: الصيغة العادية بالأرقام
-        after_pattern = re.search(r'بعد\s+(\d+)\s*(دقيقة|دقائق|ساعة|ساعات|يوم|أيام)', text_lower)
-        if after_pattern:
-            number = int(after_pattern.group(1))
-            unit = after_pattern.group(2)
-            
-            if 'دقيقة' in unit or 'دقائق' in unit:
-                return now + timedelta(minutes=number)
-            elif 'ساعة' in unit or 'ساعات' in unit:
-                return now + timedelta(hours=number)
-            elif 'يوم' in unit or 'أيام' in unit:
-                return now + timedelta(days=number)
-        
-        # نمط فرنسي: "dans X minutes/heures"
-        # ✅ FIX: دعم "dans une heure"
-        
-        french_special = {
-            r'dans\s+une\s+heure': timedelta(hours=1),
-            r'dans\s+deux\s+heures': timedelta(hours=2),
-            r'dans\s+une\s+minute': timedelta(minutes=1),
-            r'dans\s+un\s+jour': timedelta(days=1),
-            r'dans\s+deux\s+jours': timedelta(days=2),
-        }
-        
-        for pattern, delta in french_special.items():
-            if re.search(pattern, text_lower):
-                return now + delta
-        
-        dans_pattern = re.search(r'dans\s+(\d+)\s*(minute|minutes|heure|heures|jour|jours)', text_lower)
-        if dans_pattern:
-            number = int(dans_pattern.group(1))
-            unit = dans_pattern.group(2)
-            
-            if 'minute' in unit:
-                return now + timedelta(minutes=number)
-            elif 'heure' in unit:
-                return now + timedelta(hours=number)
-            elif 'jour' in unit:
-                return now + timedelta(days=number)
-        
-        # نمط إنجليزي: "in X minutes/hours"
-        # ✅ FIX: دعم "in an hour"
-        
-        english_special = {
-            r'in\s+an?\s+hour': timedelta(hours=1),
-            r'in\s+two\s+hours': timedelta(hours=2),
-            r'in\s+an?\s+minute': timedelta(minutes=1),
-            r'in\s+an?\s+day': timedelta(days=1),
-            r'in\s+two\s+days': timedelta(days=2),
-        }
-        
-        for pattern, delta in english_special.items():
-            if re.search(pattern, text_lower):
-                return now + delta
-        
-        in_pattern = re.search(r'in\s+(\d+)\s*(minute|minutes|hour|hours|day|days)', text_lower)
-        if in_pattern:
-            number = int(in_pattern.group(1))
-            unit = in_pattern.group(2)
-            
-            if 'minute' in unit:
-                return now + timedelta(minutes=number)
-            elif 'hour' in unit:
-                return now + timedelta(hours=number)
-            elif 'day' in unit:
-                return now + timedelta(days=number)
-        
-        # ==========================================
-        # ثالثاً: الكلمات المفتاحية (اليوم، غداً، إلخ)
-        # ==========================================
-        
-        date = None
-        
-        # عربي
-        if language == 'ar' or any(word in text_lower for word in ['اليوم', 'غدا', 'غداً']):
-            if 'اليوم' in text_lower:
-                date = now
-            elif 'غدا' in text_lower or 'غداً' in text_lower:
-                date = now + timedelta(days=1)
-            elif 'بعد غد' in text_lower:
-                date = now + timedelta(days=2)
-            elif 'الأسبوع القادم' in text_lower or 'الاسبوع القادم' in text_lower:
-                date = now + timedelta(weeks=1)
-        
-        # فرنسي
-        if not date and (language == 'fr' or "aujourd'hui" in text_lower or 'demain' in text_lower):
-            if "aujourd'hui" in text_lower or 'aujourdhui' in text_lower:
-                date = now
-            elif 'demain' in text_lower:
-                date = now + timedelta(days=1)
-            elif 'après-demain' in text_lower or 'apres-demain' in text_lower:
-                date = now + timedelta(days=2)
-        
-        # إنجليزي
-        if not date and (language == 'en' or 'today' in text_lower or 'tomorrow' in text_lower):
-            if 'today' in text_lower:
-                date = now
-            elif 'tomorrow' in text_lower:
-                date = now + timedelta(days=1)
-            elif 'day after tomorrow' in text_lower:
-                date = now + timedelta(days=2)
-        
-        # أيام الأسبوع
-        if not date:
-            days_map_ar = {
-                'السبت': 5, 'الأحد': 6, 'الاثنين': 0,
-                'الثلاثاء': 1, 'الأربعاء': 2, 'الخميس': 3, 'الجمعة': 4
-            }
-            days_map_fr = {
-                'lundi': 0, 'mardi': 1, 'mercredi': 2,
-                'jeudi': 3, 'vendredi': 4, 'samedi': 5, 'dimanche': 6
-            }
-            days_map_en = {
-                'monday': 0, 'tuesday': 1, 'wednesday': 2,
-                'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6
-            }
-            
-            for day_name, day_num in {**days_map_ar, **days_map_fr, **days_map_en}.items():
-                if day_name in text_lower:
-                    days_ahead = (day_num - now.weekday()) % 7
-                    if days_ahead == 0:
-                        days_ahead = 7
-                    date = now + timedelta(days=days_ahead)
-                    break
-        
-        # إذا لم يُعثر على تاريخ، استخدم غداً كافتراضي
-        if not date:
-            date = now + timedelta(days=1)
-            logger.warning("لم يتم العثور على تاريخ واضح - استخدام غداً كافتراضي")
-        
-        # ==========================================
-        # أخيراً: دمج التاريخ مع الوقت
-        # ==========================================
-        
-        time_tuple = self._extract_time(text)
-        
-        if time_tuple:
-            date = date.replace(hour=time_tuple[0], minute=time_tuple[1], second=0, microsecond=0)
-        else:
-            # وقت افتراضي 9 صباحاً
-            date = date.replace(hour=9, minute=0, second=0, microsecond=0)
+        """
+        استخراج التاريخ والوقت من النص ✨
         
-        return date
-    
-    def _extract_time(self, text: str) -> Optional[Tuple[int, int]]:
+        يعتمد على محرك التمريرة الواحدة (datetime_engine): كل المفردات
+        مجمّعة مسبقاً، والرسالة تُمسح مرة واحدة مهما كانت اللغة.
+        الأولوية: تاريخ صريح ← تاريخ رقمي ← "بعد X" ← اليوم/غداً ← يوم الأسبوع ← غداً
         """
-        استخراج الوقت من النص - نسخة محسّنة مع دعم الأرقام بالحروف ✨
+        return datetime_engine.extract_datetime(text)
     
-        يدعم:
-        - XX:XX (مثل: 16:30)
-        - XXhXX (فرنسي: 16h30)
-        - XXh (فرنسي: 16h)
-        - الأرقام بالحروف: الرابعة، العاشرة، إلخ
-        - على الساعة XX
-        - XX صباحاً/مساءً
+    def _extract_time(self, text: str) -> Optional[Tuple[int, int]]:
         """
-    
-        # 📚 خريطة الأرقام المكتوبة بالحروف
-        ARABIC_NUMBERS = {
-            'الواحدة': 1, 'واحدة': 1,
-            'الثانية': 2, 'ثانية': 2,
-            'الثالثة': 3, 'ثالثة': 3,
-            'الرابعة': 4, 'رابعة': 4,
-            'الخامسة': 5, 'خامسة': 5,
-            'السادسة': 6, 'سادسة': 6,
-            'السابعة': 7, 'سابعة': 7,
-            'الثامنة': 8, 'ثامنة': 8,
-            'التاسعة': 9, 'تاسعة': 9,
-            'العاشرة': 10, 'عاشرة': 10,
-            'الحادية عشرة': 11, 'حادية عشرة': 11,
-            'الثانية عشرة': 12, 'ثانية عشرة': 12,
-        }
-    
-        text_lower = text.lower()
-    
-        # 1️⃣ نمط XX:XX (أعلى أولوية - دقيق)
-        time_colon = re.search(r'\b([0-2]?\d):([0-5]\d)\b', text)
-        if time_colon:
-            hour = int(time_colon.group(1))
-            minute = int(time_colon.group(2))
-            if 0 <= hour <= 23 and 0 <= minute <= 59:
-                logger.debug(f"✅ استخراج وقت (XX:XX): {hour}:{minute:02d}")
-                return (hour, minute)
-    
-        # 2️⃣ نمط XXhXX (فرنسي مع دقائق)
-        french_time_full = re.search(r'(\d{1,2})h(\d{2})', text_lower)
-        if french_time_full:
-            hour = int(french_time_full.group(1))
-            minute = int(french_time_full.group(2))
-            if 0 <= hour <= 23 and 0 <= minute <= 59:
-                logger.debug(f"✅ استخراج وقت (XXhXX): {hour}:{minute:02d}")
-                return (hour, minute)
-    
-        # 3️⃣ نمط XXh (فرنسي بدون دقائق)
-        french_time_hour = re.search(r'(\d{1,2})h(?!\d)', text_lower)
-        if french_time_hour:
-            hour = int(french_time_hour.group(1))
-            if 0 <= hour <= 23:
-                logger.debug(f"✅ استخراج وقت (XXh): {hour}:00")
-                return (hour, 0)
-    
-        # 4️⃣ ✨ الأرقام المكتوبة بالحروف العربية (الأولوية العالية!)
-        for word, number in ARABIC_NUMBERS.items():
-            # البحث عن: "الساعة الرابعة مساء" أو "الرابعة صباحاً"
-            pattern = rf'(?:الساعة\s+)?{re.escape(word)}\s*(صباحا|صباحاً|مساء|مساءً)?'
-            match = re.search(pattern, text_lower)
+        استخراج الوقت من النص
         
-            if match:
-                hour = number
-                period = match.group(1)
-            
-                # معالجة صباحاً/مساءً
-                if period:
-                    if period in ['مساء', 'مساءً'] and hour < 12:
-                        hour += 12
-                    elif period in ['صباحا', 'صباحاً'] and hour == 12:
-                        hour = 0
-            
-                if 0 <= hour <= 23:
-                    logger.debug(f"✅ استخراج وقت (حروف): {word} → {hour}:00")
-                    return (hour, 0)
-    
-        # 5️⃣ نمط "على الساعة X" (رقمي - يجب أن تسبق كلمة "ساعة")
-        time_with_keyword = re.search(
-            r'(?:على\s+)?(?:الساعة|ساعة)\s+(\d{1,2})(?!\d)',
-            text_lower
-        )
-        if time_with_keyword:
-            hour = int(time_with_keyword.group(1))
-            if 0 <= hour <= 23:
-                logger.debug(f"✅ استخراج وقت (على الساعة X): {hour}:00")
-                return (hour, 0)
-    
-        # 6️⃣ نمط "X صباحاً" أو "X مساءً" (رقمي بدون كلمة "الساعة")
-        time_with_period = re.search(
-            r'\b(\d{1,2})\s+(صباحا|صباحاً|مساء|مساءً|am|pm)\b',
-            text_lower
-        )
-        if time_with_period:
-            hour = int(time_with_period.group(1))
-            period = time_with_period.group(2)
-        
-            # معالجة صباحاً/مساءً
-            if period in ['مساء', 'مساءً', 'pm'] and 1 <= hour <= 11:
-                hour += 12
-            elif period in ['صباحا', 'صباحاً', 'am'] and hour == 12:
-                hour = 0
-            elif period == 'pm' and hour == 12:
-                hour = 12
-        
-            if 0 <= hour <= 23:
-                logger.debug(f"✅ استخراج وقت (X صباحاً/مساءً): {hour}:00")
-                return (hour, 0)
-    
-        # إذا لم نجد شيئاً
-        logger.debug("⚠️ لم يتم استخراج الوقت")
-        return None
+        يدعم: 16:30، 16h30، 16h، الرابعة مساءً، على الساعة 5، 5 مساءً
+        """
+        return datetime_engine.extract_time(text)
 
     def _extract_title_and_description(self, message: str, language: str) -> Tuple[str, str]:
         """استخراج عنوان مختصر ووصف من الرسالة"""
@@ -849,151 +416,182 @@ class IntelligentAgent:
         # لم يُعثر على تاريخ
         return None
     
-    def process_message(self, user_id: int, message: str) -> str:
-        
-             
-        """معالجة الرسالة الرئيسية"""
-        # كشف اللغة
-        language = self.detect_language(message)
+    # ==========================================
+    # بناء الردود (مشتركة بين المسار المتزامن و async)
+    # ==========================================
+    
+    CUSTOM_REMINDER_PATTERNS = [
+        re.compile(pattern, re.IGNORECASE) for pattern in (
+            r'ذكرني قبل (\d+) دقيقة',
+            r'ذكرني قبل (\d+) دقائق',
+            r'ذكرني قبل ساعة',
+            r'ذكرني قبل يوم',
+            r'rappelle.moi (\d+) minutes? avant',
+            r'remind me (\d+) minutes? before'
+        )
+    ]
+    
+    NO_RECENT_APPOINTMENT = (
+        "⚠️ لا يوجد موعد حديث لإضافة تذكير له\n"
+        "أضف موعداً أولاً ثم أضف التذكير\n\n"
+        "⚠️ Aucun RDV récent\n"
+        "Ajoutez d'abord un RDV\n\n"
+        "⚠️ No recent appointment\n"
+        "Add an appointment first"
+    )
+    
+    def match_custom_reminder(self, message: str) -> Optional[int]:
+        """
+        التعرف على طلب تذكير مخصص ("ذكرني قبل 30 دقيقة")
         
-        # تصنيف النية
-        intent = self.classify_intent(message)
+        Returns:
+            int: عدد الدقائق قبل الموعد، أو None إذا لم تكن الرسالة طلب تذكير
+        """
+        message_lower = message.lower()
         
-        response = ""
+        for pattern in self.CUSTOM_REMINDER_PATTERNS:
+            match = pattern.search(message_lower)
+            if match:
+                if 'ساعة' in message or 'hour' in message or 'heure' in message:
+                    return 60
+                if 'يوم' in message or 'day' in message or 'jour' in message:
+                    return 1440
+                try:
+                    return int(match.group(1))
+                except (IndexError, TypeError, ValueError):
+                    return 30
         
-        # معالجة حسب النية
-        if intent == 'add_appointment':
-            # استخراج تفاصيل الموعد
-            date_time = self.extract_datetime(message, language)
-            
-            # استخراج عنوان مختصر ووصف
-            title, description = self._extract_title_and_description(message, language)
-            
-            # إضافة الموعد
-            appointment_id = self.db.add_appointment(
-                user_id, 
-                title,
-                description,
-                date_time
-            )
-            
-            # رد بثلاث لغات
-            response = f"""✅ تم إضافة موعد بنجاح! 
+        return None
+    
+    def format_custom_reminder_response(self, appointment_id: int, minutes_before: int) -> str:
+        """رد تأكيد إضافة تذكير مخصص"""
+        return (
+            f"✅ تم إضافة التذكير!\n"
+            f"🔔 سأذكرك قبل {minutes_before} دقيقة من الموعد #{appointment_id}\n\n"
+            f"✅ Rappel ajouté!\n"
+            f"🔔 Je vous rappellerai {minutes_before} minutes avant le RDV\n\n"
+            f"✅ Reminder added!\n"
+            f"🔔 I'll remind you {minutes_before} minutes before the appointment"
+        )
+    
+    def _format_added_response(self, appointment_id: int, date_time: datetime) -> str:
+        """رد إضافة موعد بثلاث لغات"""
+        return f"""✅ تم إضافة موعد بنجاح! 
 ✅ Rendez-vous ajouté avec succès!
 ✅ Appointment added successfully!
 
 📋 رقم الموعد | Numéro | ID: {appointment_id}
 📅 التاريخ | Date: {date_time.strftime('%Y-%m-%d %H:%M')}"""
+    
+    def _resolve_day_query(self, message: str, language: str) -> Tuple[datetime, datetime, str]:
+        """
+        تحديد اليوم المطلوب في استفسار "مواعيدي يوم ..."
         
-        elif intent == 'check_specific_day':
-            # استخراج التاريخ من الاستفسار
-            target_date = self._extract_date_from_query(message, language)
-            
-            if target_date:
-                # تسميات حسب التاريخ
-                now = datetime.now()
-                if target_date.date() == now.date():
-                    day_label_ar = "اليوم"
-                    day_label_fr = "Aujourd'hui"
-                    day_label_en = "Today"
-                elif target_date.date() == (now + timedelta(days=1)).date():
-                    day_label_ar = "غداً"
-                    day_label_fr = "Demain"
-                    day_label_en = "Tomorrow"
-                else:
-                    day_label_ar = target_date.strftime('%d/%m/%Y')
-                    day_label_fr = target_date.strftime('%d/%m/%Y')
-                    day_label_en = target_date.strftime('%d/%m/%Y')
-            else:
-                # افتراضي: اليوم
-                target_date = datetime.now()
+        Returns:
+            Tuple: (بداية اليوم, نهاية اليوم, تسمية اليوم بالعربية)
+        """
+        target_date = self._extract_date_from_query(message, language)
+        now = datetime.now()
+        
+        if target_date:
+            # تسميات حسب التاريخ
+            if target_date.date() == now.date():
                 day_label_ar = "اليوم"
-                day_label_fr = "Aujourd'hui"
-                day_label_en = "Today"
-            
-            # تحديد بداية ونهاية اليوم
-            day_start = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = target_date.replace(hour=23, minute=59, second=59, microsecond=0)
-            
-            # جلب المواعيد
-            appointments = self.db.get_appointments(
-                user_id,
-                day_start.strftime('%Y-%m-%d %H:%M:%S'),
-                day_end.strftime('%Y-%m-%d %H:%M:%S')
-            )
-            
-            if not appointments:
-                response = f"""📅 **مواعيدك {day_label_ar}**
+            elif target_date.date() == (now + timedelta(days=1)).date():
+                day_label_ar = "غداً"
+            else:
+                day_label_ar = target_date.strftime('%d/%m/%Y')
+        else:
+            # افتراضي: اليوم
+            target_date = now
+            day_label_ar = "اليوم"
+        
+        # تحديد بداية ونهاية اليوم
+        day_start = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = target_date.replace(hour=23, minute=59, second=59, microsecond=0)
+        
+        return day_start, day_end, day_label_ar
+    
+    def _format_day_response(self, appointments: List[Dict], day_start: datetime, 
+                             day_label_ar: str) -> str:
+        """رد مواعيد يوم محدد"""
+        if not appointments:
+            return f"""📅 **مواعيدك {day_label_ar}**
 **{day_start.strftime('%d/%m/%Y')}**
 
 ✨ لا توجد مواعيد
 ✨ Aucun rendez-vous
 ✨ No appointments"""
-            else:
-                response = f"""📅 **مواعيدك {day_label_ar}**
+        
+        response = f"""📅 **مواعيدك {day_label_ar}**
 **{day_start.strftime('%d/%m/%Y')}**
 
 """
-                for apt in appointments:
-                    # تنظيف microseconds
-                    apt_time_str = apt['date_time']
-                    if '.' in apt_time_str:
-                        apt_time_str = apt_time_str.split('.')[0]
-                    
-                    try:
-                        apt_time = datetime.strptime(apt_time_str, '%Y-%m-%d %H:%M:%S')
-                        priority_emoji = "🔴" if apt['priority'] == 1 else "🟡" if apt['priority'] == 2 else "🟢"
-                        
-                        response += f"{priority_emoji} **{apt_time.strftime('%H:%M')}** - {apt['title']}\n"
-                        if apt['description'] and apt['description'] != apt['title']:
-                            response += f"   📝 {apt['description'][:50]}...\n"
-                        response += "\n"
-                    except Exception as e:
-                        logger.error(f"خطأ في parsing التاريخ: {apt_time_str} - {e}")
-                        continue
-        
-        elif intent == 'list_appointments':
-            appointments = self.db.get_appointments(user_id)
+        for apt in appointments:
+            # تنظيف microseconds
+            apt_time_str = apt['date_time']
+            if '.' in apt_time_str:
+                apt_time_str = apt_time_str.split('.')[0]
             
-            if not appointments:
-                response = """📭 لا توجد مواعيد حالياً
+            try:
+                apt_time = datetime.strptime(apt_time_str, '%Y-%m-%d %H:%M:%S')
+                priority_emoji = "🔴" if apt['priority'] == 1 else "🟡" if apt['priority'] == 2 else "🟢"
+                
+                response += f"{priority_emoji} **{apt_time.strftime('%H:%M')}** - {apt['title']}\n"
+                if apt['description'] and apt['description'] != apt['title']:
+                    response += f"   📝 {apt['description'][:50]}...\n"
+                response += "\n"
+            except Exception as e:
+                logger.error(f"خطأ في parsing التاريخ: {apt_time_str} - {e}")
+                continue
+        
+        return response
+    
+    def _format_list_response(self, appointments: List[Dict]) -> str:
+        """رد قائمة جميع المواعيد"""
+        if not appointments:
+            return """📭 لا توجد مواعيد حالياً
 📭 Aucun rendez-vous pour le moment
 📭 No appointments at the moment"""
-            else:
-                response = """📋 **مواعيدك | Vos rendez-vous | Your appointments:**
+        
+        response = """📋 **مواعيدك | Vos rendez-vous | Your appointments:**
 
 """
-                for apt in appointments:
-                    # تنظيف microseconds
-                    apt_time_str = apt['date_time']
-                    if '.' in apt_time_str:
-                        apt_time_str = apt_time_str.split('.')[0]
-                    
-                    try:
-                        priority_emoji = "🔴" if apt['priority'] == 1 else "🟡" if apt['priority'] == 2 else "🟢"
-                        apt_date = datetime.strptime(apt_time_str, '%Y-%m-%d %H:%M:%S')
-                        
-                        response += f"{priority_emoji} **{apt['title']}**\n"
-                        response += f"📅 {apt_date.strftime('%d/%m/%Y %H:%M')}\n"
-                        if apt['description'] and apt['description'] != apt['title']:
-                            response += f"📝 {apt['description'][:50]}...\n"
-                        response += "\n"
-                    except Exception as e:
-                        logger.error(f"خطأ في parsing التاريخ: {apt_time_str} - {e}")
-                        continue
+        for apt in appointments:
+            # تنظيف microseconds
+            apt_time_str = apt['date_time']
+            if '.' in apt_time_str:
+                apt_time_str = apt_time_str.split('.')[0]
+            
+            try:
+                priority_emoji = "🔴" if apt['priority'] == 1 else "🟡" if apt['priority'] == 2 else "🟢"
+                apt_date = datetime.strptime(apt_time_str, '%Y-%m-%d %H:%M:%S')
+                
+                response += f"{priority_emoji} **{apt['title']}**\n"
+                response += f"📅 {apt_date.strftime('%d/%m/%Y %H:%M')}\n"
+                if apt['description'] and apt['description'] != apt['title']:
+                    response += f"📝 {apt['description'][:50]}...\n"
+                response += "\n"
+            except Exception as e:
+                logger.error(f"خطأ في parsing التاريخ: {apt_time_str} - {e}")
+                continue
         
-        elif intent == 'greeting':
-            response = """مرحباً! 👋 كيف يمكنني مساعدتك؟
+        return response
+    
+    def _static_response(self, intent: str) -> str:
+        """الردود التي لا تحتاج قاعدة البيانات"""
+        if intent == 'greeting':
+            return """مرحباً! 👋 كيف يمكنني مساعدتك؟
 Bonjour! 👋 Comment puis-je vous aider?
 Hello! 👋 How can I help you?"""
         
-        elif intent == 'thanks':
-            response = """العفو! 😊
+        if intent == 'thanks':
+            return """العفو! 😊
 De rien! 😊
 You're welcome! 😊"""
         
-        elif intent == 'help':
-            response = """🤖 **المساعدة | Aide | Help:**
+        if intent == 'help':
+            return """🤖 **المساعدة | Aide | Help:**
 
 **العربية:**
 - اكتب: "موعد غداً الساعة 3"
@@ -1014,8 +612,7 @@ You're welcome! 😊"""
 - "Show all appointments"
 """
         
-        else:
-            response = """🤔 لم أفهم طلبك. جرب:
+        return """🤔 لم أفهم طلبك. جرب:
 "موعد غداً الساعة 3"
 "مواعيدي اليوم"
 
@@ -1027,84 +624,95 @@ You're welcome! 😊"""
 "Appointment tomorrow at 3pm"
 "My appointments today"
 """
+    
+    # ==========================================
+    # المعالجة الرئيسية
+    # ==========================================
+    
+    def add_custom_reminder(self, user_id: int, minutes_before: int) -> str:
+        """إضافة تذكير مخصص لآخر موعد للمستخدم"""
+        # استيراد مدير التذكيرات المخصصة
+        from advanced_features import CustomReminderManager
+        
+        # الحصول على آخر موعد للمستخدم (عبر المجموعة المشتركة)
+        last_appointment = self.db.pool.execute_one('''
+            SELECT id FROM appointments 
+            WHERE user_id = ? 
+            ORDER BY created_at DESC 
+            LIMIT 1
+        ''', (user_id,))
+        
+        if not last_appointment:
+            return self.NO_RECENT_APPOINTMENT
+        
+        appointment_id = last_appointment[0]
+        
+        reminder_mgr = CustomReminderManager(self.db.db_path)
+        reminder_mgr.add_custom_reminder(
+            appointment_id=appointment_id,
+            minutes_before=minutes_before,
+            custom_message=f"تذكير: لديك موعد بعد {minutes_before} دقيقة"
+        )
         
-        # تسجيل التفاعل
-        self.db.log_interaction(user_id, message, response, intent, language)
-        import re
-
-        # البحث عن طلب تذكير مخصص
-        reminder_patterns = [
-            r'ذكرني قبل (\d+) دقيقة',
-            r'ذكرني قبل (\d+) دقائق',
-            r'ذكرني قبل ساعة',
-            r'ذكرني قبل يوم',
-            r'rappelle.moi (\d+) minutes? avant',
-            r'remind me (\d+) minutes? before'
-        ]
-
-        for pattern in reminder_patterns:
-            match = re.search(pattern, message.lower(), re.IGNORECASE)
-            if match:
-                try:
-                    # استيراد مدير التذكيرات المخصصة
-                    from advanced_features import CustomReminderManager
+        return self.format_custom_reminder_response(appointment_id, minutes_before)
+    
+    def process_message(self, user_id: int, message: str) -> str:
+        """معالجة الرسالة الرئيسية"""
+        # طلب تذكير مخصص ("ذكرني قبل 30 دقيقة")
+        minutes_before = self.match_custom_reminder(message)
+        
+        if minutes_before is not None:
+            try:
+                return self.add_custom_reminder(user_id, minutes_before)
+            except Exception as e:
+                logger.error(f"خطأ في إضافة تذكير مخصص: {e}")
+        
+        # كشف اللغة
+        language = self.detect_language(message)
+        
+        # تصنيف النية
+        intent = self.classify_intent(message)
+        
+        # معالجة حسب النية
+        if intent == 'add_appointment':
+            # استخراج تفاصيل الموعد
+            date_time = self.extract_datetime(message, language)
             
-                    # ✅ فتح اتصال قاعدة البيانات
-                    conn = sqlite3.connect(self.db.db_path)
-                    cursor = conn.cursor()
+            # استخراج عنوان مختصر ووصف
+            title, description = self._extract_title_and_description(message, language)
             
-                    # الحصول على آخر موعد للمستخدم
-                    cursor.execute('''
-                        SELECT id FROM appointments 
-                        WHERE user_id = ? 
-                        ORDER BY created_at DESC 
-                        LIMIT 1
-                    ''', (user_id,))
+            # إضافة الموعد
+            appointment_id = self.db.add_appointment(
+                user_id, 
+                title,
+                description,
+                date_time
+            )
             
-                    last_appointment = cursor.fetchone()
+            response = self._format_added_response(appointment_id, date_time)
+        
+        elif intent == 'check_specific_day':
+            day_start, day_end, day_label_ar = self._resolve_day_query(message, language)
             
-                    if last_appointment:
-                        appointment_id = last_appointment[0]
-                
-                        # تحديد عدد الدقائق
-                        if 'ساعة' in message or 'hour' in message or 'heure' in message:
-                            minutes_before = 60
-                        elif 'يوم' in message or 'day' in message or 'jour' in message:
-                            minutes_before = 1440
-                        else:
-                            minutes_before = int(match.group(1))
-                
-                    # إضافة التذكير المخصص
-                        reminder_mgr = CustomReminderManager(self.db_path)
-                        reminder_id = reminder_mgr.add_custom_reminder(
-                            appointment_id=appointment_id,
-                            minutes_before=minutes_before,
-                            custom_message=f"تذكير: لديك موعد بعد {minutes_before} دقيقة"
-                        )
-                
-                        return (
-                            f"✅ تم إضافة التذكير!\n"
-                            f"🔔 سأذكرك قبل {minutes_before} دقيقة من الموعد #{appointment_id}\n\n"
-                            f"✅ Rappel ajouté!\n"
-                            f"🔔 Je vous rappellerai {minutes_before} minutes avant le RDV\n\n"
-                            f"✅ Reminder added!\n"
-                            f"🔔 I'll remind you {minutes_before} minutes before the appointment"
-                        )
-                    else:
-                        return (
-                            "⚠️ لا يوجد موعد حديث لإضافة تذكير له\n"
-                            "أضف موعداً أولاً ثم أضف التذكير\n\n"
-                            "⚠️ Aucun RDV récent\n"
-                            "Ajoutez d'abord un RDV\n\n"
-                            "⚠️ No recent appointment\n"
-                            "Add an appointment first"
-                        )
-                
-                except Exception as e:
-                    logger.error(f"خطأ في إضافة تذكير مخصص: {e}")
-                # استمرار العمل بدون المرحلة 2
-                    pass
-
+            # جلب المواعيد
+            appointments = self.db.get_appointments(
+                user_id,
+                day_start.strftime('%Y-%m-%d %H:%M:%S'),
+                day_end.strftime('%Y-%m-%d %H:%M:%S')
+            )
+            
+            response = self._format_day_response(appointments, day_start, day_label_ar)
+        
+        elif intent == 'list_appointments':
+            appointments = self.db.get_appointments(user_id)
+            response = self._format_list_response(appointments)
+        
+        else:
+            response = self._static_response(intent)
+        
+        # تسجيل التفاعل
+        self.db.log_interaction(user_id, message, response, intent, language)
+        
         return response
 
 
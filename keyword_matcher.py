@@ -0,0 +1,227 @@
+# keyword_matcher.py
+"""
+مطابقة الكلمات المفتاحية بخوارزمية Aho–Corasick
+✅ كل مجموعة قواعد تُجمّع مرة واحدة (عند تحميل الوحدة)
+✅ تمريرة واحدة على الرسالة تُعيد كل الكلمات المطابقة مع مواقعها
+✅ الكلفة لا تتعلق بعدد الكلمات - يمكن توسيع القوائم بحرية
+"""
+
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Sequence, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordHit(NamedTuple):
+    """كلمة مطابقة داخل النص"""
+    start: int
+    end: int
+    keyword: str
+    labels: Tuple[str, ...]
+
+
+class KeywordMatcher:
+    """
+    آلة Aho–Corasick لمجموعات كلمات مفتاحية مسماة
+
+    المطابقة كمطابقة `kw in text` تماماً (أجزاء كلمات وتداخلات مشمولة)،
+    والكلمة المشتركة بين عدة مجموعات تُنسب لكلها.
+
+    Usage:
+        matcher = KeywordMatcher({'greeting': ['مرحبا', 'hello'], 'thanks': ['شكرا']})
+        matcher.match("مرحبا وشكرا")   # {'greeting': {'مرحبا'}, 'thanks': {'شكرا'}}
+    """
+
+    def __init__(self, groups: Dict[str, Sequence[str]]):
+        """
+        Args:
+            groups: {اسم المجموعة: [الكلمات]} - الترتيب محفوظ في self.labels
+        """
+        self.labels = list(groups)
+        self.sizes = {label: len(keywords) for label, keywords in groups.items()}
+
+        # كلمة ← المجموعات التي تنتمي إليها
+        owners: Dict[str, List[str]] = {}
+        for label, keywords in groups.items():
+            for keyword in keywords:
+                owners.setdefault(keyword, [])
+                if label not in owners[keyword]:
+                    owners[keyword].append(label)
+
+        self.keywords = list(owners)
+        self._keyword_labels = [tuple(owners[keyword]) for keyword in self.keywords]
+
+        self._build()
+
+    def _build(self):
+        """بناء الـ trie وروابط الفشل (BFS)"""
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state].append(index)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                queue.append(child)
+
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+
+                # مخرجات حالة الفشل (لاحقات أقصر) تُدمج مسبقاً
+                outputs[child].extend(outputs[fail[child]])
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [tuple(output) for output in outputs]
+        self._alphabet = frozenset(char for keyword in self.keywords for char in keyword)
+
+    def _scan(self, text: str) -> Iterator[Tuple[int, int]]:
+        """(موقع النهاية، رقم الكلمة) لكل تطابق"""
+        goto, fail, outputs, alphabet = self._goto, self._fail, self._outputs, self._alphabet
+        state = 0
+
+        for position, char in enumerate(text):
+            # حرف لا يظهر في أي كلمة يعيد الآلة للجذر مباشرة
+            if char not in alphabet:
+                state = 0
+                continue
+
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for index in outputs[state]:
+                yield position + 1, index
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """كل التطابقات مع مواقعها (بترتيب نهاية التطابق)"""
+        return [
+            KeywordHit(end - len(self.keywords[index]), end, self.keywords[index], self._keyword_labels[index])
+            for end, index in self._scan(text)
+        ]
+
+    def match(self, text: str) -> Dict[str, Set[str]]:
+        """المجموعات المطابقة ← الكلمات المختلفة التي ظهرت منها"""
+        matched: Dict[str, Set[str]] = {}
+
+        for _, index in self._scan(text):
+            keyword = self.keywords[index]
+            for label in self._keyword_labels[index]:
+                matched.setdefault(label, set()).add(keyword)
+
+        return matched
+
+    def score(self, text: str, normalize: bool = False) -> Dict[str, float]:
+        """
+        درجة كل مجموعة = عدد الكلمات المختلفة المطابقة
+
+        Args:
+            normalize: القسمة على حجم المجموعة
+        """
+        return {
+            label: len(keywords) / self.sizes[label] if normalize else len(keywords)
+            for label, keywords in self.match(text).items()
+        }
+
+    def best(self, text: str, normalize: bool = False) -> Tuple[str, float]:
+        """
+        المجموعة الأعلى درجة (التعادل لصالح الأسبق في ترتيب المجموعات)
+
+        Returns:
+            (المجموعة، الدرجة) أو ('unknown', 0) بدون تطابق
+        """
+        scores = self.score(text, normalize)
+        best_label, best_score = 'unknown', 0
+
+        for label in self.labels:
+            if scores.get(label, 0) > best_score:
+                best_label, best_score = label, scores[label]
+
+        return best_label, best_score
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+
+# ==========================================
+# اختبار الأداء
+# ==========================================
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    print("="*70)
+    print("🧪 اختبار مطابقة الكلمات المفتاحية (Aho–Corasick)")
+    print("="*70)
+
+    messages = [
+        "موعد مع الطبيب غداً الساعة 3",
+        "ما هي مواعيدي اليوم",
+        "شكرا جزيلا",
+        "bonjour, rdv demain à 14h",
+        "show my appointments for tomorrow please",
+        "كيف أضيف موعد"
+    ]
+
+    # قوائم كلمات عشوائية بأحجام متزايدة
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyzابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+    vocabulary = [
+        "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+        for _ in range(5000)
+    ] + ["موعد", "مواعيدي", "شكرا", "rdv", "appointments", "كيف"]
+
+    def linear_match(groups, text):
+        """الطريقة القديمة: فحص كل كلمة على حدة"""
+        matched = {}
+        for label, keywords in groups.items():
+            found = {kw for kw in keywords if kw in text}
+            if found:
+                matched[label] = found
+        return matched
+
+    for size in (50, 500, 5000):
+        groups = {'a': vocabulary[-size:][::2], 'b': vocabulary[-size:][1::2]}
+        matcher = KeywordMatcher(groups)
+
+        for text in messages:
+            assert matcher.match(text) == linear_match(groups, text), text
+
+        rounds = 2000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in messages:
+                linear_match(groups, text)
+        linear_us = (time.perf_counter() - start) / (rounds * len(messages)) * 1e6
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in messages:
+                matcher.match(text)
+        matcher_us = (time.perf_counter() - start) / (rounds * len(messages)) * 1e6
+
+        print(f"   🔑 {size:>5} كلمة: خطي {linear_us:>8.1f} µs → Aho–Corasick {matcher_us:>6.1f} µs")
+
+    print("\n📍 التطابقات مع المواقع:")
+    matcher = KeywordMatcher({'add': ['موعد', 'rdv'], 'list': ['مواعيدي'], 'help': ['كيف']})
+    for text in messages:
+        print(f"   '{text}' → {[(hit.keyword, hit.start) for hit in matcher.find_all(text)]}")
+
+    print("="*70)
+    print("✅ الاختبار اكتمل!")
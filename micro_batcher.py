@@ -0,0 +1,185 @@
+# micro_batcher.py
+"""
+تجميع طلبات التنبؤ المتزامنة (Micro-Batching)
+✅ الطلبات القادمة من معالجات تيليجرام خلال بضع ميلي ثوانٍ تُجمع في دفعة واحدة
+✅ تمريرة واحدة للنموذج لكل دفعة (predict_batch) في thread منفصل
+✅ أثناء تنفيذ دفعة تتراكم الطلبات التالية - حجم الدفعة يكبر مع الحمل
+"""
+
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    واجهة async فوق predict_batch
+
+    كل طلب ينتظر حتى max_wait_ms لينضم إليه غيره (أو حتى امتلاء
+    الدفعة)، ثم تُنفذ الدفعة كاملة في thread حتى لا تُحجب حلقة الأحداث.
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[List[str]], List[Dict]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Args:
+            predict_batch: دالة تنبؤ دفعية (نصوص → نتائج بنفس الترتيب)
+            max_batch_size: أقصى حجم للدفعة
+            max_wait_ms: أقصى انتظار لتجميع الدفعة (ميلي ثانية)
+        """
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._last_batch_size = 0
+
+        # إحصائيات
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'max_batch': 0,
+            'errors': 0
+        }
+
+    async def predict(self, text: str) -> Dict:
+        """التنبؤ بنص واحد (يُجمع مع الطلبات المتزامنة)"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        self.stats['requests'] += 1
+
+        return await future
+
+    async def close(self):
+        """إيقاف العامل"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """تجميع دفعة: أول طلب + ما يصل خلال النافذة"""
+        batch = [await self._queue.get()]
+
+        # بدون حمل (الدفعة السابقة فردية) لا داعي لانتظار النافذة
+        wait = self.max_wait if self._last_batch_size > 1 else 0
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+
+        while len(batch) < self.max_batch_size:
+            # ما تراكم أثناء الدفعة السابقة يُؤخذ فوراً
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        """حلقة العامل"""
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            self._last_batch_size = len(batch)
+
+            self.stats['batches'] += 1
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+
+            try:
+                results = await asyncio.to_thread(self.predict_batch, texts)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ خطأ في التنبؤ الدفعي ({len(batch)}): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def get_stats(self) -> Dict:
+        """الحصول على الإحصائيات"""
+        return {
+            **self.stats,
+            'avg_batch': (
+                self.stats['requests'] / self.stats['batches']
+                if self.stats['batches'] > 0 else 0
+            )
+        }
+
+
+# ==========================================
+# اختبار الأداء
+# ==========================================
+
+if __name__ == "__main__":
+    import threading
+
+    print("="*70)
+    print("🧪 اختبار تجميع طلبات التنبؤ")
+    print("="*70)
+
+    # محاكاة تمريرة نموذج على CPU: كلفة ثابتة + كلفة صغيرة لكل نص
+    # (القفل يمثل أنوية المعالج المشغولة - تمريرتان لا تتوازيان)
+    cpu = threading.Lock()
+
+    def fake_predict_batch(texts: List[str]) -> List[Dict]:
+        with cpu:
+            time.sleep(0.004 + 0.0002 * len(texts))
+        return [{'intent': 'greeting', 'confidence': 0.9} for _ in texts]
+
+    async def run(concurrency: int, requests: int = 400, batched: bool = True) -> float:
+        batcher = MicroBatcher(fake_predict_batch)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i: int):
+            async with semaphore:
+                if batched:
+                    await batcher.predict(f"رسالة {i}")
+                else:
+                    await asyncio.to_thread(fake_predict_batch, [f"رسالة {i}"])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+        await batcher.close()
+        if batched:
+            print(f"      📦 {batcher.get_stats()}")
+        return requests / elapsed
+
+    async def main():
+        for concurrency in (1, 8, 64):
+            single = await run(concurrency, batched=False)
+            batched = await run(concurrency)
+            print(f"   👥 {concurrency:>3} مستخدم: فردي {single:>6,.0f} طلب/ث → مجمّع {batched:>6,.0f} طلب/ث")
+
+    asyncio.run(main())
+
+    print("="*70)
+    print("✅ الاختبار اكتمل!")
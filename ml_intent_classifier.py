@@ -14,13 +14,28 @@ import numpy as np
 import sqlite3
 import json
 import re
+import copy
+import os
+import random
+import time
 import pickle
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 from collections import Counter
+from itertools import chain, repeat
+from functools import lru_cache
 import logging
 from datetime import datetime
 
+from inference_backends import export_model, load_inference_model
+from cache_manager import PredictionCache
+from corpus_cache import CORPUS_CACHE_DIR, corpus_key, fingerprint, load_or_encode
+from model_registry import (
+    INTENT_CLASSIFIER, PROCESSOR_FILE, ModelRegistry, assign_state_dict, is_published,
+    load_checkpoint, model_filename, save_checkpoint
+)
+from rule_classifier import FRENCH_INDICATORS, rule_based_classify, detect_language
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,6 +43,19 @@ logger = logging.getLogger(__name__)
 # 1. معالجة النصوص متعددة اللغات
 # ==========================================
 
+# الكلمات: (عربية | لاتينية | أرقام) - المجموعة تحدد لغة الكلمة
+TOKEN_PATTERN = re.compile(r'([\u0600-\u06FF]+)|([a-zA-Zàâäéèêëïîôùûüÿç]+)|(\d+)')
+FRENCH_PATTERN = re.compile('|'.join(FRENCH_INDICATORS))
+
+# توحيد الهمزات، والتاء المربوطة، وإزالة التشكيل (U+064B..U+065F)
+ARABIC_NORMALIZATION = {
+    **{ord(char): 'ا' for char in 'إأآ'},
+    **{ord(char): 'ء' for char in 'ؤئ'},
+    ord('ة'): 'ه',
+    **{code: None for code in range(0x064B, 0x0660)}
+}
+
+
 class MultilingualTextProcessor:
     """معالج نصوص متعدد اللغات"""
     
@@ -40,12 +68,6 @@ class MultilingualTextProcessor:
         self.idx2word = {0: '<PAD>', 1: '<UNK>', 2: '<SOS>', 3: '<EOS>'}
         self.word_counts = Counter()
         
-        # أنماط التنظيف
-        self.arabic_pattern = re.compile(r'[\u0600-\u06FF]+')
-        self.french_pattern = re.compile(r'[a-zA-Zàâäéèêëïîôùûüÿç]+')
-        self.english_pattern = re.compile(r'[a-zA-Z]+')
-        self.number_pattern = re.compile(r'\d+')
-        
         # Stop words بسيطة
         self.stop_words = {
             'ar': {'في', 'من', 'إلى', 'على', 'عن', 'مع', 'هذا', 'هذه', 'و', 'أو', 'ثم'},
@@ -55,47 +77,47 @@ class MultilingualTextProcessor:
     
     def detect_language(self, text: str) -> str:
         """كشف لغة النص"""
-        arabic_chars = len(self.arabic_pattern.findall(text))
-        latin_chars = len(self.french_pattern.findall(text))
-        
-        if arabic_chars > latin_chars:
-            return 'ar'
-        
-        # التفريق بين الفرنسية والإنجليزية
-        french_indicators = ['je', 'tu', 'il', 'nous', 'vous', 'rdv', 'rendez', 'demain', 'aujourd']
-        if any(ind in text.lower() for ind in french_indicators):
-            return 'fr'
-        
-        return 'en'
+        return detect_language(text)
     
     def normalize_arabic(self, text: str) -> str:
-        """توحيد الأحرف العربية"""
-        # توحيد الهمزات
-        text = re.sub(r'[إأآا]', 'ا', text)
-        text = re.sub(r'[ؤئ]', 'ء', text)
-        # إزالة التشكيل
-        text = re.sub(r'[\u064B-\u065F]', '', text)
-        # توحيد التاء المربوطة والهاء
-        text = re.sub(r'ة', 'ه', text)
-        return text
+        """توحيد الأحرف العربية (الهمزات، التشكيل، التاء المربوطة) بجدول translate واحد"""
+        return text.translate(ARABIC_NORMALIZATION)
     
-    def tokenize(self, text: str) -> List[str]:
-        """تقسيم النص إلى كلمات"""
-        text = text.lower()
-        language = self.detect_language(text)
+    def _tokenize_lowered(self, text: str) -> List[str]:
+        """
+        تقسيم نص بعد lower(): findall واحد يُعطي الكلمات وعدّ العربية/اللاتينية
+        معاً (نفس نتيجة detect_language ثم normalize_arabic ثم الاستخراج)
+        """
+        matches = TOKEN_PATTERN.findall(text)
         
-        # تنظيف النص
-        if language == 'ar':
-            text = self.normalize_arabic(text)
+        if any(digits and not digits.isascii() for _, _, digits in matches):
+            # أرقام عربية-هندية داخل رقم: detect_language يعدّها كلمات عربية
+            language = detect_language(text)
+        elif sum(1 for ar, _, _ in matches if ar) > sum(1 for _, la, _ in matches if la):
+            language = 'ar'
+        else:
+            language = 'fr' if FRENCH_PATTERN.search(text) else 'en'
         
-        # استخراج الكلمات
-        words = re.findall(r'[\u0600-\u06FF]+|[a-zA-Zàâäéèêëïîôùûüÿç]+|\d+', text)
+        if language == 'ar':
+            # حذف التشكيل قد يصل كلمتين لاتينيتين، فالاستخراج يُعاد بعد التوحيد
+            matches = TOKEN_PATTERN.findall(text.translate(ARABIC_NORMALIZATION))
+        words = [ar or la or digits for ar, la, digits in matches]
         
         # إزالة stop words
-        stop = self.stop_words.get(language, set())
-        words = [w for w in words if w not in stop and len(w) > 1]
-        
-        return words
+        stop = self.stop_words.get(language, ())
+        return [w for w in words if len(w) > 1 and w not in stop]
+    
+    def tokenize(self, text: str) -> List[str]:
+        """تقسيم النص إلى كلمات"""
+        return self._tokenize_lowered(text.lower())
+    
+    def tokenize_batch(self, texts: List[str]) -> List[List[str]]:
+        """تقسيم عدة نصوص (النصوص المكررة تُقسّم مرة واحدة وتشترك في نفس القائمة)"""
+        tokenize = self._tokenize_lowered
+        unique = {text: None for text in texts}
+        for text in unique:
+            unique[text] = tokenize(text.lower())
+        return [unique[text] for text in texts]
     
     def build_vocabulary(self, texts: List[str]):
         """بناء القاموس من النصوص"""
@@ -112,30 +134,69 @@ class MultilingualTextProcessor:
         
         logger.info(f"✅ تم بناء قاموس بـ {len(self.word2idx)} كلمة")
     
+    def extend_vocabulary(self, texts: List[str]) -> int:
+        """
+        إضافة الكلمات الجديدة في آخر القاموس (الفهارس الحالية لا تتغير)
+        
+        Returns:
+            int: عدد الكلمات المضافة
+        """
+        added = 0
+        for text in texts:
+            for token in self.tokenize(text):
+                if token in self.word2idx or len(self.word2idx) >= self.max_vocab_size:
+                    continue
+                idx = len(self.word2idx)
+                self.word2idx[token] = idx
+                self.idx2word[idx] = token
+                added += 1
+        return added
+    
     def encode(self, text: str) -> torch.Tensor:
         """تحويل النص إلى tensor"""
-        tokens = self.tokenize(text)
+        return self.encode_batch([text])[0]
+    
+    def encode_batch(self, texts: List[str]) -> torch.Tensor:
+        """
+        تحويل عدة نصوص إلى LongTensor واحد (batch, max_seq_length)
         
-        # تحويل إلى indices
-        indices = [self.word2idx.get(token, 1) for token in tokens]  # 1 = <UNK>
+        كل الكلمات تُحوّل عبر القاموس في تمريرة واحدة، ثم تُوزّع على
+        المصفوفة بفهرسة NumPy. الطول ثابت (max_seq_length) كما في
+        التدريب: LSTM لا يستخدم attention mask، فتقصير الـ padding يغيّر النتائج.
+        """
+        max_length = self.max_seq_length
+        tokens = [words[:max_length] for words in self.tokenize_batch(texts)]
+        lengths = np.fromiter((len(words) for words in tokens), dtype=np.int64, count=len(tokens))
         
-        # Padding أو Truncation
-        if len(indices) < self.max_seq_length:
-            indices = indices + [0] * (self.max_seq_length - len(indices))
-        else:
-            indices = indices[:self.max_seq_length]
+        batch = np.zeros((len(texts), max_length), dtype=np.int64)
+        total = int(lengths.sum())
+        
+        if total:
+            # 1 = <UNK>
+            flat = list(chain.from_iterable(tokens))
+            ids = np.fromiter(map(self.word2idx.get, flat, repeat(1, total)), dtype=np.int64, count=total)
+            
+            rows = np.repeat(np.arange(len(texts)), lengths)
+            starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            batch[rows, np.arange(total) - starts] = ids
         
-        return torch.tensor(indices, dtype=torch.long)
+        return torch.from_numpy(batch)
+    
+    def vocabulary_hash(self) -> str:
+        """بصمة القاموس (مفتاح المجموعات المُرمّزة)"""
+        return fingerprint(f"{word}\t{idx}" for word, idx in self.word2idx.items())
     
     def save(self, path: str):
-        """حفظ المعالج"""
+        """حفظ المعالج (ذرياً)"""
         data = {
             'word2idx': self.word2idx,
             'idx2word': self.idx2word,
             'max_seq_length': self.max_seq_length
         }
-        with open(path, 'wb') as f:
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
             pickle.dump(data, f)
+        os.replace(tmp_path, path)
     
     def load(self, path: str):
         """تحميل المعالج"""
@@ -275,7 +336,15 @@ class IntentClassifierCNN(nn.Module):
 # ==========================================
 
 class IntentDataset(Dataset):
-    """مجموعة بيانات النوايا"""
+    """
+    مجموعة بيانات النوايا
+    
+    العينات تُرمّز كلها مرة واحدة عند الإنشاء (أو تُحمّل من القرص بـ mmap)،
+    فـ __getitem__ مجرد فهرسة في tensor متصل.
+    """
+    
+    # بذرة التوسيع: نفس العينات في كل تشغيل (حتى يصيب cache الترميز)
+    AUGMENT_SEED = 42
     
     INTENT_LABELS = [
         'add_appointment',      # إضافة موعد
@@ -294,7 +363,8 @@ class IntentDataset(Dataset):
         self,
         db_path: str = "agent_data.db",
         processor: MultilingualTextProcessor = None,
-        augment: bool = True
+        augment: bool = True,
+        cache_dir: Optional[str] = CORPUS_CACHE_DIR
     ):
         self.db_path = db_path
         self.processor = processor or MultilingualTextProcessor()
@@ -309,6 +379,21 @@ class IntentDataset(Dataset):
         if not self.processor.word2idx or len(self.processor.word2idx) <= 4:
             texts = [s for s, _ in self.samples]
             self.processor.build_vocabulary(texts)
+        
+        self._encode_corpus(cache_dir)
+    
+    def _encode_corpus(self, cache_dir: Optional[str]):
+        """ترميز كل العينات مرة واحدة (مفتاح القرص: القاموس + العينات)"""
+        key = corpus_key(self.samples, self.processor.vocabulary_hash(), self.processor.max_seq_length)
+        arrays = load_or_encode(
+            key,
+            self.samples,
+            self.INTENT_LABELS,
+            lambda texts: {'input_ids': self.processor.encode_batch(texts).numpy()},
+            cache_dir
+        )
+        self.inputs = torch.from_numpy(arrays['input_ids'])
+        self.labels = torch.from_numpy(arrays['labels'])
     
     def _load_from_database(self):
         """تحميل البيانات من قاعدة البيانات"""
@@ -340,6 +425,8 @@ class IntentDataset(Dataset):
     
     def _add_synthetic_data(self):
         """إضافة بيانات تدريب صناعية موسعة"""
+        self._rng = random.Random(self.AUGMENT_SEED)
+        
         synthetic_data = {
             'add_appointment': [
                 # العربية - أكثر تنوعاً
@@ -667,10 +754,18 @@ class IntentDataset(Dataset):
         
         logger.info(f"✅ إجمالي العينات: {len(self.samples)}")
     
+    @classmethod
+    def synthetic_samples(cls, augment: bool = False) -> List[Tuple[str, str]]:
+        """البيانات الصناعية وحدها (بدون قاعدة البيانات) - للتقييم والمقارنة"""
+        dataset = cls.__new__(cls)
+        dataset.samples = []
+        dataset.labels = []
+        dataset.augment = augment
+        dataset._add_synthetic_data()
+        return dataset.samples
+    
     def _augment_text(self, text: str) -> str:
         """توسيع البيانات بتنوع أكبر"""
-        import random
-        
         augmentations = [
             lambda t: t.lower(),
             lambda t: t.upper(),
@@ -688,10 +783,10 @@ class IntentDataset(Dataset):
         ]
         
         # اختيار 1-2 تحويلات عشوائية
-        num_augs = random.randint(1, 2)
+        num_augs = self._rng.randint(1, 2)
         result = text
         for _ in range(num_augs):
-            aug_func = random.choice(augmentations)
+            aug_func = self._rng.choice(augmentations)
             result = aug_func(result)
         
         return result
@@ -700,15 +795,13 @@ class IntentDataset(Dataset):
         return len(self.samples)
     
     def __getitem__(self, idx):
-        text, intent = self.samples[idx]
-        
-        # تحويل النص
-        encoded = self.processor.encode(text)
-        
-        # تحويل النية إلى رقم
-        label = self.INTENT_LABELS.index(intent) if intent in self.INTENT_LABELS else len(self.INTENT_LABELS) - 1
-        
-        return encoded, torch.tensor(label, dtype=torch.long)
+        return self.inputs[idx], self.labels[idx]
+
+
+@lru_cache(maxsize=1)
+def _synthetic_corpus() -> Tuple[Tuple[str, str], ...]:
+    """البيانات الصناعية مع التوسيع (تُولّد مرة واحدة لكل عملية)"""
+    return tuple(IntentDataset.synthetic_samples(augment=True))
 
 
 # ==========================================
@@ -723,21 +816,37 @@ class SmartIntentClassifier:
         model_path: str = "models/intent_classifier.pth",
         processor_path: str = "models/text_processor.pkl",
         db_path: str = "agent_data.db",
-        model_type: str = "lstm"  # "lstm" or "cnn"
+        model_type: str = "lstm",  # "lstm" or "cnn"
+        backend: str = "eager",  # eager | int8 | torchscript | onnx
+        registry: Optional[ModelRegistry] = None
     ):
         self.model_path = model_path
         self.processor_path = processor_path
         self.db_path = db_path
         self.model_type = model_type
         
+        # السجل: كل حفظ يُنشر كإصدار جديد (الإصدار المحمّل لا يُعدّل)
+        self.registry = registry
+        self.registry_version = Path(model_path).parent.name if is_published(model_path) else None
+        
         self.processor = MultilingualTextProcessor()
         self.model = None
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
+        # واجهة الاستدلال (النموذج المُصدَّر - على CPU)
+        self.requested_backend = backend
+        self.backend = 'eager'
+        self.inference_model = None
+        
+        # Cache النتائج (يُفرغ عند تغيّر إصدار النموذج أو الواجهة)
+        self.model_version = None
+        self.prediction_cache = PredictionCache(maxsize=2048)
+        
         self.intent_labels = IntentDataset.INTENT_LABELS
         
         # محاولة تحميل نموذج موجود
         self._load_model()
+        self.set_backend(backend)
     
     def _load_model(self):
         """تحميل النموذج المحفوظ"""
@@ -747,7 +856,8 @@ class SmartIntentClassifier:
                 logger.info("✅ تم تحميل معالج النصوص")
             
             if Path(self.model_path).exists():
-                checkpoint = torch.load(self.model_path, map_location=self.device)
+                # mmap: الأوزان تُشارك بين عمليات البوت على نفس الجهاز
+                state_dict, metadata = load_checkpoint(self.model_path, self.device)
                 
                 vocab_size = len(self.processor.word2idx)
                 num_intents = len(self.intent_labels)
@@ -757,9 +867,10 @@ class SmartIntentClassifier:
                 else:
                     self.model = IntentClassifierCNN(vocab_size, num_intents=num_intents)
                 
-                self.model.load_state_dict(checkpoint['model_state_dict'])
+                assign_state_dict(self.model, state_dict)
                 self.model.to(self.device)
                 self.model.eval()
+                self.model_version = metadata.get('timestamp')
                 
                 logger.info(f"✅ تم تحميل النموذج من {self.model_path}")
             else:
@@ -775,12 +886,17 @@ class SmartIntentClassifier:
         learning_rate: float = 0.002,
         validation_split: float = 0.15
     ) -> Dict:
-        """تدريب النموذج"""
+        """
+        تدريب النموذج من الصفر
+        
+        يُدرّب نموذجاً جديداً منفصلاً؛ النموذج المنشور يخدم التنبؤات حتى
+        النهاية ثم يُستبدل بأفضل نسخة بإسناد واحد.
+        """
         print("\n" + "="*70)
         print("🧠 بدء تدريب نموذج تصنيف النوايا")
         print("="*70)
         
-        # تحميل البيانات
+        # تحميل البيانات (قاموس جديد فقط إذا لم يوجد نموذج منشور)
         dataset = IntentDataset(self.db_path, self.processor)
         
         if len(dataset) < 50:
@@ -806,26 +922,27 @@ class SmartIntentClassifier:
         vocab_size = len(self.processor.word2idx)
         
         if self.model_type == "lstm":
-            self.model = IntentClassifierLSTM(vocab_size, num_intents=len(self.intent_labels))
+            model = IntentClassifierLSTM(vocab_size, num_intents=len(self.intent_labels))
         else:
-            self.model = IntentClassifierCNN(vocab_size, num_intents=len(self.intent_labels))
+            model = IntentClassifierCNN(vocab_size, num_intents=len(self.intent_labels))
         
-        self.model.to(self.device)
+        model.to(self.device)
         
         # Optimizer و Loss
-        optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
+        optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
         scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=3)
         criterion = nn.CrossEntropyLoss()
         
         # التدريب
         history = {'train_loss': [], 'val_loss': [], 'val_acc': []}
         best_val_acc = 0
+        best_state = None
         
         print(f"\n{'─'*70}")
         
         for epoch in range(epochs):
             # Training
-            self.model.train()
+            model.train()
             train_loss = 0
             
             for batch_x, batch_y in train_loader:
@@ -834,16 +951,13 @@ class SmartIntentClassifier:
                 
                 optimizer.zero_grad()
                 
-                if self.model_type == "lstm":
-                    outputs, _ = self.model(batch_x)
-                else:
-                    outputs = self.model(batch_x)
+                outputs = self._logits(model, batch_x)
                 
                 loss = criterion(outputs, batch_y)
                 loss.backward()
                 
                 # Gradient clipping
-                torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
+                torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
                 
                 optimizer.step()
                 train_loss += loss.item()
@@ -851,7 +965,7 @@ class SmartIntentClassifier:
             train_loss /= len(train_loader)
             
             # Validation
-            self.model.eval()
+            model.eval()
             val_loss = 0
             correct = 0
             total = 0
@@ -861,10 +975,7 @@ class SmartIntentClassifier:
                     batch_x = batch_x.to(self.device)
                     batch_y = batch_y.to(self.device)
                     
-                    if self.model_type == "lstm":
-                        outputs, _ = self.model(batch_x)
-                    else:
-                        outputs = self.model(batch_x)
+                    outputs = self._logits(model, batch_x)
                     
                     loss = criterion(outputs, batch_y)
                     val_loss += loss.item()
@@ -888,10 +999,10 @@ class SmartIntentClassifier:
                   f"Val Loss: {val_loss:.4f} │ "
                   f"Val Acc: {val_acc:.1f}%", end="")
             
-            # حفظ أفضل نموذج
+            # أفضل نسخة تبقى في الذاكرة (الحفظ والتصدير مرة واحدة بعد التدريب)
             if val_acc > best_val_acc:
                 best_val_acc = val_acc
-                self._save_model()
+                best_state = copy.deepcopy(model.state_dict())
                 print(" ⭐ Best!")
             else:
                 print()
@@ -900,25 +1011,313 @@ class SmartIntentClassifier:
         print(f"\n🎉 انتهى التدريب!")
         print(f"⭐ أفضل دقة: {best_val_acc:.1f}%")
         
+        # حفظ أفضل نسخة وتصديرها، ثم تبديل النموذج المنشور وواجهة الاستدلال
+        if best_state is not None:
+            model.load_state_dict(best_state)
+        model.eval()
+        self._save_model(model, metrics={'mode': 'full', 'accuracy': best_val_acc})
+        self.model = model
+        self.set_backend(self.requested_backend)
+        
         return {
             'success': True,
             'best_accuracy': best_val_acc,
+            'version': self.registry_version,
             'history': history
         }
     
-    def _save_model(self):
-        """حفظ النموذج"""
-        Path(self.model_path).parent.mkdir(parents=True, exist_ok=True)
+    def _logits(self, model: nn.Module, batch_x: torch.Tensor) -> torch.Tensor:
+        """مخرجات النموذج (LSTM يُرجع أيضاً أوزان attention)"""
+        if self.model_type == "lstm":
+            outputs, _ = model(batch_x)
+            return outputs
+        return model(batch_x)
+    
+    def _evaluate(
+        self,
+        model: nn.Module,
+        processor: MultilingualTextProcessor,
+        samples: List[Tuple[str, str]],
+        batch_size: int = 128
+    ) -> float:
+        """دقة نموذج على عينات (نسبة مئوية)"""
+        if not samples:
+            return 0.0
+        
+        model.eval()
+        correct = 0
+        
+        with torch.no_grad():
+            for i in range(0, len(samples), batch_size):
+                chunk = samples[i:i + batch_size]
+                batch_x = processor.encode_batch([text for text, _ in chunk]).to(self.device)
+                predicted = self._logits(model, batch_x).argmax(dim=1).tolist()
+                correct += sum(
+                    self.intent_labels[idx] == intent
+                    for idx, (_, intent) in zip(predicted, chunk)
+                )
+        
+        return 100 * correct / len(samples)
+    
+    def _replay_samples(self, size: int) -> List[Tuple[str, str]]:
+        """عينة عشوائية من التفاعلات المخزنة + البيانات الصناعية (للمراجعة والتقييم)"""
+        samples = list(_synthetic_corpus())
+        
+        try:
+            conn = sqlite3.connect(self.db_path)
+            rows = conn.execute('''
+                SELECT user_message, intent
+                FROM interactions
+                WHERE intent IS NOT NULL AND intent != ''
+                ORDER BY RANDOM()
+                LIMIT ?
+            ''', (size,)).fetchall()
+            conn.close()
+            samples.extend((message, intent) for message, intent in rows if intent in self.intent_labels)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ خطأ في تحميل عينات المراجعة: {e}")
+        
+        return samples
+    
+    def fine_tune(
+        self,
+        samples: List[Tuple[str, str]],
+        epochs: int = 3,
+        batch_size: int = 16,
+        learning_rate: float = 0.0005,
+        replay_size: int = 512,
+        holdout_size: int = 256,
+        correction_weight: int = 3
+    ) -> Dict:
+        """
+        تدريب تزايدي (warm-start) من النموذج المنشور
+        
+        يُدرّب نسخة من النموذج على العينات الجديدة (التصحيحات) مع عينة
+        مراجعة من البيانات القديمة، ثم يقيسها على بيانات محجوزة. الأوزان
+        الجديدة تُنشر فقط إذا لم تنخفض الدقة؛ النموذج الحالي يخدم التنبؤات
+        طوال التدريب.
+        
+        Args:
+            samples: [(النص, النية الصحيحة)]
+            epochs: عدد الدورات (قليلة - التدريب يبدأ من أوزان مدربة)
+            replay_size: عدد التفاعلات القديمة المسحوبة للمراجعة
+            holdout_size: عدد العينات المحجوزة للتقييم (لا يُدرّب عليها)
+            correction_weight: تكرار كل تصحيح في بيانات التدريب
+        
+        Returns:
+            Dict: promoted, baseline_accuracy, best_accuracy, corrections_accuracy
+        """
+        if self.model is None:
+            return {'success': False, 'reason': 'no_checkpoint'}
+        
+        samples = [(text, intent) for text, intent in samples if intent in self.intent_labels]
+        if not samples:
+            return {'success': False, 'reason': 'no_samples'}
+        
+        start = time.perf_counter()
+        
+        # بيانات المراجعة: جزء محجوز للتقييم والباقي يُخلط مع التصحيحات
+        replay = self._replay_samples(replay_size)
+        random.shuffle(replay)
+        holdout, replay = replay[:holdout_size], replay[holdout_size:holdout_size + replay_size]
+        train_samples = samples * correction_weight + replay
+        random.shuffle(train_samples)
+        
+        # نسخ (النموذج المنشور يبقى كما هو حتى الترقية)
+        processor = copy.deepcopy(self.processor)
+        candidate = copy.deepcopy(self.model)
+        
+        # كلمات جديدة في التصحيحات: توسيع الـ embedding (الصفوف القديمة كما هي)
+        if processor.extend_vocabulary([text for text, _ in samples]):
+            old = candidate.embedding
+            candidate.embedding = nn.Embedding(len(processor.word2idx), old.embedding_dim, padding_idx=0)
+            with torch.no_grad():
+                candidate.embedding.weight[:old.num_embeddings] = old.weight
+            candidate.to(self.device)
+        
+        baseline_accuracy = self._evaluate(self.model, self.processor, holdout)
+        
+        optimizer = torch.optim.Adam(candidate.parameters(), lr=learning_rate)
+        criterion = nn.CrossEntropyLoss()
+        
+        # ترميز مرة واحدة (نفس البيانات في كل الدورات)
+        inputs = processor.encode_batch([text for text, _ in train_samples])
+        targets = torch.tensor([self.intent_labels.index(intent) for _, intent in train_samples], dtype=torch.long)
+        
+        history = {'train_loss': []}
         
-        torch.save({
-            'model_state_dict': self.model.state_dict(),
+        for epoch in range(epochs):
+            candidate.train()
+            permutation = torch.randperm(len(train_samples))
+            train_loss = 0
+            batches = 0
+            
+            for i in range(0, len(train_samples), batch_size):
+                index = permutation[i:i + batch_size]
+                batch_x = inputs[index].to(self.device)
+                batch_y = targets[index].to(self.device)
+                
+                optimizer.zero_grad()
+                loss = criterion(self._logits(candidate, batch_x), batch_y)
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(candidate.parameters(), max_norm=1.0)
+                optimizer.step()
+                
+                train_loss += loss.item()
+                batches += 1
+            
+            history['train_loss'].append(train_loss / batches)
+        
+        candidate_accuracy = self._evaluate(candidate, processor, holdout)
+        corrections_accuracy = self._evaluate(candidate, processor, samples)
+        promoted = candidate_accuracy >= baseline_accuracy
+        
+        if promoted:
+            candidate.eval()
+            self._save_model(candidate, processor, metrics={
+                'mode': 'incremental',
+                'accuracy': candidate_accuracy,
+                'baseline_accuracy': baseline_accuracy,
+                'samples_count': len(train_samples)
+            })
+            
+            # النموذج أولاً ثم إيقاف الواجهة المُصدَّرة القديمة: المعالج
+            # الجديد لا يُنتج فهارس خارج الـ embedding المستخدم
+            self.model = candidate
+            self.inference_model = None
+            self.processor = processor
+            self.set_backend(self.requested_backend)
+        
+        duration = time.perf_counter() - start
+        logger.info(
+            f"{'✅' if promoted else '⚠️'} تدريب تزايدي: {len(samples)} تصحيح + {len(replay)} مراجعة "
+            f"| الدقة {baseline_accuracy:.1f}% → {candidate_accuracy:.1f}% "
+            f"| {'نُشر' if promoted else 'رُفض (انخفاض الدقة)'} في {duration:.1f}ث"
+        )
+        
+        return {
+            'success': promoted,
+            'promoted': promoted,
+            'reason': None if promoted else 'accuracy_regression',
+            'baseline_accuracy': baseline_accuracy,
+            'best_accuracy': candidate_accuracy,
+            'corrections_accuracy': corrections_accuracy,
+            'samples_count': len(train_samples),
+            'version': self.registry_version if promoted else None,
+            'duration_s': duration,
+            'history': history
+        }
+    
+    def _save_model(
+        self,
+        model: Optional[nn.Module] = None,
+        processor: Optional[MultilingualTextProcessor] = None,
+        metrics: Optional[Dict] = None
+    ):
+        """
+        حفظ النموذج (الافتراضي: المنشور) وتصديره
+        
+        مع السجل: إصدار جديد كامل (الأوزان + المعالج + التصدير) يُنشر ذرياً
+        ثم تنتقل المسارات إليه. بدون السجل: الكتابة في المسارات الحالية،
+        إلا إذا كانت داخل إصدار منشور (RuntimeError).
+        """
+        model = model or self.model
+        processor = processor or self.processor
+        self.model_version = datetime.now().isoformat()
+        
+        if self.registry is None:
+            if is_published(self.model_path):
+                raise RuntimeError(f"Published model version is immutable: {self.model_path}")
+            self._write_model_files(model, processor, self.model_path, self.processor_path)
+            return
+        
+        manifest = self.registry.commit(
+            INTENT_CLASSIFIER,
+            lambda staging: self._write_model_files(
+                model, processor,
+                str(staging / model_filename()),
+                str(staging / PROCESSOR_FILE)
+            ),
+            labels=list(self.intent_labels),
+            vocab_hash=processor.vocabulary_hash(),
+            model_type=self.model_type,
+            metrics=metrics or {},
+            parent=self.registry_version
+        )
+        
+        directory = self.registry.version_dir(INTENT_CLASSIFIER, manifest.version)
+        self.model_path = str(directory / manifest.files['model'])
+        self.processor_path = str(directory / manifest.files['processor'])
+        self.registry_version = manifest.version
+    
+    def _write_model_files(
+        self,
+        model: nn.Module,
+        processor: MultilingualTextProcessor,
+        model_path: str,
+        processor_path: str
+    ) -> Dict[str, str]:
+        """
+        كتابة الأوزان والمعالج والنماذج المُصدَّرة
+        
+        Returns:
+            Dict: {الدور: اسم الملف} (ملفات الـ manifest)
+        """
+        save_checkpoint(model_path, model.state_dict(), {
             'model_type': self.model_type,
             'intent_labels': self.intent_labels,
-            'timestamp': datetime.now().isoformat()
-        }, self.model_path)
+            'timestamp': self.model_version
+        })
+        
+        processor.save(processor_path)
+        logger.info(f"✅ تم حفظ النموذج في {model_path}")
+        
+        # تصدير int8 / TorchScript / ONNX لواجهات CPU
+        example = processor.encode_batch(["موعد غدا الساعة 3"])
+        output_names = ['logits', 'attention'] if self.model_type == "lstm" else ['logits']
+        export_model(
+            model,
+            model_path,
+            (example,),
+            input_names=['input_ids'],
+            output_names=output_names,
+            dynamic_axes={name: {0: 'batch'} for name in ['input_ids'] + output_names}
+        )
+        
+        return {'model': Path(model_path).name, 'processor': Path(processor_path).name}
+    
+    def set_backend(self, backend: str) -> bool:
+        """
+        اختيار واجهة الاستدلال (eager | int8 | torchscript | onnx)
+        
+        Returns:
+            bool: True إذا فُعّلت الواجهة، False عند الرجوع إلى eager
+        """
+        self.inference_model = None
+        self.backend = 'eager'
+        
+        if backend != 'eager':
+            try:
+                self.inference_model = load_inference_model(backend, self.model_path)
+                self.backend = backend
+                logger.info(f"✅ واجهة الاستدلال: {backend}")
+            except Exception as e:
+                logger.warning(f"⚠️ تعذر تحميل واجهة {backend}: {e} - استخدام eager")
+        
+        self._stamp_cache()
+        return self.backend == backend
+    
+    def _stamp_cache(self):
+        """ختم الـ cache بإصدار النموذج والواجهة (نتائج eager و int8 تختلف قليلاً)"""
+        self.prediction_cache.set_version(f"{self.model_version}|{self.backend}")
+    
+    def _cache_key(self, text: str) -> Tuple[str, ...]:
+        """
+        مفتاح الـ cache: الكلمات بعد tokenize (التي تُوحّد العربية)
         
-        self.processor.save(self.processor_path)
-        logger.info(f"✅ تم حفظ النموذج في {self.model_path}")
+        نصان بنفس الكلمات يُنتجان نفس مدخلات النموذج تماماً.
+        """
+        return tuple(self.processor.tokenize(text))
     
     def predict(self, text: str) -> Dict:
         """
@@ -932,110 +1331,139 @@ class SmartIntentClassifier:
                 'method': 'ml' أو 'fallback'
             }
         """
+        return self.predict_batch([text])[0]
+    
+    def predict_batch(self, texts: List[str]) -> List[Dict]:
+        """
+        التنبؤ بنوايا عدة نصوص في تمريرة واحدة
+        
+        النصوص المكررة (في الـ cache أو داخل الدفعة) لا تمر بالنموذج؛
+        softmax واحد للبقية، واستخراج النتائج عبر NumPy بدلاً من .item().
+        
+        Returns:
+            List[dict]: نتيجة لكل نص بنفس ترتيب المدخلات (نفس صيغة predict)
+        """
+        if not texts:
+            return []
+        
         # إذا لم يكن هناك نموذج، استخدم القواعد
         if self.model is None:
-            return self._rule_based_classify(text)
-        
-        try:
-            self.model.eval()
+            return [self._rule_based_classify(text) for text in texts]
+        
+        # الإصدار قبل الحساب: نموذج يُنشر أثناء الدفعة لا يستقبل نتائجها
+        version = self.prediction_cache.version
+        keys = [self._cache_key(text) for text in texts]
+        entries = [self.prediction_cache.get(key) for key in keys]
+        
+        # نص واحد لكل مفتاح غير مخزن
+        pending = {}
+        for text, key, entry in zip(texts, keys, entries):
+            if entry is None:
+                pending.setdefault(key, text)
+        
+        if pending:
+            try:
+                scored = dict(zip(pending, self._score_batch(list(pending.values()))))
+            except Exception as e:
+                logger.error(f"❌ خطأ في التنبؤ: {e}")
+                return [self._rule_based_classify(text) for text in texts]
             
-            with torch.no_grad():
-                encoded = self.processor.encode(text).unsqueeze(0).to(self.device)
-                
-                if self.model_type == "lstm":
-                    outputs, attention = self.model(encoded)
-                else:
-                    outputs = self.model(encoded)
-                
-                probabilities = F.softmax(outputs, dim=1)[0]
-                confidence, predicted = torch.max(probabilities, 0)
-                
-                # تحويل إلى dict
-                all_scores = {
-                    self.intent_labels[i]: probabilities[i].item()
-                    for i in range(len(self.intent_labels))
-                }
-                
-                predicted_intent = self.intent_labels[predicted.item()]
-                confidence_score = confidence.item()
-                
-                # إذا كانت الثقة منخفضة، استخدم القواعد كـ fallback
-                if confidence_score < 0.5:
-                    rule_result = self._rule_based_classify(text)
-                    if rule_result['confidence'] > confidence_score:
-                        return rule_result
-                
-                return {
-                    'intent': predicted_intent,
-                    'confidence': confidence_score,
-                    'all_scores': all_scores,
-                    'method': 'ml'
-                }
-                
-        except Exception as e:
-            logger.error(f"❌ خطأ في التنبؤ: {e}")
-            return self._rule_based_classify(text)
-    
-    def _rule_based_classify(self, text: str) -> Dict:
-        """تصنيف بالقواعد (fallback)"""
-        text_lower = text.lower()
+            self.prediction_cache.set_many_if_version(scored, version)
+            
+            entries = [entry or scored[key] for key, entry in zip(keys, entries)]
         
-        # قواعد التصنيف
-        rules = {
-            'add_appointment': [
-                'موعد', 'اجتماع', 'لقاء', 'مقابلة', 'أضف', 'سجل', 'حجز',
-                'rdv', 'rendez-vous', 'réunion', 'ajouter',
-                'appointment', 'meeting', 'schedule', 'book'
-            ],
-            'list_appointments': [
-                'عرض مواعيدي', 'مواعيدي', 'أظهر المواعيد', 'كل مواعيدي',
-                'mes rdv', 'mes rendez-vous', 'afficher',
-                'my appointments', 'show appointments', 'list'
-            ],
-            'check_specific_day': [
-                'مواعيدي اليوم', 'مواعيدي غدا', 'مواعيد يوم',
-                'rdv aujourd', 'rdv demain',
-                'today', 'tomorrow', 'appointments on'
-            ],
-            'cancel_appointment': [
-                'إلغاء', 'احذف', 'حذف', 'ألغي',
-                'annuler', 'supprimer',
-                'cancel', 'delete', 'remove'
-            ],
-            'greeting': [
-                'مرحبا', 'السلام', 'صباح', 'مساء', 'أهلا',
-                'bonjour', 'salut', 'bonsoir',
-                'hello', 'hi', 'hey', 'good morning'
-            ],
-            'thanks': [
-                'شكرا', 'مشكور',
-                'merci',
-                'thanks', 'thank you'
-            ],
-            'help': [
-                'مساعدة', 'ساعدني', 'كيف',
-                'aide', 'comment',
-                'help', 'how'
-            ]
-        }
+        return [self._build_result(text, entry) for text, entry in zip(texts, entries)]
+    
+    def _score_batch(self, texts: List[str]) -> List[Dict]:
+        """تمريرة النموذج: نتيجة ML خام لكل نص (قبل fallback القواعد)"""
+        self.model.eval()
         
-        best_intent = 'unknown'
-        best_score = 0
+        # النماذج المُصدَّرة تعمل على CPU
+        if self.inference_model is not None:
+            model, device = self.inference_model, torch.device('cpu')
+        else:
+            model, device = self.model, self.device
         
-        for intent, keywords in rules.items():
-            matches = sum(1 for kw in keywords if kw in text_lower)
-            score = matches / len(keywords) if keywords else 0
+        with torch.no_grad():
+            encoded = self.processor.encode_batch(texts).to(device)
             
-            if score > best_score:
-                best_score = score
-                best_intent = intent
+            if self.model_type == "lstm":
+                outputs, attention = model(encoded)
+            else:
+                outputs = model(encoded)
+            
+            probabilities = F.softmax(outputs, dim=1).cpu().numpy()
         
-        return {
-            'intent': best_intent,
-            'confidence': min(best_score * 2, 0.9),  # تحويل إلى نسبة ثقة
-            'all_scores': {},
-            'method': 'rule_based'
-        }
+        predicted = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(texts)), predicted]
+        
+        return [
+            {
+                'intent': self.intent_labels[index],
+                'confidence': confidence_score,
+                'all_scores': dict(zip(self.intent_labels, scores)),
+                'method': 'ml'
+            }
+            for scores, index, confidence_score in zip(
+                probabilities.tolist(), predicted.tolist(), confidences.tolist()
+            )
+        ]
+    
+    def _build_result(self, text: str, entry: Dict) -> Dict:
+        """نتيجة نص واحد من نتيجة ML (مخزنة أو جديدة)"""
+        # إذا كانت الثقة منخفضة، استخدم القواعد كـ fallback
+        if entry['confidence'] < 0.5:
+            rule_result = self._rule_based_classify(text)
+            if rule_result['confidence'] > entry['confidence']:
+                return rule_result
+        
+        # نسخة حتى لا يُعدّل المستدعي القيمة المخزنة
+        return {**entry, 'all_scores': dict(entry['all_scores'])}
+    
+    def _rule_based_classify(self, text: str) -> Dict:
+        """تصنيف بالقواعد (fallback)"""
+        return rule_based_classify(text)
+
+
+# ==========================================
+# قياس سرعة معالج النصوص
+# ==========================================
+
+def benchmark_text_processor(
+    processor: Optional[MultilingualTextProcessor] = None,
+    texts: Optional[List[str]] = None,
+    batch_size: int = 256
+) -> Dict:
+    """
+    سرعة الترميز (نص/ثانية): نص واحد في كل استدعاء مقابل دفعات
+    
+    Returns:
+        Dict: texts, single_per_s, batch_per_s, speedup
+    """
+    if texts is None:
+        # نصوص فريدة (لا يخدمها إزالة التكرار داخل الدفعة)
+        texts = [f"{text} {i}" for i, (text, _) in enumerate(_synthetic_corpus())]
+    
+    if processor is None:
+        processor = MultilingualTextProcessor()
+        processor.build_vocabulary(texts)
+    
+    start = time.perf_counter()
+    for text in texts:
+        processor.encode(text)
+    single = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        processor.encode_batch(texts[i:i + batch_size])
+    batch = time.perf_counter() - start
+    
+    return {
+        'texts': len(texts),
+        'single_per_s': len(texts) / single,
+        'batch_per_s': len(texts) / batch,
+        'speedup': single / batch
+    }
 
 
 # ==========================================
@@ -1047,6 +1475,11 @@ if __name__ == "__main__":
     print("🧪 اختبار نظام تصنيف النوايا الذكي")
     print("="*70)
     
+    # سرعة معالج النصوص
+    speed = benchmark_text_processor()
+    print(f"\n⚡ معالج النصوص ({speed['texts']} نص): فردي {speed['single_per_s']:,.0f} نص/ث"
+          f" → دفعي {speed['batch_per_s']:,.0f} نص/ث (×{speed['speedup']:.1f})")
+    
     # إنشاء المصنف
     classifier = SmartIntentClassifier(model_type="lstm")
     
@@ -1077,6 +1510,47 @@ if __name__ == "__main__":
             print(f"   → النية: {result['intent']}")
             print(f"   → الثقة: {result['confidence']*100:.1f}%")
             print(f"   → الطريقة: {result['method']}")
+        
+        # مقارنة التنبؤ الفردي والدفعي
+        import time
+        
+        # نصوص فريدة حتى لا يخدمها الـ cache
+        corpus = [f"{msg} {i}" for i in range(50) for msg in test_messages]
+        
+        classifier.prediction_cache.clear()
+        start = time.perf_counter()
+        for msg in corpus:
+            classifier.predict(msg)
+        single_time = time.perf_counter() - start
+        
+        classifier.prediction_cache.clear()
+        start = time.perf_counter()
+        for i in range(0, len(corpus), 32):
+            classifier.predict_batch(corpus[i:i + 32])
+        batch_time = time.perf_counter() - start
+        
+        # رسائل متكررة (من الـ cache)
+        start = time.perf_counter()
+        for msg in corpus:
+            classifier.predict(msg)
+        cached_time = time.perf_counter() - start
+        
+        print("\n" + "─"*70)
+        print(f"⚡ {len(corpus)} رسالة: فردي {len(corpus) / single_time:,.0f} رسالة/ث"
+              f" → دفعي (32) {len(corpus) / batch_time:,.0f} رسالة/ث"
+              f" → مكرر (cache) {len(corpus) / cached_time:,.0f} رسالة/ث")
+        print(f"💾 {classifier.prediction_cache.get_stats()}")
+        
+        # تدريب تزايدي على تصحيحات جديدة (بدون إعادة التدريب من الصفر)
+        corrections = [
+            ("احجز لي جلسة مع الطبيب", 'add_appointment'),
+            ("شو عندي بكرة", 'list_appointments'),
+            ("annule ma réunion", 'cancel_appointment')
+        ]
+        tuned = classifier.fine_tune(corrections)
+        print(f"\n🔁 تدريب تزايدي: {tuned['baseline_accuracy']:.1f}% → {tuned['best_accuracy']:.1f}%"
+              f" | التصحيحات {tuned['corrections_accuracy']:.0f}%"
+              f" | {'نُشر' if tuned['promoted'] else 'رُفض'} في {tuned['duration_s']:.1f}ث")
     
     print("\n" + "="*70)
     print("✅ الاختبار انتهى!")
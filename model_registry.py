@@ -0,0 +1,386 @@
+# model_registry.py
+"""
+سجل إصدارات نماذج النوايا
+✅ كل إصدار مجلد مستقل: models/registry/<name>/<version>/ + manifest.json
+✅ Manifest: النوايا، بصمة القاموس، المقاييس، الصيغة، الإصدار السابق
+✅ نشر ذري: مجلد staging كامل ← rename ← تحديث المؤشر current.json بـ os.replace
+✅ تحميل lazy بـ mmap (torch.load(mmap=True) أو safetensors): عدة عمليات
+   للبوت على نفس الجهاز تتشارك صفحات النموذج بدل نسخة لكل عملية
+
+الوحدة لا تستورد torch (تُستخدم في مسار الإقلاع) - الاستيراد داخل الدوال.
+
+التخطيط:
+    models/registry/intent_classifier/
+        current.json                 ← {"version": "..."}
+        20251120-180958-123456/
+            manifest.json
+            model.safetensors | model.pth
+            processor.pkl
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+REGISTRY_DIR = 'registry'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_POINTER = 'current.json'
+STAGING_PREFIX = '.staging-'
+
+# الإصدارات المحفوظة لكل نموذج (الحالي دائماً محفوظ)
+KEEP_VERSIONS = 5
+
+# أسماء النماذج في السجل
+INTENT_CLASSIFIER = 'intent_classifier'
+BERT_INTENT = 'bert_intent'
+PROCESSOR_FILE = 'processor.pkl'
+
+# الملفات القديمة خارج السجل (قبل الترحيل)
+LEGACY_FILES = {
+    INTENT_CLASSIFIER: {'model': 'intent_classifier.pth', 'processor': 'text_processor.pkl'},
+    BERT_INTENT: {'model': 'bert_intent.pth'}
+}
+
+
+def safetensors_available() -> bool:
+    """safetensors اختيارية (بدونها: torch.load(mmap=True))"""
+    return importlib.util.find_spec('safetensors') is not None
+
+
+def model_format() -> str:
+    """صيغة حفظ الأوزان للإصدارات الجديدة"""
+    return 'safetensors' if safetensors_available() else 'torch'
+
+
+def model_filename(fmt: Optional[str] = None) -> str:
+    return 'model.safetensors' if (fmt or model_format()) == 'safetensors' else 'model.pth'
+
+
+def is_published(path: str) -> bool:
+    """هل الملف داخل إصدار منشور (غير قابل للتعديل)؟"""
+    return (Path(path).parent / MANIFEST_FILE).exists()
+
+
+def new_version() -> str:
+    """معرف إصدار قابل للترتيب زمنياً"""
+    return datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+
+def _fsync_file(path: Path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path):
+    """تثبيت إعادة التسمية على القرص (غير مدعوم على Windows)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path: Path, data: Dict):
+    """كتابة JSON ذرياً (tmp + fsync + os.replace)"""
+    tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ==========================================
+# حفظ وتحميل الأوزان (ذري + mmap)
+# ==========================================
+
+def save_checkpoint(path: str, state_dict: Dict, metadata: Optional[Dict[str, Any]] = None):
+    """
+    حفظ الأوزان ذرياً (القارئ لا يرى ملفاً نصف مكتوب)
+
+    .safetensors: الأوزان فقط + metadata نصية؛ غير ذلك: torch.save للصيغة القديمة
+    """
+    import torch
+
+    metadata = metadata or {}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp{os.getpid()}")
+
+    if path.suffix == '.safetensors':
+        from safetensors.torch import save_file
+        save_file(
+            {name: tensor.contiguous() for name, tensor in state_dict.items()},
+            str(tmp_path),
+            metadata={key: json.dumps(value, ensure_ascii=False) for key, value in metadata.items()}
+        )
+    else:
+        torch.save({'model_state_dict': state_dict, **metadata}, tmp_path)
+
+    _fsync_file(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str, map_location=None) -> Tuple[Dict, Dict[str, Any]]:
+    """
+    تحميل الأوزان بـ mmap (الصفحات تُقرأ عند الاستخدام وتُشارك بين العمليات)
+
+    Returns:
+        Tuple: (state_dict, metadata)
+    """
+    import torch
+
+    if str(path).endswith('.safetensors'):
+        from safetensors import safe_open
+        from safetensors.torch import load_file
+
+        with safe_open(str(path), framework='pt') as f:
+            metadata = {key: json.loads(value) for key, value in (f.metadata() or {}).items()}
+
+        device = str(map_location) if map_location is not None else 'cpu'
+        return load_file(str(path), device=device), metadata
+
+    try:
+        checkpoint = torch.load(path, map_location=map_location, mmap=True, weights_only=True)
+    except Exception as e:
+        # torch < 2.1 أو ملف بالصيغة القديمة (غير zip): تحميل كامل
+        logger.debug(f"mmap غير متاح لـ {path}: {e}")
+        checkpoint = torch.load(path, map_location=map_location)
+
+    state_dict = checkpoint.pop('model_state_dict')
+    return state_dict, checkpoint
+
+
+def assign_state_dict(model, state_dict: Dict):
+    """
+    تحميل الأوزان في النموذج دون نسخ (assign=True يُبقي tensors الـ mmap)
+
+    torch < 2.1: نسخ عادي
+    """
+    try:
+        model.load_state_dict(state_dict, assign=True)
+    except TypeError:
+        model.load_state_dict(state_dict)
+
+
+# ==========================================
+# السجل
+# ==========================================
+
+@dataclass
+class ModelManifest:
+    """وصف إصدار واحد"""
+    name: str
+    version: str
+    format: str  # safetensors | torch
+    files: Dict[str, str]  # الدور ← اسم الملف داخل مجلد الإصدار
+    labels: List[str] = field(default_factory=list)
+    vocab_hash: Optional[str] = None
+    model_type: Optional[str] = None
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    parent: Optional[str] = None  # الإصدار الذي بدأ منه التدريب
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ModelManifest':
+        return cls(**{key: data[key] for key in cls.__dataclass_fields__ if key in data})
+
+
+class ModelRegistry:
+    """
+    سجل إصدارات النماذج
+
+    الكاتب (عامل التدريب) يحضّر الملفات في مجلد staging ثم ينشر؛
+    القارئ (البوت) يقرأ المؤشر ثم الـ manifest ثم يحمّل بـ mmap.
+    """
+
+    def __init__(self, root: str = "models"):
+        self.root = Path(root)
+        self.registry_dir = self.root / REGISTRY_DIR
+
+    def model_dir(self, name: str) -> Path:
+        return self.registry_dir / name
+
+    def version_dir(self, name: str, version: str) -> Path:
+        return self.model_dir(name) / version
+
+    # ------------------------------------------
+    # النشر
+    # ------------------------------------------
+
+    def stage(self, name: str) -> Tuple[str, Path]:
+        """
+        مجلد مؤقت لإصدار جديد (غير مرئي للقراء حتى publish)
+
+        Returns:
+            Tuple: (الإصدار, مسار staging)
+        """
+        version = new_version()
+        staging = self.model_dir(name) / f"{STAGING_PREFIX}{version}"
+        staging.mkdir(parents=True, exist_ok=True)
+        return version, staging
+
+    def publish(self, manifest: ModelManifest, staging: Path) -> ModelManifest:
+        """
+        نشر إصدار: fsync للملفات ← manifest ← rename ← تحديث المؤشر
+
+        القارئ يرى الإصدار السابق أو الجديد كاملاً، ولا يرى ملفات ناقصة.
+        """
+        missing = [role for role, filename in manifest.files.items() if not (staging / filename).exists()]
+        if missing:
+            raise FileNotFoundError(f"Missing artifacts for {manifest.name}: {missing}")
+
+        for path in staging.iterdir():
+            if path.is_file():
+                _fsync_file(path)
+
+        write_json_atomic(staging / MANIFEST_FILE, manifest.to_dict())
+
+        final = self.version_dir(manifest.name, manifest.version)
+        os.rename(staging, final)
+        _fsync_dir(self.model_dir(manifest.name))
+
+        write_json_atomic(self.model_dir(manifest.name) / CURRENT_POINTER, {'version': manifest.version})
+        logger.info(f"✅ نُشر {manifest.name}@{manifest.version} ({manifest.format})")
+
+        self.prune(manifest.name)
+        return manifest
+
+    def commit(self, name: str, write: Callable[[Path], Dict[str, str]], **fields) -> ModelManifest:
+        """
+        نشر إصدار جديد: stage ← write ← publish (staging يُحذف عند أي خطأ)
+
+        Args:
+            write: دالة (مجلد staging) -> {الدور: اسم الملف} تكتب ملفات الإصدار
+            fields: بقية حقول ModelManifest (labels, vocab_hash, metrics, parent...)
+        """
+        version, staging = self.stage(name)
+        try:
+            files = write(staging)
+            fmt = 'safetensors' if files['model'].endswith('.safetensors') else 'torch'
+            return self.publish(
+                ModelManifest(name=name, version=version, format=fmt, files=files, **fields),
+                staging
+            )
+        except BaseException:
+            self.discard(staging)
+            raise
+
+    def discard(self, staging: Path):
+        """حذف staging لتدريب فاشل أو مرفوض"""
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def prune(self, name: str, keep: int = KEEP_VERSIONS):
+        """حذف أقدم الإصدارات (الحالي لا يُحذف)"""
+        current = self.current_version(name)
+        for version in self.versions(name)[:-keep]:
+            if version != current:
+                shutil.rmtree(self.version_dir(name, version), ignore_errors=True)
+
+    # ------------------------------------------
+    # القراءة
+    # ------------------------------------------
+
+    def current_version(self, name: str) -> Optional[str]:
+        try:
+            with open(self.model_dir(name) / CURRENT_POINTER, 'r', encoding='utf-8') as f:
+                return json.load(f)['version']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def versions(self, name: str) -> List[str]:
+        """الإصدارات المنشورة (الأقدم أولاً)"""
+        directory = self.model_dir(name)
+        if not directory.exists():
+            return []
+        return sorted(
+            entry.name for entry in directory.iterdir()
+            if entry.is_dir() and not entry.name.startswith(STAGING_PREFIX)
+            and (entry / MANIFEST_FILE).exists()
+        )
+
+    def manifest(self, name: str, version: Optional[str] = None) -> Optional[ModelManifest]:
+        """manifest إصدار (الافتراضي: الحالي)"""
+        version = version or self.current_version(name)
+        if version is None:
+            return None
+        try:
+            with open(self.version_dir(name, version) / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                return ModelManifest.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def checkpoint(self, name: str) -> Dict:
+        """
+        مسارات التحميل: الإصدار الحالي، أو الملفات القديمة في models/
+
+        Returns:
+            Dict: {'version', 'model_path', 'processor_path', 'manifest'}
+        """
+        manifest = self.manifest(name)
+        if manifest is not None:
+            directory = self.version_dir(name, manifest.version)
+            processor = manifest.files.get('processor')
+            return {
+                'version': manifest.version,
+                'model_path': str(directory / manifest.files['model']),
+                'processor_path': str(directory / processor) if processor else None,
+                'manifest': manifest
+            }
+
+        legacy = LEGACY_FILES.get(name, {'model': f"{name}.pth"})
+        return {
+            'version': None,
+            'model_path': str(self.root / legacy['model']),
+            'processor_path': str(self.root / legacy['processor']) if 'processor' in legacy else None,
+            'manifest': None
+        }
+
+    def get_stats(self, name: str) -> Dict:
+        manifest = self.manifest(name)
+        return {
+            'name': name,
+            'current': manifest.version if manifest else None,
+            'format': manifest.format if manifest else None,
+            'metrics': manifest.metrics if manifest else {},
+            'versions': len(self.versions(name))
+        }
+
+
+if __name__ == "__main__":
+    import sys
+
+    registry = ModelRegistry(sys.argv[1] if len(sys.argv) > 1 else "models")
+
+    print("="*70)
+    print(f"📦 سجل النماذج: {registry.registry_dir}")
+    print("="*70)
+
+    names = sorted(p.name for p in registry.registry_dir.iterdir()) if registry.registry_dir.exists() else []
+    if not names:
+        print("\nℹ️ لا إصدارات منشورة بعد")
+
+    for name in names:
+        current = registry.current_version(name)
+        print(f"\n🧠 {name}")
+        for version in registry.versions(name):
+            manifest = registry.manifest(name, version)
+            marker = "⭐" if version == current else "  "
+            print(f"   {marker} {version} │ {manifest.format:<11} │ {manifest.metrics}")
@@ -0,0 +1,474 @@
+# outbound_governor.py
+"""
+منظّم الرسائل الصادرة - نقطة واحدة لكل استدعاءات Bot API
+✅ ممرات أولوية: تذكير الآن > الردود > التذكيرات المسبقة > الرسوم/التصدير
+✅ تشكيل المعدل: حد عام (~30 رسالة/ثانية) + حد لكل محادثة
+✅ دمج التذكيرات المنتظرة لنفس المحادثة في رسالة واحدة
+✅ احترام RetryAfter وإعادة الإرسال دون إسقاط الترتيب
+✅ مقاييس عمق الطوابير وزمن الانتظار لكل ممر
+
+كل الإرسال يمر عبر event loop البوت: المنظّم يُربط به مرة واحدة (bind)
+ولا يُعاد ربطه. الدوال تُستدعى من داخل ذلك الـ loop فقط؛ من loop آخر
+(thread التذكيرات) يصل ReminderDeliveryPipeline إليه عبر run_coroutine_threadsafe.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+import logging
+
+from reminder_system import AsyncTokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+# الممرات بترتيب الأولوية (الأول يُخدم أولاً)
+LANES = ('now', 'reply', 'advance', 'bulk')
+
+# ممرات تُدمج رسائلها المنتظرة لنفس المحادثة
+COALESCE_LANES = frozenset({'now', 'advance'})
+COALESCE_SEPARATOR = "\n\n➖➖➖➖➖➖➖➖\n\n"
+
+# حد طول رسالة Telegram
+TELEGRAM_MAX_MESSAGE = 4096
+
+
+class _Job:
+    """رسالة منتظرة في ممر"""
+    __slots__ = ('lane', 'chat_id', 'send', 'future', 'bot', 'texts', 'parse_mode', 'enqueued', 'attempts')
+
+    def __init__(self, lane: str, chat_id: int, future: asyncio.Future, send=None,
+                 bot=None, text: Optional[str] = None, parse_mode: Optional[str] = None):
+        self.lane = lane
+        self.chat_id = chat_id
+        self.future = future
+        self.send = send
+        self.bot = bot
+        self.texts = [text] if text is not None else []
+        self.parse_mode = parse_mode
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+    @property
+    def text(self) -> str:
+        return COALESCE_SEPARATOR.join(self.texts)
+
+
+class _ChatPace:
+    """دلو رموز لمحادثة واحدة"""
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class OutboundGovernor:
+    """
+    موزّع واحد لكل الرسائل الصادرة
+
+    Usage:
+        governor = OutboundGovernor()
+        await governor.send_text(bot, chat_id, "مرحبا", lane='reply')
+        await governor.submit(chat_id, lambda: message.reply_photo(photo=chart), lane='bulk')
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float = 30.0,
+        burst: int = 5,
+        chat_rate: float = 1.0,
+        chat_burst: int = 3,
+        max_concurrency: int = 20,
+        max_retries: int = 3
+    ):
+        """
+        Args:
+            rate_per_second: الحد العام للرسائل في الثانية
+            burst: أقصى دفعة عامة (صغيرة حتى لا تتجاوز نافذة Telegram)
+            chat_rate: رسائل/ثانية لكل محادثة
+            chat_burst: أقصى دفعة متتالية لنفس المحادثة
+            max_concurrency: الإرسالات الجارية في نفس الوقت
+            max_retries: محاولات إعادة الإرسال بعد RetryAfter
+        """
+        self.rate_per_second = rate_per_second
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+        self.bucket = AsyncTokenBucket(rate_per_second, capacity=burst)
+
+        # ممر ← {محادثة: طابور} (OrderedDict للتناوب بين المحادثات)
+        self._lanes: Dict[str, 'OrderedDict[int, Deque[_Job]]'] = {lane: OrderedDict() for lane in LANES}
+        self._pace: Dict[int, _ChatPace] = {}
+        self._busy: Set[int] = set()  # رسالة واحدة جارية لكل محادثة = ترتيب محفوظ
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._next_sweep = 0.0
+
+        # إحصائيات
+        self.stats = {
+            'submitted': 0,
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'coalesced': 0
+        }
+        self._peak_depth = {lane: 0 for lane in LANES}
+        self._wait_total = {lane: 0.0 for lane in LANES}
+        self._sent_by_lane = {lane: 0 for lane in LANES}
+
+    # ==========================================
+    # الإرسال
+    # ==========================================
+
+    def send_text(
+        self,
+        bot,
+        chat_id: int,
+        text: str,
+        lane: str = 'reply',
+        parse_mode: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        إرسال نص (تذكيرات 'now'/'advance' المنتظرة لنفس المحادثة تُدمج)
+
+        Returns:
+            Future: نتيجة send_message (المدموجة تتشارك نفس الـ Future)
+        """
+        self._ensure_running()
+
+        if lane in COALESCE_LANES:
+            pending = self._lanes[lane].get(chat_id)
+            if pending:
+                last = pending[-1]
+                if (
+                    last.bot is bot
+                    and last.parse_mode == parse_mode
+                    and len(last.text) + len(COALESCE_SEPARATOR) + len(text) <= TELEGRAM_MAX_MESSAGE
+                ):
+                    last.texts.append(text)
+                    self.stats['coalesced'] += 1
+                    return last.future
+
+        job = _Job(lane, chat_id, self._loop.create_future(), bot=bot, text=text, parse_mode=parse_mode)
+        return self._enqueue(job)
+
+    def submit(
+        self,
+        chat_id: int,
+        send: Callable[[], Awaitable[Any]],
+        lane: str = 'reply'
+    ) -> asyncio.Future:
+        """
+        إرسال عام (صور، ملفات، رد على رسالة)
+
+        Args:
+            send: دالة تُنشئ الاستدعاء عند الدور (تُستدعى من جديد عند إعادة المحاولة)
+        """
+        self._ensure_running()
+        job = _Job(lane, chat_id, self._loop.create_future(), send=send)
+        return self._enqueue(job)
+
+    def _enqueue(self, job: _Job) -> asyncio.Future:
+        if job.lane not in self._lanes:
+            raise ValueError(f"ممر غير معروف: {job.lane} (المتاح: {', '.join(LANES)})")
+
+        self._lanes[job.lane].setdefault(job.chat_id, deque()).append(job)
+        self.stats['submitted'] += 1
+
+        depth = self._lane_depth(job.lane)
+        if depth > self._peak_depth[job.lane]:
+            self._peak_depth[job.lane] = depth
+
+        self._wakeup.set()
+        return job.future
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """الـ loop المربوط (None قبل bind)"""
+        return self._loop
+
+    def bind(self):
+        """
+        ربط المنظّم بالـ loop الحالي (مرة واحدة - يُستدعى من post_init البوت)
+
+        Raises:
+            RuntimeError: المنظّم مربوط بـ loop آخر
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._loop is None:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        elif self._loop is not loop:
+            raise RuntimeError("OutboundGovernor is bound to a different event loop")
+
+    def accepts_current_loop(self) -> bool:
+        """هل الـ loop الحالي هو الـ loop المربوط (غير ذلك: run_coroutine_threadsafe)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return self._loop is loop
+
+    def _ensure_running(self):
+        """ربط المنظّم عند أول استخدام وتشغيل حلقة التوزيع (على الـ loop المربوط فقط)"""
+        self.bind()
+
+        if self._task is None or self._task.done():
+            self._task = self._loop.create_task(self._run())
+
+    # ==========================================
+    # حلقة التوزيع
+    # ==========================================
+
+    def _chat_delay(self, chat_id: int, now: float) -> float:
+        """الثواني حتى يُسمح للمحادثة برسالة (0 = الآن)"""
+        pace = self._pace.get(chat_id)
+        if pace is None:
+            return 0.0
+
+        pace.tokens = min(self.chat_burst, pace.tokens + (now - pace.updated) * self.chat_rate)
+        pace.updated = now
+        return 0.0 if pace.tokens >= 1 else (1 - pace.tokens) / self.chat_rate
+
+    def _next_job(self, now: float) -> Tuple[Optional[_Job], Optional[float]]:
+        """
+        أعلى ممر فيه محادثة جاهزة (غير مشغولة وضمن حدها)
+
+        Returns:
+            (الرسالة، None) أو (None، ثواني الانتظار حتى أقرب محادثة)
+        """
+        wait = None
+
+        for lane in LANES:
+            queue = self._lanes[lane]
+
+            for chat_id in queue:
+                if chat_id in self._busy:
+                    continue
+
+                delay = self._chat_delay(chat_id, now)
+                if delay > 0:
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+
+                jobs = queue[chat_id]
+                job = jobs.popleft()
+                if jobs:
+                    queue.move_to_end(chat_id)  # التناوب بين المحادثات
+                else:
+                    del queue[chat_id]
+
+                pace = self._pace.setdefault(chat_id, _ChatPace(self.chat_burst, now))
+                pace.tokens -= 1
+                self._busy.add(chat_id)
+                return job, None
+
+        return None, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._sweep_pace(now)
+
+            job, wait = self._next_job(now)
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.bucket.acquire()
+            await self._slots.acquire()
+            self._loop.create_task(self._deliver(job))
+
+    async def _deliver(self, job: _Job):
+        try:
+            if job.send is not None:
+                result = await job.send()
+            else:
+                result = await job.bot.send_message(
+                    chat_id=job.chat_id,
+                    text=job.text,
+                    parse_mode=job.parse_mode
+                )
+
+        except Exception as e:
+            # telegram.error.RetryAfter (بدون استيراد telegram هنا)
+            retry_after = getattr(e, 'retry_after', None)
+
+            if retry_after is not None and job.attempts < self.max_retries:
+                if hasattr(retry_after, 'total_seconds'):
+                    retry_after = retry_after.total_seconds()
+
+                logger.warning(f"⏳ Flood limit: انتظار {retry_after}ث ({job.lane} → {job.chat_id})")
+                job.attempts += 1
+                self.stats['retries'] += 1
+                self.bucket.pause(float(retry_after))
+
+                # العودة لرأس طابور المحادثة (الترتيب محفوظ)
+                self._lanes[job.lane].setdefault(job.chat_id, deque()).appendleft(job)
+            else:
+                logger.error(f"❌ فشل الإرسال إلى {job.chat_id} ({job.lane}): {e}")
+                self.stats['failed'] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+
+        else:
+            self.stats['sent'] += 1
+            self._sent_by_lane[job.lane] += 1
+            self._wait_total[job.lane] += time.monotonic() - job.enqueued
+            if not job.future.done():
+                job.future.set_result(result)
+
+        finally:
+            self._busy.discard(job.chat_id)
+            self._slots.release()
+            self._wakeup.set()
+
+    def _sweep_pace(self, now: float):
+        """حذف حدود المحادثات الممتلئة (مثل محادثة جديدة تماماً)"""
+        idle = [
+            chat_id for chat_id, pace in self._pace.items()
+            if chat_id not in self._busy
+            and pace.tokens + (now - pace.updated) * self.chat_rate >= self.chat_burst
+        ]
+        for chat_id in idle:
+            del self._pace[chat_id]
+
+        self._next_sweep = now + 60
+
+    # ==========================================
+    # الإيقاف والمقاييس
+    # ==========================================
+
+    def _lane_depth(self, lane: str) -> int:
+        return sum(len(jobs) for jobs in self._lanes[lane].values())
+
+    def queue_depths(self) -> Dict[str, int]:
+        """عدد الرسائل المنتظرة في كل ممر"""
+        return {lane: self._lane_depth(lane) for lane in LANES}
+
+    async def close(self, timeout: float = 10.0):
+        """انتظار تفريغ الطوابير ثم إيقاف الحلقة (الباقي يُلغى)"""
+        if self._task is None:
+            return
+
+        deadline = time.monotonic() + timeout
+        while (sum(self.queue_depths().values()) or self._busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        for queue in self._lanes.values():
+            for jobs in queue.values():
+                for job in jobs:
+                    job.future.cancel()
+            queue.clear()
+
+        self._task = None
+
+    def get_stats(self) -> Dict:
+        """المقاييس: عمق الطوابير، الذروة، متوسط الانتظار لكل ممر"""
+        depths = self.queue_depths()
+
+        return {
+            **self.stats,
+            'queue_depth': depths,
+            'total_depth': sum(depths.values()),
+            'peak_depth': dict(self._peak_depth),
+            'in_flight': len(self._busy),
+            'tracked_chats': len(self._pace),
+            'avg_wait_ms': {
+                lane: self._wait_total[lane] / self._sent_by_lane[lane] * 1000
+                for lane in LANES if self._sent_by_lane[lane]
+            }
+        }
+
+
+# ==========================================
+# اختبار
+# ==========================================
+
+if __name__ == "__main__":
+    import random
+
+    print("="*70)
+    print("🧪 اختبار منظّم الرسائل الصادرة")
+    print("="*70)
+
+    class RetryAfter(Exception):
+        def __init__(self, seconds):
+            super().__init__(f"Flood control: retry in {seconds}s")
+            self.retry_after = seconds
+
+    class FakeBot:
+        """يحاكي Telegram: يرفض أكثر من 30 رسالة/ثانية"""
+
+        def __init__(self):
+            self.sent = []
+            self.window = deque()
+            self.flood_errors = 0
+
+        async def send_message(self, chat_id, text, parse_mode=None):
+            now = time.monotonic()
+            while self.window and now - self.window[0] > 1:
+                self.window.popleft()
+            if len(self.window) >= 30:
+                self.flood_errors += 1
+                raise RetryAfter(1)
+            self.window.append(now)
+            await asyncio.sleep(0.005)
+            self.sent.append((chat_id, text))
+            return len(self.sent)
+
+    async def main():
+        bot = FakeBot()
+        governor = OutboundGovernor(rate_per_second=25, chat_rate=1, chat_burst=2)
+        rng = random.Random(0)
+
+        # موجة: 200 تذكير مسبق لـ 40 محادثة + 20 تذكير الآن + 30 رد تفاعلي
+        futures = []
+        for i in range(200):
+            futures.append(governor.send_text(bot, rng.randrange(40), f"advance {i}", lane='advance'))
+        for i in range(20):
+            futures.append(governor.send_text(bot, 100 + i, f"now {i}", lane='now'))
+        for i in range(30):
+            futures.append(governor.send_text(bot, 200 + i, f"reply {i}", lane='reply'))
+
+        print(f"\n📥 في الطوابير: {governor.queue_depths()}")
+        print(f"🔗 مدموجة: {governor.stats['coalesced']}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*futures)
+        elapsed = time.perf_counter() - start
+
+        order = [text.split()[0] for _, text in bot.sent]
+        print(f"\n📤 {len(bot.sent)} رسالة في {elapsed:.2f}ث (أخطاء flood: {bot.flood_errors})")
+        print(f"   أول 'advance' في الموقع {order.index('advance')} "
+              f"بعد {order.count('now')} 'now' و {order.count('reply')} 'reply'")
+
+        stats = governor.get_stats()
+        print(f"   متوسط الانتظار (ms): { {k: round(v) for k, v in stats['avg_wait_ms'].items()} }")
+        await governor.close()
+
+    asyncio.run(main())
+
+    print("="*70)
+    print("✅ الاختبار اكتمل!")
@@ -5,36 +5,125 @@
 """
 
 from functools import wraps
+import math
+import threading
 import time
-from typing import Dict, Callable
-from collections import defaultdict
+from typing import Dict, Callable, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class _Bucket:
+    """دلو رموز لمستخدم واحد"""
+    __slots__ = ('tokens', 'updated')
+    
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class _TokenBucket:
+    """دلو رموز مشترك (الحد العام) بقفله الخاص"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.bucket = _Bucket(capacity, time.monotonic())
+        self.lock = threading.Lock()
+
+
+class _Shard:
+    """جزء من جدول المستخدمين بقفل مستقل"""
+    __slots__ = ('buckets', 'lock', 'next_sweep')
+    
+    def __init__(self, next_sweep: float):
+        self.buckets: Dict[int, _Bucket] = {}
+        self.lock = threading.Lock()
+        self.next_sweep = next_sweep
+
+
 class RateLimiter:
     """
-    نظام التحكم في معدل الطلبات
+    نظام التحكم في معدل الطلبات (Token Bucket)
     
-    يتتبع عدد الطلبات لكل مستخدم ويمنع تجاوز الحد المسموح
+    كل مستخدم له دلو سعته burst يمتلئ بمعدل max_requests/time_window،
+    فالفحص O(1) مهما كان عدد الطلبات. المستخدمون موزعون على shards
+    بأقفال مستقلة (آمن من event loop ومن threads الخلفية معاً)،
+    والدلو الممتلئ مجدداً يُحذف دورياً: حذفه لا يغيّر أي قرار لاحق.
     """
     
-    def __init__(self, max_requests: int = 30, time_window: int = 60):
+    def __init__(
+        self,
+        max_requests: int = 30,
+        time_window: int = 60,
+        burst: Optional[int] = None,
+        global_max_requests: Optional[int] = None,
+        global_time_window: Optional[int] = None,
+        shards: int = 16
+    ):
         """
         Args:
             max_requests: الحد الأقصى للطلبات
             time_window: النافذة الزمنية بالثواني
+            burst: أقصى دفعة متتالية (الافتراضي: max_requests)
+            global_max_requests: حد عام لكل المستخدمين معاً (None = بلا حد)
+            global_time_window: نافذة الحد العام (الافتراضي: time_window)
+            shards: عدد أجزاء جدول المستخدمين
         """
         self.max_requests = max_requests
         self.time_window = time_window
+        self.burst = burst or max_requests
+        self.rate = max_requests / time_window  # رمز/ثانية
+        
+        # الدلو الذي لم يُستخدم هذه المدة ممتلئ = مثل دلو جديد
+        self.idle_timeout = self.burst / self.rate
         
-        # تخزين: {user_id: [(timestamp1, timestamp2, ...)]}
-        self.requests: Dict[int, list] = defaultdict(list)
+        now = time.monotonic()
+        self._shards: List[_Shard] = [_Shard(now + self.idle_timeout) for _ in range(shards)]
         
-        logger.info(f"✅ Rate Limiter مفعّل: {max_requests} طلب/{time_window}ث")
+        self.global_limit: Optional[_TokenBucket] = None
+        if global_max_requests:
+            global_window = global_time_window or time_window
+            self.global_limit = _TokenBucket(global_max_requests / global_window, global_max_requests)
+        
+        self.counters = {
+            'allowed': 0,
+            'denied': 0,
+            'global_denied': 0,
+            'evicted': 0
+        }
+        
+        logger.info(
+            f"✅ Rate Limiter مفعّل: {max_requests} طلب/{time_window}ث (دفعة {self.burst})"
+            + (f"، عام {global_max_requests} طلب" if global_max_requests else "")
+        )
+    
+    def _shard(self, user_id: int) -> _Shard:
+        return self._shards[hash(user_id) % len(self._shards)]
+    
+    @staticmethod
+    def _refill(bucket: _Bucket, rate: float, capacity: float, now: float):
+        bucket.tokens = min(capacity, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
     
-    def is_allowed(self, user_id: int) -> tuple[bool, int]:
+    def _wait_time(self, tokens: float, rate: float) -> int:
+        """الثواني حتى يتوفر رمز كامل"""
+        return max(1, math.ceil((1 - tokens) / rate))
+    
+    def _sweep(self, shard: _Shard, now: float):
+        """حذف الدلاء الخاملة (القفل مأخوذ)"""
+        idle = [
+            user_id for user_id, bucket in shard.buckets.items()
+            if now - bucket.updated >= self.idle_timeout
+        ]
+        for user_id in idle:
+            del shard.buckets[user_id]
+        
+        self.counters['evicted'] += len(idle)
+        shard.next_sweep = now + self.idle_timeout
+    
+    def is_allowed(self, user_id: int) -> Tuple[bool, int]:
         """
         فحص ما إذا كان المستخدم يمكنه إرسال طلب جديد
         
@@ -44,29 +133,57 @@ class RateLimiter:
         Returns:
             tuple: (مسموح؟, الوقت المتبقي للانتظار)
         """
-        now = time.time()
-        user_requests = self.requests[user_id]
-        
-        # حذف الطلبات القديمة (خارج النافذة الزمنية)
-        cutoff_time = now - self.time_window
-        user_requests[:] = [req_time for req_time in user_requests if req_time > cutoff_time]
-        
-        # فحص العدد
-        if len(user_requests) >= self.max_requests:
-            # حساب الوقت المتبقي
-            oldest_request = user_requests[0]
-            time_until_allowed = int(oldest_request + self.time_window - now) + 1
+        now = time.monotonic()
+        shard = self._shard(user_id)
+        
+        with shard.lock:
+            if now >= shard.next_sweep:
+                self._sweep(shard, now)
             
-            logger.warning(
-                f"⚠️ Rate limit reached for user {user_id}: "
-                f"{len(user_requests)}/{self.max_requests} requests"
-            )
+            bucket = shard.buckets.get(user_id)
+            if bucket is None:
+                bucket = shard.buckets[user_id] = _Bucket(self.burst, now)
+            else:
+                self._refill(bucket, self.rate, self.burst, now)
             
-            return False, time_until_allowed
+            # فحص العدد
+            if bucket.tokens < 1:
+                self.counters['denied'] += 1
+                wait_time = self._wait_time(bucket.tokens, self.rate)
+                
+                logger.warning(
+                    f"⚠️ Rate limit reached for user {user_id}: "
+                    f"{self.max_requests}/{self.time_window}s"
+                )
+                
+                return False, wait_time
+            
+            # الحد العام (ترتيب الأقفال ثابت: shard ثم العام)
+            if self.global_limit is not None:
+                limit = self.global_limit
+                with limit.lock:
+                    self._refill(limit.bucket, limit.rate, limit.capacity, now)
+                    
+                    if limit.bucket.tokens < 1:
+                        self.counters['global_denied'] += 1
+                        return False, self._wait_time(limit.bucket.tokens, limit.rate)
+                    
+                    limit.bucket.tokens -= 1
+            
+            bucket.tokens -= 1
+            self.counters['allowed'] += 1
+            return True, 0
+    
+    def _peek_tokens(self, user_id: int) -> float:
+        """الرموز المتاحة الآن - بدون إنشاء دلو للمستخدم"""
+        now = time.monotonic()
+        shard = self._shard(user_id)
         
-        # إضافة الطلب الجديد
-        user_requests.append(now)
-        return True, 0
+        with shard.lock:
+            bucket = shard.buckets.get(user_id)
+            if bucket is None:
+                return self.burst
+            return min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
     
     def get_remaining_requests(self, user_id: int) -> int:
         """
@@ -78,20 +195,15 @@ class RateLimiter:
         Returns:
             int: عدد الطلبات المتبقية
         """
-        now = time.time()
-        user_requests = self.requests[user_id]
-        
-        # حذف الطلبات القديمة
-        cutoff_time = now - self.time_window
-        user_requests[:] = [req_time for req_time in user_requests if req_time > cutoff_time]
-        
-        return max(0, self.max_requests - len(user_requests))
+        return int(self._peek_tokens(user_id))
     
     def reset_user(self, user_id: int):
         """إعادة تعيين عداد المستخدم"""
-        if user_id in self.requests:
-            del self.requests[user_id]
-            logger.info(f"🔄 Reset rate limit for user {user_id}")
+        shard = self._shard(user_id)
+        
+        with shard.lock:
+            if shard.buckets.pop(user_id, None) is not None:
+                logger.info(f"🔄 Reset rate limit for user {user_id}")
     
     def get_stats(self, user_id: int) -> Dict:
         """
@@ -100,24 +212,43 @@ class RateLimiter:
         Returns:
             dict: إحصائيات مفصلة
         """
-        now = time.time()
-        user_requests = self.requests[user_id]
-        
-        # حذف الطلبات القديمة
-        cutoff_time = now - self.time_window
-        user_requests[:] = [req_time for req_time in user_requests if req_time > cutoff_time]
+        remaining = int(self._peek_tokens(user_id))
+        used = self.burst - remaining
         
         return {
-            'current_requests': len(user_requests),
+            'current_requests': used,
             'max_requests': self.max_requests,
-            'remaining': self.max_requests - len(user_requests),
+            'burst': self.burst,
+            'remaining': remaining,
             'time_window': self.time_window,
-            'percentage_used': (len(user_requests) / self.max_requests) * 100
+            'percentage_used': (used / self.burst) * 100
         }
+    
+    def get_global_stats(self) -> Dict:
+        """إحصائيات عامة (المستخدمون المتتبعون، القرارات، الحد العام)"""
+        stats = {
+            **self.counters,
+            'tracked_users': sum(len(shard.buckets) for shard in self._shards),
+            'shards': len(self._shards)
+        }
+        
+        if self.global_limit is not None:
+            with self.global_limit.lock:
+                stats['global_tokens'] = int(self.global_limit.bucket.tokens)
+        
+        return stats
+    
+    def __len__(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
 
 
 # Decorator لسهولة الاستخدام
-def rate_limit(max_requests: int = 30, time_window: int = 60):
+def rate_limit(
+    max_requests: int = 30,
+    time_window: int = 60,
+    burst: Optional[int] = None,
+    global_max_requests: Optional[int] = None
+):
     """
     Decorator للتحكم في معدل الطلبات
     
@@ -126,7 +257,7 @@ def rate_limit(max_requests: int = 30, time_window: int = 60):
         async def my_handler(update, context):
             ...
     """
-    limiter = RateLimiter(max_requests, time_window)
+    limiter = RateLimiter(max_requests, time_window, burst=burst, global_max_requests=global_max_requests)
     
     def decorator(func: Callable):
         @wraps(func)
@@ -204,5 +335,23 @@ if __name__ == "__main__":
         else:
             print(f"   • {key}: {value}")
     
+    # الحد العام + حذف المستخدمين الخاملين
+    print(f"\n🌍 الحد العام وحذف الخاملين:")
+    shared = RateLimiter(max_requests=600, time_window=1, global_max_requests=20000, global_time_window=1)
+    
+    start = time.perf_counter()
+    for i in range(50000):
+        shared.is_allowed(i % 5000)
+    elapsed_us = (time.perf_counter() - start) / 50000 * 1e6
+    
+    print(f"   50000 فحص لـ 5000 مستخدم: {elapsed_us:.2f} µs/فحص")
+    print(f"   قبل: {shared.get_global_stats()}")
+    
+    time.sleep(1.1)
+    shared.is_allowed(0)  # أول فحص بعد انتهاء المهلة يكنس الـ shard
+    for user in range(1, 16):
+        shared.is_allowed(user)
+    print(f"   بعد الخمول: {len(shared)} مستخدم متتبع")
+    
     print("\n" + "="*70)
     print("✅ الاختبار اكتمل!")
\ No newline at end of file
@@ -2,28 +2,961 @@
 """
 نظام تذكيرات بديل - يعمل بدون job_queue
 ✅ محدّث: دعم التذكير عند وقت الموعد
+✅ جدولة بالأحداث (min-heap) بدلاً من الفحص كل 60 ثانية
+✅ صندوق صادر بحجز/إيجار: عدة عمليات تتقاسم الإرسال دون تكرار
 """
 
+import os
+import socket
 import threading
 import time
+import uuid
+import concurrent.futures
+import heapq
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import asyncio
-from typing import Optional
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+
+# ==========================================
+# مجدول التذكيرات بالأحداث
+# ==========================================
+
+# المجدولات النشطة في هذه العملية (تُبلَّغ عند إضافة تذكير)
+_active_schedulers: List['ReminderScheduler'] = []
+_schedulers_lock = threading.Lock()
+
+
+def notify_reminder_scheduled(reminder_id: int, reminder_time: datetime):
+    """
+    إبلاغ المجدولات النشطة بتذكير جديد
+
+    تُستدعى بعد commit الإدراج في جدول reminders
+
+    Args:
+        reminder_id: معرف التذكير
+        reminder_time: وقت إرسال التذكير
+    """
+    with _schedulers_lock:
+        schedulers = list(_active_schedulers)
+
+    for scheduler in schedulers:
+        scheduler.notify(reminder_id, reminder_time)
+
+
+class ReminderScheduler:
+    """
+    مجدول تذكيرات قائم على الأحداث
+
+    يحمّل التذكيرات القادمة في min-heap مرتبة حسب reminder_time،
+    وينام حتى أقرب موعد بالضبط، ويستيقظ فوراً عند إضافة تذكير جديد.
+    قاعدة البيانات لا تُقرأ إلا عند حلول تذكير أو عند المزامنة الدورية.
+    """
+
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(
+        self,
+        db_path: str,
+        on_due: Callable[[], None],
+        resync_interval: int = 3600
+    ):
+        """
+        Args:
+            db_path: مسار قاعدة البيانات
+            on_due: الدالة المستدعاة عند حلول تذكير أو أكثر
+            resync_interval: مدة أفق التحميل بالثواني (مزامنة احتياطية)
+        """
+        self.db_path = db_path
+        self.on_due = on_due
+        self.resync_interval = resync_interval
+
+        # Heap: [(reminder_time, reminder_id)]
+        self._heap: List[Tuple[datetime, int]] = []
+        self._scheduled_ids: Set[int] = set()
+        self._horizon: datetime = datetime.now()
+
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        # إحصائيات
+        self.stats = {
+            'loaded': 0,
+            'notified': 0,
+            'dispatches': 0,
+            'resyncs': 0
+        }
+
+    @classmethod
+    def _parse_time(cls, value: str) -> datetime:
+        """تحويل نص التاريخ (مع أو بدون microseconds)"""
+        return datetime.strptime(value.split('.')[0], cls.TIME_FORMAT)
+
+    def _push(self, reminder_id: int, reminder_time: datetime) -> bool:
+        """إضافة تذكير إلى الـ heap (يجب حمل القفل)"""
+        if reminder_id in self._scheduled_ids:
+            return False
+
+        heapq.heappush(self._heap, (reminder_time, reminder_id))
+        self._scheduled_ids.add(reminder_id)
+        return True
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        """سحب جميع التذكيرات المستحقة (يجب حمل القفل)"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, reminder_id = heapq.heappop(self._heap)
+            self._scheduled_ids.discard(reminder_id)
+            due.append(reminder_id)
+        return due
+
+    def load_upcoming(self):
+        """تحميل التذكيرات غير المرسلة حتى نهاية الأفق"""
+        horizon = datetime.now() + timedelta(seconds=self.resync_interval)
+        rows = []
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, reminder_time
+                    FROM reminders
+                    WHERE sent = 0 AND reminder_time <= ?
+                ''', (horizon.strftime(self.TIME_FORMAT),))
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.error(f"❌ خطأ في تحميل التذكيرات القادمة: {e}")
+
+        loaded = 0
+        with self._condition:
+            self._horizon = horizon
+            for reminder_id, reminder_time in rows:
+                try:
+                    if self._push(reminder_id, self._parse_time(reminder_time)):
+                        loaded += 1
+                except ValueError:
+                    logger.warning(f"⚠️ وقت تذكير غير صالح #{reminder_id}: {reminder_time}")
+            self._condition.notify_all()
+
+        self.stats['loaded'] += loaded
+        self.stats['resyncs'] += 1
+        logger.debug(f"🔄 تم تحميل {loaded} تذكير حتى {horizon.strftime(self.TIME_FORMAT)}")
+
+    def notify(self, reminder_id: int, reminder_time: datetime):
+        """
+        إضافة تذكير جديد وإيقاظ المجدول
+
+        التذكيرات خارج الأفق الحالي تُحمّل عند المزامنة التالية
+        """
+        with self._condition:
+            if reminder_time > self._horizon:
+                return
+
+            if self._push(reminder_id, reminder_time):
+                self.stats['notified'] += 1
+                self._condition.notify_all()
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        """المدة حتى أقرب حدث (تذكير أو نهاية الأفق)"""
+        deadline = self._horizon
+        if self._heap and self._heap[0][0] < deadline:
+            deadline = self._heap[0][0]
+        return max(0.0, (deadline - now).total_seconds())
+
+    def run(self):
+        """حلقة الجدولة (blocking) - تُشغّل في thread منفصل"""
+        self._running = True
+        with _schedulers_lock:
+            _active_schedulers.append(self)
+
+        try:
+            self.load_upcoming()
+
+            while self._running:
+                resync = False
+
+                with self._condition:
+                    now = datetime.now()
+                    due = self._pop_due(now)
+
+                    if not due:
+                        if now >= self._horizon:
+                            resync = True
+                        elif self._running:
+                            self._condition.wait(timeout=self._seconds_until_next(now))
+
+                if due:
+                    self.stats['dispatches'] += 1
+                    try:
+                        self.on_due()
+                    except Exception as e:
+                        logger.error(f"❌ خطأ في إرسال التذكيرات المستحقة: {e}")
+
+                if resync:
+                    self.load_upcoming()
+        finally:
+            with _schedulers_lock:
+                if self in _active_schedulers:
+                    _active_schedulers.remove(self)
+
+    def start(self):
+        """تشغيل المجدول في thread خلفي"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._thread = threading.Thread(
+            target=self.run,
+            daemon=True,
+            name="ReminderScheduler"
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """إيقاف المجدول"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def pending_count(self) -> int:
+        """عدد التذكيرات المجدولة في الذاكرة"""
+        with self._condition:
+            return len(self._heap)
+
+
+# ==========================================
+# بناء رسائل التذكير والوصول لقاعدة البيانات
+# ==========================================
+
+# إدراج التذكيرات دفعة واحدة + استرجاع معرفاتها في نفس المعاملة
+INSERT_REMINDER_SQL = '''
+    INSERT INTO reminders (appointment_id, reminder_time, custom_message)
+    VALUES (?, ?, ?)
+'''
+LAST_REMINDER_ID_SQL = 'SELECT COALESCE(MAX(id), 0) FROM reminders'
+NEW_REMINDER_IDS_SQL = 'SELECT id, appointment_id FROM reminders WHERE id > ? ORDER BY id'
+
+# (معرف الموعد، وقت التذكير، الرسالة)
+PlannedReminder = Tuple[int, datetime, str]
+
+
+def reminder_offsets(reminder_hours: Iterable[float]) -> Tuple[timedelta, ...]:
+    """
+    تحويل ساعات التذكير إلى فروق زمنية مرتبة تنازلياً
+
+    القيم المكررة أو غير الموجبة تُتجاهل (تذكير "الآن" يُضاف دائماً)
+    """
+    return tuple(sorted({timedelta(hours=hours) for hours in reminder_hours if hours > 0}, reverse=True))
+
+
+def reminder_params(rows: List[PlannedReminder]) -> List[Tuple[int, str, str]]:
+    """صفوف جاهزة لـ executemany(INSERT_REMINDER_SQL)"""
+    return [
+        (appointment_id, reminder_time.strftime('%Y-%m-%d %H:%M:%S'), message)
+        for appointment_id, reminder_time, message in rows
+    ]
+
+
+def match_reminder_ids(
+    rows: List[PlannedReminder],
+    inserted: List[Tuple[int, int]]
+) -> List[Tuple[int, datetime]]:
+    """
+    ربط المعرفات الجديدة بالتذكيرات المخططة (بترتيب الإدراج)
+
+    Args:
+        rows: التذكيرات المخططة
+        inserted: [(id, appointment_id)] من NEW_REMINDER_IDS_SQL
+
+    Returns:
+        List[Tuple]: [(معرف التذكير, وقته)] - لإبلاغ المجدول
+    """
+    batch = {appointment_id for appointment_id, _, _ in rows}
+    ids = [reminder_id for reminder_id, appointment_id in inserted if appointment_id in batch]
+    return [(reminder_id, reminder_time) for reminder_id, (_, reminder_time, _) in zip(ids, rows)]
+
+
+def notify_reminders_scheduled(scheduled: List[Tuple[int, datetime]]):
+    """إبلاغ المجدولات بدفعة تذكيرات (بعد commit)"""
+    for reminder_id, reminder_time in scheduled:
+        notify_reminder_scheduled(reminder_id, reminder_time)
+
+
+class ReminderPlanner:
+    """
+    تخطيط التذكيرات التلقائية من Config.DEFAULT_REMINDER_HOURS
+
+    يحسب كل صفوف التذكير لدفعة مواعيد في مرور واحد (بنفس "الآن")،
+    ثم تُدرج كلها بـ executemany واحد. يُستخدم للإضافة الفردية،
+    والاستيراد، وتوليد نسخ المواعيد المتكررة.
+    """
+
+    def __init__(self, reminder_hours: Optional[Iterable[float]] = None):
+        """
+        Args:
+            reminder_hours: ساعات التذكير قبل الموعد (الافتراضي: Config.DEFAULT_REMINDER_HOURS)
+        """
+        if reminder_hours is None:
+            from config import Config
+            reminder_hours = Config.DEFAULT_REMINDER_HOURS
+
+        self.offsets = reminder_offsets(reminder_hours)
+
+    def plan(self, date_time: datetime, now: Optional[datetime] = None) -> List[Tuple[datetime, str]]:
+        """
+        تحديد التذكيرات التلقائية لموعد واحد
+
+        Returns:
+            List[Tuple]: [(وقت التذكير, 'type:advance' أو 'type:now')]
+        """
+        now = now or datetime.now()
+        time_until = date_time - now
+        planned = []
+
+        for offset in self.offsets:
+            if time_until > offset:
+                planned.append((date_time - offset, 'type:advance'))
+
+        # تذكير عند الموعد
+        if time_until > timedelta(0):
+            planned.append((date_time, 'type:now'))
+
+        return planned
+
+    def plan_batch(
+        self,
+        appointments: Iterable[Tuple[int, datetime]],
+        now: Optional[datetime] = None
+    ) -> List[PlannedReminder]:
+        """
+        تخطيط تذكيرات دفعة مواعيد
+
+        Args:
+            appointments: [(معرف الموعد, وقته)]
+            now: الوقت الحالي (واحد للدفعة كلها)
+        """
+        now = now or datetime.now()
+        return [
+            (appointment_id, reminder_time, message)
+            for appointment_id, date_time in appointments
+            for reminder_time, message in self.plan(date_time, now)
+        ]
+
+    def insert(
+        self,
+        cursor,
+        appointments: Iterable[Tuple[int, datetime]],
+        now: Optional[datetime] = None
+    ) -> List[Tuple[int, datetime]]:
+        """
+        إدراج تذكيرات دفعة مواعيد بـ executemany واحد (داخل معاملة المستدعي)
+
+        Returns:
+            List[Tuple]: [(معرف التذكير, وقته)] - تُمرر لـ notify_reminders_scheduled بعد commit
+        """
+        rows = self.plan_batch(appointments, now)
+        if not rows:
+            return []
+
+        cursor.execute(LAST_REMINDER_ID_SQL)
+        last_id = cursor.fetchone()[0]
+
+        cursor.executemany(INSERT_REMINDER_SQL, reminder_params(rows))
+
+        cursor.execute(NEW_REMINDER_IDS_SQL, (last_id,))
+        return match_reminder_ids(rows, cursor.fetchall())
+
+
+_reminder_planner: Optional[ReminderPlanner] = None
+
+
+def get_reminder_planner() -> ReminderPlanner:
+    """المخطط المشترك (يُنشأ عند أول استخدام - Config لا يُستورد مع الوحدة)"""
+    global _reminder_planner
+    if _reminder_planner is None:
+        _reminder_planner = ReminderPlanner()
+    return _reminder_planner
+
+
+def plan_appointment_reminders(
+    date_time: datetime,
+    now: Optional[datetime] = None
+) -> List[Tuple[datetime, str]]:
+    """
+    تحديد التذكيرات التلقائية لموعد جديد
+    
+    Args:
+        date_time: وقت الموعد
+        now: الوقت الحالي (الافتراضي: datetime.now())
+    
+    Returns:
+        List[Tuple]: [(وقت التذكير, 'type:advance' أو 'type:now')]
+    """
+    return get_reminder_planner().plan(date_time, now)
+
+
+def build_reminder_message(title: str, apt_time: str, custom_msg: Optional[str]) -> Tuple[str, str]:
+    """
+    بناء نص التذكير حسب نوعه
+
+    Returns:
+        Tuple: (نوع التذكير, نص الرسالة)
+    """
+    # تنظيف التاريخ
+    if '.' in apt_time:
+        apt_time = apt_time.split('.')[0]
+
+    # تحديد نوع التذكير
+    reminder_type = "advance"
+    if custom_msg and "type:" in custom_msg:
+        reminder_type = custom_msg.split("type:")[1].strip()
+
+    # ✨ رسالة مختلفة حسب نوع التذكير
+    if reminder_type == "now":
+        # 🚨 تذكير عند الموعد
+        message = f"""🚨 **حان وقت الموعد! | C'est l'heure! | It's time!** 🚨
+
+📋 **{title}**
+📅 {apt_time}
+
+⏰ **موعدك الآن!**
+⏰ **Votre RDV maintenant!**
+⏰ **Your appointment is NOW!**
+
+🏃‍♂️ لا تتأخر! | Ne soyez pas en retard! | Don't be late!"""
+    else:
+        # 🔔 تذكير عادي
+        time_remaining_msg = ""
+        try:
+            from time_utils import get_time_remaining_message
+            apt_datetime = datetime.strptime(apt_time, '%Y-%m-%d %H:%M:%S')
+            time_remaining_msg = "\n\n" + get_time_remaining_message(apt_datetime)
+        except ImportError:
+            logger.warning("⚠️ time_utils.py غير موجود")
+        except Exception as e:
+            logger.warning(f"خطأ في حساب الوقت: {e}")
+
+        message = f"""⏰ **تذكير بموعد | Rappel | Reminder:**
+
+📋 {title}
+📅 {apt_time}{time_remaining_msg}
+
+🔔 لا تنسى موعدك!
+🔔 N'oubliez pas votre RDV!
+🔔 Don't forget your appointment!"""
+
+    return reminder_type, message
+
+
+class ReminderOutbox:
+    """
+    صندوق صادر للتذكيرات بنظام حجز/إيجار (claim/lease)
+
+    يسمح لعدة عمليات بوت بتقاسم إرسال التذكيرات دون تكرار:
+    - كل عامل يحجز دفعة تذكيرات ذرياً (UPDATE ... RETURNING)
+    - الحجز صالح حتى lease_until ويُجدَّد أثناء الموجات الطويلة
+    - إذا توقف عامل، تنتهي مدة حجزه ويلتقط غيره تذكيراته
+    """
+
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    # RETURNING مدعوم منذ SQLite 3.35
+    SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+    def __init__(
+        self,
+        db_path: str,
+        worker_id: Optional[str] = None,
+        lease_seconds: int = 120,
+        batch_size: int = 500
+    ):
+        """
+        Args:
+            db_path: مسار قاعدة البيانات
+            worker_id: معرف العامل (الافتراضي: host:pid:random)
+            lease_seconds: مدة صلاحية الحجز بالثواني
+            batch_size: أقصى عدد تذكيرات في الحجز الواحد
+        """
+        self.db_path = db_path
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+
+        self.ensure_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """اتصال مع انتظار القفل بدلاً من الفشل الفوري"""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _lease_deadline(self) -> str:
+        return (datetime.now() + timedelta(seconds=self.lease_seconds)).strftime(self.TIME_FORMAT)
+
+    def ensure_schema(self):
+        """إضافة أعمدة الحجز لقواعد البيانات القديمة"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('PRAGMA table_info(reminders)')
+            columns = {row[1] for row in cursor.fetchall()}
+
+            if not columns:
+                # الجدول غير موجود بعد - يُنشئه Database.init_database
+                return
+
+            if 'claimed_by' not in columns:
+                cursor.execute('ALTER TABLE reminders ADD COLUMN claimed_by TEXT')
+            if 'lease_until' not in columns:
+                cursor.execute('ALTER TABLE reminders ADD COLUMN lease_until TIMESTAMP')
+
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_reminders_outbox
+                ON reminders(sent, reminder_time)
+            ''')
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            # عامل آخر أضاف العمود في نفس اللحظة
+            logger.debug(f"ensure_schema: {e}")
+        finally:
+            conn.close()
+
+    def _claim_ids(self, conn: sqlite3.Connection) -> List[int]:
+        """حجز دفعة تذكيرات مستحقة ذرياً وإرجاع معرفاتها"""
+        now = datetime.now().strftime(self.TIME_FORMAT)
+        lease_until = self._lease_deadline()
+        cursor = conn.cursor()
+
+        # تذكيرات غير محجوزة، أو انتهت مدة حجزها (عامل متوقف)
+        claim_sql = '''
+            UPDATE reminders
+            SET claimed_by = ?, lease_until = ?
+            WHERE id IN (
+                SELECT id FROM reminders
+                WHERE sent = 0 AND reminder_time <= ?
+                  AND (claimed_by IS NULL OR lease_until IS NULL OR lease_until <= ?)
+                ORDER BY reminder_time, id
+                LIMIT ?
+            )
+        '''
+        params = (self.worker_id, lease_until, now, now, self.batch_size)
+
+        if self.SUPPORTS_RETURNING:
+            cursor.execute(claim_sql + ' RETURNING id', params)
+            ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            return ids
+
+        # SQLite قديم: قفل كتابة ثم قراءة ما حُجز بنفس الرمز
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(claim_sql, params)
+        cursor.execute('''
+            SELECT id FROM reminders
+            WHERE claimed_by = ? AND lease_until = ? AND sent = 0
+        ''', (self.worker_id, lease_until))
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        return ids
+
+    def claim_due(self) -> List[Dict]:
+        """
+        حجز التذكيرات المستحقة لهذا العامل
+
+        Returns:
+            List[Dict]: [{'id', 'user_id', 'type', 'message'}] مرتبة حسب الوقت
+        """
+        conn = self._connect()
+        try:
+            ids = self._claim_ids(conn)
+            if not ids:
+                return []
+
+            placeholders = ','.join('?' * len(ids))
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT r.id, a.user_id, a.title, a.date_time, r.custom_message
+                FROM reminders r
+                JOIN appointments a ON r.appointment_id = a.id
+                WHERE r.id IN ({placeholders}) AND r.claimed_by = ?
+                ORDER BY r.reminder_time, r.id
+            ''', (*ids, self.worker_id))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        reminders = []
+        for reminder_id, user_id, title, apt_time, custom_msg in rows:
+            reminder_type, message = build_reminder_message(title, apt_time, custom_msg)
+            reminders.append({
+                'id': reminder_id,
+                'user_id': user_id,
+                'type': reminder_type,
+                'message': message
+            })
+
+        return reminders
+
+    def renew(self, reminder_ids: List[int]) -> int:
+        """تجديد الحجز للتذكيرات التي لم تُرسل بعد"""
+        if not reminder_ids:
+            return 0
+
+        lease_until = self._lease_deadline()
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE reminders SET lease_until = ?
+                WHERE id = ? AND claimed_by = ? AND sent = 0
+            ''', [(lease_until, reminder_id, self.worker_id) for reminder_id in reminder_ids])
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    async def keep_alive(self, reminder_ids: List[int], interval: Optional[float] = None):
+        """تجديد الحجز دورياً حتى إلغاء المهمة (أثناء موجة إرسال طويلة)"""
+        interval = interval or self.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.get_running_loop().run_in_executor(None, self.renew, reminder_ids)
+
+    def complete(self, reminder_ids: List[int]) -> int:
+        """تعليم التذكيرات كمرسلة وتحرير حجزها - commit واحد لكل موجة"""
+        if not reminder_ids:
+            return 0
+
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE reminders
+                SET sent = 1, claimed_by = NULL, lease_until = NULL
+                WHERE id = ? AND claimed_by = ?
+            ''', [(reminder_id, self.worker_id) for reminder_id in reminder_ids])
+            conn.commit()
+        finally:
+            conn.close()
+
+        return len(reminder_ids)
+
+    def release_all(self) -> int:
+        """تحرير جميع حجوزات هذا العامل (عند الإيقاف المنظّم)"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE reminders SET claimed_by = NULL, lease_until = NULL
+                WHERE claimed_by = ? AND sent = 0
+            ''', (self.worker_id,))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def next_lease_expiry(self) -> Optional[Tuple[int, datetime]]:
+        """
+        أقرب حجز قائم سينتهي (لإيقاظ المجدول واستعادة تذكيرات عامل متوقف
+        أو إعادة محاولة تذكيرات فشل إرسالها)
+
+        Returns:
+            Tuple: (معرف التذكير, وقت انتهاء الحجز) أو None
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, lease_until FROM reminders
+                WHERE sent = 0 AND claimed_by IS NOT NULL AND lease_until IS NOT NULL
+                ORDER BY lease_until
+                LIMIT 1
+            ''')
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+
+        try:
+            return row[0], datetime.strptime(row[1].split('.')[0], self.TIME_FORMAT)
+        except ValueError:
+            return None
+
+
+# ==========================================
+# خط إرسال متزامن (asyncio) مع احترام حدود Telegram
+# ==========================================
+
+class AsyncTokenBucket:
+    """
+    Token bucket عام لمعدل الإرسال
+
+    Telegram يسمح بحوالي 30 رسالة/ثانية للبوت الواحد.
+    لا يستخدم asyncio.Lock: الفحص والخصم يتمان بدون await بينهما.
+    """
+
+    def __init__(self, rate: float = 30.0, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: عدد الرموز المضافة في الثانية
+            capacity: السعة القصوى (الافتراضي = rate)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        """إضافة الرموز حسب الوقت المنقضي"""
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """إيقاف الإرسال مؤقتاً (عند RetryAfter من Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        """انتظار رمز متاح"""
+        while True:
+            now = time.monotonic()
+
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._refill(now)
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ReminderDeliveryPipeline:
+    """
+    إرسال دفعات التذكيرات بشكل متزامن
+
+    - مجموعة تزامن محدودة (Semaphore)
+    - token bucket عام (~30 رسالة/ثانية)
+    - انتظار RetryAfter وإعادة المحاولة
+    - الحفاظ على ترتيب الرسائل داخل كل محادثة
+
+    مع governor (OutboundGovernor) يمر الإرسال عبر ممرات البوت المشتركة
+    (تذكير 'now' قبل الردود، والمسبقة بعدها) مع دمج تذكيرات نفس المحادثة.
+    من loop آخر تُرسل الموجة إلى loop المنظّم (run_coroutine_threadsafe)؛
+    قبل ربط المنظّم يُستخدم token bucket الخاص بالـ pipeline.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 20,
+        rate_per_second: float = 30.0,
+        max_retries: int = 3,
+        governor=None
+    ):
+        """
+        Args:
+            max_concurrency: عدد المحادثات المُرسل إليها في نفس الوقت
+            rate_per_second: الحد العام للرسائل في الثانية
+            max_retries: عدد محاولات إعادة الإرسال بعد RetryAfter
+            governor: منظّم الرسائل الصادرة المشترك (اختياري)
+        """
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.max_retries = max_retries
+        self.bucket = AsyncTokenBucket(rate_per_second)
+        self.governor = governor
+
+        # تذكيرات قيد الإرسال (لمنع تكرارها إذا تداخلت موجتان)
+        self._in_flight: Set[int] = set()
+
+        # إحصائيات
+        self.stats = {
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'waves': 0
+        }
+
+    def estimate_duration(self, count: int) -> float:
+        """الزمن التقريبي لإرسال count رسالة"""
+        return count / self.rate_per_second
+
+    async def _send_with_retry(self, bot, chat_id: int, text: str) -> bool:
+        """إرسال رسالة واحدة مع احترام RetryAfter"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+
+            try:
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    parse_mode='Markdown'
+                )
+                return True
+
+            except Exception as e:
+                # telegram.error.RetryAfter (بدون استيراد telegram هنا)
+                retry_after = getattr(e, 'retry_after', None)
+
+                if retry_after is None or attempt == self.max_retries:
+                    logger.error(f"❌ فشل الإرسال إلى {chat_id}: {e}")
+                    return False
+
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+
+                logger.warning(f"⏳ Flood limit: انتظار {retry_after}ث قبل إعادة المحاولة")
+                self.stats['retries'] += 1
+                self.bucket.pause(float(retry_after))
+
+        return False
+
+    async def deliver(
+        self,
+        bot,
+        reminders: List[Dict],
+        sent_ids: Optional[List[int]] = None
+    ) -> List[int]:
+        """
+        إرسال موجة تذكيرات
+
+        Args:
+            bot: كائن Telegram Bot
+            reminders: التذكيرات مرتبة حسب الوقت ({'id', 'user_id', 'message'})
+            sent_ids: قائمة تُملأ بالمعرفات المرسلة أثناء التنفيذ (اختياري)
+
+        Returns:
+            List[int]: معرفات التذكيرات المرسلة بنجاح
+        """
+        if sent_ids is None:
+            sent_ids = []
+
+        reminders = [r for r in reminders if r['id'] not in self._in_flight]
+        wave_ids = {r['id'] for r in reminders}
+        self._in_flight |= wave_ids
+
+        # تجميع حسب المحادثة مع الحفاظ على الترتيب
+        by_chat: Dict[int, List[Dict]] = {}
+        for reminder in reminders:
+            by_chat.setdefault(reminder['user_id'], []).append(reminder)
+
+        governor_loop = self.governor.loop if self.governor is not None else None
+
+        if governor_loop is not None and not governor_loop.is_closed():
+            try:
+                if self.governor.accepts_current_loop():
+                    await self._deliver_governed(bot, reminders, sent_ids)
+                else:
+                    # thread التذكيرات: المنظّم لا يُستخدم إلا من loop البوت
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+                        self._deliver_governed(bot, reminders, sent_ids), governor_loop
+                    ))
+            finally:
+                self._in_flight -= wave_ids
+
+            self.stats['waves'] += 1
+            return sent_ids
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def deliver_chat(chat_id: int, items: List[Dict]):
+            async with semaphore:
+                for item in items:
+                    if await self._send_with_retry(bot, chat_id, item['message']):
+                        sent_ids.append(item['id'])
+                        self.stats['sent'] += 1
+                    else:
+                        self.stats['failed'] += 1
+
+        try:
+            await asyncio.gather(*(
+                deliver_chat(chat_id, items) for chat_id, items in by_chat.items()
+            ))
+        finally:
+            self._in_flight -= wave_ids
+
+        self.stats['waves'] += 1
+        return sent_ids
+
+
+    async def _deliver_governed(self, bot, reminders: List[Dict], sent_ids: List[int]):
+        """إرسال الموجة عبر المنظّم (تذكيرات نفس المحادثة في نفس الممر تُدمج)"""
+        def record(reminder_id: int):
+            # sent_ids تُملأ لحظة الإرسال (تبقى صالحة حتى لو انتهت مهلة الموجة)
+            def done(future: asyncio.Future):
+                if future.cancelled() or future.exception() is not None:
+                    self.stats['failed'] += 1
+                else:
+                    sent_ids.append(reminder_id)
+                    self.stats['sent'] += 1
+            return done
+
+        futures = []
+        for reminder in reminders:
+            future = self.governor.send_text(
+                bot,
+                reminder['user_id'],
+                reminder['message'],
+                lane='now' if reminder['type'] == 'now' else 'advance',
+                parse_mode='Markdown'
+            )
+            future.add_done_callback(record(reminder['id']))
+            futures.append(future)
+
+        await asyncio.gather(*futures, return_exceptions=True)
+
+
+async def deliver_claimed(
+    outbox: ReminderOutbox,
+    pipeline: ReminderDeliveryPipeline,
+    bot,
+    reminders: List[Dict],
+    sent_ids: Optional[List[int]] = None
+) -> List[int]:
+    """
+    إرسال تذكيرات محجوزة مع تجديد الحجز طوال مدة الموجة
+
+    Returns:
+        List[int]: معرفات التذكيرات المرسلة بنجاح
+    """
+    keeper = asyncio.ensure_future(outbox.keep_alive([r['id'] for r in reminders]))
+    try:
+        return await pipeline.deliver(bot, reminders, sent_ids)
+    finally:
+        keeper.cancel()
+
+
 class BackgroundReminderSystem:
     """نظام تذكيرات يعمل في الخلفية - محدّث"""
-    
-    def __init__(self, bot_application, db_path="agent_data.db"):
+
+    def __init__(self, bot_application, db_path="agent_data.db", worker_id: Optional[str] = None,
+                 governor=None):
         self.bot = bot_application.bot
         self.db_path = db_path
         self.running = False
         self.thread = None
         self._loop = None
-        
+        self.pipeline = ReminderDeliveryPipeline(governor=governor)
+        self.outbox = ReminderOutbox(db_path, worker_id=worker_id)
+        self.scheduler = ReminderScheduler(db_path, on_due=self.check_and_send_reminders)
+
     def _get_event_loop(self):
         """الحصول على event loop البوت"""
         if self._loop is None:
@@ -38,149 +971,96 @@ class BackgroundReminderSystem:
         return self._loop
     
     def check_and_send_reminders(self):
-        """✅ فحص وإرسال التذكيرات - مع دعم التذكير عند الموعد"""
+        """✅ حجز وإرسال التذكيرات المستحقة على دفعات (outbox)"""
         try:
-            # استيراد دالة حساب الوقت المتبقي
-            try:
-                from time_utils import get_time_remaining_message
-                has_time_utils = True
-            except ImportError:
-                has_time_utils = False
-                logger.warning("⚠️ time_utils.py غير موجود")
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # البحث عن تذكيرات يجب إرسالها (مع نوعها)
-            cursor.execute('''
-                SELECT r.id, r.appointment_id, a.user_id, a.title, a.date_time, r.custom_message
-                FROM reminders r
-                JOIN appointments a ON r.appointment_id = a.id
-                WHERE r.reminder_time <= ? AND r.sent = 0
-            ''', (now,))
-            
-            reminders = cursor.fetchall()
-            
-            if reminders:
-                logger.info(f"🔔 وجدت {len(reminders)} تذكير لإرسالها")
-                print(f"🔔 إرسال {len(reminders)} تذكير...")
-            
-            for reminder in reminders:
-                reminder_id, apt_id, user_id, title, apt_time, custom_msg = reminder
-                
-                # تنظيف التاريخ
-                if '.' in apt_time:
-                    apt_time = apt_time.split('.')[0]
-                
-                # تحديد نوع التذكير
-                reminder_type = "advance"
-                if custom_msg and "type:" in custom_msg:
-                    reminder_type = custom_msg.split("type:")[1].strip()
-                
-                # ✨ رسالة مختلفة حسب نوع التذكير
-                if reminder_type == "now":
-                    # 🚨 تذكير عند الموعد
-                    message = f"""🚨 **حان وقت الموعد! | C'est l'heure! | It's time!** 🚨
+            while True:
+                reminders = self.outbox.claim_due()
 
-📋 **{title}**
-📅 {apt_time}
+                if not reminders:
+                    break
 
-⏰ **موعدك الآن!**
-⏰ **Votre RDV maintenant!**
-⏰ **Your appointment is NOW!**
+                self._send_wave(reminders)
 
-🏃‍♂️ لا تتأخر! | Ne soyez pas en retard! | Don't be late!"""
-                else:
-                    # 🔔 تذكير عادي
-                    time_remaining_msg = ""
-                    if has_time_utils:
-                        try:
-                            apt_datetime = datetime.strptime(apt_time, '%Y-%m-%d %H:%M:%S')
-                            time_remaining_msg = "\n\n" + get_time_remaining_message(apt_datetime)
-                        except Exception as e:
-                            logger.warning(f"خطأ في حساب الوقت: {e}")
-                    
-                    message = f"""⏰ **تذكير بموعد | Rappel | Reminder:**
+                if len(reminders) < self.outbox.batch_size:
+                    break
 
-📋 {title}
-📅 {apt_time}{time_remaining_msg}
+            # إيقاظ المجدول عند انتهاء أقرب حجز قائم (عامل متوقف أو إرسال فاشل)
+            expiry = self.outbox.next_lease_expiry()
+            if expiry:
+                self.scheduler.notify(*expiry)
 
-🔔 لا تنسى موعدك!
-🔔 N'oubliez pas votre RDV!
-🔔 Don't forget your appointment!"""
-                
-                # إرسال الرسالة
-                success = self._send_message_sync(user_id, message)
-                
-                if success:
-                    cursor.execute('UPDATE reminders SET sent = 1 WHERE id = ?', (reminder_id,))
-                    conn.commit()
-                    
-                    emoji = "🚨" if reminder_type == "now" else "✅"
-                    logger.info(f"{emoji} تم إرسال تذكير ({reminder_type}) للمستخدم {user_id}")
-                    print(f"{emoji} تذكير #{reminder_id} → تم الإرسال ({reminder_type})")
-                else:
-                    logger.error(f"❌ فشل إرسال تذكير #{reminder_id}")
-                    print(f"❌ تذكير #{reminder_id} → فشل")
-            
-            conn.close()
-            
         except Exception as e:
             logger.error(f"❌ خطأ في فحص التذكيرات: {e}")
             print(f"❌ خطأ: {e}")
-    
-    def _send_message_sync(self, chat_id: int, text: str) -> bool:
-        """إرسال رسالة بشكل متزامن من thread منفصل"""
+
+    def _send_wave(self, reminders: List[Dict]):
+        """إرسال دفعة محجوزة كموجة واحدة متزامنة"""
+        logger.info(f"🔔 حجزت {len(reminders)} تذكير لإرسالها ({self.outbox.worker_id})")
+        print(f"🔔 إرسال {len(reminders)} تذكير...")
+
+        # تُملأ أثناء الإرسال - تبقى صالحة حتى لو انتهت المهلة
+        sent_ids: List[int] = []
+        timeout = 60 + 2 * self.pipeline.estimate_duration(len(reminders))
+
         try:
-            async def send():
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    parse_mode='Markdown'
-                )
-            
-            try:
-                loop = self._get_event_loop()
-                
-                if loop.is_running():
-                    future = asyncio.run_coroutine_threadsafe(send(), loop)
-                    future.result(timeout=10)
-                else:
-                    loop.run_until_complete(send())
-                
-                return True
-                
-            except Exception as e:
-                logger.error(f"خطأ في الطريقة 1: {e}")
-                
-                try:
-                    new_loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(new_loop)
-                    new_loop.run_until_complete(send())
-                    new_loop.close()
-                    return True
-                except Exception as e2:
-                    logger.error(f"خطأ في الطريقة 2: {e2}")
-                    return False
-                    
+            self._run_coroutine_sync(
+                deliver_claimed(self.outbox, self.pipeline, self.bot, reminders, sent_ids),
+                timeout=timeout
+            )
         except Exception as e:
-            logger.error(f"خطأ في إرسال رسالة: {e}")
-            return False
-    
+            logger.error(f"❌ خطأ في موجة الإرسال: {e}")
+
+        # commit واحد لجميع التذكيرات المرسلة
+        # (الفاشلة تبقى محجوزة حتى انتهاء الحجز ثم يُعاد إرسالها)
+        sent_ids = list(sent_ids)
+        self.outbox.complete(sent_ids)
+
+        sent_set = set(sent_ids)
+        now_count = sum(
+            1 for reminder in reminders
+            if reminder['type'] == 'now' and reminder['id'] in sent_set
+        )
+        failed = len(reminders) - len(sent_ids)
+
+        logger.info(
+            f"✅ تم إرسال {len(sent_ids)}/{len(reminders)} تذكير "
+            f"(🚨 {now_count} عند الموعد)"
+        )
+        print(f"✅ {len(sent_ids)} تذكير → تم الإرسال")
+        if failed:
+            logger.error(f"❌ فشل إرسال {failed} تذكير")
+            print(f"❌ {failed} تذكير → فشل")
+
+    def _run_coroutine_sync(self, coro, timeout: float):
+        """تشغيل coroutine على event loop البوت من thread منفصل"""
+        loop = self._get_event_loop()
+
+        if loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(coro, loop)
+            try:
+                return future.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                raise
+
+        # لا يوجد loop يعمل - تشغيل في loop مؤقت
+        new_loop = asyncio.new_event_loop()
+        try:
+            return new_loop.run_until_complete(coro)
+        finally:
+            new_loop.close()
+
     def reminder_loop(self):
-        """حلقة فحص التذكيرات"""
+        """حلقة التذكيرات - تنام حتى أقرب تذكير مستحق"""
         logger.info("🔔 بدء نظام التذكيرات في الخلفية...")
         print("🔔 نظام التذكيرات يعمل...")
-        
+
         while self.running:
             try:
-                self.check_and_send_reminders()
-                time.sleep(60)
+                self.scheduler.run()
             except Exception as e:
                 logger.error(f"❌ خطأ في حلقة التذكيرات: {e}")
-                time.sleep(60)
+                time.sleep(1)
     
     def start(self):
         """بدء نظام التذكيرات"""
@@ -206,6 +1086,16 @@ class BackgroundReminderSystem:
     def stop(self):
         """إيقاف نظام التذكيرات"""
         self.running = False
+        self.scheduler.stop()
         if self.thread:
             self.thread.join(timeout=5)
+
+        # تحرير الحجوزات غير المرسلة ليلتقطها عامل آخر فوراً
+        try:
+            released = self.outbox.release_all()
+            if released:
+                logger.info(f"🔓 تم تحرير {released} تذكير محجوز")
+        except Exception as e:
+            logger.warning(f"⚠️ تعذّر تحرير الحجوزات: {e}")
+
         logger.info("⏹️ تم إيقاف نظام التذكيرات")
\ No newline at end of file
@@ -0,0 +1,109 @@
+# rule_classifier.py
+"""
+تصنيف النوايا بالقواعد - بدون torch
+✅ جاهز فوراً عند الإقلاع (قبل تحميل نماذج ML في الخلفية)
+✅ نفس القواعد التي يرجع إليها SmartIntentClassifier عند ضعف الثقة
+"""
+
+import re
+from typing import Dict, List
+import logging
+
+from keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# كشف اللغة
+# ==========================================
+
+ARABIC_WORD = re.compile(r'[\u0600-\u06FF]+')
+LATIN_WORD = re.compile(r'[a-zA-Zàâäéèêëïîôùûüÿç]+')
+FRENCH_INDICATORS = ('je', 'tu', 'il', 'nous', 'vous', 'rdv', 'rendez', 'demain', 'aujourd')
+
+
+def detect_language(text: str) -> str:
+    """كشف لغة النص (ar / fr / en)"""
+    if len(ARABIC_WORD.findall(text)) > len(LATIN_WORD.findall(text)):
+        return 'ar'
+    
+    # التفريق بين الفرنسية والإنجليزية
+    text_lower = text.lower()
+    if any(indicator in text_lower for indicator in FRENCH_INDICATORS):
+        return 'fr'
+    
+    return 'en'
+
+
+# ==========================================
+# قواعد التصنيف (تُجمّع مرة واحدة)
+# ==========================================
+
+RULE_KEYWORDS = KeywordMatcher({
+    'add_appointment': [
+        'موعد', 'اجتماع', 'لقاء', 'مقابلة', 'أضف', 'سجل', 'حجز',
+        'rdv', 'rendez-vous', 'réunion', 'ajouter',
+        'appointment', 'meeting', 'schedule', 'book'
+    ],
+    'list_appointments': [
+        'عرض مواعيدي', 'مواعيدي', 'أظهر المواعيد', 'كل مواعيدي',
+        'mes rdv', 'mes rendez-vous', 'afficher',
+        'my appointments', 'show appointments', 'list'
+    ],
+    'check_specific_day': [
+        'مواعيدي اليوم', 'مواعيدي غدا', 'مواعيد يوم',
+        'rdv aujourd', 'rdv demain',
+        'today', 'tomorrow', 'appointments on'
+    ],
+    'cancel_appointment': [
+        'إلغاء', 'احذف', 'حذف', 'ألغي',
+        'annuler', 'supprimer',
+        'cancel', 'delete', 'remove'
+    ],
+    'greeting': [
+        'مرحبا', 'السلام', 'صباح', 'مساء', 'أهلا',
+        'bonjour', 'salut', 'bonsoir',
+        'hello', 'hi', 'hey', 'good morning'
+    ],
+    'thanks': [
+        'شكرا', 'مشكور',
+        'merci',
+        'thanks', 'thank you'
+    ],
+    'help': [
+        'مساعدة', 'ساعدني', 'كيف',
+        'aide', 'comment',
+        'help', 'how'
+    ]
+})
+
+
+def rule_based_classify(text: str) -> Dict:
+    """تصنيف بالقواعد - الدرجة = نسبة كلمات النية المطابقة"""
+    best_intent, best_score = RULE_KEYWORDS.best(text.lower(), normalize=True)
+    
+    return {
+        'intent': best_intent,
+        'confidence': min(best_score * 2, 0.9),  # تحويل إلى نسبة ثقة
+        'all_scores': {},
+        'method': 'rule_based'
+    }
+
+
+class RuleBasedClassifier:
+    """
+    مصنف بالقواعد بنفس واجهة مصنفات ML (predict / predict_batch)
+    
+    يخدم الرسائل أثناء تحميل النموذج، أو بشكل دائم إذا فشل التحميل.
+    """
+    
+    backend = 'rules'
+    
+    def predict(self, text: str) -> Dict:
+        """التنبؤ بنية النص"""
+        return rule_based_classify(text)
+    
+    def predict_batch(self, texts: List[str]) -> List[Dict]:
+        """التنبؤ بنوايا عدة نصوص"""
+        return [rule_based_classify(text) for text in texts]
@@ -7,6 +7,8 @@ Lamis Bot - نقطة البداية الرئيسية
 
 import sys
 import os
+import argparse
+import importlib.util
 import subprocess
 from pathlib import Path
 
@@ -78,15 +80,13 @@ def check_libraries():
             logger.error("❌ لا يمكن تشغيل البوت بدون المكتبات الأساسية")
             sys.exit(1)
     
-    # فحص الاختيارية (مع تجاهل الأخطاء)
+    # فحص الاختيارية بدون استيرادها (torch وحده يستغرق ثوانٍ)
     missing_optional = []
     for module, package in optional.items():
-        try:
-            __import__(module)
+        if importlib.util.find_spec(module) is not None:
             logger.info(f"✅ {module} متوفر")
-        except Exception as e:
+        else:
             logger.warning(f"⚠️ {module} غير متوفر (اختياري)")
-            logger.debug(f"   السبب: {str(e)[:100]}")
             missing_optional.append(package)
     
     if missing_optional:
@@ -184,5 +184,49 @@ def main():
         sys.exit(1)
 
 
+def profile_startup():
+    """قياس زمن وذاكرة استيراد مسار الإقلاع (بدون تشغيل البوت)"""
+    from startup_profiler import profile_startup as run_profile, print_profile
+    
+    print_profile(run_profile())
+
+
+def check_cold_imports() -> int:
+    """
+    فحص المسار البارد: المكتبات الثقيلة يجب ألا تُستورد عند الإقلاع
+    
+    Returns:
+        int: رمز الخروج (0 = سليم، 1 = مخالفة أو تعذّر الفحص)
+    """
+    from startup_profiler import profile_startup as run_profile, HEAVY_MODULES
+    
+    profile = run_profile()
+    heavy = profile.heavy_imports()
+    
+    if profile.error:
+        logger.error(f"❌ تعذّر استيراد {profile.target}: {profile.error}")
+        return 1
+    
+    if heavy:
+        logger.error(f"❌ مكتبات ثقيلة في مسار الإقلاع: {', '.join(heavy)}")
+        return 1
+    
+    logger.info(f"✅ مسار الإقلاع نظيف ({', '.join(HEAVY_MODULES)}) - "
+                f"{profile.total_us / 1000:.0f}ms، {len(profile.modules)} وحدة")
+    return 0
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Lamis Bot")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="قياس زمن وذاكرة استيراد كل وحدة عند الإقلاع")
+    parser.add_argument('--check-cold-imports', action='store_true',
+                        help="الفشل إذا استُوردت مكتبة ثقيلة (torch, transformers, ...) عند الإقلاع")
+    args = parser.parse_args()
+    
+    if args.profile_startup:
+        profile_startup()
+    elif args.check_cold_imports:
+        sys.exit(check_cold_imports())
+    else:
+        main()
\ No newline at end of file
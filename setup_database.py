@@ -56,6 +56,8 @@ def create_database(db_path="agent_data.db"):
             reminder_time TIMESTAMP NOT NULL,
             custom_message TEXT,
             sent BOOLEAN DEFAULT 0,
+            claimed_by TEXT,
+            lease_until TIMESTAMP,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (appointment_id) REFERENCES appointments(id) ON DELETE CASCADE
         )
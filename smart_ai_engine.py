@@ -16,13 +16,20 @@
 
 import asyncio
 import logging
+import threading
+import time
 from datetime import datetime
 from typing import Dict, Optional, Tuple, Any
 from pathlib import Path
 import json
 
 # استيراد الأنظمة الفرعية
-from ml_intent_classifier import SmartIntentClassifier, MultilingualTextProcessor
+# (مصنفات ML تستورد torch - تُحمّل في الخلفية داخل _load_classifier)
+from rule_classifier import RuleBasedClassifier, detect_language
+from datetime_engine import DateTimeParse
+from micro_batcher import MicroBatcher
+from model_registry import BERT_INTENT, INTENT_CLASSIFIER, ModelRegistry
+from training_worker import ModelVersionWatcher, TrainingWorker
 from conversation_context import (
     ConversationManager, 
     ConversationContext,
@@ -40,13 +47,6 @@ from feedback_learning_system import (
     AnalyticsReporter
 )
 
-# محاولة استيراد BERT
-try:
-    from bert_arabic_classifier import SmartBERTClassifier
-    BERT_AVAILABLE = True
-except ImportError:
-    BERT_AVAILABLE = False
-
 logger = logging.getLogger(__name__)
 
 
@@ -66,6 +66,10 @@ class EngineConfig:
         self.use_bert = False  # استخدام BERT (أبطأ لكن أدق)
         self.confidence_threshold = 0.6  # حد الثقة الأدنى
         self.fallback_to_rules = True  # الرجوع للقواعد عند الثقة المنخفضة
+        self.batch_max_size = 32  # أقصى حجم لدفعة التنبؤ
+        self.batch_max_wait_ms = 5.0  # نافذة تجميع الطلبات المتزامنة
+        self.inference_backend = "eager"  # eager | int8 | torchscript | onnx
+        self.background_model_load = True  # القواعد فوراً، ونموذج ML في الخلفية
         
         # إعدادات السياق
         self.context_timeout_minutes = 30
@@ -75,6 +79,8 @@ class EngineConfig:
         self.auto_retrain = True
         self.retrain_threshold = 50  # عدد التصحيحات قبل إعادة التدريب
         self.check_interval = 3600  # فحص كل ساعة
+        self.out_of_process_training = True  # تدريب LSTM في عملية منفصلة (training_worker.py)؛ BERT داخل العملية
+        self.model_watch_interval = 30.0  # فحص الإصدارات المنشورة (ثانية)
         
         # إعدادات Feedback
         self.request_feedback_below = 0.7  # طلب تأكيد تحت هذه الثقة
@@ -84,7 +90,9 @@ class EngineConfig:
             'db_path': self.db_path,
             'use_bert': self.use_bert,
             'confidence_threshold': self.confidence_threshold,
-            'auto_retrain': self.auto_retrain
+            'auto_retrain': self.auto_retrain,
+            'inference_backend': self.inference_backend,
+            'background_model_load': self.background_model_load
         }
 
 
@@ -105,30 +113,42 @@ class SmartAIEngine:
     def __init__(self, config: EngineConfig = None):
         self.config = config or EngineConfig()
         
+        # الإقلاع المرحلي: المرحلة 1 (القواعد + السياق + التعلم) فورية،
+        # والمرحلة 2 (نموذج ML) في thread خلفي
+        self._started_at = time.perf_counter()
+        self.startup_times: Dict[str, Optional[float]] = {'core': None, 'ml': None}
+        self.model_load_error: Optional[str] = None
+        self._model_loaded = threading.Event()
+        
         # تهيئة المكونات
         self._init_components()
+        self.startup_times['core'] = time.perf_counter() - self._started_at
+        
+        if self.config.background_model_load:
+            threading.Thread(
+                target=self._load_classifier,
+                name="ml-model-loader",
+                daemon=True
+            ).start()
+        else:
+            self._load_classifier()
         
         logger.info("🚀 تم تشغيل المحرك الذكي")
     
     def _init_components(self):
-        """تهيئة جميع المكونات"""
-        
-        # 1. مصنف النوايا
-        print("📦 جاري تحميل مصنف النوايا...")
-        if self.config.use_bert and BERT_AVAILABLE:
-            self.intent_classifier = SmartBERTClassifier(
-                model_path=f"{self.config.models_dir}/bert_intent.pth",
-                db_path=self.config.db_path
-            )
-            print("   ✅ BERT Classifier")
-        else:
-            self.intent_classifier = SmartIntentClassifier(
-                model_path=f"{self.config.models_dir}/intent_classifier.pth",
-                processor_path=f"{self.config.models_dir}/text_processor.pkl",
-                db_path=self.config.db_path,
-                model_type="lstm"
-            )
-            print("   ✅ LSTM Classifier")
+        """تهيئة المكونات الخفيفة (بدون torch)"""
+        
+        # 1. مصنف النوايا - القواعد حتى يجهز نموذج ML
+        self.rule_classifier = RuleBasedClassifier()
+        self.intent_classifier = self.rule_classifier
+        
+        # تجميع الطلبات المتزامنة في تمريرة واحدة للنموذج
+        self.prediction_batcher = MicroBatcher(
+            self._predict_batch,
+            max_batch_size=self.config.batch_max_size,
+            max_wait_ms=self.config.batch_max_wait_ms
+        )
+        print("   ✅ Rule-based Classifier (مؤقتاً حتى تحميل النموذج)")
         
         # 2. مدير السياق
         print("📦 جاري تحميل مدير السياق...")
@@ -142,11 +162,17 @@ class SmartAIEngine:
         self.feedback_manager = FeedbackManager(self.config.db_path)
         self.feedback_interface = UserFeedbackInterface(self.feedback_manager)
         
-        # 4. نظام التعلم التلقائي
+        # 4. نظام التعلم التلقائي (يحصل على المصنف عند جاهزيته)
+        # عامل التدريب يُنشأ مع مصنف LSTM فقط (ينشر إصدارات LSTM) - مع BERT
+        # يبقى التدريب داخل العملية حتى لا تُعلَّم التصحيحات دون أن تُخدم
+        self.registry = ModelRegistry(self.config.models_dir)
+        self.trainer: Optional[TrainingWorker] = None
+        self.model_watcher: Optional[ModelVersionWatcher] = None
         self.auto_learner = AutoLearningSystem(
             self.feedback_manager,
-            self.intent_classifier,
-            retrain_threshold=self.config.retrain_threshold
+            None,
+            retrain_threshold=self.config.retrain_threshold,
+            trainer=self.trainer
         )
         
         if self.config.auto_retrain:
@@ -156,7 +182,101 @@ class SmartAIEngine:
         # 5. مولد التقارير
         self.reporter = AnalyticsReporter(self.feedback_manager)
         
-        print("\n✅ تم تهيئة جميع المكونات!")
+        print("\n✅ تم تهيئة المكونات الأساسية!")
+    
+    def _load_classifier(self):
+        """
+        المرحلة 2: تحميل مصنف ML (استيراد torch + النموذج)
+        
+        عند النجاح يُستبدل مصنف القواعد ذرياً؛ عند الفشل يبقى المحرك
+        على القواعد ويُسجّل السبب في get_status.
+        """
+        print("📦 جاري تحميل مصنف النوايا (في الخلفية)...")
+        
+        try:
+            classifier = None
+            
+            if self.config.use_bert:
+                try:
+                    from bert_arabic_classifier import SmartBERTClassifier
+                    classifier = SmartBERTClassifier(
+                        model_path=self.registry.checkpoint(BERT_INTENT)['model_path'],
+                        db_path=self.config.db_path,
+                        backend=self.config.inference_backend,
+                        registry=self.registry
+                    )
+                    print("   ✅ BERT Classifier")
+                except ImportError as e:
+                    logger.warning(f"⚠️ BERT غير متوفر ({e}) - استخدام LSTM")
+            
+            if classifier is None:
+                checkpoint = self.registry.checkpoint(INTENT_CLASSIFIER)
+                classifier = self._build_lstm_classifier(checkpoint)
+                print("   ✅ LSTM Classifier")
+                
+                # الإصدارات التي ينشرها عامل التدريب تُبدّل بين الطلبات
+                if self.config.out_of_process_training:
+                    self.trainer = TrainingWorker(self.config.db_path, self.config.models_dir)
+                    self.auto_learner.trainer = self.trainer
+                    self.model_watcher = ModelVersionWatcher(
+                        self.registry,
+                        loader=self._build_lstm_classifier,
+                        on_swap=self._swap_classifier,
+                        interval=self.config.model_watch_interval,
+                        current_version=checkpoint['version']
+                    )
+                    self.model_watcher.start()
+            
+            self._swap_classifier(classifier)
+            self.startup_times['ml'] = time.perf_counter() - self._started_at
+            logger.info(f"✅ مصنف ML جاهز بعد {self.startup_times['ml']:.1f}ث")
+            
+        except Exception as e:
+            self.model_load_error = str(e)
+            logger.error(f"❌ فشل تحميل مصنف ML - الاستمرار بالقواعد: {e}")
+            
+        finally:
+            self._model_loaded.set()
+    
+    def _build_lstm_classifier(self, checkpoint: Dict):
+        """تحميل مصنف LSTM من إصدار (مسارات ModelRegistry.checkpoint)"""
+        from ml_intent_classifier import SmartIntentClassifier
+        return SmartIntentClassifier(
+            model_path=checkpoint['model_path'],
+            processor_path=checkpoint['processor_path'],
+            db_path=self.config.db_path,
+            model_type="lstm",
+            backend=self.config.inference_backend,
+            registry=self.registry
+        )
+    
+    def _swap_classifier(self, classifier, checkpoint: Optional[Dict] = None):
+        """
+        تبديل المصنف بإسناد واحد
+        
+        الدفعة الجارية تُكمل على المصنف القديم، والدفعة التالية تقرأ الجديد.
+        """
+        self.auto_learner.classifier = classifier
+        self.intent_classifier = classifier
+    
+    @property
+    def ml_ready(self) -> bool:
+        """هل يعمل المحرك بمصنف ML (وليس القواعد)"""
+        return self.intent_classifier is not self.rule_classifier
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        انتظار انتهاء تحميل مصنف ML
+        
+        Returns:
+            bool: True إذا أصبح مصنف ML جاهزاً
+        """
+        self._model_loaded.wait(timeout)
+        return self.ml_ready
+    
+    def _predict_batch(self, texts):
+        """التنبؤ بالمصنف الحالي (القواعد ثم ML بعد التحميل)"""
+        return self.intent_classifier.predict_batch(texts)
     
     # ==========================================
     # المعالجة الرئيسية
@@ -166,7 +286,8 @@ class SmartAIEngine:
         self,
         user_id: int,
         message: str,
-        extracted_datetime: Dict = None
+        extracted_datetime: Dict = None,
+        parsed_datetime: Optional[DateTimeParse] = None
     ) -> Dict[str, Any]:
         """
         معالجة رسالة المستخدم
@@ -175,6 +296,7 @@ class SmartAIEngine:
             user_id: معرف المستخدم
             message: نص الرسالة
             extracted_datetime: التاريخ/الوقت المستخرج مسبقاً (اختياري)
+            parsed_datetime: نتيجة datetime_engine للرسالة (تُحسب مرة واحدة)
         
         Returns:
             Dict: {
@@ -191,8 +313,8 @@ class SmartAIEngine:
             # 1. الحصول على سياق المحادثة
             ctx = self.conversation_manager.get_context(user_id)
             
-            # 2. تصنيف النية
-            classification = self.intent_classifier.predict(message)
+            # 2. تصنيف النية (مجمّع مع الرسائل المتزامنة)
+            classification = await self.prediction_batcher.predict(message)
             
             intent = classification['intent']
             confidence = classification['confidence']
@@ -203,7 +325,8 @@ class SmartAIEngine:
                 user_id,
                 message,
                 intent,
-                extracted_datetime or {}
+                extracted_datetime or {},
+                parsed_datetime
             )
             
             # تحديث السياق
@@ -356,11 +479,18 @@ class SmartAIEngine:
         print("🧠 تدريب مصنف النوايا")
         print("="*70)
         
+        if not self.wait_until_ready():
+            return {'success': False, 'reason': 'classifier_not_ready'}
+        
         result = self.intent_classifier.train(epochs=epochs)
+        
+        # الإصدار نشره هذا المصنف - المراقب لا يعيد تحميله
+        if self.model_watcher is not None and result.get('version'):
+            self.model_watcher.current_version = result['version']
         return result
     
     def retrain_with_feedback(self) -> Dict:
-        """إعادة التدريب بناءً على التغذية الراجعة"""
+        """إعادة التدريب بناءً على التغذية الراجعة (في عملية منفصلة عند تفعيل عامل التدريب)"""
         return self.auto_learner.retrain_model()
     
     # ==========================================
@@ -385,23 +515,58 @@ class SmartAIEngine:
     
     def detect_language(self, text: str) -> str:
         """كشف لغة النص"""
-        processor = MultilingualTextProcessor()
-        return processor.detect_language(text)
+        return detect_language(text)
     
     def get_status(self) -> Dict:
         """حالة النظام"""
         return {
             'engine': 'running',
-            'classifier': 'bert' if self.config.use_bert else 'lstm',
+            'classifier': type(self.intent_classifier).__name__,
+            'readiness': self.get_readiness(),
             'auto_learning': self.config.auto_retrain,
             'corrections_pending': len(self.feedback_manager.get_pending_corrections()),
+            'training': {
+                'out_of_process': self.trainer is not None,
+                'running': self.trainer.is_running if self.trainer else self.auto_learner.is_training,
+                'last_result': self.trainer.last_result if self.trainer else None,
+                'model_version': self.model_watcher.current_version if self.model_watcher else None,
+                'registry': self.registry.get_stats(INTENT_CLASSIFIER),
+                'swaps': self.model_watcher.swaps if self.model_watcher else 0
+            },
+            'batching': self.prediction_batcher.get_stats(),
+            'inference_backend': self.intent_classifier.backend,
+            'prediction_cache': (
+                self.intent_classifier.prediction_cache.get_stats() if self.ml_ready else None
+            ),
             'config': self.config.to_dict()
         }
     
+    def get_readiness(self) -> Dict:
+        """مراحل الإقلاع: core (القواعد) فوراً، ml بعد تحميل النموذج"""
+        if self.ml_ready:
+            stage = 'ml'
+        elif self._model_loaded.is_set():
+            stage = 'rules_only'  # فشل التحميل
+        else:
+            stage = 'loading_ml'
+        
+        return {
+            'stage': stage,
+            'core_ready': True,
+            'ml_ready': self.ml_ready,
+            'core_ready_s': self.startup_times['core'],
+            'ml_ready_s': self.startup_times['ml'],
+            'error': self.model_load_error
+        }
+    
     def shutdown(self):
         """إيقاف النظام"""
         if hasattr(self, 'auto_learner'):
             self.auto_learner.stop_monitoring()
+        if self.model_watcher is not None:
+            self.model_watcher.stop()
+        if self.trainer is not None:
+            self.trainer.stop()
         logger.info("🛑 تم إيقاف المحرك الذكي")
 
 
@@ -428,8 +593,15 @@ async def test_engine():
     print("🧪 اختبار المحرك الذكي المتكامل")
     print("="*70)
     
-    # إنشاء المحرك
+    # إنشاء المحرك (الرد الأول بالقواعد قبل جاهزية النموذج)
+    start = time.perf_counter()
     engine = create_engine(use_bert=False, auto_retrain=False)
+    first = await engine.process_message(1, "مرحبا")
+    print(f"\n⚡ أول رد بعد {(time.perf_counter() - start) * 1000:.0f}ms "
+          f"({first.get('method')}) - {engine.get_readiness()['stage']}")
+    
+    engine.wait_until_ready()
+    print(f"🧠 {engine.get_readiness()}")
     
     # تدريب أولي
     print("\n📚 التدريب الأولي...")
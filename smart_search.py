@@ -6,18 +6,21 @@
 ✅ تصنيف النتائج حسب الأهمية
 """
 
-import sqlite3
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from difflib import SequenceMatcher
 import re
 
+from database_pool import get_pool
+from cache_manager import appointment_cache
+
 
 class SmartSearch:
     """محرك بحث ذكي للمواعيد"""
     
     def __init__(self, db_path: str = "agent_data.db"):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
     
     def _similarity(self, a: str, b: str) -> float:
         """حساب نسبة التشابه بين نصين"""
@@ -43,41 +46,19 @@ class SmartSearch:
             priority: الأولوية
             min_similarity: الحد الأدنى للتشابه (0-1)
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # بناء الاستعلام الأساسي
-        sql = "SELECT id, title, description, date_time, priority FROM appointments WHERE user_id = ?"
-        params = [user_id]
-        
-        # إضافة فلاتر
-        if start_date:
-            sql += " AND date_time >= ?"
-            params.append(start_date.strftime('%Y-%m-%d %H:%M:%S'))
-        
-        if end_date:
-            sql += " AND date_time <= ?"
-            params.append(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        
-        if priority:
-            sql += " AND priority = ?"
-            params.append(priority)
-        
-        cursor.execute(sql, params)
-        results = cursor.fetchall()
-        conn.close()
+        # النطاق الزمني من الخط الزمني المخزن للمستخدم
+        timeline = appointment_cache.get_timeline(self.db_path, user_id)
+        results = timeline.between(
+            start_date.strftime('%Y-%m-%d %H:%M:%S') if start_date else None,
+            end_date.strftime('%Y-%m-%d %H:%M:%S') if end_date else None
+        )
         
-        # تحويل إلى قاموس
         appointments = []
-        for row in results:
-            apt = {
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'date_time': row[3],
-                'priority': row[4],
-                'relevance': 1.0  # افتراضي
-            }
+        for apt in results:
+            if priority and apt['priority'] != priority:
+                continue
+            
+            apt['relevance'] = 1.0  # افتراضي
             
             # حساب نسبة الصلة بالبحث
             if query:
@@ -113,10 +94,7 @@ class SmartSearch:
         start_time = target_date
         end_time = target_date + timedelta(minutes=duration_minutes)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        rows = self.pool.execute('''
             SELECT id, title, date_time, priority
             FROM appointments
             WHERE user_id = ?
@@ -128,7 +106,7 @@ class SmartSearch:
         ))
         
         conflicts = []
-        for row in cursor.fetchall():
+        for row in rows:
             conflicts.append({
                 'id': row[0],
                 'title': row[1],
@@ -136,23 +114,18 @@ class SmartSearch:
                 'priority': row[3]
             })
         
-        conn.close()
         return conflicts
     
     def get_suggestions(self, user_id: int, query: str, limit: int = 5) -> List[str]:
         """اقتراحات بحث ذكية بناءً على التاريخ"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        rows = self.pool.execute('''
             SELECT DISTINCT title FROM appointments
             WHERE user_id = ?
             ORDER BY created_at DESC
             LIMIT 100
         ''', (user_id,))
         
-        titles = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        titles = [row[0] for row in rows]
         
         # العثور على أقرب التطابقات
         suggestions = []
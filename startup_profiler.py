@@ -0,0 +1,201 @@
+# startup_profiler.py
+"""
+قياس زمن وذاكرة الاستيراد عند الإقلاع
+✅ نسخة منظمة من python -X importtime + tracemalloc (لكل وحدة)
+✅ القياس في عملية فرعية نظيفة (إقلاع بارد حقيقي)
+✅ فحص المسار البارد: المكتبات الثقيلة لا تُستورد قبل بدء الاستقبال
+
+الاستخدام:
+    python run.py --profile-startup
+    python run.py --check-cold-imports   # رمز خروج 1 عند المخالفة (للـ CI)
+"""
+
+import json
+import re
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# مكتبات ثقيلة يجب ألا تظهر في مسار الإقلاع (تُستورد عند أول استخدام)
+HEAVY_MODULES = ('torch', 'transformers', 'matplotlib', 'aiosqlite')
+
+# الوحدة التي يستوردها run.py قبل بدء الاستقبال
+COLD_PATH_TARGET = 'telegram_bot'
+
+TARGET_START = '__TARGET_START__'
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)')
+
+# يُشغّل في العملية الفرعية: استيراد الهدف تحت tracemalloc ثم تقرير JSON
+CHILD_SCRIPT = '''
+import json, sys, tracemalloc
+tracemalloc.start()
+sys.stderr.write("__TARGET_START__\\n")
+sys.stderr.flush()
+error = None
+try:
+    import __TARGET__
+except BaseException as e:
+    error = f"{type(e).__name__}: {e}"
+snapshot = tracemalloc.take_snapshot()
+current, peak = tracemalloc.get_traced_memory()
+print(json.dumps({
+    'error': error,
+    'peak': peak,
+    'memory': {stat.traceback[0].filename: stat.size for stat in snapshot.statistics('filename')},
+    'files': {name: getattr(module, '__file__', None) for name, module in list(sys.modules.items())}
+}))
+'''
+
+
+@dataclass
+class ImportRecord:
+    """وحدة واحدة في شجرة الاستيراد"""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+    memory_bytes: int = 0
+
+
+@dataclass
+class StartupProfile:
+    """نتيجة قياس الإقلاع"""
+    target: str
+    records: List[ImportRecord] = field(default_factory=list)
+    modules: List[str] = field(default_factory=list)
+    peak_bytes: int = 0
+    wall_s: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def total_us(self) -> int:
+        """زمن الاستيراد الكلي (مجموع الوحدات في المستوى الأعلى)"""
+        return sum(record.cumulative_us for record in self.records if record.depth == 0)
+
+    def heavy_imports(self, heavy: Sequence[str] = HEAVY_MODULES) -> List[str]:
+        """المكتبات الثقيلة التي استُوردت"""
+        loaded = {name.split('.')[0] for name in self.modules}
+        return [name for name in heavy if name in loaded]
+
+    def to_dict(self) -> Dict:
+        return {
+            'target': self.target,
+            'total_ms': self.total_us / 1000,
+            'wall_s': self.wall_s,
+            'peak_kb': self.peak_bytes / 1024,
+            'modules': len(self.modules),
+            'heavy_imports': self.heavy_imports(),
+            'error': self.error,
+            'records': [record.__dict__ for record in self.records]
+        }
+
+
+def _parse_importtime(stderr: str) -> List[ImportRecord]:
+    """تحليل مخرجات -X importtime (بعد علامة بدء استيراد الهدف فقط)"""
+    records = []
+    _, _, stderr = stderr.rpartition(TARGET_START)
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(ImportRecord(
+                module=module,
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(indent) - 1) // 2
+            ))
+    return records
+
+
+def profile_startup(target: str = COLD_PATH_TARGET, cwd: Optional[str] = None) -> StartupProfile:
+    """
+    قياس استيراد وحدة في عملية فرعية نظيفة
+
+    Args:
+        target: الوحدة المراد استيرادها
+        cwd: مجلد المشروع (الافتراضي: مجلد هذا الملف)
+
+    Returns:
+        StartupProfile: زمن كل وحدة (self/cumulative) وذاكرتها
+    """
+    import time
+
+    cwd = cwd or str(Path(__file__).parent)
+    script = CHILD_SCRIPT.replace('__TARGET__', target)
+
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=cwd,
+        capture_output=True,
+        text=True
+    )
+    profile = StartupProfile(target=target, wall_s=time.perf_counter() - start)
+    profile.records = _parse_importtime(completed.stderr)
+
+    try:
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        profile.error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'no report'
+        return profile
+
+    profile.error = report['error']
+    profile.peak_bytes = report['peak']
+    profile.modules = sorted(report['files'])
+
+    # الذاكرة المخصصة من ملف كل وحدة (وما زالت حية بعد الاستيراد)
+    memory = report['memory']
+    for record in profile.records:
+        filename = report['files'].get(record.module)
+        if filename:
+            record.memory_bytes = memory.get(filename, 0)
+
+    return profile
+
+
+def check_cold_path(target: str = COLD_PATH_TARGET, heavy: Sequence[str] = HEAVY_MODULES) -> List[str]:
+    """
+    فحص المسار البارد
+
+    Returns:
+        List[str]: المكتبات الثقيلة المستوردة (فارغة = سليم)
+    """
+    return profile_startup(target).heavy_imports(heavy)
+
+
+def print_profile(profile: StartupProfile, top: int = 25):
+    """طباعة تقرير الإقلاع"""
+    print("\n" + "="*78)
+    print(f"⏱️ قياس الإقلاع: import {profile.target}")
+    print("="*78)
+
+    print(f"\n📊 الزمن الكلي: {profile.total_us / 1000:.1f}ms "
+          f"(العملية: {profile.wall_s:.2f}ث) | الذاكرة القصوى: {profile.peak_bytes / 1024:,.0f}KB "
+          f"| الوحدات: {len(profile.modules)}")
+
+    if profile.error:
+        print(f"⚠️ الاستيراد توقف: {profile.error}")
+
+    print(f"\n🐢 أبطأ {top} وحدة (زمن ذاتي):")
+    print(f"   {'الوحدة':<40}{'ذاتي ms':>10}{'تراكمي ms':>12}{'ذاكرة KB':>12}")
+    for record in sorted(profile.records, key=lambda r: r.self_us, reverse=True)[:top]:
+        print(f"   {record.module:<40}{record.self_us / 1000:>10.1f}"
+              f"{record.cumulative_us / 1000:>12.1f}{record.memory_bytes / 1024:>12.0f}")
+
+    heavy = profile.heavy_imports()
+    if heavy:
+        print(f"\n❌ مكتبات ثقيلة في مسار الإقلاع: {', '.join(heavy)}")
+    else:
+        print(f"\n✅ لا مكتبات ثقيلة في مسار الإقلاع ({', '.join(HEAVY_MODULES)})")
+
+    print("="*78 + "\n")
+
+
+if __name__ == "__main__":
+    print_profile(profile_startup(sys.argv[1] if len(sys.argv) > 1 else COLD_PATH_TARGET))
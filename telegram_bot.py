@@ -1,4 +1,5 @@
 # telegram_bot.py
+import importlib.util
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -22,10 +23,16 @@ from config import Config  # استخدام Config المحسّن
 # Rate Limiter عام
 bot_rate_limiter = RateLimiter(max_requests=30, time_window=60)
 from intelligent_agent import IntelligentAgent
+from write_behind import close_all_write_buffers
+from outbound_governor import OutboundGovernor
+
+# المسار غير المتزامن (aiosqlite) - وإلا يُشغّل المسار المتزامن في thread
+# (فحص التوفر فقط؛ الاستيراد عند إنشاء البوت حتى لا يثقل مسار الإقلاع)
+ASYNC_AGENT_AVAILABLE = importlib.util.find_spec("aiosqlite") is not None
 
 from enhanced_keyboard import EnhancedKeyboard
 from datetime import datetime, timedelta
-import sqlite3
+import asyncio
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """معالج الأخطاء العام"""
@@ -51,13 +58,30 @@ logger = logging.getLogger(__name__)
 class TelegramBot:
     def __init__(self, token: str):
         self.token = token
-        self.agent = IntelligentAgent()
+        self.agent = self._create_agent()
+        
+        # كل الرسائل الصادرة (ردود، تذكيرات، رسوم) تمر عبر ممرات أولوية واحدة
+        self.outbound = OutboundGovernor()
         
         # إنشاء Application مع job_queue مفعّل
-        self.app = Application.builder().token(token).build()
+        self.app = (
+            Application.builder()
+            .token(token)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         
         self._setup_handlers()
     
+    @staticmethod
+    def _create_agent() -> IntelligentAgent:
+        """الوكيل غير المتزامن إن توفر aiosqlite، وإلا المتزامن"""
+        if ASYNC_AGENT_AVAILABLE:
+            from async_database import IntelligentAgentAsync
+            return IntelligentAgentAsync()
+        return IntelligentAgent()
+    
     async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """البحث في المواعيد"""
         try:
@@ -118,18 +142,22 @@ class TelegramBot:
             # تصدير iCal
             ical_file = exporter.export_to_ical(user_id)
         
-            # إرسال الملف
+            # إرسال الملف (ممر bulk - لا يزاحم الردود والتذكيرات)
             with open(ical_file, 'rb') as f:
-                await update.message.reply_document(
-                    document=f,
-                    filename=f"my_calendar_{datetime.now().strftime('%Y%m%d')}.ics",
-                    caption="📅 **تقويمك بصيغة iCal**\n\n"
-                        "يمكنك استيراده في:\n"
-                        "• Google Calendar\n"
-                        "• Apple Calendar\n"
-                        "• Outlook\n"
-                        "• أي تطبيق تقويم آخر"
-                )
+                async def send_document():
+                    f.seek(0)
+                    return await update.message.reply_document(
+                        document=f,
+                        filename=f"my_calendar_{datetime.now().strftime('%Y%m%d')}.ics",
+                        caption="📅 **تقويمك بصيغة iCal**\n\n"
+                            "يمكنك استيراده في:\n"
+                            "• Google Calendar\n"
+                            "• Apple Calendar\n"
+                            "• Outlook\n"
+                            "• أي تطبيق تقويم آخر"
+                    )
+                
+                await self.outbound.submit(update.effective_chat.id, send_document, lane='bulk')
         
             # حذف الملف المؤقت
             Path(ical_file).unlink()
@@ -155,24 +183,15 @@ class TelegramBot:
         
             # رسم النشاط الأسبوعي
             weekly_chart = analytics.plot_weekly_activity(user_id)
-            await update.message.reply_photo(
-                photo=weekly_chart,
-                caption="📅 **نشاطك الأسبوعي**"
-            )
+            await self._send_bulk_photo(update, weekly_chart, "📅 **نشاطك الأسبوعي**")
         
             # رسم الأولويات
             priority_chart = analytics.plot_priority_distribution(user_id)
-            await update.message.reply_photo(
-                photo=priority_chart,
-                caption="🎯 **توزيع الأولويات**"
-            )
+            await self._send_bulk_photo(update, priority_chart, "🎯 **توزيع الأولويات**")
         
             # رسم الاتجاه الشهري
             trend_chart = analytics.plot_monthly_trend(user_id)
-            await update.message.reply_photo(
-                photo=trend_chart,
-                caption="📈 **الاتجاه الشهري**"
-            )
+            await self._send_bulk_photo(update, trend_chart, "📈 **الاتجاه الشهري**")
     
         except ImportError:
             await update.message.reply_text(
@@ -184,6 +203,14 @@ class TelegramBot:
         except Exception as e:
             logger.error(f"خطأ في الرسوم البيانية: {e}")
             await update.message.reply_text("❌ حدث خطأ في إنشاء الرسوم")
+    def _send_bulk_photo(self, update: Update, photo, caption: str):
+        """إرسال صورة عبر ممر bulk (تُعاد للبداية عند إعادة المحاولة)"""
+        async def send():
+            photo.seek(0)
+            return await update.message.reply_photo(photo=photo, caption=caption)
+        
+        return self.outbound.submit(update.effective_chat.id, send, lane='bulk')
+    
     def _setup_handlers(self):
         """إعداد معالجات الأوامر والرسائل"""
         self.app.add_handler(CommandHandler("start", self.start_command))
@@ -204,6 +231,27 @@ class TelegramBot:
         # ✅ إضافة معالج الأخطاء
         self.app.add_error_handler(error_handler)
     
+    async def _get_appointments(self, user_id: int, start_date: str = None,
+                                end_date: str = None):
+        """جلب المواعيد دون حجز event loop"""
+        if ASYNC_AGENT_AVAILABLE:
+            return await self.agent.async_db.get_appointments(user_id, start_date, end_date)
+        return await asyncio.to_thread(self.agent.db.get_appointments, user_id, start_date, end_date)
+    
+    async def _post_init(self, application: Application):
+        """ربط منظّم الرسائل بـ event loop البوت (التذكيرات من threads أخرى تُرسل إليه)"""
+        self.outbound.bind()
+    
+    async def _post_shutdown(self, application: Application):
+        """تفريغ الرسائل والكتابات المؤجلة وإغلاق الاتصال غير المتزامن عند إيقاف البوت"""
+        await self.outbound.close()
+        logger.info(f"📤 الرسائل الصادرة: {self.outbound.get_stats()}")
+        
+        await asyncio.to_thread(close_all_write_buffers)
+        
+        if ASYNC_AGENT_AVAILABLE:
+            await self.agent.close()
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """أمر البداية - رد بثلاث لغات"""
         user = update.effective_user
@@ -275,7 +323,7 @@ I'm your advanced intelligent assistant 🤖
     async def appointments_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """عرض جميع المواعيد - بثلاث لغات"""
         user_id = update.effective_user.id
-        appointments = self.agent.db.get_appointments(user_id)
+        appointments = await self._get_appointments(user_id)
         
         if not appointments:
             no_apt_msg = """📭 لا توجد مواعيد حالياً
@@ -309,7 +357,7 @@ I'm your advanced intelligent assistant 🤖
         today_start = datetime.now().replace(hour=0, minute=0, second=0)
         today_end = datetime.now().replace(hour=23, minute=59, second=59)
         
-        appointments = self.agent.db.get_appointments(
+        appointments = await self._get_appointments(
             user_id, 
             today_start.strftime('%Y-%m-%d %H:%M:%S'),
             today_end.strftime('%Y-%m-%d %H:%M:%S')
@@ -343,7 +391,7 @@ I'm your advanced intelligent assistant 🤖
         week_start = datetime.now().replace(hour=0, minute=0, second=0)
         week_end = week_start + timedelta(days=7)
         
-        appointments = self.agent.db.get_appointments(
+        appointments = await self._get_appointments(
             user_id,
             week_start.strftime('%Y-%m-%d %H:%M:%S'),
             week_end.strftime('%Y-%m-%d %H:%M:%S')
@@ -383,8 +431,9 @@ I'm your advanced intelligent assistant 🤖
             from advanced_features import MonthlyCalendar
             
             user_id = update.effective_user.id
+            now = datetime.now()
             calendar = MonthlyCalendar(self.agent.db.db_path)
-            calendar_text = calendar.generate_calendar(user_id)
+            calendar_text = calendar.generate_calendar_text(user_id, now.year, now.month)
             
             if update.message:
                 await update.message.reply_text(calendar_text, parse_mode='Markdown')
@@ -457,112 +506,22 @@ I'm your advanced intelligent assistant 🤖
         user_id = update.effective_user.id
         message_text = update.message.text
         
-        # ==========================================
-        # المرحلة 2: التحقق من التذكيرات المخصصة أولاً
-        # ==========================================
-        import re
-        
-        reminder_patterns = [
-            r'ذكرني قبل (\d+) دقيقة',
-            r'ذكرني قبل (\d+) دقائق',
-            r'ذكرني قبل ساعة',
-            r'ذكرني قبل يوم',
-            r'rappelle.moi (\d+) minutes? avant',
-            r'remind me (\d+) minutes? before'
-        ]
-        
-        is_reminder_request = False
-        for pattern in reminder_patterns:
-            if re.search(pattern, message_text.lower(), re.IGNORECASE):
-                is_reminder_request = True
-                break
-        
-        if is_reminder_request:
-            try:
-                from advanced_features import CustomReminderManager
-                
-                # الحصول على آخر موعد
-                conn = sqlite3.connect(self.agent.db.db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute('''
-                    SELECT id FROM appointments 
-                    WHERE user_id = ? 
-                    ORDER BY created_at DESC 
-                    LIMIT 1
-                ''', (user_id,))
-                
-                last_appointment = cursor.fetchone()
-                
-                if last_appointment:
-                    appointment_id = last_appointment[0]
-                    
-                    # تحديد عدد الدقائق
-                    minutes_before = 30  # افتراضي
-                    for pattern in reminder_patterns:
-                        match = re.search(pattern, message_text.lower(), re.IGNORECASE)
-                        if match:
-                            if 'ساعة' in message_text or 'hour' in message_text or 'heure' in message_text:
-                                minutes_before = 60
-                            elif 'يوم' in message_text or 'day' in message_text or 'jour' in message_text:
-                                minutes_before = 1440
-                            else:
-                                try:
-                                    minutes_before = int(match.group(1))
-                                except:
-                                    minutes_before = 30
-                            break
-                    
-                    # إضافة التذكير
-                    reminder_mgr = CustomReminderManager(self.agent.db.db_path)
-                    reminder_id = reminder_mgr.add_custom_reminder(
-                        appointment_id=appointment_id,
-                        minutes_before=minutes_before,
-                        custom_message=f"تذكير: لديك موعد بعد {minutes_before} دقيقة"
-                    )
-                    
-                    conn.close()
-                    
-                    response = (
-                        f"✅ تم إضافة التذكير!\n"
-                        f"🔔 سأذكرك قبل {minutes_before} دقيقة من الموعد #{appointment_id}\n\n"
-                        f"✅ Rappel ajouté!\n"
-                        f"🔔 Je vous rappellerai {minutes_before} minutes avant le RDV\n\n"
-                        f"✅ Reminder added!\n"
-                        f"🔔 I'll remind you {minutes_before} minutes before the appointment"
-                    )
-                    
-                    await update.message.reply_text(response)
-                    return  # توقف هنا - لا نرسل للـ agent
-                else:
-                    conn.close()
-                    response = (
-                        "⚠️ لا يوجد موعد حديث لإضافة تذكير له\n"
-                        "أضف موعداً أولاً ثم أضف التذكير\n\n"
-                        "⚠️ Aucun RDV récent\n"
-                        "Ajoutez d'abord un RDV\n\n"
-                        "⚠️ No recent appointment\n"
-                        "Add an appointment first"
-                    )
-                    await update.message.reply_text(response)
-                    return
-                    
-            except Exception as e:
-                logger.error(f"خطأ في التذكيرات المخصصة: {e}")
-                # نكمل للمعالج العادي
-        
-        # ==========================================
-        # المعالجة العادية
-        # ==========================================
-        
         # إظهار أن البوت يكتب
         await update.message.chat.send_action("typing")
         
-        # معالجة الرسالة بواسطة الوكيل الذكي
-        response = self.agent.process_message(user_id, message_text)
+        # معالجة الرسالة بواسطة الوكيل الذكي (يشمل التذكيرات المخصصة)
+        # بدون حجز event loop حتى لا تنتظر رسائل المستخدمين الآخرين
+        if ASYNC_AGENT_AVAILABLE:
+            response = await self.agent.process_message_async(user_id, message_text)
+        else:
+            response = await asyncio.to_thread(self.agent.process_message, user_id, message_text)
         
-        # إرسال الرد
-        await update.message.reply_text(response)
+        # إرسال الرد (ممر reply - بعد تذكيرات "الآن" وقبل المسبقة والرسوم)
+        await self.outbound.submit(
+            update.effective_chat.id,
+            lambda: update.message.reply_text(response),
+            lane='reply'
+        )
     
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالجة ضغطات الأزرار"""
@@ -579,95 +538,36 @@ I'm your advanced intelligent assistant 🤖
             await self.help_command(update, context)
     
     async def check_reminders(self, context: ContextTypes.DEFAULT_TYPE):
-        """✅ فحص التذكيرات وإرسالها - محدّث مع تذكير عند الموعد"""
+        """✅ حجز وإرسال التذكيرات المستحقة على دفعات (outbox)"""
         try:
-            # استيراد دالة حساب الوقت المتبقي
-            try:
-                from time_utils import get_time_remaining_message
-                has_time_utils = True
-            except ImportError:
-                has_time_utils = False
-        
-            conn = sqlite3.connect(self.agent.db.db_path)
-            cursor = conn.cursor()
-        
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-            # جلب التذكيرات مع نوعها (custom_message)
-            cursor.execute('''
-                SELECT r.id, r.appointment_id, a.user_id, a.title, a.date_time, r.custom_message
-                FROM reminders r
-                JOIN appointments a ON r.appointment_id = a.id
-                WHERE r.reminder_time <= ? AND r.sent = 0
-            ''', (now,))
-        
-            reminders = cursor.fetchall()
-        
-            if reminders:
-                logger.info(f"🔔 وجدت {len(reminders)} تذكير لإرسالها")
-        
-            for reminder in reminders:
-                reminder_id, apt_id, user_id, title, apt_time, custom_msg = reminder
-            
-                # تنظيف التاريخ
-                if '.' in apt_time:
-                    apt_time = apt_time.split('.')[0]
+            from reminder_system import deliver_claimed
             
-                # تحديد نوع التذكير
-                reminder_type = "advance"  # افتراضي
-                if custom_msg and "type:" in custom_msg:
-                    reminder_type = custom_msg.split("type:")[1].strip()
+            outbox = self.reminder_outbox
             
-                # ✨ رسالة مختلفة حسب نوع التذكير
-                if reminder_type == "now":
-                    # 🚨 تذكير عند الموعد - رسالة إلحاحية!
-                    message = f"""🚨 **حان وقت الموعد! | C'est l'heure! | It's time!** 🚨
-
-    📋 **{title}**
-    📅 {apt_time}
-
-    ⏰ **موعدك الآن!**
-    ⏰ **Votre RDV maintenant!**
-    ⏰ **Your appointment is NOW!**
-
-    🏃‍♂️ لا تتأخر! | Ne soyez pas en retard! | Don't be late!"""
-                else:
-                    # 🔔 تذكير عادي (قبل الموعد)
-                    # حساب الوقت المتبقي
-                    time_remaining_msg = ""
-                    if has_time_utils:
-                        try:
-                            apt_datetime = datetime.strptime(apt_time, '%Y-%m-%d %H:%M:%S')
-                            time_remaining_msg = "\n\n" + get_time_remaining_message(apt_datetime)
-                        except Exception as e:
-                            logger.warning(f"خطأ في حساب الوقت: {e}")
+            while True:
+                reminders = outbox.claim_due()
                 
-                    message = f"""⏰ **تذكير بموعد | Rappel | Reminder:**
-
-    📋 {title}
-    📅 {apt_time}{time_remaining_msg}
-
-    🔔 لا تنسى موعدك!
-    🔔 N'oubliez pas votre RDV!
-    🔔 Don't forget your appointment!"""
-            
-                try:
-                    await context.bot.send_message(
-                    chat_id=user_id, 
-                    text=message, 
-                    parse_mode='Markdown'
-                    )
+                if not reminders:
+                    break
                 
-                    cursor.execute('UPDATE reminders SET sent = 1 WHERE id = ?', (reminder_id,))
-                    conn.commit()
+                logger.info(f"🔔 حجزت {len(reminders)} تذكير لإرسالها ({outbox.worker_id})")
                 
-                    emoji = "🚨" if reminder_type == "now" else "✅"
-                    logger.info(f"{emoji} تم إرسال تذكير ({reminder_type}) للمستخدم {user_id}")
+                sent_ids = await deliver_claimed(
+                    outbox, self.reminder_pipeline, context.bot, reminders
+                )
                 
-                except Exception as e:
-                    logger.error(f"❌ خطأ في إرسال تذكير: {e}")
-        
-            conn.close()
+                # commit واحد لجميع التذكيرات المرسلة
+                outbox.complete(sent_ids)
+                
+                logger.info(f"✅ تم إرسال {len(sent_ids)}/{len(reminders)} تذكير")
+                
+                if len(reminders) < outbox.batch_size:
+                    break
+            
+            # إيقاظ المجدول عند انتهاء أقرب حجز قائم (عامل متوقف أو إرسال فاشل)
+            expiry = outbox.next_lease_expiry()
+            if expiry:
+                self.reminder_scheduler.notify(*expiry)
         
         except Exception as e:
             logger.error(f"❌ خطأ في فحص التذكيرات: {e}")
@@ -675,13 +575,20 @@ I'm your advanced intelligent assistant 🤖
     def setup_jobs(self):
         """إعداد المهام الدورية (التذكيرات)"""
         try:
-            # المحاولة 1: استخدام job_queue المدمج
+            # المحاولة 1: استخدام job_queue المدمج (يُوقَظ عند حلول التذكير)
             if self.app.job_queue is not None:
-                self.app.job_queue.run_repeating(
-                    self.check_reminders, 
-                    interval=60,
-                    first=10
+                from reminder_system import (
+                    ReminderScheduler, ReminderDeliveryPipeline, ReminderOutbox
                 )
+                
+                job_queue = self.app.job_queue
+                self.reminder_pipeline = ReminderDeliveryPipeline(governor=self.outbound)
+                self.reminder_outbox = ReminderOutbox(self.agent.db.db_path)
+                self.reminder_scheduler = ReminderScheduler(
+                    self.agent.db.db_path,
+                    on_due=lambda: job_queue.run_once(self.check_reminders, when=0)
+                )
+                self.reminder_scheduler.start()
                 logger.info("✅ تم تفعيل نظام التذكيرات (job_queue)")
                 print("✅ نظام التذكيرات مفعّل (job_queue)")
                 return True
@@ -693,7 +600,9 @@ I'm your advanced intelligent assistant 🤖
                 try:
                     from reminder_system import BackgroundReminderSystem
                     
-                    self.reminder_system = BackgroundReminderSystem(self.app, self.agent.db.db_path)
+                    self.reminder_system = BackgroundReminderSystem(
+                        self.app, self.agent.db.db_path, governor=self.outbound
+                    )
                     self.reminder_system.start()
                     
                     logger.info("✅ تم تفعيل النظام البديل")
@@ -724,7 +633,7 @@ I'm your advanced intelligent assistant 🤖
         reminders_ok = self.setup_jobs()
         
         if reminders_ok:
-            print("   ✅ التذكيرات ستُفحص كل 60 ثانية")
+            print("   ✅ التذكيرات تُرسل عند موعدها مباشرة")
         else:
             print("   ⚠️ التذكيرات لن تعمل")
         
@@ -786,7 +695,7 @@ def run_bot():
         print("🔔 بدء نظام التذكيرات...")
         try:
             from reminder_system import BackgroundReminderSystem
-            reminder_system = BackgroundReminderSystem(bot.app, bot.agent.db.db_path)
+            reminder_system = BackgroundReminderSystem(bot.app, bot.agent.db.db_path, governor=bot.outbound)
             reminder_system.start()
             print("✅ نظام التذكيرات يعمل")
         except Exception as e:
@@ -0,0 +1,259 @@
+# training_worker.py
+"""
+عامل التدريب خارج عملية البوت
+✅ التدريب (الكامل أو التزايدي) في عملية منفصلة - لا يشارك البوت الـ GIL
+✅ كل تدريب ناجح يُنشر كإصدار مستقل في سجل النماذج (model_registry.py)
+✅ النشر ذري: مجلد staging ← rename ← مؤشر current.json بـ os.replace
+✅ جانب الخدمة يكتشف الإصدار الجديد ويبدّل المصنف بين الطلبات
+
+الاستخدام:
+    python training_worker.py --mode incremental
+    python training_worker.py --mode full --epochs 30
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+from model_registry import INTENT_CLASSIFIER, ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+TRAINING_MODES = ('incremental', 'full')
+
+
+# ==========================================
+# التدريب (داخل العملية المنفصلة)
+# ==========================================
+
+def run_training(
+    db_path: str = "agent_data.db",
+    models_dir: str = "models",
+    mode: str = 'incremental',
+    epochs: int = 5
+) -> Dict:
+    """
+    تدريب إصدار جديد ونشره (يُشغّل في عملية العامل)
+
+    يبدأ من الإصدار المنشور؛ المصنف يحفظ عبر السجل (staging ← publish)،
+    فالمؤشر لا يتغير إلا عند النجاح (والتدريب التزايدي يُرفض عند انخفاض الدقة).
+    """
+    from ml_intent_classifier import SmartIntentClassifier
+    from feedback_learning_system import AutoLearningSystem, FeedbackManager
+
+    registry = ModelRegistry(models_dir)
+    current = registry.checkpoint(INTENT_CLASSIFIER)
+    classifier = SmartIntentClassifier(
+        model_path=current['model_path'],
+        processor_path=current['processor_path'],
+        db_path=db_path,
+        model_type="lstm",
+        registry=registry
+    )
+
+    learner = AutoLearningSystem(FeedbackManager(db_path), classifier)
+    result = learner.retrain_model(mode=mode, epochs=epochs)
+
+    # التدريب الكامل لا يحتاج تصحيحات معلقة
+    if mode == 'full' and result.get('reason') == 'no_corrections':
+        result = classifier.train(epochs=epochs)
+
+    if not result.get('version'):
+        logger.info(f"ℹ️ لم يُنشر إصدار جديد: {result.get('reason')}")
+
+    return result
+
+
+# ==========================================
+# جانب البوت: تشغيل العامل ومراقبة الإصدارات
+# ==========================================
+
+class TrainingWorker:
+    """
+    تشغيل التدريب في عملية منفصلة (python training_worker.py)
+
+    عملية واحدة على الأكثر في نفس الوقت؛ النتيجة تُقرأ من stdout.
+    """
+
+    def __init__(self, db_path: str = "agent_data.db", models_dir: str = "models"):
+        self.db_path = db_path
+        self.models_dir = models_dir
+
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self.last_result: Optional[Dict] = None
+        self.started_at: Optional[float] = None
+        self._done = threading.Event()
+        self._done.set()
+
+    @property
+    def is_running(self) -> bool:
+        with self._lock:
+            return self._process is not None and self._process.poll() is None
+
+    def start(self, mode: str = 'incremental', epochs: int = 5) -> bool:
+        """
+        بدء تدريب في الخلفية
+
+        Returns:
+            bool: False إذا كان تدريب آخر قيد التشغيل
+        """
+        if mode not in TRAINING_MODES:
+            raise ValueError(f"Invalid mode: {mode}")
+
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return False
+
+            self._process = subprocess.Popen(
+                [
+                    sys.executable, str(Path(__file__).resolve()),
+                    '--mode', mode,
+                    '--epochs', str(epochs),
+                    '--db', self.db_path,
+                    '--models-dir', self.models_dir
+                ],
+                stdout=subprocess.PIPE,
+                text=True
+            )
+            self.started_at = time.time()
+            self.last_result = None
+            self._done.clear()
+            process = self._process
+
+        threading.Thread(
+            target=self._collect,
+            args=(process, self.started_at),
+            name="training-worker",
+            daemon=True
+        ).start()
+        logger.info(f"🔄 بدء التدريب ({mode}) في العملية {process.pid}")
+        return True
+
+    def _collect(self, process: subprocess.Popen, started_at: float):
+        """انتظار العملية وقراءة النتيجة (آخر سطر JSON في stdout)"""
+        stdout, _ = process.communicate()
+
+        try:
+            result = json.loads(stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            result = {'success': False, 'reason': f'worker_exit_{process.returncode}'}
+
+        result['duration_s'] = time.time() - started_at
+        self.last_result = result
+        self._done.set()
+        logger.info(f"🏁 انتهى التدريب: {result.get('version') or result.get('reason')}")
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """انتظار انتهاء التدريب الحالي"""
+        self._done.wait(timeout)
+        return self.last_result
+
+    def stop(self, timeout: float = 10.0):
+        """إيقاف التدريب الجاري (الإصدار المنشور لا يتأثر)"""
+        with self._lock:
+            process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class ModelVersionWatcher:
+    """
+    مراقبة الإصدار الحالي في السجل وتبديل المصنف عند تغيّره
+
+    التحميل يتم في thread المراقبة؛ on_swap يستقبل المصنف الجاهز
+    فيبدّل المرجع بإسناد واحد (الطلبات الجارية تُكمل على القديم).
+    """
+
+    def __init__(self, registry: ModelRegistry, loader, on_swap, interval: float = 30.0,
+                 current_version: Optional[str] = None, name: str = INTENT_CLASSIFIER):
+        """
+        Args:
+            loader: دالة (checkpoint) -> مصنف جديد محمّل
+            on_swap: دالة (مصنف, checkpoint) تُستدعى بعد التحميل
+            interval: فترة الفحص (ثانية)
+        """
+        self.registry = registry
+        self.name = name
+        self.loader = loader
+        self.on_swap = on_swap
+        self.interval = interval
+        self.current_version = current_version
+
+        self.swaps = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """فحص واحد: تحميل وتبديل إذا تغيّر الإصدار"""
+        version = self.registry.current_version(self.name)
+        if version is None or version == self.current_version:
+            return False
+
+        checkpoint = self.registry.checkpoint(self.name)
+        try:
+            classifier = self.loader(checkpoint)
+        except Exception as e:
+            logger.error(f"❌ فشل تحميل الإصدار {checkpoint['version']}: {e}")
+            return False
+
+        self.on_swap(classifier, checkpoint)
+        self.current_version = checkpoint['version']
+        self.swaps += 1
+        logger.info(f"🔁 تبديل المصنف إلى الإصدار {checkpoint['version']}")
+        return True
+
+    def start(self):
+        """بدء المراقبة في thread خلفي"""
+        self._thread = threading.Thread(target=self._loop, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"❌ خطأ في مراقبة الإصدارات: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+# ==========================================
+# نقطة الدخول (العملية المنفصلة)
+# ==========================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lamis training worker")
+    parser.add_argument('--mode', choices=TRAINING_MODES, default='incremental')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--db', default="agent_data.db")
+    parser.add_argument('--models-dir', default="models")
+    args = parser.parse_args()
+
+    # السجلات على stderr؛ stdout للنتيجة فقط
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    sys.stdout, result_stream = sys.stderr, sys.stdout
+
+    try:
+        result = run_training(args.db, args.models_dir, args.mode, args.epochs)
+    except Exception as e:
+        logger.error(f"❌ فشل التدريب: {e}")
+        result = {'success': False, 'reason': str(e)}
+
+    result_stream.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+    result_stream.flush()
+    sys.exit(0 if result.get('success') else 1)
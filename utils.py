@@ -8,176 +8,61 @@ from datetime import datetime, timedelta
 import re
 from typing import Optional, Tuple, List
 
+from datetime_engine import datetime_engine
+
 class DateTimeParser:
-    """محلل التواريخ والأوقات متعدد اللغات"""
+    """
+    محلل التواريخ والأوقات متعدد اللغات
+    
+    واجهة توافق فوق المحلل الموحد (datetime_engine) - كل الدوال
+    تقرأ من نفس المسح الواحد للرسالة.
+    """
+    
+    @staticmethod
+    def _parse_relative_date(text: str) -> Optional[datetime]:
+        """كلمة مفتاحية (اليوم/غداً/...) أو يوم أسبوع - بأي لغة"""
+        parsed = datetime_engine.parse(text)
+        if parsed.date_source in ('keyword', 'weekday'):
+            return parsed.date
+        return None
     
     @staticmethod
     def parse_arabic_date(text: str) -> Optional[datetime]:
         """تحليل التواريخ بالعربية"""
-        now = datetime.now()
-        text = text.lower()
-        
-        # الكلمات المفتاحية
-        if 'اليوم' in text:
-            return now
-        elif 'غدا' in text or 'غدً' in text:
-            return now + timedelta(days=1)
-        elif 'بعد غد' in text:
-            return now + timedelta(days=2)
-        elif 'الأسبوع القادم' in text or 'الاسبوع القادم' in text:
-            return now + timedelta(weeks=1)
-        elif 'الشهر القادم' in text:
-            return now + timedelta(days=30)
-        
-        # أيام الأسبوع
-        days_map = {
-            'السبت': 5, 'الأحد': 6, 'الاثنين': 0,
-            'الثلاثاء': 1, 'الأربعاء': 2, 'الخميس': 3, 'الجمعة': 4
-        }
-        
-        for day_name, day_num in days_map.items():
-            if day_name in text:
-                days_ahead = (day_num - now.weekday()) % 7
-                if days_ahead == 0:
-                    days_ahead = 7
-                return now + timedelta(days=days_ahead)
-        
-        return None
+        return DateTimeParser._parse_relative_date(text)
     
     @staticmethod
     def parse_french_date(text: str) -> Optional[datetime]:
         """تحليل التواريخ بالفرنسية"""
-        now = datetime.now()
-        text = text.lower()
-        
-        if "aujourd'hui" in text or 'aujourdhui' in text:
-            return now
-        elif 'demain' in text:
-            return now + timedelta(days=1)
-        elif 'après-demain' in text or 'apres-demain' in text:
-            return now + timedelta(days=2)
-        elif 'semaine prochaine' in text:
-            return now + timedelta(weeks=1)
-        
-        # أيام الأسبوع
-        days_map = {
-            'lundi': 0, 'mardi': 1, 'mercredi': 2,
-            'jeudi': 3, 'vendredi': 4, 'samedi': 5, 'dimanche': 6
-        }
-        
-        for day_name, day_num in days_map.items():
-            if day_name in text:
-                days_ahead = (day_num - now.weekday()) % 7
-                if days_ahead == 0:
-                    days_ahead = 7
-                return now + timedelta(days=days_ahead)
-        
-        return None
+        return DateTimeParser._parse_relative_date(text)
     
     @staticmethod
     def parse_english_date(text: str) -> Optional[datetime]:
         """تحليل التواريخ بالإنجليزية"""
-        now = datetime.now()
-        text = text.lower()
-        
-        if 'today' in text:
-            return now
-        elif 'tomorrow' in text:
-            return now + timedelta(days=1)
-        elif 'day after tomorrow' in text:
-            return now + timedelta(days=2)
-        elif 'next week' in text:
-            return now + timedelta(weeks=1)
-        
-        # أيام الأسبوع
-        days_map = {
-            'monday': 0, 'tuesday': 1, 'wednesday': 2,
-            'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6
-        }
-        
-        for day_name, day_num in days_map.items():
-            if day_name in text:
-                days_ahead = (day_num - now.weekday()) % 7
-                if days_ahead == 0:
-                    days_ahead = 7
-                return now + timedelta(days=days_ahead)
-        
-        return None
+        return DateTimeParser._parse_relative_date(text)
     
     @staticmethod
     def parse_time(text: str) -> Optional[Tuple[int, int]]:
         """استخراج الوقت من النص"""
-        # نمط XX:XX
-        time_pattern = r'(\d{1,2})[:](\d{2})'
-        match = re.search(time_pattern, text)
-        if match:
-            hour, minute = int(match.group(1)), int(match.group(2))
-            if 0 <= hour <= 23 and 0 <= minute <= 59:
-                return (hour, minute)
-        
-        # نمط "الساعة X" أو "X صباحاً" أو "X مساءً"
-        hour_pattern = r'(\d{1,2})\s*(صباحا|صباحً|مساء|مساءً|am|pm|h)?'
-        match = re.search(hour_pattern, text.lower())
-        if match:
-            hour = int(match.group(1))
-            period = match.group(2)
-            
-            if period in ['مساء', 'مساءً', 'pm'] and hour < 12:
-                hour += 12
-            elif period in ['صباحا', 'صباحً', 'am'] and hour == 12:
-                hour = 0
-            
-            if 0 <= hour <= 23:
-                return (hour, 0)
-        
-        return None
+        return datetime_engine.extract_time(text)
     
     @staticmethod
     def parse_numeric_date(text: str) -> Optional[datetime]:
-        """استخراج تاريخ رقمي من النص"""
-        # DD/MM/YYYY أو DD-MM-YYYY
-        date_match = re.search(r'(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})', text)
-        if date_match:
-            day, month, year = map(int, date_match.groups())
-            if year < 100:
-                year += 2000
-            try:
-                return datetime(year, month, day)
-            except ValueError:
-                pass
-        
+        """استخراج تاريخ رقمي من النص (DD/MM/YYYY أو DD-MM-YYYY)"""
+        parsed = datetime_engine.parse(text)
+        if parsed.date_source == 'numeric':
+            return parsed.date
         return None
     
     @classmethod
     def parse_datetime(cls, text: str, language: str = 'ar') -> Optional[datetime]:
-        """تحليل التاريخ والوقت الكامل"""
-        # محاولة استخراج تاريخ رقمي أولاً
-        date = cls.parse_numeric_date(text)
-        
-        # إذا لم يُعثر على تاريخ رقمي، استخدم التحليل اللغوي
-        if not date:
-            if language == 'ar':
-                date = cls.parse_arabic_date(text)
-            elif language == 'fr':
-                date = cls.parse_french_date(text)
-            elif language == 'en':
-                date = cls.parse_english_date(text)
-        
-        # إذا لم يُعثر على تاريخ، استخدم غداً كافتراضي
-        if not date:
-            date = datetime.now() + timedelta(days=1)
-        
-        # استخراج الوقت
-        time = cls.parse_time(text)
-        
-        # دمج التاريخ والوقت
-        if time:
-            date = date.replace(hour=time[0], minute=time[1], second=0, microsecond=0)
-        else:
-            # وقت افتراضي (9 صباحاً)
-            date = date.replace(hour=9, minute=0, second=0, microsecond=0)
+        """
+        تحليل التاريخ والوقت الكامل
         
-        return date
+        نفس نتيجة IntelligentAgent.extract_datetime (غداً 9:00 افتراضياً)؛
+        language محفوظ للتوافق - المحلل الموحد يتعرف على اللغات الثلاث معاً.
+        """
+        return datetime_engine.extract_datetime(text)
     
     @staticmethod
     def combine_datetime(date: datetime, time: Optional[Tuple[int, int]]) -> datetime:
@@ -0,0 +1,408 @@
+# write_behind.py
+"""
+مخزن كتابة مؤجلة (Write-Behind) لبيانات القياس
+✅ تجميع الكتابات الصغيرة (interactions, conversation_history, performance_stats)
+   في معاملات متعددة الصفوف بدلاً من commit لكل رسالة
+✅ طابور محدود + سياسة تفريغ بالحجم/الوقت + تفريغ عند الإيقاف + ضغط عكسي
+"""
+
+import atexit
+import os
+import threading
+import time
+from queue import Queue, Empty, Full
+from typing import Dict, Hashable, List, Optional, Tuple
+import logging
+
+from database_pool import get_pool, DatabaseConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class _FlushRequest:
+    """طلب تفريغ فوري داخل الطابور"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class WriteBehindBuffer:
+    """
+    مخزن كتابة مؤجلة
+
+    المنتجون يضيفون (SQL, params) إلى طابور محدود ويعودون فوراً.
+    thread خلفي يجمع الكتابات ويكتبها في معاملة واحدة عند:
+    - امتلاء الدفعة (max_batch)
+    - مرور flush_interval على أول كتابة معلقة
+    - طلب flush() صريح أو الإيقاف
+
+    عند امتلاء الطابور ينتظر المنتج حتى put_timeout (ضغط عكسي)،
+    ثم يكتب مباشرة بدلاً من فقدان البيانات.
+    """
+
+    def __init__(
+        self,
+        pool: DatabaseConnectionPool,
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        put_timeout: float = 2.0
+    ):
+        """
+        Args:
+            pool: مجموعة اتصالات قاعدة البيانات
+            max_batch: أقصى عدد كتابات في المعاملة الواحدة
+            flush_interval: أقصى مدة بقاء كتابة في المخزن (ثوانٍ)
+            max_queue: سعة الطابور
+            put_timeout: مدة انتظار المنتج عند امتلاء الطابور
+        """
+        self.pool = pool
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._queue: Queue = Queue(maxsize=max_queue)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._closed = False
+
+        # إحصائيات
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'coalesced': 0,
+            'batches': 0,
+            'backpressure': 0,
+            'errors': 0
+        }
+
+        self._thread = threading.Thread(
+            target=self._run,
+            daemon=True,
+            name="WriteBehindBuffer"
+        )
+        self._thread.start()
+
+    # ==========================================
+    # واجهة المنتجين
+    # ==========================================
+
+    def submit(self, sql: str, params: tuple, key: Optional[Hashable] = None):
+        """
+        إضافة كتابة مؤجلة
+
+        Args:
+            sql: استعلام الكتابة
+            params: المعاملات
+            key: مفتاح دمج اختياري - الكتابات بنفس المفتاح داخل الدفعة
+                 يُكتب آخرها فقط (مثل INSERT OR REPLACE لسياق المستخدم)
+        """
+        if self._closed:
+            self._write_direct([(sql, params, key)])
+            return
+
+        with self._pending_lock:
+            self._pending += 1
+        self.stats['submitted'] += 1
+
+        try:
+            self._queue.put((sql, params, key), timeout=self.put_timeout)
+        except Full:
+            # ضغط عكسي: الكاتب متأخر - نكتب مباشرة بدلاً من فقدان البيانات
+            self.stats['backpressure'] += 1
+            logger.warning("⚠️ مخزن الكتابة ممتلئ - كتابة مباشرة")
+            self._write_direct([(sql, params, key)])
+            self._release(1)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        انتظار كتابة كل ما سبق إضافته (قبل قراءة تعتمد عليه)
+
+        Returns:
+            bool: True إذا اكتمل التفريغ خلال المهلة
+        """
+        if self._pending == 0 or self._closed:
+            return True
+
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except Full:
+            return False
+
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """تفريغ الكتابات المعلقة وإيقاف الـ thread"""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+
+    def pending_count(self) -> int:
+        """عدد الكتابات التي لم تُكتب بعد"""
+        return self._pending
+
+    # ==========================================
+    # الكاتب الخلفي
+    # ==========================================
+
+    def _release(self, count: int):
+        with self._pending_lock:
+            self._pending -= count
+
+    def _run(self):
+        """حلقة التجميع والكتابة"""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except Empty:
+                continue
+
+            batch: List[Tuple] = []
+            waiters: List[_FlushRequest] = []
+            stop = False
+
+            # أول كتابة تحدد موعد التفريغ
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _FlushRequest):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+
+                if stop or waiters or len(batch) >= self.max_batch:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+
+            if stop:
+                # تفريغ كل ما تبقى قبل الخروج
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except Empty:
+                        break
+                    if isinstance(item, _FlushRequest):
+                        waiters.append(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+
+            if batch:
+                self._write_batch(batch)
+                self._release(len(batch))
+
+            for waiter in waiters:
+                waiter.done.set()
+
+            if stop:
+                return
+
+    def _group(self, batch: List[Tuple]) -> Dict[str, List[tuple]]:
+        """تجميع الكتابات حسب الاستعلام مع دمج الكتابات ذات المفتاح"""
+        latest_keyed = {}
+        for index, (_, _, key) in enumerate(batch):
+            if key is not None:
+                latest_keyed[key] = index
+
+        groups: Dict[str, List[tuple]] = {}
+        for index, (sql, params, key) in enumerate(batch):
+            if key is not None and latest_keyed[key] != index:
+                self.stats['coalesced'] += 1
+                continue
+            groups.setdefault(sql, []).append(params)
+
+        return groups
+
+    def _write_batch(self, batch: List[Tuple]):
+        """كتابة دفعة في معاملة واحدة"""
+        groups = self._group(batch)
+
+        try:
+            with self.pool.get_cursor() as cursor:
+                for sql, rows in groups.items():
+                    cursor.executemany(sql, rows)
+
+            self.stats['written'] += sum(len(rows) for rows in groups.values())
+            self.stats['batches'] += 1
+
+        except Exception as e:
+            # صف معطوب لا يُسقط الدفعة كاملة: إعادة المحاولة صفاً صفاً
+            logger.error(f"❌ فشل كتابة الدفعة ({len(batch)}): {e} - إعادة المحاولة فردياً")
+            self._write_direct([
+                (sql, params, None) for sql, rows in groups.items() for params in rows
+            ])
+
+    def _write_direct(self, items: List[Tuple]):
+        """كتابة فورية (بدون تجميع)"""
+        for sql, params, _ in items:
+            try:
+                with self.pool.get_cursor() as cursor:
+                    cursor.execute(sql, params)
+                self.stats['written'] += 1
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ فشل الكتابة المؤجلة: {e}")
+
+    def get_stats(self) -> dict:
+        """الحصول على الإحصائيات"""
+        return {
+            **self.stats,
+            'pending': self._pending,
+            'queued': self._queue.qsize(),
+            'rows_per_batch': (
+                self.stats['written'] / self.stats['batches']
+                if self.stats['batches'] > 0 else 0
+            )
+        }
+
+
+# ==========================================
+# Global Buffer Instance
+# ==========================================
+
+# مخزن واحد لكل ملف قاعدة بيانات
+_buffers: Dict[str, WriteBehindBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_write_buffer(db_path: str = "agent_data.db", **kwargs) -> WriteBehindBuffer:
+    """
+    الحصول على مخزن الكتابة المشترك لقاعدة البيانات (Singleton لكل مسار)
+
+    Args:
+        db_path: مسار قاعدة البيانات
+        **kwargs: معاملات إضافية للمخزن (عند الإنشاء الأول فقط)
+    """
+    key = os.path.abspath(db_path)
+
+    with _buffers_lock:
+        buffer = _buffers.get(key)
+        if buffer is None or buffer._closed:
+            buffer = WriteBehindBuffer(get_pool(db_path), **kwargs)
+            _buffers[key] = buffer
+
+    return buffer
+
+
+def flush_all_write_buffers(timeout: float = 10.0):
+    """تفريغ جميع المخازن دون إيقافها"""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+
+    for buffer in buffers:
+        buffer.flush(timeout)
+
+
+def close_all_write_buffers():
+    """تفريغ وإيقاف جميع المخازن (يُستدعى عند الخروج)"""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+        _buffers.clear()
+
+    for buffer in buffers:
+        buffer.close()
+
+
+atexit.register(close_all_write_buffers)
+
+
+# ==========================================
+# اختبار الأداء
+# ==========================================
+
+if __name__ == "__main__":
+    import sqlite3
+
+    print("="*70)
+    print("🧪 اختبار مخزن الكتابة المؤجلة")
+    print("="*70)
+
+    db_path = "test_write_behind.db"
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, user_message TEXT,
+            bot_response TEXT, intent TEXT, language TEXT)
+    ''')
+    conn.execute('''
+        CREATE TABLE conversation_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, user_message TEXT,
+            bot_response TEXT, intent TEXT, extracted_info TEXT)
+    ''')
+    conn.execute('''
+        CREATE TABLE performance_stats (
+            date TEXT, intent TEXT, total_predictions INTEGER DEFAULT 0,
+            correct_predictions INTEGER DEFAULT 0, UNIQUE(date, intent))
+    ''')
+    conn.commit()
+    conn.close()
+
+    writes = [
+        ('INSERT INTO interactions (user_id, user_message, bot_response, intent, language) '
+         'VALUES (?, ?, ?, ?, ?)', lambda i: (i % 50, 'موعد غدا', 'تم', 'add_appointment', 'ar')),
+        ('INSERT INTO conversation_history (user_id, user_message, bot_response, intent, extracted_info) '
+         'VALUES (?, ?, ?, ?, ?)', lambda i: (i % 50, 'موعد غدا', 'تم', 'add_appointment', '{}')),
+        ('INSERT INTO performance_stats (date, intent, total_predictions, correct_predictions) '
+         'VALUES (?, ?, 1, 1) ON CONFLICT(date, intent) DO UPDATE SET '
+         'total_predictions = total_predictions + 1, correct_predictions = correct_predictions + 1',
+         lambda i: ('2026-01-01', 'add_appointment')),
+    ]
+    messages = 2000
+    pool = get_pool(db_path)
+
+    # قبل: commit لكل كتابة
+    start = time.perf_counter()
+    for i in range(messages):
+        for sql, params in writes:
+            with pool.get_cursor() as cursor:
+                cursor.execute(sql, params(i))
+    direct = time.perf_counter() - start
+
+    # بعد: إضافة إلى المخزن فقط (الكتابة في الخلفية)
+    buffer = get_write_buffer(db_path)
+    start = time.perf_counter()
+    for i in range(messages):
+        for sql, params in writes:
+            buffer.submit(sql, params(i))
+    enqueue = time.perf_counter() - start
+    buffer.flush()
+    total = time.perf_counter() - start
+
+    print(f"\n📊 {messages} رسالة × {len(writes)} كتابات:")
+    print(f"   قبل (commit لكل كتابة): {direct / messages * 1e6:,.0f} µs/رسالة")
+    print(f"   بعد (زمن الرسالة):       {enqueue / messages * 1e6:,.1f} µs/رسالة")
+    print(f"   بعد (حتى اكتمال الكتابة): {total / messages * 1e6:,.0f} µs/رسالة")
+    print(f"   📦 {buffer.get_stats()}")
+
+    close_all_write_buffers()
+    pool.close_all()
+
+    rows = sqlite3.connect(db_path).execute('SELECT COUNT(*) FROM interactions').fetchone()[0]
+    print(f"   ✅ interactions: {rows} صف (متوقع {messages * 2})")
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    print("="*70)
+    print("✅ الاختبار اكتمل!")